@@ -0,0 +1,112 @@
+# actRouter.py
+# Query -> likely Acts, decided from the e5 query embedding before vector search.
+#
+# Without an `act` filter retrieve_dense searches all 20 Acts. The router scores the
+# query against each Act (a softmax-regression model trained offline by
+# data/scripts/trainActRouter.py, or plain Act-centroid similarity) and, when it is
+# confident, scopes the Chroma query to {"act": {"$in": [...]}}. With the sharded
+# layout that also means only those shards are searched. Low-confidence queries fall
+# back to the global search.
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max()
+    e = np.exp(z)
+    return e / e.sum()
+
+
+def question_hash(q: str) -> str:
+    """Identifies labelled questions used in training, so evalActRouter.py can leave them out."""
+    return hashlib.sha1(q.strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+def act_where(acts: List[str]) -> Dict[str, Any]:
+    return {"act": acts[0]} if len(acts) == 1 else {"act": {"$in": list(acts)}}
+
+
+class ActRouter:
+    def __init__(self, acts: List[str], centroids: np.ndarray, W: Optional[np.ndarray] = None,
+                 b: Optional[np.ndarray] = None, temperature: float = 0.05, mode: str = "linear",
+                 min_conf: float = 0.5, mass: float = 0.9, max_acts: int = 3, model: str = ""):
+        self.acts = list(acts)
+        self.model = model   # embedder the router was trained on
+        self.centroids = np.asarray(centroids, dtype=np.float32)   # [n_acts, dim], unit rows
+        self.W = None if W is None else np.asarray(W, dtype=np.float32)   # [n_acts, dim]
+        self.b = None if b is None else np.asarray(b, dtype=np.float32)
+        self.temperature = float(temperature)
+        self.mode = mode if (mode == "centroid" or self.W is not None) else "centroid"
+        self.min_conf = float(min_conf)
+        self.mass = float(mass)
+        self.max_acts = max(1, int(max_acts))
+
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.fallbacks = 0
+        self.acts_searched = 0
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ActRouter":
+        data = np.load(path, allow_pickle=False)
+        W = data["W"] if "W" in data.files else None
+        b = data["b"] if "b" in data.files else None
+        temperature = float(data["temperature"]) if "temperature" in data.files else 0.05
+        model = str(data["model"]) if "model" in data.files else ""
+        return cls([str(a) for a in data["acts"]], data["centroids"], W, b, temperature, model=model, **kwargs)
+
+    @property
+    def dim(self) -> int:
+        return int(self.centroids.shape[1])
+
+    def probabilities(self, q_emb) -> np.ndarray:
+        q = np.asarray(q_emb, dtype=np.float32)
+        if self.mode == "linear":
+            return _softmax(self.W @ q + self.b)
+        return _softmax((self.centroids @ q) / self.temperature)
+
+    def rank(self, q_emb, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        p = self.probabilities(q_emb)
+        order = np.argsort(-p)[:k or len(self.acts)]
+        return [(self.acts[i], float(p[i])) for i in order]
+
+    def scope(self, q_emb) -> Tuple[Optional[List[str]], List[Tuple[str, float]]]:
+        """
+        (acts to search, ranked (act, prob) pairs). acts is None when the top Act is
+        below min_conf: search everything. Otherwise Acts are taken in order until
+        their probability mass reaches `mass`, at most max_acts of them.
+        """
+        ranked = self.rank(q_emb, self.max_acts)
+        if not ranked or ranked[0][1] < self.min_conf:
+            with self._lock:
+                self.fallbacks += 1
+            return None, ranked
+        acts, total = [], 0.0
+        for act, p in ranked:
+            acts.append(act)
+            total += p
+            if total >= self.mass:
+                break
+        with self._lock:
+            self.routed += 1
+            self.acts_searched += len(acts)
+        return acts, ranked
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.routed + self.fallbacks
+            return {
+                "model": self.model,
+                "mode": self.mode,
+                "acts": len(self.acts),
+                "min_conf": self.min_conf,
+                "mass": self.mass,
+                "max_acts": self.max_acts,
+                "routed": self.routed,
+                "fallbacks": self.fallbacks,
+                "routed_rate": round(self.routed / n, 4) if n else 0.0,
+                "mean_acts_searched": round(self.acts_searched / self.routed, 2) if self.routed else 0.0,
+            }
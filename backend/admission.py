@@ -0,0 +1,208 @@
+# admission.py
+# Admission control for /askQuery: per-client token buckets, a concurrency limit with a
+# bounded wait queue, and counters for /metrics.
+#
+# Every request that gets past the fast paths (citation, definition, semantic cache) pins a
+# worker thread on the cross-encoder or on a generator call of up to GENERATOR_TIMEOUT_S.
+# Admitting all of them turns a spike into queueing collapse: everyone waits, then times
+# out. Here at most `slots` requests run the full pipeline at once, at most `queue_size`
+# wait (each for at most its timeout), and the rest are refused straight away with a
+# Retry-After, so clients back off instead of piling on. RateLimiter keeps one client
+# from using up the slots. AdmissionController is for threaded servers (Flask / gthread);
+# AsyncAdmissionController does the same on an asyncio loop (asyncServer.py).
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class RateLimiter:
+    """Token bucket per client key: `rate` requests/s on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()   # key -> [tokens, last refill]
+
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, key: str) -> float:
+        """0.0 if the request may go ahead, else seconds until the client has a token again."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)   # least recently seen client
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (1.0 - bucket[0]) / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.allowed + self.limited
+            return {
+                "rate_per_s": self.rate,
+                "burst": self.burst,
+                "clients": len(self._buckets),
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "limited_rate": round(self.limited / n, 4) if n else 0.0,
+            }
+
+
+def _percentile(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(math.ceil(p / 100 * len(xs))) - 1)]
+
+
+class _AdmissionCounters:
+    def __init__(self, slots: int, queue_size: int):
+        self.slots = max(1, slots)
+        self.queue_size = max(0, queue_size)
+        self.in_flight = 0
+        self.queued = 0
+        self.service_ms: Optional[float] = None   # moving average time a slot is held
+
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.bypassed = 0
+        self.max_queued = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+        self._waits: deque = deque(maxlen=1000)   # ms spent queued by admitted requests that waited
+
+    def bypass(self):
+        """A request answered by a fast path without taking a slot."""
+        with self._lock:
+            self.bypassed += 1
+
+    def retry_after_s(self) -> int:
+        """Rough time until a slot frees up for a new arrival, for the Retry-After header."""
+        per_request_s = (self.service_ms or 1000.0) / 1000
+        return max(1, min(60, math.ceil(per_request_s * (self.queued + 1) / self.slots)))
+
+    def _admit(self, waited_ms: Optional[float]) -> float:
+        with self._lock:
+            self.admitted += 1
+            if waited_ms is not None:
+                self._waits.append(waited_ms)
+        return time.perf_counter()
+
+    def _shed(self, reason: str):
+        with self._lock:
+            self.shed[reason] += 1
+
+    def _held(self, ticket: float):
+        ms = (time.perf_counter() - ticket) * 1000
+        with self._lock:
+            self.service_ms = ms if self.service_ms is None else self.service_ms + 0.2 * (ms - self.service_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "slots": self.slots,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "bypassed": self.bypassed,
+                "shed": dict(self.shed),
+                "queued_admits": len(waits),
+                "queue_wait_ms_p50": round(_percentile(waits, 50), 2),
+                "queue_wait_ms_p95": round(_percentile(waits, 95), 2),
+                "service_ms": round(self.service_ms, 2) if self.service_ms is not None else None,
+            }
+
+
+class AdmissionController(_AdmissionCounters):
+    """Concurrency limit + bounded FIFO-ish wait queue for threaded servers."""
+
+    def __init__(self, slots: int, queue_size: int):
+        super().__init__(slots, queue_size)
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout_s: float) -> Tuple[Optional[float], str]:
+        """(ticket, "") once a slot is held - pass the ticket to release() - or (None, reason)
+        with reason "queue_full" or "timeout"."""
+        t0 = time.perf_counter()
+        with self._cond:
+            if self.in_flight < self.slots and not self.queued:
+                self.in_flight += 1
+                return self._admit(None), ""
+            if self.queued >= self.queue_size or timeout_s <= 0:
+                reason = "queue_full" if timeout_s > 0 else "timeout"
+                self._shed(reason)
+                return None, reason
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                while self.in_flight >= self.slots:
+                    left = t0 + timeout_s - time.perf_counter()
+                    if left <= 0:
+                        self._shed("timeout")
+                        return None, "timeout"
+                    self._cond.wait(left)
+                self.in_flight += 1
+            finally:
+                self.queued -= 1
+        return self._admit((time.perf_counter() - t0) * 1000), ""
+
+    def release(self, ticket: float):
+        self._held(ticket)
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+
+class AsyncAdmissionController(_AdmissionCounters):
+    """Same policy for coroutines on one event loop (create it inside the loop)."""
+
+    def __init__(self, slots: int, queue_size: int):
+        super().__init__(slots, queue_size)
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, timeout_s: float) -> Tuple[Optional[float], str]:
+        t0 = time.perf_counter()
+        async with self._cond:
+            if self.in_flight < self.slots and not self.queued:
+                self.in_flight += 1
+                return self._admit(None), ""
+            if self.queued >= self.queue_size or timeout_s <= 0:
+                reason = "queue_full" if timeout_s > 0 else "timeout"
+                self._shed(reason)
+                return None, reason
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.in_flight < self.slots), timeout_s)
+                self.in_flight += 1
+            except asyncio.TimeoutError:
+                self._shed("timeout")
+                return None, "timeout"
+            finally:
+                self.queued -= 1
+        return self._admit((time.perf_counter() - t0) * 1000), ""
+
+    async def release(self, ticket: float):
+        self._held(ticket)
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
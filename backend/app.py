@@ -1,4 +1,4 @@
-import os, logging, time, uuid
+import os, sys, re, logging, time, uuid, json, hashlib, hmac, threading, math
 from logging.handlers import RotatingFileHandler
 from typing import List, Dict, Any, Optional, Tuple
 
@@ -15,15 +15,19 @@ import requests
 CHROMA_PATH     = os.getenv("CHROMA_PATH", "../data/scripts/chroma")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "actSectionsV2")
 EMBED_MODEL     = os.getenv("HF_EMBED_MODEL", "intfloat/e5-base-v2")
+INDEX_LAYOUT    = os.getenv("INDEX_LAYOUT", "single").lower()  # "single" | "sharded" (see shards.py)
+SHARD_WORKERS   = int(os.getenv("SHARD_WORKERS", "8"))
 
 TOP_K_RETRIEVE  = int(os.getenv("TOP_K_RETRIEVE", "12"))
 TOP_K_RETURN    = int(os.getenv("TOP_K_RETURN", "5"))
 
 CSV_LOG         = os.path.abspath(os.getenv("CSV_LOG", "../outputs/queryLog.csv"))
+QUERY_LOG       = os.getenv("QUERY_LOG", "1") == "1"   # 0 = don't append to CSV_LOG (offline jobs)
 LOG_LEVEL       = os.getenv("APP_LOG_LEVEL", "DEBUG").upper()
 GENERATOR_URL   = os.getenv("GENERATOR_URL", "").strip()
 NOTEBOOK_API_KEY = os.getenv("NOTEBOOK_API_KEY", "")
 GENERATOR_TIMEOUT_S = int(os.getenv("GENERATOR_TIMEOUT_S", "120"))
+TORCH_THREADS   = int(os.getenv("TORCH_THREADS", "0"))  # 0 = leave torch's default
 BACKEND_MODE    = "proxy" if GENERATOR_URL else "retrieval-only"
 LOG_COLUMNS     = [
     "Query",
@@ -35,6 +39,87 @@ LOG_COLUMNS     = [
 ]
 MAX_TOP_TEXT_CHARS = 500
 
+SEMANTIC_CACHE           = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_SIZE      = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+SEMANTIC_CACHE_TTL_S     = float(os.getenv("SEMANTIC_CACHE_TTL_S", "3600"))
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1536"))  # 0 = no budget
+CONTEXT_TOKENIZER    = os.getenv("CONTEXT_TOKENIZER", "")               # e.g. Qwen/Qwen3-8B; "" = whitespace tokens
+CITATION_FAST_PATH   = os.getenv("CITATION_FAST_PATH", "1") == "1"
+CITATION_MODE        = os.getenv("CITATION_MODE", "auto").lower()       # auto | direct | merge | off
+CITATION_MODES       = ("auto", "direct", "merge", "off")
+DEFINITIONS_PATH     = os.getenv("DEFINITIONS_PATH", "../data/ActDefinitions/definitionsIndex.json")
+DEFINITIONS_FAST_PATH = os.getenv("DEFINITIONS_FAST_PATH", "0") == "1"
+ACT_ROUTER_PATH      = os.getenv("ACT_ROUTER_PATH", "../data/scripts/actRouter.npz")
+ACT_ROUTER           = os.getenv("ACT_ROUTER", "1") == "1"
+ACT_ROUTER_MODE      = os.getenv("ACT_ROUTER_MODE", "linear")      # linear | centroid
+ACT_ROUTER_MIN_CONF  = float(os.getenv("ACT_ROUTER_MIN_CONF", "0.5"))
+ACT_ROUTER_MASS      = float(os.getenv("ACT_ROUTER_MASS", "0.9"))
+ACT_ROUTER_MAX_ACTS  = int(os.getenv("ACT_ROUTER_MAX_ACTS", "3"))
+VECTOR_INDEX         = os.getenv("VECTOR_INDEX", "chroma").lower()    # chroma | compressed | hnsw (see compressedIndex.py, hnswIndex.py)
+COMPRESSED_INDEX_PATH = os.getenv("COMPRESSED_INDEX_PATH", "../data/scripts/compressedIndex.npz")
+COMPRESSED_RESCORE   = int(os.getenv("COMPRESSED_RESCORE", "0"))       # candidates re-scored in float32; 0 = index default
+HNSW_INDEX_PATH      = os.getenv("HNSW_INDEX_PATH", "../data/scripts/hnswIndex.bin")
+HNSW_EF              = int(os.getenv("HNSW_EF", "0"))                  # default search ef; 0 = tuned (per Act filter)
+HNSW_MAX_EF          = int(os.getenv("HNSW_MAX_EF", "1000"))           # largest search_ef a request may ask for
+DOC_STORE            = os.getenv("DOC_STORE", "1") == "1"               # proxy mode: hydrate sources in-process
+DEADLINE_MS          = int(os.getenv("DEADLINE_MS", "0"))              # per-request budget, deadline_ms overrides; 0 = none
+DEADLINE_RESERVE_MS  = int(os.getenv("DEADLINE_RESERVE_MS", "500"))     # proxy mode: kept for the retrieval-only fallback
+DEADLINE_PROBE_S     = float(os.getenv("DEADLINE_PROBE_S", "30"))        # a stage skipped on its estimate still runs this often
+ADMISSION            = os.getenv("ADMISSION", "1") == "1"
+ADMISSION_SLOTS      = int(os.getenv("ADMISSION_SLOTS", os.getenv("MODEL_WORKERS", "2")))  # full-pipeline requests at once
+ADMISSION_QUEUE      = int(os.getenv("ADMISSION_QUEUE", "16"))          # waiting beyond the slots; more -> 503
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "5"))
+ADMISSION_GENERATOR_SLOTS = int(os.getenv("ADMISSION_GENERATOR_SLOTS", "32"))  # proxy mode: generator calls at once (no model slot)
+RATE_LIMIT_RPS       = float(os.getenv("RATE_LIMIT_RPS", "0"))          # per API key / IP; 0 = no limit
+RATE_LIMIT_BURST     = int(os.getenv("RATE_LIMIT_BURST", "10"))
+SINGLE_FLIGHT        = os.getenv("SINGLE_FLIGHT", "1") == "1"            # coalesce identical in-flight queries
+INDEX_POINTER_FILE   = os.getenv("INDEX_POINTER_FILE", "../data/scripts/activeIndex.json")  # "" = COLLECTION_NAME only
+INDEX_WATCH_S        = float(os.getenv("INDEX_WATCH_S", "5"))            # pointer file poll; 0 = admin endpoint only
+INDEX_SMOKE_PATH     = os.getenv("INDEX_SMOKE_PATH", "../testing/uhakiRetrievalResults.csv")
+INDEX_SMOKE_N        = int(os.getenv("INDEX_SMOKE_N", "40"))
+INDEX_SMOKE_MIN_HIT  = float(os.getenv("INDEX_SMOKE_MIN_HIT", "0.6"))     # Act hit rate a new version needs
+INDEX_SMOKE_MAX_DROP = float(os.getenv("INDEX_SMOKE_MAX_DROP", "0.05"))   # ... and how far below the active one it may be
+INDEX_BUILD_DIR      = os.getenv("INDEX_BUILD_DIR", "../data/scripts")
+INDEX_BUILD_CMD      = os.getenv("INDEX_BUILD_CMD", "createEmbeddings.py")
+ADMIN_API_KEY        = os.getenv("ADMIN_API_KEY", "")                     # /admin/* disabled when empty
+FAQ_STORE_PATH       = os.getenv("FAQ_STORE_PATH", "../outputs/faqStore.json")  # built by buildFaqStore.py
+FAQ_STORE            = os.getenv("FAQ_STORE", "1") == "1"
+FAST_JSON            = os.getenv("FAST_JSON", "1") == "1"                # orjson when installed
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "1") == "1"     # brotli / gzip per Accept-Encoding
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+SHADOW_COLLECTION    = os.getenv("SHADOW_COLLECTION", "")                 # candidate-embedder collection; "" = no shadow
+SHADOW_CHROMA_PATH   = os.getenv("SHADOW_CHROMA_PATH", "") or CHROMA_PATH
+SHADOW_MODEL         = os.getenv("SHADOW_MODEL", "")                      # "" = the collection's "model" metadata
+SHADOW_QUERY_PREFIX  = os.getenv("SHADOW_QUERY_PREFIX", "query: ")        # "" for embedders trained without one
+SHADOW_SAMPLE        = float(os.getenv("SHADOW_SAMPLE", "0.1"))            # fraction of retrievals mirrored
+SHADOW_QUEUE         = int(os.getenv("SHADOW_QUEUE", "64"))                # pending mirrors; more are dropped
+SHADOW_LOG           = os.path.abspath(os.getenv("SHADOW_LOG", "../outputs/shadowLog.jsonl"))
+PAGE_POOL_SIZE       = int(os.getenv("PAGE_POOL_SIZE", "60"))            # dense candidates kept for a paginated query
+PAGE_RERANK_BATCH    = int(os.getenv("PAGE_RERANK_BATCH", "0"))          # pool candidates reranked per page extension; 0 = TOP_K_RETRIEVE
+PAGE_CURSORS         = int(os.getenv("PAGE_CURSORS", "256"))             # pools kept per process (LRU); 0 = no pagination
+PAGE_CURSOR_MB       = float(os.getenv("PAGE_CURSOR_MB", "64"))           # ... and their total size
+PAGE_CURSOR_TTL_S    = float(os.getenv("PAGE_CURSOR_TTL_S", "900"))
+SESSIONS             = int(os.getenv("SESSIONS", "512"))                 # conversations kept per process (LRU); 0 = no sessions
+SESSION_MB           = float(os.getenv("SESSION_MB", "128"))             # ... and their total size
+SESSION_TTL_S        = float(os.getenv("SESSION_TTL_S", "1800"))         # idle time before a session is dropped
+SESSION_TURNS        = int(os.getenv("SESSION_TURNS", "6"))              # turns kept per session
+SESSION_POOL_SIZE    = int(os.getenv("SESSION_POOL_SIZE", "36"))         # candidates (with embeddings) kept across turns
+SESSION_POOL_REUSE   = os.getenv("SESSION_POOL_REUSE", "0") == "1"      # answer follow-ups from the pool; off until the threshold is calibrated
+SESSION_POOL_MIN_SCORE = float(os.getenv("SESSION_POOL_MIN_SCORE", "0.8"))  # pool score at top_k_return needed to skip the search (uncalibrated)
+SESSION_DECAY        = float(os.getenv("SESSION_DECAY", "0.5"))          # weight left to earlier turns in the conversation embedding
+SESSION_CONTEXT_WEIGHT = float(os.getenv("SESSION_CONTEXT_WEIGHT", "0.5"))  # conversation embedding blended into a follow-up's
+SESSION_RERANK_CONTEXT = int(os.getenv("SESSION_RERANK_CONTEXT", "1"))   # earlier questions put before a follow-up for reranking a reused pool and for the generator's retrieval
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "3"))     # proxy mode: earlier turns sent to the generator
+CLAUSE_INDEX_PATH    = os.getenv("CLAUSE_INDEX_PATH", "../data/scripts/clauseIndex.npz")  # built by buildClauseIndex.py
+EXTRACTIVE           = os.getenv("EXTRACTIVE", "1") == "1"               # extractive answers from the clause index
+EXTRACT_CLAUSES      = int(os.getenv("EXTRACT_CLAUSES", "3"))            # clauses in an extractive answer
+EXTRACT_PER_CHUNK    = int(os.getenv("EXTRACT_PER_CHUNK", "2"))          # ... at most this many from one chunk
+EXTRACT_MIN_SCORE    = float(os.getenv("EXTRACT_MIN_SCORE", "0.78"))      # e5 cosine a clause needs to be quoted
+ANSWER_MODE          = os.getenv("ANSWER_MODE", "generate").lower()       # proxy mode default: generate | extractive
+ANSWER_MODES         = ("generate", "extractive")
+
 # ============================
 # App + Logging
 # ============================
@@ -67,9 +152,212 @@ embedder = SentenceTransformer(EMBED_MODEL)
 embedder.max_seq_length = 512
 logging.info(f"[INIT] Embedder ready: {EMBED_MODEL}")
 
-chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = chroma_client.get_collection(name=COLLECTION_NAME)
-logging.info(f"[INIT] Chroma collection loaded: {COLLECTION_NAME} @ {CHROMA_PATH}")
+# The active index version's objects; requests use the version they started on (params["index"]).
+chroma_client = None
+collection = None
+CORPUS_VERSION = ""
+citation_index = None
+doc_store = None
+corpus_lock = threading.Lock()
+
+from indexVersions import IndexVersion, IndexManager, load_smoke_questions, smoke_test
+from actRouter import ActRouter, act_where
+index_manager = IndexManager(INDEX_POINTER_FILE)
+active_index: Optional[IndexVersion] = None
+
+def open_collection():
+    """(Re)open the active index version: the pointer file's, else COLLECTION_NAME. Called again in
+    each forked worker, since SQLite handles must not be shared across processes."""
+    spec = index_manager.read_pointer() or {"name": COLLECTION_NAME}
+    try:
+        ix = open_index(spec, model=spec.get("model") or EMBED_MODEL)
+    except Exception:
+        if spec["name"] == COLLECTION_NAME:
+            raise
+        logging.exception(f"[INIT] Could not open index {spec['name']!r} from {INDEX_POINTER_FILE}; "
+                          f"using {COLLECTION_NAME}")
+        ix = open_index({"name": COLLECTION_NAME}, model=EMBED_MODEL)
+    index_manager.reset()
+    use_index(ix)
+    index_manager.activate(ix)
+
+def start_index_watch():
+    """Follow INDEX_POINTER_FILE from this process. Started by the serving process (gunicorn
+    post_fork, the first request, asyncServer startup), never in the preloading master, which
+    would otherwise load and smoke-test every new version itself. A no-op once running."""
+    index_manager.watch(INDEX_WATCH_S, lambda spec: switch_index(spec, validate=not spec.get("validated"),
+                                                                 publish=False))
+
+def open_index(spec: Dict[str, Any], model: Optional[str] = None) -> IndexVersion:
+    """Open an index version ({"name", "path"?, "model"?}) and build its corpus-derived state."""
+    path = spec.get("path") or CHROMA_PATH
+    client = chromadb.PersistentClient(path=path)
+    if INDEX_LAYOUT == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, spec["name"], max_workers=SHARD_WORKERS)
+    else:
+        coll = client.get_collection(name=spec["name"])
+    model = model or spec.get("model") or (coll.metadata or {}).get("model") or EMBED_MODEL
+    ix = IndexVersion(spec["name"], path, coll, query_embedder(model), model)
+    ix.client = client
+    load_corpus_state(ix)
+    logging.info(f"[INIT] Chroma collection loaded: {ix.name} @ {path} ({INDEX_LAYOUT}) "
+                 f"version={ix.corpus_version} embed_model={model}")
+    if EXTRACTIVE:
+        ix.clause_index = load_clause_index(ix)
+    if ACT_ROUTER:
+        ix.act_router = load_act_router(ix)
+    if VECTOR_INDEX == "compressed":
+        ix.collection = wrap_compressed(coll)
+    elif VECTOR_INDEX == "hnsw":
+        ix.collection = wrap_hnsw(coll)
+    return ix
+
+def query_embedder(model: str):
+    """The embedder for an index version; the one loaded at startup unless the version was built with another."""
+    for ix in (active_index, index_manager.previous):
+        if ix is not None and ix.embed_model == model:
+            return ix.embedder
+    if model == EMBED_MODEL:
+        return embedder
+    logging.info(f"[INIT] Loading query embedder {model} for a new index version")
+    m = SentenceTransformer(model)
+    m.max_seq_length = 512
+    return m
+
+def use_index(ix: IndexVersion):
+    """Point new requests at ix. Requests already running keep the version they pinned."""
+    global active_index, chroma_client, collection, CORPUS_VERSION, citation_index, doc_store
+    chroma_client = ix.client
+    collection = ix.collection
+    CORPUS_VERSION = ix.corpus_version
+    citation_index = ix.citation_index
+    doc_store = ix.doc_store
+    active_index = ix
+
+def pinned_index(params: Optional[Dict[str, Any]] = None) -> IndexVersion:
+    return (params or {}).get("index") or active_index
+
+def load_corpus_state(ix: IndexVersion):
+    """Corpus version plus everything derived from the chunk texts (citation index, doc store),
+    built from a single scan of the collection."""
+    coll = getattr(ix.collection, "base", ix.collection)
+    ix.corpus_version = corpus_version_of(coll, ix.name)
+    want_docs = DOC_STORE and BACKEND_MODE == "proxy"
+    if not (CITATION_FAST_PATH or want_docs):
+        return
+    from shards import iter_collection
+    records = list(iter_collection(coll, include=["documents", "metadatas"]))
+    if CITATION_FAST_PATH:
+        from citations import CitationIndex
+        try:
+            ix.citation_index = CitationIndex().build(records)
+        except Exception:
+            logging.exception("[INIT] Could not build the citation index; fast path disabled")
+            ix.citation_index = None
+    if want_docs:
+        from docStore import DocStore
+        ix.doc_store = (ix.doc_store or DocStore()).build(records, ix.corpus_version)
+
+def refresh_corpus_state(ix: Optional[IndexVersion] = None) -> bool:
+    """Rebuild the corpus-derived state if the collection changed under us (e.g. re-embedded).
+    Only called on a doc store miss, so the count() round trip stays off the normal path."""
+    ix = ix or active_index
+    with corpus_lock:
+        version = corpus_version_of(getattr(ix.collection, "base", ix.collection), ix.name)
+        if version == ix.corpus_version:
+            return False
+        logging.info(f"[DOCS] Corpus changed {ix.corpus_version} -> {version}; rebuilding")
+        load_corpus_state(ix)
+        if ix is active_index:
+            use_index(ix)
+        return True
+
+def wrap_compressed(coll):
+    """Serve vector search from the PCA/PQ or binary index; documents and metadata still come from Chroma."""
+    from compressedIndex import CompressedIndex, CompressedCollection
+    try:
+        index = CompressedIndex.load(COMPRESSED_INDEX_PATH, rescore=COMPRESSED_RESCORE or None)
+    except Exception:
+        logging.exception(f"[INIT] Could not load compressed index {COMPRESSED_INDEX_PATH}; using Chroma search")
+        return coll
+    if len(index) != coll.count():
+        logging.warning(f"[INIT] Compressed index has {len(index)} vectors but the collection has {coll.count()}; "
+                        f"rebuild it with data/scripts/buildCompressedIndex.py. Using Chroma search")
+        return coll
+    return CompressedCollection(coll, index)
+
+def wrap_hnsw(coll):
+    """Serve vector search from the tuned HNSW graph (per-request / per-Act search ef); documents and metadata still come from Chroma."""
+    from hnswIndex import HnswIndex, HnswCollection
+    try:
+        index = HnswIndex.load(HNSW_INDEX_PATH, default_ef=HNSW_EF)
+    except Exception:
+        logging.exception(f"[INIT] Could not load HNSW index {HNSW_INDEX_PATH}; using Chroma search")
+        return coll
+    if len(index) != coll.count():
+        logging.warning(f"[INIT] HNSW index has {len(index)} vectors but the collection has {coll.count()}; "
+                        f"re-run backend/tuneHnsw.py. Using Chroma search")
+        return coll
+    logging.info(f"[INIT] HNSW index M={index.config.get('M')} construction_ef={index.config.get('construction_ef')} "
+                 f"search_ef={index.default_ef} ({len(index.act_ef)} per-Act ef)")
+    return HnswCollection(coll, index)
+
+def load_clause_index(ix: IndexVersion):
+    """The clause index for extractive answers, if it was built from this version's collection and embedder."""
+    if not os.path.exists(CLAUSE_INDEX_PATH):
+        logging.info(f"[INIT] No clause index at {CLAUSE_INDEX_PATH}; run data/scripts/buildClauseIndex.py "
+                     f"for extractive answers")
+        return None
+    from clauseIndex import ClauseIndex
+    try:
+        index = ClauseIndex.load(CLAUSE_INDEX_PATH)
+    except Exception:
+        logging.exception(f"[INIT] Could not load clause index {CLAUSE_INDEX_PATH}; no extractive answers")
+        return None
+    meta = index.meta
+    count = ix.collection.count()
+    if meta.get("collection") != ix.name or meta.get("model") != ix.embed_model or meta.get("chunks") != count:
+        logging.warning(f"[INIT] Clause index was built from {meta.get('collection')} / {meta.get('model')} "
+                        f"({meta.get('chunks')} chunks), not {ix.name} / {ix.embed_model} ({count}); "
+                        f"rebuild it with data/scripts/buildClauseIndex.py. No extractive answers")
+        return None
+    logging.info(f"[INIT] Clause index: {len(index)} clauses of {count} chunks")
+    return index
+
+def load_act_router(ix: IndexVersion):
+    """The Act router for an index version, if it was trained on the version's embedder."""
+    if not os.path.exists(ACT_ROUTER_PATH):
+        logging.info(f"[INIT] No Act router at {ACT_ROUTER_PATH}; searching all Acts")
+        return None
+    try:
+        router = ActRouter.load(ACT_ROUTER_PATH, mode=ACT_ROUTER_MODE, min_conf=ACT_ROUTER_MIN_CONF,
+                                mass=ACT_ROUTER_MASS, max_acts=ACT_ROUTER_MAX_ACTS)
+    except Exception:
+        logging.exception("[INIT] Could not load the Act router; searching all Acts")
+        return None
+    dim = ix.embedder.get_sentence_embedding_dimension()
+    if router.model != ix.embed_model or router.dim != dim:
+        logging.warning(f"[INIT] Act router was trained on {router.model or 'an unknown embedder'} ({router.dim} dims), "
+                        f"not {ix.embed_model} ({dim}); retrain it with data/scripts/trainActRouter.py. "
+                        f"Searching all Acts on {ix.name}")
+        return None
+    logging.info(f"[INIT] Act router loaded for {ix.name} ({router.mode}, {len(router.acts)} Acts, "
+                 f"min_conf={ACT_ROUTER_MIN_CONF})")
+    return router
+
+def corpus_version_of(coll, name: str = COLLECTION_NAME) -> str:
+    """Cheap fingerprint of the live corpus; cached answers are dropped when it changes.
+    tuneHnsw.py's hnsw_tuned_* notes are left out: recording them changes no stored vector or text."""
+    raw = json.dumps({
+        "name": name,
+        "layout": INDEX_LAYOUT,
+        "count": coll.count(),
+        "metadata": {k: v for k, v in (coll.metadata or {}).items() if not k.startswith("hnsw_tuned_")},
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+open_collection()
 
 # ============================
 # Optional: Cross-encoder reranker (fallback to no-op)
@@ -87,6 +375,172 @@ except Exception:
             out.append(ch2)
         return out
 
+# ============================
+# Process tuning (used by the production entry points)
+# ============================
+def configure_torch_threads(n: int):
+    if n <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(n)
+        logging.info(f"[INIT] torch intra-op threads set to {n} (pid={os.getpid()})")
+    except Exception:
+        logging.exception("[INIT] Could not configure torch threads")
+
+def warm_up():
+    """Run one embed + rerank so the first real request doesn't pay for lazy init, then prewarm the caches."""
+    t0 = time.perf_counter()
+    q = "Warm-up query about employment law"
+    embed_query_e5(q)
+    try:
+        rerank_results(q, [{"text": "This is placeholder legal text for warm-up purposes only.", "score_before": 0.0}])
+    except Exception:
+        logging.exception("[INIT] Reranker warm-up failed")
+    logging.info(f"[INIT] Warm-up done in {round((time.perf_counter() - t0) * 1000, 2)} ms (pid={os.getpid()})")
+    prewarm_caches()
+
+configure_torch_threads(TORCH_THREADS)
+
+# ============================
+# Semantic answer cache
+# ============================
+semantic_cache = None
+if SEMANTIC_CACHE:
+    from semanticCache import SemanticCache
+    semantic_cache = SemanticCache(
+        max_entries=SEMANTIC_CACHE_SIZE,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl_s=SEMANTIC_CACHE_TTL_S
+    )
+    logging.info(f"[INIT] Semantic cache on (size={SEMANTIC_CACHE_SIZE}, threshold={SEMANTIC_CACHE_THRESHOLD})")
+
+# ============================
+# Materialized FAQ answers (built by buildFaqStore.py from the query log)
+# ============================
+faq_store = None
+if FAQ_STORE and os.path.exists(FAQ_STORE_PATH):
+    from faqStore import FaqStore
+    try:
+        faq_store = FaqStore.load(FAQ_STORE_PATH)
+        logging.info(f"[INIT] FAQ store: {len(faq_store)} materialized answers from {FAQ_STORE_PATH}")
+    except Exception:
+        logging.exception(f"[INIT] Could not load the FAQ store {FAQ_STORE_PATH}")
+
+# ============================
+# Statutory definitions (built by data/scripts/buildDefinitions.py)
+# ============================
+definitions_index = None
+if DEFINITIONS_FAST_PATH:
+    from definitions import DefinitionsIndex, render_definition
+    try:
+        definitions_index = DefinitionsIndex.load(DEFINITIONS_PATH)
+    except FileNotFoundError:
+        logging.warning(f"[INIT] No definitions index at {DEFINITIONS_PATH}; run data/scripts/buildDefinitions.py")
+    except Exception:
+        logging.exception("[INIT] Could not load the definitions index")
+
+# ============================
+# Context packing
+# ============================
+from contextPacker import ContextPacker, load_token_counter
+context_packer = ContextPacker(load_token_counter(CONTEXT_TOKENIZER), CONTEXT_TOKEN_BUDGET)
+logging.info(f"[INIT] Context packer: budget={CONTEXT_TOKEN_BUDGET} tokens ({context_packer.counter.name})")
+
+# ============================
+# Request deadlines
+# ============================
+from deadline import Deadline, StageCosts
+stage_costs = StageCosts(probe_s=DEADLINE_PROBE_S)
+logging.info(f"[INIT] Request deadline: {DEADLINE_MS} ms" if DEADLINE_MS > 0 else "[INIT] No request deadline")
+
+# ============================
+# Admission control + rate limits
+# ============================
+from admission import AdmissionController, RateLimiter
+admission = None
+generator_admission = None   # generator calls wait on I/O, so they don't hold the model slots
+if ADMISSION:
+    admission = AdmissionController(ADMISSION_SLOTS, ADMISSION_QUEUE)
+    logging.info(f"[INIT] Admission control: {ADMISSION_SLOTS} slots, queue {ADMISSION_QUEUE} "
+                 f"({ADMISSION_QUEUE_TIMEOUT_S}s max wait)")
+    if GENERATOR_URL:
+        generator_admission = AdmissionController(ADMISSION_GENERATOR_SLOTS, ADMISSION_QUEUE)
+        logging.info(f"[INIT] Generator calls: {ADMISSION_GENERATOR_SLOTS} slots, queue {ADMISSION_QUEUE}")
+rate_limiter = RateLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST) if RATE_LIMIT_RPS > 0 else None
+
+from singleFlight import SingleFlight
+from faqStore import normalize_query
+single_flight = SingleFlight() if SINGLE_FLIGHT else None
+
+# ============================
+# Response shaping + encoding
+# ============================
+from responseShaper import ResponseEncoder, shape, removed_bytes, FIELDS, CONTEXT_FORMATS
+response_encoder = ResponseEncoder(FAST_JSON, RESPONSE_COMPRESSION, RESPONSE_COMPRESS_MIN_BYTES)
+logging.info(f"[INIT] Responses: {'orjson' if response_encoder.fast_json else 'stdlib json'}, "
+             f"compression {'on' if RESPONSE_COMPRESSION else 'off'}")
+
+# ============================
+# Shadow index (candidate embedder, compared off the response path)
+# ============================
+from shadowIndex import ShadowMirror, chunk_key
+shadow = None
+
+def open_shadow_search():
+    """(search(query, acts, k), labels) over SHADOW_COLLECTION with its own embedder. Runs in the
+    mirror thread of each process, so the Chroma handles are never shared across a fork."""
+    client = chromadb.PersistentClient(path=SHADOW_CHROMA_PATH)
+    if INDEX_LAYOUT == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, SHADOW_COLLECTION, max_workers=SHARD_WORKERS)
+    else:
+        coll = client.get_collection(name=SHADOW_COLLECTION)
+    model_name = SHADOW_MODEL or (coll.metadata or {}).get("model") or EMBED_MODEL
+    model = query_embedder(model_name)
+
+    def search(query: str, acts: Optional[List[str]], k: int) -> Tuple[List[str], float, float]:
+        t0 = time.perf_counter()
+        q_emb = model.encode(SHADOW_QUERY_PREFIX + query, normalize_embeddings=True).tolist()
+        t1 = time.perf_counter()
+        kwargs = {"query_embeddings": [q_emb], "n_results": k, "include": ["metadatas"]}
+        if acts:
+            kwargs["where"] = {"act": acts[0]} if len(acts) == 1 else {"act": {"$in": list(acts)}}
+        res = coll.query(**kwargs)
+        t2 = time.perf_counter()
+        keys = [chunk_key(m) for m in res.get("metadatas", [[]])[0]]
+        return keys, (t1 - t0) * 1000, (t2 - t1) * 1000
+    return search, {"shadow_model": model_name, "shadow_dim": model.get_sentence_embedding_dimension(),
+                    "shadow_count": coll.count()}
+
+if SHADOW_COLLECTION and SHADOW_SAMPLE > 0:
+    shadow = ShadowMirror(open_shadow_search, SHADOW_SAMPLE, SHADOW_LOG, SHADOW_QUEUE,
+                          labels={"primary": active_index.name, "primary_model": active_index.embed_model,
+                                  "primary_dim": active_index.embedder.get_sentence_embedding_dimension(),
+                                  "primary_count": collection.count(), "shadow": SHADOW_COLLECTION})
+    logging.info(f"[INIT] Shadow index {SHADOW_COLLECTION}: mirroring {SHADOW_SAMPLE:.0%} of retrievals to {SHADOW_LOG}")
+
+# ============================
+# Result pages (cursor over a cached candidate pool)
+# ============================
+from resultPages import CursorStore, encode_cursor
+cursor_store = None
+if PAGE_CURSORS > 0:
+    cursor_store = CursorStore(PAGE_CURSORS, int(PAGE_CURSOR_MB * 2 ** 20), PAGE_CURSOR_TTL_S)
+    logging.info(f"[INIT] Result pages: {PAGE_CURSORS} pools / {PAGE_CURSOR_MB:g} MB, "
+                 f"{PAGE_POOL_SIZE} candidates each, TTL {PAGE_CURSOR_TTL_S:g}s")
+
+# ============================
+# Conversation sessions (multi-turn retrieval)
+# ============================
+from sessions import SessionStore, SESSION_ID_RE
+session_store = None
+if SESSIONS > 0:
+    session_store = SessionStore(SESSIONS, int(SESSION_MB * 2 ** 20), SESSION_TTL_S, SESSION_TURNS,
+                                 SESSION_POOL_SIZE if SESSION_POOL_REUSE else 0, SESSION_DECAY)
+    logging.info(f"[INIT] Sessions: {SESSIONS} / {SESSION_MB:g} MB, {SESSION_TURNS} turns and "
+                 f"{SESSION_POOL_SIZE if SESSION_POOL_REUSE else 0} pool candidates each, TTL {SESSION_TTL_S:g}s")
+
 # ============================
 # Helpers
 # ============================
@@ -101,14 +555,9 @@ def sanitize_meta(m: Dict[str, Any]) -> Dict[str, Any]:
             out[k] = str(v)
     return out
 
-def build_context(top_chunks: List[Dict[str, Any]]) -> str:
-    parts = []
-    for i, c in enumerate(top_chunks, start=1):
-        section_title = c.get("section", "")
-        act_name = c.get("act", "")
-        text = (c.get("text", "") or "").strip()
-        parts.append(f"[{i}] {act_name} - {section_title}\n{text}\n")
-    return "\n".join(parts)
+def build_context(top_chunks: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """Dedup overlapping chunks, order by Act/section and fit CONTEXT_TOKEN_BUDGET (see contextPacker.py)."""
+    return context_packer.pack(top_chunks)
 
 def build_query_log_row(query: str,
                         top_chunk: Optional[Dict[str, Any]],
@@ -126,40 +575,88 @@ def build_query_log_row(query: str,
         "Runtime": runtime_val
     }
 
-def embed_query_e5(q: str):
+def embed_query_e5(q: str, model=None):
  
-    return embedder.encode("query: " + q, normalize_embeddings=True).tolist()
+    return (model or embedder).encode("query: " + q, normalize_embeddings=True).tolist()
+
+def distance_space(coll) -> str:
+    """Metric behind coll.query()'s distances. The compressed / HNSW wrappers carry it as .space;
+    Chroma keeps it in the hnsw:space metadata and defaults to l2."""
+    space = getattr(coll, "space", None)
+    if isinstance(space, str):
+        return space
+    return str((getattr(coll, "metadata", None) or {}).get("hnsw:space") or "l2")
+
+def dense_similarity(dist: float, space: str) -> float:
+    """Cosine similarity from a distance, for unit-length embeddings. Chroma / hnswlib l2 is the
+    squared distance (2 - 2cos); cosine and ip distances are 1 - cos."""
+    return 1.0 - dist / 2.0 if space == "l2" else 1.0 - dist
 
-def retrieve_dense(query: str, act: Optional[str], top_k: int) -> Tuple[List[Dict[str, Any]], float, float]:
+def retrieve_dense(query: str, act: Optional[str], top_k: int,
+                   stats: Optional[Dict[str, Any]] = None,
+                   q_emb: Optional[List[float]] = None,
+                   ix: Optional[IndexVersion] = None,
+                   ef: Optional[int] = None,
+                   with_embeddings: bool = False) -> Tuple[List[Dict[str, Any]], float, float]:
     """
     Returns: (rows, embed_ms, chroma_ms)
     rows = [{id, text, act, section, metadata, dense_score, rank_before, score_before}, ...]
-    dense_score = 1 - cosine_distance from Chroma
+    dense_score = cosine similarity, whatever distance the collection returns (see dense_similarity)
+    stats, if given, receives extra per-stage timings (e.g. shard_ms in the sharded layout,
+    pq_ms with VECTOR_INDEX=compressed, search_ef / hnsw_ms with VECTOR_INDEX=hnsw).
+    q_emb skips the embed step when the caller already encoded the query.
+    ix is the index version to search (the active one by default).
+    ef is the HNSW search ef for this request (VECTOR_INDEX=hnsw only; None = tuned for the Act filter).
+    with_embeddings adds each row's stored embedding as row["embedding"] (for the session pool).
+    Without an act filter the Act router may scope the search to the Acts it is confident about.
     """
+    ix = ix or active_index
     t0 = time.perf_counter()
-    q_emb = embed_query_e5(query)
+    if q_emb is None:
+        q_emb = embed_query_e5(query, ix.embedder)
     t1 = time.perf_counter()
 
     kwargs = {
         "query_embeddings": [q_emb],
         "n_results": top_k,
-        "include": ["documents", "metadatas", "distances"]
+        "include": ["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
     }
     if act:
         kwargs["where"] = {"act": act}
+    elif ix.act_router is not None:
+        t_route = time.perf_counter()
+        routed, _ = ix.act_router.scope(q_emb)
+        if routed:
+            kwargs["where"] = act_where(routed)
+        if stats is not None:
+            stats["route_ms"] = round((time.perf_counter() - t_route) * 1000, 3)
+            stats["routed_acts"] = routed
+    if getattr(ix.collection, "accepts_ef", False):
+        kwargs["ef"] = ef
 
-    res = collection.query(**kwargs)
+    res = ix.collection.query(**kwargs)
     t2 = time.perf_counter()
+    if res.get("shard_ms") is not None:
+        logging.debug(f"[SHARDS] per-shard ms: {res['shard_ms']}")
+        if stats is not None:
+            stats["shard_ms"] = res["shard_ms"]
+    if res.get("pq_ms") is not None and stats is not None:
+        stats["pq_ms"] = res["pq_ms"]
+    if res.get("hnsw") is not None and stats is not None:
+        stats["search_ef"] = res["hnsw"]["ef"]
+        stats["hnsw_ms"] = res["hnsw"]["search_ms"]
 
     docs  = res.get("documents", [[]])[0]
     metas = [sanitize_meta(m) for m in res.get("metadatas", [[]])[0]]
     dists = res.get("distances", [[]])[0]
     ids   = res.get("ids", [[]])[0]
+    embs  = res["embeddings"][0] if with_embeddings and res.get("embeddings") is not None else None
 
+    space = distance_space(ix.collection)
     out = []
     for i in range(len(docs)):
         dist = dists[i] if i < len(dists) else None
-        sim = (1.0 - dist) if (dist is not None) else None
+        sim = dense_similarity(dist, space) if (dist is not None) else None
         md  = metas[i] if i < len(metas) else {}
         row = {
             "id": ids[i] if i < len(ids) else None,
@@ -171,34 +668,48 @@ def retrieve_dense(query: str, act: Optional[str], top_k: int) -> Tuple[List[Dic
         }
         row["rank_before"]  = i + 1
         row["score_before"] = round(row["dense_score"], 4)
+        if embs is not None and i < len(embs) and embs[i] is not None:
+            row["embedding"] = embs[i]
         out.append(row)
 
     embed_ms  = round((t1 - t0) * 1000, 2)
     chroma_ms = round((t2 - t1) * 1000, 2)
     return out, embed_ms, chroma_ms
 
-def apply_rerank(query: str, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+def dense_order(chunks: List[Dict[str, Any]], start: int = 0) -> List[Dict[str, Any]]:
+    """Chunks as ranked by the dense search, shaped like reranker output."""
+    out = []
+    for idx, ch in enumerate(chunks):
+        ch2 = dict(ch)
+        ch2["rank_after"]  = start + idx + 1
+        ch2["score_after"] = ch2.get("score_before")
+        out.append(ch2)
+    return out
+
+def apply_rerank(query: str, chunks: List[Dict[str, Any]],
+                 max_chunks: Optional[int] = None) -> Tuple[List[Dict[str, Any]], float]:
+    """max_chunks, if given, reranks only the best dense chunks and keeps the rest in dense order after them."""
     if not chunks:
         return [], 0.0
     t0 = time.perf_counter()
-    logging.debug(f"[RERANK] Calling reranker on {len(chunks)} chunks for query: {query!r}")
+    head, tail = (chunks, []) if max_chunks is None else (chunks[:max_chunks], chunks[max_chunks:])
+    if not head:
+        return dense_order(chunks), 0.0
+    logging.debug(f"[RERANK] Calling reranker on {len(head)} chunks for query: {query!r}")
     try:
-        reranked = rerank_results(query, chunks)
+        reranked = rerank_results(query, head)
         for idx, ch in enumerate(reranked):
             ch["rank_after"]  = idx + 1
             ch["score_after"] = ch.get("rerank_score", ch.get("score_before"))
     except Exception:
         logging.exception("[RERANK] Cross-encoder failed; falling back to dense order")
-        reranked = []
-        for idx, ch in enumerate(chunks):
-            ch2 = dict(ch)
-            ch2["rank_after"]  = idx + 1
-            ch2["score_after"] = ch2.get("score_before")
-            reranked.append(ch2)
+        reranked = dense_order(head)
     dt = round((time.perf_counter() - t0) * 1000, 2)
-    return reranked, dt
+    return reranked + dense_order(tail, start=len(reranked)), dt
 
 def log_to_csv(row: Dict[str, Any]):
+    if not QUERY_LOG:
+        return
     sanitized = {col: row.get(col, "") for col in LOG_COLUMNS}
     df = pd.DataFrame([sanitized], columns=LOG_COLUMNS)
     header_needed = True
@@ -210,11 +721,10 @@ def log_to_csv(row: Dict[str, Any]):
     df.to_csv(CSV_LOG, mode="a", index=False, header=header_needed)
 
 
-def call_generator_api(query: str, act: Optional[str], top_k_retrieve: int,
-                       top_k_return: int, include_context: bool) -> Dict[str, Any]:
-    if not GENERATOR_URL:
-        raise RuntimeError("GENERATOR_URL is not configured.")
-
+def build_generator_request(query: str, act: Optional[str], top_k_retrieve: int,
+                            top_k_return: int, include_context: bool,
+                            history: Optional[List[Dict[str, Any]]] = None,
+                            retrieval_query: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
     payload: Dict[str, Any] = {
         "query": query,
         "top_k_return": top_k_return,
@@ -223,23 +733,41 @@ def call_generator_api(query: str, act: Optional[str], top_k_retrieve: int,
     if act:
         payload["act"] = act
     payload["include_context"] = bool(include_context)
+    if history:
+        payload["history"] = history   # earlier turns of the conversation, oldest first
+    if retrieval_query:
+        payload["retrieval_query"] = retrieval_query   # what the generator searches with, if not the query
 
     headers = {"Content-Type": "application/json"}
     if NOTEBOOK_API_KEY:
         headers["X-API-Key"] = NOTEBOOK_API_KEY
+    return payload, headers
+
+
+def call_generator_api(query: str, act: Optional[str], top_k_retrieve: int,
+                       top_k_return: int, include_context: bool,
+                       timeout_s: Optional[float] = None,
+                       history: Optional[List[Dict[str, Any]]] = None,
+                       retrieval_query: Optional[str] = None) -> Dict[str, Any]:
+    if not GENERATOR_URL:
+        raise RuntimeError("GENERATOR_URL is not configured.")
+
+    payload, headers = build_generator_request(query, act, top_k_retrieve, top_k_return, include_context,
+                                               history, retrieval_query)
 
     logging.debug(f"[PROXY] Forwarding query to generator @ {GENERATOR_URL}")
     resp = requests.post(
         GENERATOR_URL,
         json=payload,
         headers=headers,
-        timeout=GENERATOR_TIMEOUT_S
+        timeout=timeout_s or GENERATOR_TIMEOUT_S
     )
     resp.raise_for_status()
     return resp.json()
 
 
-def fetch_docs_by_ids(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+def fetch_docs_by_ids(ids: List[str], ix: Optional[IndexVersion] = None) -> Dict[str, Dict[str, Any]]:
+    ix = ix or active_index
     unique_ids: List[str] = []
     seen = set()
     for doc_id in ids:
@@ -250,8 +778,22 @@ def fetch_docs_by_ids(ids: List[str]) -> Dict[str, Dict[str, Any]]:
     if not unique_ids:
         return {}
 
+    if ix.doc_store is not None:
+        hydrated, missing = ix.doc_store.get_many(unique_ids)
+        if not missing:
+            return hydrated
+        if refresh_corpus_state(ix):
+            found, missing = ix.doc_store.get_many(missing)
+            hydrated.update(found)
+        if missing:
+            logging.warning(f"[DOCS] {len(missing)} ids not in the doc store; falling back to Chroma")
+            hydrated.update(fetch_docs_from_chroma(missing, ix.collection))
+        return hydrated
+    return fetch_docs_from_chroma(unique_ids, ix.collection)
+
+def fetch_docs_from_chroma(unique_ids: List[str], coll=None) -> Dict[str, Dict[str, Any]]:
     try:
-        batch = collection.get(ids=unique_ids, include=["documents", "metadatas"])
+        batch = (coll or collection).get(ids=unique_ids, include=["documents", "metadatas"])
     except Exception:
         logging.exception("[PROXY] Failed to hydrate docs from Chroma via ids.")
         return {}
@@ -272,14 +814,15 @@ def fetch_docs_by_ids(ids: List[str]) -> Dict[str, Dict[str, Any]]:
     return hydrated
 
 
-def hydrate_generator_sources(gen_payload: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+def hydrate_generator_sources(gen_payload: Dict[str, Any], limit: int,
+                              ix: Optional[IndexVersion] = None) -> List[Dict[str, Any]]:
     raw = gen_payload.get("raw") or {}
     ids = raw.get("ids") or []
     limit = max(0, min(limit, len(ids)))
     if limit == 0:
         return []
 
-    doc_map = fetch_docs_by_ids(ids[:limit])
+    doc_map = fetch_docs_by_ids(ids[:limit], ix)
     top6 = gen_payload.get("top6") or []
     hydrated = []
     for idx in range(limit):
@@ -297,91 +840,611 @@ def hydrate_generator_sources(gen_payload: Dict[str, Any], limit: int) -> List[D
     return hydrated
 
 # ============================
-# Routes
+# Pipeline stages (shared by the Flask routes and asyncServer.py)
 # ============================
-@app.route("/health", methods=["GET"])
-def health():
-    return jsonify({
+def vector_index_kind(coll) -> str:
+    if getattr(coll, "accepts_ef", False):
+        return "hnsw"
+    return "compressed" if hasattr(coll, "index") else "chroma"
+
+def health_payload() -> Dict[str, Any]:
+    return {
         "ok": True,
         "backend": BACKEND_MODE,
-        "collection": COLLECTION_NAME,
-        "embed_model": EMBED_MODEL,
+        "collection": active_index.name,
+        "index_version": active_index.corpus_version,
+        "index_activated_at": round(active_index.activated_at, 3) if active_index.activated_at else None,
+        "index_layout": INDEX_LAYOUT,
+        "vector_index": vector_index_kind(collection),
+        "embed_model": active_index.embed_model,
         "generator_url": GENERATOR_URL if GENERATOR_URL else None
+    }
+
+def parse_ask_payload(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Returns (params, error)."""
+    query = (data.get("query") or "").strip()
+    if not query:
+        return None, "No query provided"
+    try:
+        top_k_ret = int(data.get("top_k_retrieve", TOP_K_RETRIEVE))
+        top_k_out = int(data.get("top_k_return", TOP_K_RETURN))
+    except (TypeError, ValueError):
+        return None, "top_k_retrieve/top_k_return must be integers"
+    citation_mode = (data.get("citation_mode") or CITATION_MODE).lower()
+    if citation_mode not in CITATION_MODES:
+        return None, f"citation_mode must be one of {', '.join(CITATION_MODES)}"
+    try:
+        deadline_ms = int(data.get("deadline_ms", DEADLINE_MS))
+    except (TypeError, ValueError):
+        return None, "deadline_ms must be an integer"
+    if deadline_ms < 0:
+        return None, "deadline_ms must be >= 0 (0 = no deadline)"
+    fields = (data.get("fields") or "full").lower()
+    if fields not in FIELDS:
+        return None, f"fields must be one of {', '.join(FIELDS)}"
+    context_format = (data.get("context_format") or "text").lower()
+    if context_format not in CONTEXT_FORMATS:
+        return None, f"context_format must be one of {', '.join(CONTEXT_FORMATS)}"
+    try:
+        snippet_chars = int(data.get("snippet_chars") or 0)
+    except (TypeError, ValueError):
+        return None, "snippet_chars must be an integer"
+    if snippet_chars < 0:
+        return None, "snippet_chars must be >= 0 (0 = full text)"
+    try:
+        search_ef = int(data.get("search_ef") or 0)
+    except (TypeError, ValueError):
+        return None, "search_ef must be an integer"
+    if not 0 <= search_ef <= HNSW_MAX_EF:
+        return None, f"search_ef must be between 0 and {HNSW_MAX_EF} (0 = tuned)"
+    paginate = bool(data.get("paginate", False))
+    if paginate and cursor_store is None:
+        return None, "paginate is not available (PAGE_CURSORS=0)"
+    answer_mode = (data.get("answer_mode") or ANSWER_MODE).lower()
+    if answer_mode not in ANSWER_MODES:
+        return None, f"answer_mode must be one of {', '.join(ANSWER_MODES)}"
+    session_id = str(data.get("session_id") or "").strip()
+    if session_id and session_store is None:
+        return None, "session_id is not available (SESSIONS=0)"
+    if session_id and not SESSION_ID_RE.match(session_id):
+        return None, "session_id must be 8-64 characters of A-Z, a-z, 0-9, '_' or '-'"
+    session = session_store.open(session_id, active_index.corpus_version) if session_id else None
+    return {
+        "query": query,
+        "act": (data.get("act") or "").strip() or None,
+        "top_k_retrieve": top_k_ret,
+        "top_k_return": top_k_out,
+        "include_context": bool(data.get("include_context", True)),
+        "citation_mode": citation_mode,
+        "deadline_ms": deadline_ms,
+        "fields": fields,
+        "snippet_chars": snippet_chars,
+        "context_format": context_format,
+        "search_ef": search_ef or None,
+        "paginate": paginate,
+        "answer_mode": answer_mode if GENERATOR_URL else "extractive",   # retrieval-only answers are extractive
+        "session": session,
+        "follow_up": session is not None and session.n_turns > 0,   # depends on earlier turns, not only on the query
+        "index": active_index,   # this request stays on this version even if another is swapped in
+    }, None
+
+def request_deadline(params: Dict[str, Any], t0: float) -> Deadline:
+    """The request's Deadline, created on first use and kept on params["deadline"]."""
+    if params.get("deadline") is None:
+        params["deadline"] = Deadline(params["deadline_ms"], t0)
+    return params["deadline"]
+
+def generator_timeout_s(req_id: str, params: Dict[str, Any], t0: float) -> Optional[float]:
+    """
+    Timeout for the generator call, or None when it should be skipped: what is left of the
+    deadline after DEADLINE_RESERVE_MS (kept for the retrieval-only fallback) is less than
+    the generator usually takes.
+    """
+    deadline = request_deadline(params, t0)
+    if not deadline.enabled:
+        return GENERATOR_TIMEOUT_S
+    left_ms = deadline.remaining_ms() - DEADLINE_RESERVE_MS
+    expected_ms = stage_costs.estimate("generator")
+    if left_ms <= 0 or (expected_ms is not None and expected_ms > left_ms and not stage_costs.probe("generator")):
+        deadline.degrade("generator_skipped")
+        logging.info(f"[{req_id}] Deadline: {max(0.0, left_ms):.0f} ms left, generator takes ~{expected_ms or 0:.0f} ms; "
+                     f"answering retrieval-only")
+        return None
+    return min(GENERATOR_TIMEOUT_S, left_ms / 1000)
+
+def generator_timed_out(req_id: str, params: Dict[str, Any], t0: float) -> bool:
+    """After a generator timeout: True if the deadline cut it short and retrieval-only results
+    should be returned instead of a 504."""
+    deadline = request_deadline(params, t0)
+    if not deadline.enabled:
+        return False
+    deadline.degrade("generator_timeout")
+    logging.warning(f"[{req_id}] Generator missed the {deadline.budget_ms:.0f} ms deadline; answering retrieval-only")
+    return True
+
+def client_key(api_key: Optional[str], remote_addr: Optional[str]) -> str:
+    """Rate-limit identity: the caller's API key (hashed, never kept in clear) or else its IP."""
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"ip:{remote_addr or '-'}"
+
+def rate_limit_response(req_id: str, client: str) -> Optional[Tuple[Dict[str, Any], int, Dict[str, str]]]:
+    """(body, 429, headers) if the client is over its token bucket, else None."""
+    if rate_limiter is None:
+        return None
+    wait_s = rate_limiter.take(client)
+    if wait_s <= 0:
+        return None
+    retry = max(1, math.ceil(wait_s))
+    logging.info(f"[{req_id}] Rate limited {client.split(':')[0]} client; retry in {retry}s")
+    return {"error": "Rate limit exceeded", "retry_after_s": retry}, 429, {"Retry-After": str(retry)}
+
+def queue_timeout_s(params: Dict[str, Any], t0: float) -> float:
+    """How long a request may wait for a slot: ADMISSION_QUEUE_TIMEOUT_S, or less if its deadline is nearer."""
+    remaining_s = request_deadline(params, t0).remaining_ms() / 1000
+    return max(0.0, min(ADMISSION_QUEUE_TIMEOUT_S, remaining_s))
+
+def shed_response(req_id: str, reason: str, ctl) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """(body, 503, headers) for a request turned away by admission control."""
+    retry = ctl.retry_after_s()
+    logging.warning(f"[{req_id}] Shed ({reason}): {ctl.in_flight} in flight, {ctl.queued} queued; retry in {retry}s")
+    return ({"error": "Server busy", "reason": reason, "retry_after_s": retry}, 503,
+            {"Retry-After": str(retry)})
+
+def flight_key(params: Dict[str, Any]) -> Tuple:
+    """Requests with the same key get the same answer, so concurrent ones are computed once.
+    The deadline is part of it: an answer cut down to fit 500 ms must not reach a request that allowed 10 s."""
+    return (normalize_query(params["query"]), params["act"] or "", params["top_k_retrieve"], params["top_k_return"],
+            params["include_context"], params["citation_mode"], BACKEND_MODE, pinned_index(params).corpus_version,
+            params["answer_mode"], params["session"].id if params["follow_up"] else "",
+            params["deadline_ms"], params["search_ef"], params["paginate"])
+
+def flight_wait_s(params: Dict[str, Any], t0: float) -> float:
+    """How long a duplicate waits for the in-flight leader: its own deadline, or the longest a leader can take."""
+    deadline = request_deadline(params, t0)
+    if deadline.enabled:
+        return max(0.0, deadline.remaining_ms() / 1000)
+    return 2 * ADMISSION_QUEUE_TIMEOUT_S + GENERATOR_TIMEOUT_S   # generator queue, call, then the fallback's queue
+
+def coalesced_response(req_id: str, params: Dict[str, Any], body: Dict[str, Any], t0: float) -> Dict[str, Any]:
+    """The leader's answer, re-labelled for this request (and logged, so the query log still counts it)."""
+    resp = dict(body)
+    leader = resp.get("request_id")
+    if leader is None:
+        return resp   # an error body
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    resp["request_id"] = req_id
+    resp["query"] = params["query"]
+    resp["timings"] = {**(resp.get("timings") or {}), "total_ms": total_ms}
+    resp["coalesced"] = {"with": leader}
+
+    top = (resp.get("top_results") or [{}])[0]
+    log_row = build_query_log_row(params["query"], top, resp.get("answer"), total_ms)
+    try:
+        log_to_csv(log_row)
+    except Exception as e:
+        logging.warning(f"[{req_id}] CSV log failed: {e}")
+    logging.info(f"[{req_id}] Coalesced with in-flight request {leader} in {total_ms} ms")
+    return resp
+
+def encode_response(req_id: str, params: Dict[str, Any], body: Dict[str, Any], status: int = 200,
+                    headers: Optional[Dict[str, str]] = None,
+                    accept_encoding: str = "") -> Tuple[bytes, int, Dict[str, str]]:
+    """Shape a body to the request's fields / snippet_chars / context_format, serialize and compress it."""
+    full = shape(body)
+    out = full
+    if params["fields"] != "full" or params["snippet_chars"] or params["context_format"] != "text":
+        out = shape(body, params["fields"], params["snippet_chars"], params["context_format"])
+    data, enc_headers, info = response_encoder.encode(out, removed_bytes(full, out), accept_encoding)
+    logging.debug(f"[{req_id}] Response {info['bytes_full']} -> {info['bytes_sent']} bytes "
+                  f"({info['encoding']}), serialize {info['serialize_ms']} ms, compress {info['compress_ms']} ms")
+    return data, status, {**(headers or {}), **enc_headers}
+
+def cache_scope(params: Dict[str, Any]) -> str:
+    return (f"{BACKEND_MODE}|{params['act'] or '*'}|{params['top_k_retrieve']}|{params['top_k_return']}"
+            f"|ctx={int(params['include_context'])}" + (f"|ef={params['search_ef']}" if params.get("search_ef") else "")
+            + ("|extractive" if GENERATOR_URL and params["answer_mode"] == "extractive" else ""))
+
+def semantic_scope(scope: str, q_emb, ix: IndexVersion) -> str:
+    """Cache scope plus the Act the router ranks first, so paraphrases that turn on a different Act never share an answer."""
+    if ix.act_router is None:
+        return scope
+    return f"{scope}|routed={ix.act_router.rank(q_emb, 1)[0][0]}"
+
+def cached_response(req_id: str, params: Dict[str, Any], t0: float) -> Optional[Dict[str, Any]]:
+    """
+    Embed the query once and look for a near-duplicate in the semantic cache.
+    The embedding is kept on params["q_emb"] so retrieval doesn't encode twice.
+    A session's follow-up is never answered from a cache: its answer depends on the earlier turns.
+    """
+    if params["follow_up"]:
+        return None
+    if faq_store is not None:
+        hit = faq_response(req_id, params, t0)
+        if hit is not None:
+            return hit
+    if semantic_cache is None:
+        return None
+    t_embed = time.perf_counter()
+    ix = pinned_index(params)
+    params["q_emb"] = embed_query_e5(params["query"], ix.embedder)
+    params["embed_ms"] = round((time.perf_counter() - t_embed) * 1000, 2)
+    stage_costs.observe("embed", params["embed_ms"])
+
+    t_lookup = time.perf_counter()
+    found = semantic_cache.lookup(params["q_emb"], semantic_scope(cache_scope(params), params["q_emb"], ix),
+                                  ix.corpus_version)
+    lookup_ms = round((time.perf_counter() - t_lookup) * 1000, 3)
+    if found is None:
+        return None
+
+    entry, sim = found
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    resp = dict(entry["payload"])
+    resp.update({
+        "request_id": req_id,
+        "query": params["query"],
+        "timings": {"embed_ms": params["embed_ms"], "cache_ms": lookup_ms, "total_ms": total_ms},
+        "cache": {"hit": True, "similarity": round(sim, 4), "matched_query": entry["query"]},
     })
 
-@app.route("/askQuery", methods=["POST"])
-def ask_query():
-    req_id = str(uuid.uuid4())[:8]
+    top = (resp.get("top_results") or [{}])[0]
+    log_row = build_query_log_row(params["query"], top, resp.get("answer"), total_ms)
+    try:
+        log_to_csv(log_row)
+    except Exception as e:
+        logging.warning(f"[{req_id}] CSV log failed: {e}")
+    logging.info(f"[{req_id}] Semantic cache hit (sim={sim:.3f}) for {entry['query']!r} in {total_ms} ms")
+    return resp
+
+def faq_response(req_id: str, params: Dict[str, Any], t0: float) -> Optional[Dict[str, Any]]:
+    """A materialized answer for this exact (normalized) question, if the store has one for this index."""
+    t_lookup = time.perf_counter()
+    entry = faq_store.lookup(params["query"], cache_scope(params), pinned_index(params).corpus_version)
+    lookup_ms = round((time.perf_counter() - t_lookup) * 1000, 3)
+    if entry is None:
+        return None
+
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    resp = dict(entry["payload"])
+    resp.update({
+        "request_id": req_id,
+        "query": params["query"],
+        "timings": {"faq_ms": lookup_ms, "total_ms": total_ms},
+        "cache": {"hit": True, "faq": True, "matched_query": entry["query"]},
+    })
+
+    top = (resp.get("top_results") or [{}])[0]
+    log_row = build_query_log_row(params["query"], top, resp.get("answer"), total_ms)
+    try:
+        log_to_csv(log_row)
+    except Exception as e:
+        logging.warning(f"[{req_id}] CSV log failed: {e}")
+    logging.info(f"[{req_id}] FAQ store hit for {entry['query']!r} in {total_ms} ms")
+    return resp
+
+def prewarm_caches():
+    """Seed the semantic cache with the FAQ store's answers for the active index, so paraphrases hit too."""
+    if faq_store is None or semantic_cache is None:
+        return
+    ix = active_index
+    entries = faq_store.live_entries(ix.corpus_version)[:SEMANTIC_CACHE_SIZE]
+    if not entries:
+        logging.info(f"[INIT] FAQ store has no answers for index version {ix.corpus_version}; rebuild it")
+        return
     t0 = time.perf_counter()
+    embs = ix.embedder.encode(["query: " + e["query"] for e in entries], normalize_embeddings=True)
+    for e, emb in zip(entries, embs):
+        semantic_cache.store(emb, semantic_scope(e["scope"], emb, ix), ix.corpus_version, e["query"], e["payload"])
+    logging.info(f"[INIT] Semantic cache prewarmed with {len(entries)} FAQ answers in "
+                 f"{round((time.perf_counter() - t0) * 1000, 2)} ms")
+
+def remember_response(params: Dict[str, Any], resp: Dict[str, Any]):
+    if semantic_cache is None or params.get("q_emb") is None or params["follow_up"]:
+        return
+    if resp.get("degradations"):
+        return   # a cut-down answer shouldn't be served to the next similar query
+    ix = pinned_index(params)
+    if ix is not active_index:
+        return   # answered from a version that was swapped out meanwhile
+    payload = {k: v for k, v in resp.items() if k not in ("request_id", "query", "timings", "cache")}
+    semantic_cache.store(params["q_emb"], semantic_scope(cache_scope(params), params["q_emb"], ix), ix.corpus_version,
+                         params["query"], payload)
+
+def citation_answer(refs: List[Dict[str, Any]], hits: List[Dict[str, Any]]) -> str:
+    passages, _ = context_packer.merge_sections(hits)
+    kinds = {(r["act"], r["section_number"]): r["kind"] for r in refs}
+    parts = []
+    for p in passages:
+        label = "Article" if kinds.get((p["act"], p["section_number"])) == "article" else "Section"
+        parts.append(f"{p['act']}, {label} {p['section']}:\n{p['text']}")
+    return "\n\n".join(parts)
+
+def citation_response(req_id: str, params: Dict[str, Any], t0: float) -> Optional[Dict[str, Any]]:
+    """
+    Explicit citations ("Employment Act s.44") are resolved through the section index.
+    Pure lookups are answered here; questions with more to them ("can I appeal under
+    s.44 ...") keep the cited chunks on params["citation_hits"] for retrieval_response.
+    """
+    citation_index = pinned_index(params).citation_index
+    if citation_index is None or params["citation_mode"] == "off":
+        return None
+    t_lookup = time.perf_counter()
+    refs, hits = citation_index.lookup(params["query"], params["act"])
+    lookup_ms = round((time.perf_counter() - t_lookup) * 1000, 3)
+    if not hits:
+        return None
+
+    cited = [{"act": r["act"], "section_number": r["section_number"]} for r in refs]
+    mode = params["citation_mode"]
+    if mode == "auto":
+        mode = "merge" if citation_index.residual(params["query"]) else "direct"
+    if mode == "merge":
+        if not GENERATOR_URL:
+            params["citation_hits"] = hits
+            params["citations"] = cited
+            citation_index.record_fast(lookup_ms, merged=True)
+            logging.info(f"[{req_id}] Citation hit {cited}; merging with semantic results")
+        return None
+
+    hits = hits[:max(params["top_k_return"], len(refs))]
+    answer = citation_answer(refs, hits)
+    resp = {
+        "request_id": req_id,
+        "query": params["query"],
+        "answer": answer,
+        "top_results": [{
+            "id": c["id"],
+            "act": c["act"],
+            "section": c["section"],
+            "score_before": None,
+            "score_after": None,
+            "text": c["text"],
+        } for c in hits],
+        "citations": cited,
+        "fast_path": "citation",
+        "proxy": False,
+    }
+    if params["include_context"]:
+        resp["context"], resp["context_stats"] = build_context(hits)
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    resp["timings"] = {"citation_ms": lookup_ms, "total_ms": total_ms}
+    citation_index.record_fast(total_ms)
 
+    log_row = build_query_log_row(params["query"], hits[0], answer, total_ms)
     try:
-        data = request.get_json(force=True) or {}
-    except Exception:
-        logging.exception(f"[{req_id}] Bad JSON payload")
-        return jsonify({"error": "Invalid JSON"}), 400
+        log_to_csv(log_row)
+    except Exception as e:
+        logging.warning(f"[{req_id}] CSV log failed: {e}")
+    logging.info(f"[{req_id}] Citation fast path {cited} answered in {total_ms} ms")
+    return resp
 
-    query = (data.get("query") or "").strip()
-    act   = (data.get("act") or "").strip() or None
-    top_k_ret = int(data.get("top_k_retrieve", TOP_K_RETRIEVE))
-    top_k_out = int(data.get("top_k_return", TOP_K_RETURN))
-    include_context = bool(data.get("include_context", True))
+def definition_response(req_id: str, params: Dict[str, Any], t0: float) -> Optional[Dict[str, Any]]:
+    """ "What does 'child' mean under the Employment Act?" -> the statutory definitions, no retrieval."""
+    if definitions_index is None:
+        return None
+    t_lookup = time.perf_counter()
+    term, entries, how = definitions_index.match_query(params["query"], params["act"])
+    lookup_ms = round((time.perf_counter() - t_lookup) * 1000, 3)
+    if not entries:
+        return None
 
-    if not query:
-        return jsonify({"error": "No query provided"}), 400
+    entries = entries[:params["top_k_return"]]
+    answer = "\n\n".join(f"Under the {e['act']} (section {e['section']}), {render_definition(e)}" for e in entries)
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    resp = {
+        "request_id": req_id,
+        "query": params["query"],
+        "answer": answer,
+        "top_results": [{
+            "id": None,
+            "act": e["act"],
+            "section": e["section"],
+            "score_before": None,
+            "score_after": None,
+            "text": render_definition(e),
+        } for e in entries],
+        "definitions": [{"term": e["term"], "act": e["act"], "section": e["section"], "match": how} for e in entries],
+        "fast_path": "definition",
+        "timings": {"definition_ms": lookup_ms, "total_ms": total_ms},
+        "proxy": False,
+    }
 
-    logging.info(
-        f"[{req_id}] Query: {query!r} | act_filter={act} | k={top_k_ret}/{top_k_out} | mode={BACKEND_MODE}"
-    )
+    log_row = build_query_log_row(params["query"], resp["top_results"][0], answer, total_ms)
+    try:
+        log_to_csv(log_row)
+    except Exception as e:
+        logging.warning(f"[{req_id}] CSV log failed: {e}")
+    logging.info(f"[{req_id}] Definition fast path ({how}) for {term!r}: {len(entries)} definitions in {total_ms} ms")
+    return resp
 
-    if GENERATOR_URL:
-        try:
-            generator_payload = call_generator_api(query, act, top_k_ret, top_k_out, include_context)
-        except requests.Timeout:
-            logging.exception(f"[{req_id}] Generator timed out")
-            return jsonify({"error": "Generator timeout"}), 504
-        except requests.RequestException:
-            logging.exception(f"[{req_id}] Generator request failed")
-            return jsonify({"error": "Generator request failed"}), 502
-
-        total_ms = round((time.perf_counter() - t0) * 1000, 2)
-        top_results = hydrate_generator_sources(generator_payload, top_k_out)
-        model_answer = generator_payload.get("answer")
-        resp = {
-            "request_id": req_id,
-            "query": query,
-            "answer": model_answer,
-            "top_results": top_results,
-            "timings": generator_payload.get("timings") or {"total_ms": total_ms},
-            "proxy": True
-        }
-        if include_context and top_results:
-            resp["context"] = build_context(top_results)
+def merge_citation_hits(hits: List[Dict[str, Any]], rows: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Cited chunks first (leaving room for at least one semantic result), then the reranked rows."""
+    by_id = {r.get("id"): r for r in rows}
+    cap = max(1, top_k - 1)
+    merged = []
+    for c in hits[:cap]:
+        row = dict(by_id.get(c["id"]) or c)
+        row.setdefault("score_before", None)
+        row.setdefault("score_after", None)
+        merged.append(row)
+    seen = {r["id"] for r in merged}
+    merged.extend(r for r in rows if r.get("id") not in seen)
+    for idx, r in enumerate(merged):
+        r["rank_after"] = idx + 1
+    return merged
 
-        top = top_results[0] if top_results else {}
-        log_row = build_query_log_row(query, top, model_answer, total_ms)
-        try:
-            log_to_csv(log_row)
-        except Exception as e:
-            logging.warning(f"[{req_id}] CSV log failed: {e}")
+def proxy_response(req_id: str, params: Dict[str, Any], generator_payload: Dict[str, Any], t0: float) -> Dict[str, Any]:
+    query = params["query"]
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    ix = pinned_index(params)
+    top_results = hydrate_generator_sources(generator_payload, params["top_k_return"], ix)
+    model_answer = generator_payload.get("answer")
+    resp = {
+        "request_id": req_id,
+        "query": query,
+        "answer": model_answer,
+        "top_results": top_results,
+        "timings": generator_payload.get("timings") or {"total_ms": total_ms},
+        "proxy": True
+    }
+    deadline = request_deadline(params, t0)
+    if params["include_context"] and top_results:
+        if deadline.allows(None):
+            resp["context"], resp["context_stats"] = build_context(top_results)
+        else:
+            deadline.degrade("context_skipped")
+    if deadline.enabled:
+        resp["degradations"] = deadline.degradations
+        stage_costs.record(deadline)
+    if model_answer:
+        remember_response(params, resp)
+    if ix.citation_index is not None:
+        ix.citation_index.observe_full(total_ms)
+
+    top = top_results[0] if top_results else {}
+    log_row = build_query_log_row(query, top, model_answer, total_ms)
+    try:
+        log_to_csv(log_row)
+    except Exception as e:
+        logging.warning(f"[{req_id}] CSV log failed: {e}")
+
+    logging.info(f"[{req_id}] Proxy completed in {total_ms} ms | top_act={top.get('act','')}")
+    return resp
+
+def pack_source(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": r.get("id"),
+        "act": r.get("act"),
+        "section": r.get("section"),
+        "score_before": r.get("score_before"),
+        "score_after": r.get("score_after"),
+        "text": r.get("text"),
+    }
+
+def query_embedding(params: Dict[str, Any]) -> List[float]:
+    """params["q_emb"], encoding the query first unless the semantic cache already has."""
+    if params.get("q_emb") is None:
+        t_embed = time.perf_counter()
+        params["q_emb"] = embed_query_e5(params["query"], pinned_index(params).embedder)
+        params["embed_ms"] = round((time.perf_counter() - t_embed) * 1000, 2)
+        stage_costs.observe("embed", params["embed_ms"])
+    return params["q_emb"]
+
+def extractive_answer(params: Dict[str, Any], rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The clauses of the top chunks that best match the question, quoted with their Act and section:
+    {answer, clauses: [{source, start, end, score, text, act, section}], select_ms}. source indexes
+    top_results and start / end are offsets into its text (for highlighting). None without a
+    clause index or when no clause reaches EXTRACT_MIN_SCORE.
+    """
+    clause_index = pinned_index(params).clause_index
+    if clause_index is None or not rows:
+        return None
+    picked, info = clause_index.select(query_embedding(params), rows, EXTRACT_CLAUSES, EXTRACT_PER_CHUNK,
+                                       EXTRACT_MIN_SCORE)
+    if not picked:
+        return None
+    groups: List[List[Dict[str, Any]]] = []   # picked is in reading order: one group per quoted chunk
+    for c in picked:
+        row = rows[c["source"]]
+        c.update(text=row["text"][c["start"]:c["end"]], act=row.get("act"), section=row.get("section"))
+        if groups and groups[-1][0]["source"] == c["source"]:
+            groups[-1].append(c)
+        else:
+            groups.append([c])
+    paragraphs = []
+    for group in groups:
+        row = rows[group[0]["source"]]
+        text = group[0]["text"]
+        for prev, c in zip(group, group[1:]):
+            text += (" ... " if row["text"][prev["end"]:c["start"]].strip() else " ") + c["text"]
+        num = (row.get("metadata") or {}).get("section_number") or row.get("section")
+        paragraphs.append(f"{text} ({row.get('act')} s.{num})")
+    return {"answer": "\n\n".join(paragraphs), "clauses": picked, **info}
 
-        logging.info(f"[{req_id}] Proxy completed in {total_ms} ms | top_act={top.get('act','')}")
-        return jsonify(resp)
+def retrieval_response(req_id: str, params: Dict[str, Any], t0: float) -> Tuple[Dict[str, Any], int]:
+    query = params["query"]
+    top_k_out = params["top_k_return"]
+    deadline = request_deadline(params, t0)
 
-    # 1) Dense retrieval
+    # 1) Dense retrieval; ask for fewer results if reranking all of them wouldn't fit
+    n_results = params["top_k_retrieve"]
+    per_chunk = stage_costs.estimate("rerank")
+    if deadline.enabled and per_chunk and n_results > top_k_out:
+        search_ms = stage_costs.estimate("search") or 0.0
+        if params.get("q_emb") is None:
+            search_ms += stage_costs.estimate("embed") or 0.0
+        fit = max(top_k_out, int((deadline.remaining_ms() - search_ms) // per_chunk))
+        if fit < n_results:
+            deadline.degrade(f"n_results:{n_results}->{fit}")
+            n_results = fit
+    n_pool = max(n_results, PAGE_POOL_SIZE) if params["paginate"] else n_results
+    stage_stats: Dict[str, Any] = {}
+    session = params["session"]
+    rerank_query = query
     try:
-        rows_before, embed_ms, chroma_ms = retrieve_dense(query, act, top_k_ret)
+        if session is not None:
+            search_emb = session_embedding(params)
+        elif pinned_index(params).clause_index is not None:
+            search_emb = query_embedding(params)   # the clause scoring needs it too
+        else:
+            search_emb = params.get("q_emb")
+        reused = None
+        if params["follow_up"] and SESSION_POOL_REUSE:
+            reused = session_candidates(params, query_embedding(params), n_results, stage_stats)
+        if reused is not None:
+            # The conversation's own candidates still fit: no search, and the cross-encoder reads the
+            # follow-up after the question it follows
+            rows_before, pool_tail, embed_ms, chroma_ms = reused, [], 0.0, 0.0
+            rerank_query = session.rerank_query(query, SESSION_RERANK_CONTEXT)
+        else:
+            rows_before, embed_ms, chroma_ms = retrieve_dense(
+                query, params["act"], n_pool, stage_stats, q_emb=search_emb, ix=pinned_index(params),
+                ef=params.get("search_ef"), with_embeddings=session is not None and SESSION_POOL_REUSE
+            )
+            params["session_embs"] = {r["id"]: r.pop("embedding") for r in rows_before if "embedding" in r}
+            rows_before, pool_tail = rows_before[:n_results], rows_before[n_results:]   # the tail waits for later pages
+            if params.get("q_emb") is None:
+                stage_costs.observe("embed", embed_ms)
+            stage_costs.observe("search", chroma_ms)
+        embed_ms = params.get("embed_ms", embed_ms)
     except Exception:
         logging.exception(f"[{req_id}] Retrieval failed")
-        return jsonify({"error": "Retrieval failed"}), 500
+        return {"error": "Retrieval failed"}, 500
+    if shadow is not None and reused is None:
+        shadow.offer(query, [params["act"]] if params["act"] else stage_stats.get("routed_acts"), n_results,
+                     [chunk_key(r.get("metadata")) for r in rows_before], {"embed_ms": embed_ms, "search_ms": chroma_ms})
 
-    # 2) Rerank
-    rows_after, rerank_ms = apply_rerank(query, rows_before)
+    # 2) Rerank, cut to the chunks the remaining budget covers (dense order below them)
+    max_chunks = None
+    if not deadline.allows(stage_costs.estimate("rerank", len(rows_before))):
+        per_chunk = stage_costs.estimate("rerank") or float("inf")
+        max_chunks = max(0, int(deadline.remaining_ms() // per_chunk))
+        if max_chunks < 2 and stage_costs.probe("rerank"):
+            max_chunks = 2   # a small probe, so the estimate can come back down
+        if max_chunks < 2:
+            max_chunks = 0
+            deadline.degrade("rerank_skipped")
+        else:
+            deadline.degrade(f"rerank:{len(rows_before)}->{max_chunks}")
+    rows_after, rerank_ms = apply_rerank(rerank_query, rows_before, max_chunks)
+    stage_costs.observe("rerank", rerank_ms, len(rows_before[:max_chunks]))
     logging.info(f"[{req_id}] Rerank ran in {rerank_ms} ms")
+    if params.get("citation_hits"):
+        rows_after = merge_citation_hits(params["citation_hits"], rows_after, top_k_out)
+    if session is not None:
+        params["session_rows"] = rows_after
+    if params["paginate"]:
+        params["pool"] = {"ranked": rows_after, "pending": pool_tail}
+
+    # 3) Extractive answer: the best clauses of the chunks returned (no generator needed)
+    extract = extractive_answer(params, rows_after[:top_k_out])
 
     total_ms = round((time.perf_counter() - t0) * 1000, 2)
     top = rows_after[0] if rows_after else {}
 
-    log_row = build_query_log_row(query, top, None, total_ms)
+    log_row = build_query_log_row(query, top, extract["answer"] if extract else None, total_ms)
     try:
         log_to_csv(log_row)
     except Exception as e:
@@ -389,16 +1452,6 @@ def ask_query():
 
     logging.info(f"[{req_id}] Done in {total_ms} ms | top: {top.get('act','')}, s_after={top.get('score_after','')}")
 
-    def pack_source(r: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "id": r.get("id"),
-            "act": r.get("act"),
-            "section": r.get("section"),
-            "score_before": r.get("score_before"),
-            "score_after": r.get("score_after"),
-            "text": r.get("text"),
-        }
-
     resp = {
         "request_id": req_id,
         "query": query,
@@ -406,19 +1459,494 @@ def ask_query():
             "embed_ms": embed_ms,
             "chroma_ms": chroma_ms,
             "rerank_ms": rerank_ms,
-            "total_ms": total_ms
+            "total_ms": total_ms,
+            **stage_stats
         },
         "top_results": [pack_source(r) for r in rows_after[:top_k_out]],
         "proxy": False
     }
-    if include_context:
-        resp["context"] = build_context(rows_after[:top_k_out])
+    if extract:
+        resp["answer"] = extract["answer"]
+        resp["answer_type"] = "extractive"
+        resp["extract"] = {"clauses": extract["clauses"], "clauses_scored": extract["clauses_scored"]}
+        resp["timings"]["extract_ms"] = extract["select_ms"]
+    if params["include_context"]:
+        if deadline.allows(None):
+            t_pack = time.perf_counter()
+            resp["context"], resp["context_stats"] = build_context(rows_after[:top_k_out])
+            resp["timings"]["pack_ms"] = round((time.perf_counter() - t_pack) * 1000, 2)
+        else:
+            deadline.degrade("context_skipped")
+    if params.get("citation_hits"):
+        resp["citations"] = params["citations"]
+    if deadline.enabled:
+        resp["degradations"] = deadline.degradations
+        stage_costs.record(deadline)
+        if deadline.degradations:
+            logging.info(f"[{req_id}] Deadline {deadline.budget_ms:.0f} ms: {', '.join(deadline.degradations)}")
+    remember_response(params, resp)
+    citation_index = pinned_index(params).citation_index
+    if citation_index is not None and not params.get("citation_hits"):
+        citation_index.observe_full(total_ms)
+
+    return resp, 200
+
+# ============================
+# Result pages
+# ============================
+def attach_cursor(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A paginated answer with a cursor to its next page. The pool is the request's own candidates
+    (local retrieval), or else the sources shown: answers from a cache or the generator have no
+    local candidates, so their pool runs one dense search when a page first goes past them.
+    """
+    if not params.get("paginate") or cursor_store is None or "cursor" in body or "error" in body:
+        return body
+    shown = body.get("top_results") or []
+    pool = params.pop("pool", None) or {"ranked": list(shown), "pending": None}
+    pool.update(query=params["query"], act=params["act"], index=pinned_index(params),
+                search_ef=params.get("search_ef"),
+                q_emb=params.get("q_emb") if pool["pending"] is None else None)
+    pool_id = cursor_store.put(pool)
+    offset = len(shown)
+    more = offset < len(pool["ranked"]) or pool["pending"] is None or bool(pool["pending"])
+    return {**body, "cursor": encode_cursor(pool_id, offset) if more else None, "has_more": more}
+
+def extend_pool(pool: Dict[str, Any], upto: int) -> Tuple[float, bool]:
+    """Rank pool candidates until `upto` rows are ranked or none are left: rerank the next batch
+    of the tail, after running the pool's dense search if it has none yet. (rerank_ms, searched)."""
+    ranked = pool["ranked"]
+    rerank_ms, searched = 0.0, False
+    while len(ranked) < upto:
+        if pool["pending"] is None:
+            rows, _, _ = retrieve_dense(pool["query"], pool["act"], max(PAGE_POOL_SIZE, upto), q_emb=pool["q_emb"],
+                                        ix=pool["index"], ef=pool["search_ef"])
+            seen = {r.get("id") for r in ranked}
+            pool["pending"] = [r for r in rows if r["id"] not in seen]
+            searched = True
+            continue
+        if not pool["pending"]:
+            break
+        batch = pool["pending"][:PAGE_RERANK_BATCH or TOP_K_RETRIEVE]
+        pool["pending"] = pool["pending"][len(batch):]
+        rows, ms = apply_rerank(pool["query"], batch)
+        for i, r in enumerate(rows):
+            r["rank_after"] = len(ranked) + i + 1
+        ranked.extend(rows)
+        rerank_ms += ms
+    return rerank_ms, searched
+
+def parse_page_payload(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Returns (params, error) for /askQuery/more."""
+    cursor = (data.get("cursor") or "").strip()
+    if not cursor:
+        return None, "No cursor provided"
+    try:
+        limit = int(data.get("limit") or TOP_K_RETURN)
+        snippet_chars = int(data.get("snippet_chars") or 0)
+    except (TypeError, ValueError):
+        return None, "limit/snippet_chars must be integers"
+    if not 1 <= limit <= PAGE_POOL_SIZE:
+        return None, f"limit must be between 1 and {PAGE_POOL_SIZE}"
+    if snippet_chars < 0:
+        return None, "snippet_chars must be >= 0 (0 = full text)"
+    fields = (data.get("fields") or "full").lower()
+    if fields not in FIELDS:
+        return None, f"fields must be one of {', '.join(FIELDS)}"
+    return {"cursor": cursor, "limit": limit, "fields": fields, "snippet_chars": snippet_chars,
+            "context_format": "text"}, None
+
+def page_response(req_id: str, params: Dict[str, Any], t0: float) -> Tuple[Dict[str, Any], int]:
+    """The next page of a paginated answer: no embed, search or rerank beyond the batch it reaches into."""
+    if cursor_store is None:
+        return {"error": "Pagination is off (PAGE_CURSORS=0)"}, 404
+    found = cursor_store.get(params["cursor"])
+    if found is None:
+        return {"error": "Cursor expired or unknown; ask the question again with paginate=true"}, 410
+    pool_id, pool, offset = found
+    with pool["lock"]:
+        try:
+            rerank_ms, searched = extend_pool(pool, offset + params["limit"])
+        except Exception:
+            logging.exception(f"[{req_id}] Could not extend result pool {pool_id}")
+            return {"error": "Retrieval failed"}, 500
+        rows = pool["ranked"][offset:offset + params["limit"]]
+        more = offset + len(rows) < len(pool["ranked"]) or bool(pool["pending"])
+        sizes = {"ranked": len(pool["ranked"]), "pending": len(pool["pending"] or [])}
+    if searched:
+        cursor_store.resized(pool_id)
+    cursor_store.observe(rerank_ms, searched)
+    total_ms = round((time.perf_counter() - t0) * 1000, 2)
+    logging.info(f"[{req_id}] Page {offset}+{len(rows)} of pool {pool_id} in {total_ms} ms "
+                 f"(rerank {rerank_ms} ms{', searched' if searched else ''})")
+    return {
+        "request_id": req_id,
+        "query": pool["query"],
+        "offset": offset,
+        "top_results": [pack_source(r) for r in rows],
+        "cursor": encode_cursor(pool_id, offset + len(rows)) if more else None,
+        "has_more": more,
+        "pool": sizes,
+        "timings": {"rerank_ms": rerank_ms, "total_ms": total_ms},
+    }, 200
+
+# ============================
+# Conversation sessions
+# ============================
+def session_embedding(params: Dict[str, Any]) -> List[float]:
+    """The query embedding blended with the session's conversation embedding (just the query's on
+    the first turn)."""
+    return params["session"].context_embedding(query_embedding(params), SESSION_CONTEXT_WEIGHT).tolist()
+
+def session_candidates(params: Dict[str, Any], q_emb: List[float], n_results: int,
+                       stats: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    A follow-up's candidates rescored from the session pool, or None when the pool scores poorly
+    for it (fewer than top_k_return candidates at SESSION_POOL_MIN_SCORE or above, e.g. a new
+    topic) and the full search should run. The pool is scored with the follow-up's own embedding:
+    the blended one leans toward the previous topic and would keep a new topic on the old pool.
+    """
+    t_rescore = time.perf_counter()
+    rows = params["session"].rescore(q_emb, params["act"], n_results)
+    rescore_ms = round((time.perf_counter() - t_rescore) * 1000, 3)
+    need = min(params["top_k_return"], n_results)
+    score = rows[need - 1]["dense_score"] if need and len(rows) >= need else 0.0
+    reused = bool(rows) and score >= SESSION_POOL_MIN_SCORE
+    session_store.observe(reused, rescore_ms)
+    stats["session_pool"] = {"reused": reused, "candidates": len(rows), "score": round(score, 4),
+                             "rescore_ms": rescore_ms}
+    return rows if reused else None
+
+def session_history(params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Earlier turns for the generator's prompt (proxy mode), oldest first."""
+    if not params.get("follow_up"):
+        return None
+    return params["session"].history(SESSION_HISTORY_TURNS) or None
+
+def session_retrieval_query(params: Dict[str, Any]) -> Optional[str]:
+    """What the generator should search with for a follow-up (proxy mode): the follow-up after the
+    questions it follows, as the cross-encoder reads it. The generator cannot use the session's
+    blended embedding, and "what about for employers?" alone finds nothing about the earlier topic."""
+    if not params.get("follow_up"):
+        return None
+    return params["session"].rerank_query(params["query"], SESSION_RERANK_CONTEXT)
+
+def attach_session(params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    """Record the answer as the session's next turn (with this request's candidates, if it retrieved
+    locally) and label the body with the session."""
+    session = params.get("session")
+    if session is None or "error" in body:
+        return body
+    session_store.record(session, params["query"], body.get("answer"), params.get("q_emb"),
+                         params.pop("session_rows", None), params.pop("session_embs", None))
+    pool = (body.get("timings") or {}).get("session_pool")
+    return {**body, "session": {"id": session.id, "turn": session.n_turns,
+                                "pool_reused": pool["reused"] if pool else None}}
+
+def log_incoming(req_id: str, params: Dict[str, Any]):
+    logging.info(
+        f"[{req_id}] Query: {params['query']!r} | act_filter={params['act']} | "
+        f"k={params['top_k_retrieve']}/{params['top_k_return']} | mode={BACKEND_MODE}"
+    )
+
+# ============================
+# Index versions (blue/green swap)
+# ============================
+smoke_questions = load_smoke_questions(INDEX_SMOKE_PATH, INDEX_SMOKE_N)
+COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]$")   # Chroma's naming rule
+
+def smoke_search(ix: IndexVersion):
+    """Smoke questions take the request path (router, ef, compressed / HNSW wrappers) on ix."""
+    def search(q: str) -> List[str]:
+        rows, _, _ = retrieve_dense(q, None, TOP_K_RETRIEVE, ix=ix)
+        return [r["act"] for r in rows]
+    return search
+
+def validate_index(ix: IndexVersion) -> Dict[str, Any]:
+    """Smoke questions against a candidate: it must find the expected Act often enough, and not
+    much less often than the active version does."""
+    ix.smoke = smoke_test(smoke_search(ix), smoke_questions)
+    base = active_index if active_index is not ix else None
+    if base is not None and base.smoke is None:
+        base.smoke = smoke_test(smoke_search(base), smoke_questions)
+    rate = ix.smoke["act_hit_rate"]
+    baseline = base.smoke["act_hit_rate"] if base is not None else None
+    reasons = []
+    if ix.collection.count() == 0:
+        reasons.append("collection is empty")
+    if ix.smoke["errors"]:
+        reasons.append(f"{ix.smoke['errors']} smoke queries failed")
+    if rate is not None and rate < INDEX_SMOKE_MIN_HIT:
+        reasons.append(f"act hit rate {rate} < {INDEX_SMOKE_MIN_HIT}")
+    if rate is not None and baseline is not None and rate < baseline - INDEX_SMOKE_MAX_DROP:
+        reasons.append(f"act hit rate {rate} vs {baseline} on the active version")
+    ix.smoke.update({"baseline": baseline, "passed": not reasons, "reasons": reasons})
+    return ix.smoke
+
+def switch_index(spec: Dict[str, Any], validate: bool = True, publish: bool = True,
+                 force: bool = False, rollback: bool = False) -> Tuple[Dict[str, Any], int]:
+    """Load (or reuse) the version in spec, smoke-test it and make it active: (body, status).
+    publish=True also rewrites the pointer file, so the other workers follow."""
+    with index_manager.swap_lock:
+        current = active_index
+        if current.matches(spec):
+            return {"active": current.describe(), "changed": False}, 200
+        ix = index_manager.previous
+        if ix is None or not ix.matches(spec):
+            try:
+                ix = open_index(spec)
+            except Exception as e:
+                logging.exception(f"[INDEX] Could not open index {spec.get('name')!r}")
+                index_manager.record("load_failed", name=spec.get("name"), error=str(e))
+                return {"error": f"Could not open index {spec.get('name')!r}: {e}"}, 400
+        if validate:
+            smoke = validate_index(ix)
+            if not smoke["passed"] and not force:
+                index_manager.rejected += 1
+                index_manager.record("rejected", name=ix.name, reasons=smoke["reasons"])
+                logging.warning(f"[INDEX] Not activating {ix.name}: {'; '.join(smoke['reasons'])}")
+                return {"error": "Index version failed its smoke test", "smoke": smoke,
+                        "active": current.describe()}, 409
+
+        use_index(ix)
+        index_manager.activate(ix, rollback=rollback)
+        if publish:
+            index_manager.write_pointer({**ix.spec(), "validated": validate or rollback, "previous": current.spec()})
+        logging.info(f"[INDEX] {'Rolled back' if rollback else 'Swapped'} {current.name}@{current.corpus_version} "
+                     f"-> {ix.name}@{ix.corpus_version}")
+        return {"active": ix.describe(), "previous": current.describe(), "changed": True}, 200
+
+def rollback_index() -> Tuple[Dict[str, Any], int]:
+    with index_manager.swap_lock:
+        prev = index_manager.previous
+        spec = prev.spec() if prev is not None else (index_manager.read_pointer() or {}).get("previous")
+        if not spec:
+            return {"error": "No previous index version to roll back to"}, 409
+        return switch_index(spec, validate=False, rollback=True)
+
+def build_index(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Build a new collection in the background (INDEX_BUILD_CMD), then validate and optionally activate it."""
+    name = (data.get("name") or f"{COLLECTION_NAME}-{time.strftime('%Y%m%d-%H%M%S')}").strip()
+    if not COLLECTION_NAME_RE.match(name):
+        return {"error": "name must be 3-63 characters of [A-Za-z0-9._-], alphanumeric at both ends"}, 400
+    path = os.path.abspath(data.get("path") or CHROMA_PATH)
+    if name == active_index.name and path == os.path.abspath(active_index.path):
+        return {"error": "Refusing to build into the active collection"}, 409
+    env = {"NEW_COLLECTION": name, "CHROMA_PATH": path}
+    if data.get("model"):
+        env["HF_MODEL"] = str(data["model"])
+    if data.get("chunks_dir"):
+        env["CHUNKS_DIR"] = os.path.abspath(data["chunks_dir"])
+    spec = {"name": name, "path": path, "model": data.get("model")}
+    activate = bool(data.get("activate", True))
+
+    def then(build: Dict[str, Any]):
+        if activate:
+            body, status = switch_index(spec)
+        else:
+            ix = open_index(spec)
+            body = {"smoke": validate_index(ix)}
+            status = 200 if body["smoke"]["passed"] else 409
+        build["result"] = body
+        build["state"] = ("activated" if activate else "validated") if status == 200 else "rejected"
+
+    build = index_manager.run_build(
+        name, [sys.executable, INDEX_BUILD_CMD], os.path.abspath(INDEX_BUILD_DIR), env,
+        os.path.join(log_dir, f"indexBuild-{name}.log"), then
+    )
+    if build is None:
+        return {"error": "An index build is already running", "build": index_manager.build}, 409
+    return {"build": build}, 202
+
+def index_admin(action: str, data: Dict[str, Any], admin_key: Optional[str]) -> Tuple[Dict[str, Any], int]:
+    """/admin/index[/<action>] for both servers: status | activate | rollback | build."""
+    if not ADMIN_API_KEY:
+        return {"error": "Admin endpoints are disabled; set ADMIN_API_KEY"}, 403
+    if not hmac.compare_digest((admin_key or "").encode(), ADMIN_API_KEY.encode()):
+        return {"error": "Invalid admin key"}, 401
+    if action == "status":
+        return index_manager.status(), 200
+    if action == "rollback":
+        return rollback_index()
+    if action == "build":
+        return build_index(data)
+    if action == "activate":
+        if not data.get("name"):
+            return {"error": "name is required"}, 400
+        spec = {"name": data["name"], "path": data.get("path"), "model": data.get("model")}
+        return switch_index(spec, force=bool(data.get("force")))
+    return {"error": f"Unknown action {action!r}"}, 404
+
+# ============================
+# Routes
+# ============================
+@app.before_request
+def ensure_index_watch():
+    start_index_watch()
+
+@app.route("/health", methods=["GET"])
+def health():
+    return jsonify(health_payload())
+
+def metrics_payload() -> Dict[str, Any]:
+    return {
+        "corpus_version": CORPUS_VERSION,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "citations": citation_index.stats() if citation_index is not None else None,
+        "definitions": definitions_index.stats() if definitions_index is not None else None,
+        "act_router": active_index.act_router.stats() if active_index.act_router is not None else None,
+        "doc_store": doc_store.stats() if doc_store is not None else None,
+        "context_packer": context_packer.stats(),
+        "deadlines": stage_costs.stats(),
+        "admission": admission.stats() if admission is not None else None,
+        "generator_admission": generator_admission.stats() if generator_admission is not None else None,
+        "rate_limits": rate_limiter.stats() if rate_limiter is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "responses": response_encoder.stats(),
+        "faq": faq_store.stats() if faq_store is not None else None,
+        "hnsw": collection.index.stats() if vector_index_kind(collection) == "hnsw" else None,
+        "shadow": shadow.stats() if shadow is not None else None,
+        "result_pages": cursor_store.stats() if cursor_store is not None else None,
+        "sessions": session_store.stats() if session_store is not None else None,
+        "clauses": active_index.clause_index.stats() if active_index.clause_index is not None else None,
+        "index": {
+            "name": active_index.name,
+            "version": active_index.corpus_version,
+            "swaps": index_manager.swaps,
+            "rollbacks": index_manager.rollbacks,
+            "rejected": index_manager.rejected,
+            "build": (index_manager.build or {}).get("state"),
+        },
+    }
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify(metrics_payload())
+
+@app.route("/admin/index", methods=["GET"])
+@app.route("/admin/index/<action>", methods=["POST"])
+def admin_index(action: str = "status"):
+    body, status = index_admin(action, request.get_json(silent=True) or {}, request.headers.get("X-Admin-Key"))
+    return jsonify(body), status
+
+def answer_query(req_id: str, params: Dict[str, Any], t0: float) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """Semantic cache, then the generator round trip (proxy mode) and / or local retrieval, each
+    once admitted: (body, status, headers). The generator call takes a generator slot, the local
+    pipeline (also the fallback when the generator is skipped or times out) a model slot."""
+    cached = cached_response(req_id, params, t0)
+    if cached is not None:
+        if admission is not None:
+            admission.bypass()
+        return cached, 200, {}
+
+    if GENERATOR_URL and params["answer_mode"] == "generate":
+        ticket = None
+        if generator_admission is not None:
+            ticket, reason = generator_admission.acquire(queue_timeout_s(params, t0))
+            if ticket is None:
+                return shed_response(req_id, reason, generator_admission)
+        try:
+            timeout_s = generator_timeout_s(req_id, params, t0)
+            if timeout_s is not None:
+                try:
+                    t_gen = time.perf_counter()
+                    generator_payload = call_generator_api(
+                        params["query"], params["act"], params["top_k_retrieve"],
+                        params["top_k_return"], params["include_context"], timeout_s=timeout_s,
+                        history=session_history(params), retrieval_query=session_retrieval_query(params)
+                    )
+                    stage_costs.observe("generator", (time.perf_counter() - t_gen) * 1000)
+                except requests.Timeout:
+                    logging.exception(f"[{req_id}] Generator timed out")
+                    if not generator_timed_out(req_id, params, t0):
+                        return {"error": "Generator timeout"}, 504, {}
+                except requests.RequestException:
+                    logging.exception(f"[{req_id}] Generator request failed")
+                    return {"error": "Generator request failed"}, 502, {}
+                else:
+                    return proxy_response(req_id, params, generator_payload, t0), 200, {}
+        finally:
+            if ticket is not None:
+                generator_admission.release(ticket)
+
+    ticket = None
+    if admission is not None:
+        ticket, reason = admission.acquire(queue_timeout_s(params, t0))
+        if ticket is None:
+            return shed_response(req_id, reason, admission)
+    try:
+        resp, status = retrieval_response(req_id, params, t0)
+        return resp, status, {}
+    finally:
+        if ticket is not None:
+            admission.release(ticket)
+
+@app.route("/askQuery", methods=["POST"])
+def ask_query():
+    req_id = str(uuid.uuid4())[:8]
+    t0 = time.perf_counter()
+
+    limited = rate_limit_response(req_id, client_key(request.headers.get("X-API-Key"), request.remote_addr))
+    if limited is not None:
+        body, status, headers = limited
+        return jsonify(body), status, headers
+
+    try:
+        data = request.get_json(force=True) or {}
+    except Exception:
+        logging.exception(f"[{req_id}] Bad JSON payload")
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    params, err = parse_ask_payload(data)
+    if err:
+        return jsonify({"error": err}), 400
+    log_incoming(req_id, params)
+
+    accept = request.headers.get("Accept-Encoding", "")
+
+    # Fast paths skip the admission queue: no reranker, no generator
+    fast = citation_response(req_id, params, t0) or definition_response(req_id, params, t0)
+    if fast is not None:
+        if admission is not None:
+            admission.bypass()
+        return encode_response(req_id, params, attach_session(params, fast), accept_encoding=accept)
+
+    if single_flight is None:
+        body, status, headers = answer_query(req_id, params, t0)
+        body = attach_session(params, attach_cursor(params, body))
+        return encode_response(req_id, params, body, status, headers, accept)
+    try:
+        (body, status, headers), shared = single_flight.do(
+            flight_key(params), lambda: answer_query(req_id, params, t0), flight_wait_s(params, t0)
+        )
+    except TimeoutError:
+        logging.warning(f"[{req_id}] Gave up waiting for an identical in-flight query")
+        return jsonify({"error": "Timed out waiting for an identical in-flight query"}), 504
+    if shared:
+        body = coalesced_response(req_id, params, body, t0)
+    body = attach_session(params, attach_cursor(params, body))
+    return encode_response(req_id, params, body, status, headers, accept)
+
+@app.route("/askQuery/more", methods=["POST"])
+def ask_query_more():
+    req_id = str(uuid.uuid4())[:8]
+    t0 = time.perf_counter()
+
+    limited = rate_limit_response(req_id, client_key(request.headers.get("X-API-Key"), request.remote_addr))
+    if limited is not None:
+        body, status, headers = limited
+        return jsonify(body), status, headers
 
-    return jsonify(resp)
+    params, err = parse_page_payload(request.get_json(silent=True) or {})
+    if err:
+        return jsonify({"error": err}), 400
+    body, status = page_response(req_id, params, t0)
+    return encode_response(req_id, params, body, status, accept_encoding=request.headers.get("Accept-Encoding", ""))
 
 # ============================
 # Main
 # ============================
 if __name__ == "__main__":
+    # Development server only; see wsgi.py / asyncServer.py for production serving.
     print(" Starting Flask server on http://127.0.0.1:5000 ...")
     app.run(debug=True, port=5000)
@@ -0,0 +1,271 @@
+# asyncServer.py
+# asyncio (aiohttp) front end for the Uhaki API.
+#
+# The Flask app pins one thread per request for the whole generator round trip
+# (up to GENERATOR_TIMEOUT_S). Here the proxy call is awaited on the event loop, and
+# only the CPU-bound stages (embed, Chroma, rerank, hydration, CSV logging, the citation and
+# definition fast paths, response serialization and compression) go to a small thread pool
+# sized to the model workers. Admission control and single-flight
+# coalescing mirror app.py's (same settings), with asyncio-side state per worker process.
+#
+#   python asyncServer.py                                    # single process
+#   WORKER_CLASS=aiohttp.GunicornWebWorker \
+#   gunicorn -c gunicorn.conf.py asyncServer:web_app         # preforked, models preloaded
+import asyncio
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web, ClientSession, ClientTimeout, ClientError
+
+import app as uhaki
+from admission import AsyncAdmissionController
+from singleFlight import AsyncSingleFlight
+
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "2"))
+ASYNC_PORT    = int(os.getenv("ASYNC_PORT", "5000"))
+
+
+async def _on_startup(web_app: web.Application):
+    # Created per worker process (after fork), never in the preloading master.
+    web_app["pool"] = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="uhaki-model")
+    web_app["http"] = ClientSession(timeout=ClientTimeout(total=uhaki.GENERATOR_TIMEOUT_S))
+    web_app["admission"] = (AsyncAdmissionController(uhaki.ADMISSION_SLOTS, uhaki.ADMISSION_QUEUE)
+                            if uhaki.ADMISSION else None)
+    web_app["generator_admission"] = (AsyncAdmissionController(uhaki.ADMISSION_GENERATOR_SLOTS, uhaki.ADMISSION_QUEUE)
+                                      if uhaki.ADMISSION and uhaki.GENERATOR_URL else None)
+    web_app["flights"] = AsyncSingleFlight() if uhaki.SINGLE_FLIGHT else None
+    uhaki.start_index_watch()
+
+
+async def _on_cleanup(web_app: web.Application):
+    await web_app["http"].close()
+    web_app["pool"].shutdown(wait=False)
+
+
+@web.middleware
+async def cors(req: web.Request, handler):
+    # Same open policy as flask_cors.CORS(app) in app.py.
+    if req.method == "OPTIONS":
+        resp = web.Response()
+    else:
+        resp = await handler(req)
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    resp.headers["Access-Control-Allow-Headers"] = req.headers.get("Access-Control-Request-Headers", "Content-Type")
+    resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    return resp
+
+
+async def preflight(req: web.Request) -> web.Response:
+    return web.Response()
+
+
+async def health(req: web.Request) -> web.Response:
+    return web.json_response(uhaki.health_payload())
+
+
+async def metrics(req: web.Request) -> web.Response:
+    ctl, gen_ctl, flights = req.app["admission"], req.app["generator_admission"], req.app["flights"]
+    return web.json_response({
+        **uhaki.metrics_payload(),
+        "admission": ctl.stats() if ctl is not None else None,
+        "generator_admission": gen_ctl.stats() if gen_ctl is not None else None,
+        "single_flight": flights.stats() if flights is not None else None,
+    })
+
+
+async def admin_index(req: web.Request) -> web.Response:
+    # Loading and smoke-testing a version takes seconds; keep it off the loop and the model pool.
+    action = req.match_info.get("action", "status")
+    try:
+        data = await req.json() if req.body_exists else {}
+    except Exception:
+        data = {}
+    body, status = await asyncio.get_running_loop().run_in_executor(
+        None, uhaki.index_admin, action, data or {}, req.headers.get("X-Admin-Key")
+    )
+    return web.json_response(body, status=status)
+
+
+async def ask_query(req: web.Request) -> web.Response:
+    req_id = str(uuid.uuid4())[:8]
+    t0 = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    pool = req.app["pool"]
+    ctl = req.app["admission"]
+
+    limited = uhaki.rate_limit_response(req_id, uhaki.client_key(req.headers.get("X-API-Key"), req.remote))
+    if limited is not None:
+        body, status, headers = limited
+        return web.json_response(body, status=status, headers=headers)
+
+    try:
+        data = await req.json() or {}
+    except Exception:
+        logging.exception(f"[{req_id}] Bad JSON payload")
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+
+    params, err = uhaki.parse_ask_payload(data)
+    if err:
+        return web.json_response({"error": err}, status=400)
+    uhaki.log_incoming(req_id, params)
+    accept = req.headers.get("Accept-Encoding", "")
+
+    # Fast paths skip the admission queue. They still pack context (tokenizer) and log to CSV, so
+    # they run on the pool too.
+    fast = await loop.run_in_executor(pool, fast_answer, req_id, params, t0)
+    if fast is not None:
+        if ctl is not None:
+            ctl.bypass()
+        return await encoded(pool, req_id, params, fast, session=True, accept_encoding=accept)
+
+    flights = req.app["flights"]
+    if flights is None:
+        body, status, headers = await answer_query(req, req_id, params, t0)
+        return await encoded(pool, req_id, params, body, status, headers, accept, session=True, cursor=True)
+    try:
+        (body, status, headers), shared = await flights.do(
+            uhaki.flight_key(params), lambda: answer_query(req, req_id, params, t0), uhaki.flight_wait_s(params, t0)
+        )
+    except TimeoutError:
+        logging.warning(f"[{req_id}] Gave up waiting for an identical in-flight query")
+        return web.json_response({"error": "Timed out waiting for an identical in-flight query"}, status=504)
+    if shared:
+        body = await loop.run_in_executor(pool, uhaki.coalesced_response, req_id, params, body, t0)
+    return await encoded(pool, req_id, params, body, status, headers, accept, session=True, cursor=True)
+
+
+async def ask_query_more(req: web.Request) -> web.Response:
+    req_id = str(uuid.uuid4())[:8]
+    t0 = time.perf_counter()
+    limited = uhaki.rate_limit_response(req_id, uhaki.client_key(req.headers.get("X-API-Key"), req.remote))
+    if limited is not None:
+        body, status, headers = limited
+        return web.json_response(body, status=status, headers=headers)
+    try:
+        data = await req.json() or {}
+    except Exception:
+        data = {}
+    params, err = uhaki.parse_page_payload(data)
+    if err:
+        return web.json_response({"error": err}, status=400)
+    # A page may rerank the next batch of the pool: model work, so it goes to the model pool.
+    body, status = await asyncio.get_running_loop().run_in_executor(req.app["pool"], uhaki.page_response,
+                                                                    req_id, params, t0)
+    return await encoded(req.app["pool"], req_id, params, body, status,
+                         accept_encoding=req.headers.get("Accept-Encoding", ""))
+
+
+def fast_answer(req_id: str, params: dict, t0: float):
+    return uhaki.citation_response(req_id, params, t0) or uhaki.definition_response(req_id, params, t0)
+
+
+def finish(req_id: str, params: dict, body: dict, status: int, headers, accept_encoding: str,
+           session: bool, cursor: bool):
+    if cursor:
+        body = uhaki.attach_cursor(params, body)
+    if session:
+        body = uhaki.attach_session(params, body)
+    return uhaki.encode_response(req_id, params, body, status, headers, accept_encoding)
+
+
+async def encoded(pool, req_id: str, params: dict, body: dict, status: int = 200, headers=None,
+                  accept_encoding: str = "", session: bool = False, cursor: bool = False) -> web.Response:
+    """Attach the cursor / session, then shape, serialize and compress on the pool (not the loop)."""
+    data, status, headers = await asyncio.get_running_loop().run_in_executor(
+        pool, finish, req_id, params, body, status, headers, accept_encoding, session, cursor
+    )
+    return web.Response(body=data, status=status, headers=headers)
+
+
+async def answer_query(req: web.Request, req_id: str, params: dict, t0: float):
+    """Semantic cache, then the generator round trip (proxy mode) and / or local retrieval, each
+    once admitted: (body, status, headers)."""
+    loop = asyncio.get_running_loop()
+    ctl = req.app["admission"]
+    cached = await loop.run_in_executor(req.app["pool"], uhaki.cached_response, req_id, params, t0)
+    if cached is not None:
+        if ctl is not None:
+            ctl.bypass()
+        return cached, 200, {}
+
+    if uhaki.GENERATOR_URL and params["answer_mode"] == "generate":
+        gen_ctl = req.app["generator_admission"]
+        ticket = None
+        if gen_ctl is not None:
+            ticket, reason = await gen_ctl.acquire(uhaki.queue_timeout_s(params, t0))
+            if ticket is None:
+                return uhaki.shed_response(req_id, reason, gen_ctl)
+        try:
+            answered = await generate(req, req_id, params, t0)
+        finally:
+            if ticket is not None:
+                await gen_ctl.release(ticket)
+        if answered is not None:
+            return answered
+
+    ticket = None
+    if ctl is not None:
+        ticket, reason = await ctl.acquire(uhaki.queue_timeout_s(params, t0))
+        if ticket is None:
+            return uhaki.shed_response(req_id, reason, ctl)
+    try:
+        resp, status = await loop.run_in_executor(req.app["pool"], uhaki.retrieval_response, req_id, params, t0)
+        return resp, status, {}
+    finally:
+        if ticket is not None:
+            await ctl.release(ticket)
+
+
+async def generate(req: web.Request, req_id: str, params: dict, t0: float):
+    """Generator round trip: (body, status, headers), or None to answer from local retrieval instead."""
+    timeout_s = uhaki.generator_timeout_s(req_id, params, t0)
+    if timeout_s is None:
+        return None
+    payload, headers = uhaki.build_generator_request(
+        params["query"], params["act"], params["top_k_retrieve"],
+        params["top_k_return"], params["include_context"], uhaki.session_history(params),
+        uhaki.session_retrieval_query(params)
+    )
+    try:
+        t_gen = time.perf_counter()
+        async with req.app["http"].post(uhaki.GENERATOR_URL, json=payload, headers=headers,
+                                        timeout=ClientTimeout(total=timeout_s)) as r:
+            r.raise_for_status()
+            generator_payload = await r.json(content_type=None)
+        uhaki.stage_costs.observe("generator", (time.perf_counter() - t_gen) * 1000)
+    except asyncio.TimeoutError:
+        logging.exception(f"[{req_id}] Generator timed out")
+        if not uhaki.generator_timed_out(req_id, params, t0):
+            return {"error": "Generator timeout"}, 504, {}
+        return None
+    except ClientError:
+        logging.exception(f"[{req_id}] Generator request failed")
+        return {"error": "Generator request failed"}, 502, {}
+    resp = await asyncio.get_running_loop().run_in_executor(req.app["pool"], uhaki.proxy_response, req_id, params,
+                                                            generator_payload, t0)
+    return resp, 200, {}
+
+
+def make_app() -> web.Application:
+    web_app = web.Application(middlewares=[cors])
+    web_app.on_startup.append(_on_startup)
+    web_app.on_cleanup.append(_on_cleanup)
+    web_app.router.add_get("/health", health)
+    web_app.router.add_get("/metrics", metrics)
+    web_app.router.add_get("/admin/index", admin_index)
+    web_app.router.add_post("/admin/index/{action}", admin_index)
+    web_app.router.add_post("/askQuery", ask_query)
+    web_app.router.add_post("/askQuery/more", ask_query_more)
+    web_app.router.add_route("OPTIONS", "/{tail:.*}", preflight)
+    return web_app
+
+
+web_app = make_app()
+
+if __name__ == "__main__":
+    uhaki.warm_up()
+    print(f" Starting async server on http://0.0.0.0:{ASYNC_PORT} ...")
+    web.run_app(web_app, port=ASYNC_PORT)
@@ -0,0 +1,258 @@
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import time
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchServe import percentile, load_questions
+from hybridFusion import HybridCorpus, HybridFusion, SALIENT_TERMS, DEAD_HEAD_RE, INTERP_RE
+
+# Same constants as notebooks/backendProcess.ipynb
+W_BM25_DOC, W_BM25_HEAD, W_DENSE = 0.35, 0.35, 0.30
+ALPHA_FUSION = 0.80
+HEADING_PRIOR_POS, HEADING_PRIOR_NEG = 0.05, -0.05
+ACT_PRIOR_BETA = 0.05
+ACT_GATING_K, ACT_CONF_MIN = 3, 0.55
+TOPK_CE_RERANK, TOPK_FINAL = 400, 6
+
+
+# ============================
+# Reference: the notebook's loop implementation (pools and CE passed in)
+# ============================
+def _tok(t: str):
+    return [x for x in re.split(r"\W+", (t or "").lower()) if x]
+
+def _minmax(xs):
+    if not xs: return []
+    mn, mx = float(min(xs)), float(max(xs))
+    if mx <= mn: return [0.0]*len(xs)
+    return [(x-mn)/(mx-mn) for x in xs]
+
+def _act_topk_share_and_map(id2, ids, scores, k=3):
+    mass, total = defaultdict(float), 0.0
+    for _id, sc in zip(ids, scores):
+        if _id in id2.index:
+            a = str(id2.loc[_id, "act"] or "")
+            mass[a] += sc; total += sc
+    ranked = sorted(mass.items(), key=lambda kv: kv[1], reverse=True)
+    share  = (ranked[0][1]/total) if (ranked and total>0) else 0.0
+    topk   = [a for a,_ in ranked[:k] if a]
+    act_share = {a: (v/total if total>0 else 0.0) for a, v in mass.items()}
+    return topk, share, act_share
+
+def _heading_prior(heading, q):
+    h, ql = (heading or "").lower(), (q or "").lower()
+    if any(t in h for t in SALIENT_TERMS) and any(t in ql for t in SALIENT_TERMS):
+        return HEADING_PRIOR_POS
+    if DEAD_HEAD_RE.search(h): return HEADING_PRIOR_NEG
+    if INTERP_RE.search(h):    return -0.03
+    return 0.0
+
+def _overlap_prior(heading, q):
+    ht, qt = set(_tok(heading)), set(_tok(q))
+    if not ht or not qt: return 0.0
+    jacc = len(ht & qt) / max(1, len(ht | qt))
+    bonus = min(0.05, 0.30 * jacc)
+    qtokens = _tok(q)
+    phrases = [" ".join(p) for p in zip(qtokens, qtokens[1:])]
+    if any(p and p in (heading or "").lower() for p in phrases):
+        bonus += 0.02
+    return min(bonus, 0.07)
+
+def _section_num_bonus(q, sec_num):
+    if not sec_num: return 0.0
+    q_nums = re.findall(r"\d+", (q or ""))
+    return 0.03 if sec_num in q_nums else 0.0
+
+def reference_rank(id2, q, d_ids, d_dists, bd_ids, bd_scs, bh_ids, bh_scs, ce_fn) -> List[str]:
+    d_norm  = _minmax([-d for d in d_dists])
+    bd_norm = _minmax(bd_scs)
+    bh_norm = _minmax(bh_scs)
+
+    fuse = defaultdict(float)
+    for i, _id in enumerate(d_ids):  fuse[_id]  += W_DENSE     * d_norm[i]
+    for i, _id in enumerate(bd_ids): fuse[_id]  += W_BM25_DOC  * bd_norm[i]
+    for i, _id in enumerate(bh_ids): fuse[_id]  += W_BM25_HEAD * bh_norm[i]
+
+    cand_ids    = sorted(fuse.keys(), key=lambda k: fuse[k], reverse=True)
+    cand_scores = [fuse[_id] for _id in cand_ids]
+
+    top_acts, share, act_share = _act_topk_share_and_map(id2, cand_ids, cand_scores, k=ACT_GATING_K)
+    if share >= ACT_CONF_MIN and top_acts:
+        gated = []
+        for _id in cand_ids:
+            if _id in id2.index and id2.loc[_id, "act"] in top_acts:
+                gated.append(_id)
+            if len(gated) >= TOPK_CE_RERANK: break
+    else:
+        gated = cand_ids[:TOPK_CE_RERANK]
+
+    qdoc = [(q, id2.loc[_id, "doc"]) for _id in gated]
+    ce_scores = ce_fn(qdoc)
+    ce_norm   = _minmax(ce_scores)
+
+    d_map       = {i:d for i,d in zip(d_ids, d_dists)}
+    dense_sims  = [(-d_map[_id] if _id in d_map else float("-inf")) for _id in gated]
+    dense_norm2 = _minmax(dense_sims)
+
+    finals = []
+    for i, _id in enumerate(gated):
+        row    = id2.loc[_id]
+        head   = row["heading"]
+        secnum = str(row["section_num"] or "")
+        act    = str(row["act"] or "")
+        score = (
+            ALPHA_FUSION * ce_norm[i] +
+            (1.0 - ALPHA_FUSION) * dense_norm2[i] +
+            _heading_prior(head, q) +
+            _overlap_prior(head, q) +
+            ACT_PRIOR_BETA * float(act_share.get(act, 0.0)) +
+            _section_num_bonus(q, secnum)
+        )
+        finals.append((_id, score))
+    finals_sorted = sorted(finals, key=lambda t: t[1], reverse=True)
+
+    seen_secs, top_ids = set(), []
+    for _id, _sc in finals_sorted:
+        s = str(id2.loc[_id, "section_num"] or "")
+        if s and s in seen_secs:
+            continue
+        seen_secs.add(s)
+        top_ids.append(_id)
+        if len(top_ids) >= TOPK_FINAL: break
+    if len(top_ids) < TOPK_FINAL:
+        for _id, _ in finals_sorted:
+            if _id not in top_ids:
+                top_ids.append(_id)
+            if len(top_ids) >= TOPK_FINAL: break
+    return top_ids
+
+
+# ============================
+# Corpus + synthetic pools
+# ============================
+def load_corpus(chunks_dir: str) -> pd.DataFrame:
+    """corpus_df as the notebook's load_corpus_df builds it from Chroma metadata."""
+    rows = []
+    for fp in sorted(glob.glob(os.path.join(chunks_dir, "*.json"))):
+        with open(fp, "r", encoding="utf-8") as f:
+            for c in json.load(f):
+                rows.append({
+                    "id": f"{c.get('act')}::{c.get('section')}::{c.get('chunk_id')}",
+                    "doc": c.get("text") or "",
+                    "heading": c.get("section_title") or "",
+                    "act": c.get("act") or "",
+                    "section_num": str(c.get("section") or "").strip(),
+                })
+    return pd.DataFrame(rows)
+
+
+def make_pools(rng: np.random.Generator, q: str, corpus: HybridCorpus, pool: int, nested: bool):
+    """Dense / BM25 pools that behave like the real ones: each pool leans towards one Act
+    (so gating kicks in), BM25 pools overlap the dense pool, scores are decreasing.
+    nested=True keeps both BM25 pools inside the dense pool (no missing dense score)."""
+    n = len(corpus)
+    act = rng.integers(len(corpus.act_names))
+    in_act = np.flatnonzero(corpus.act_codes == act)
+    mix = np.concatenate([rng.choice(in_act, size=min(len(in_act), pool // 2), replace=False),
+                          rng.choice(n, size=pool, replace=False)])
+    d_rows = pd.unique(mix)[:pool]
+    d_dists = np.sort(rng.uniform(0.08, 0.35, size=len(d_rows)))
+
+    def bm25_pool():
+        if nested:
+            rows = rng.permutation(d_rows)
+        else:
+            rows = pd.unique(np.concatenate([rng.permutation(d_rows)[:pool // 2], rng.choice(n, size=pool, replace=False)]))[:pool]
+        return rows, np.sort(rng.gamma(2.0, 4.0, size=len(rows)))[::-1]
+    bd_rows, bd_scs = bm25_pool()
+    bh_rows, bh_scs = bm25_pool()
+    return d_rows, d_dists, bd_rows, bd_scs, bh_rows, bh_scs
+
+
+def fake_ce(pairs: List[Tuple[str, str]]) -> List[float]:
+    """Deterministic stand-in for the cross-encoder (token overlap + a hash jitter)."""
+    out = []
+    for q, doc in pairs:
+        qt = set(_tok(q))
+        dt = set(_tok(doc[:400]))
+        out.append(len(qt & dt) + (zlib.crc32(doc.encode("utf-8")) % 1000) / 1000.0)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized vs loop hybrid fusion: equivalence and latency.")
+    parser.add_argument("--chunks_dir", type=str, default="../data/ActsinSectionChunks")
+    parser.add_argument("--csv_path", type=str, default="../testing/uhakiTestQuestions.csv")
+    parser.add_argument("--limit", type=int, default=0, help="Questions to run (0 = all)")
+    parser.add_argument("--pool", type=int, default=350, help="Size of each of the three candidate pools")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--passes", type=int, default=2,
+                        help="Runs over the questions; pass 1 fills the heading-phrase cache, later passes hit it")
+    args = parser.parse_args()
+
+    corpus_df = load_corpus(args.chunks_dir)
+    assert corpus_df["id"].is_unique, "chunk ids must be unique"
+    id2 = corpus_df.set_index("id")
+    t0 = time.perf_counter()
+    corpus = HybridCorpus.from_df(corpus_df)
+    fusion = HybridFusion(corpus, W_DENSE, W_BM25_DOC, W_BM25_HEAD, ALPHA_FUSION, ACT_PRIOR_BETA,
+                          ACT_GATING_K, ACT_CONF_MIN, TOPK_CE_RERANK, TOPK_FINAL,
+                          HEADING_PRIOR_POS, HEADING_PRIOR_NEG)
+    print(f"[INFO] {len(corpus)} chunks, {len(corpus.act_names)} Acts | HybridCorpus built in "
+          f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    questions = load_questions(args.csv_path, args.limit)
+    ids = corpus.ids
+    for p in range(1, args.passes + 1):
+        rng = np.random.default_rng(args.seed)
+        same = 0
+        mismatches: List[Dict[str, Any]] = []
+        ref_ms: List[float] = []
+        vec_ms: List[float] = []
+        cands: List[int] = []
+        for qi, q in enumerate(questions):
+            d_rows, d_dists, bd_rows, bd_scs, bh_rows, bh_scs = make_pools(rng, q, corpus, args.pool, nested=qi % 4 == 0)
+            # Score the pools once, outside both timings, so only the fusion work is measured
+            docs = [corpus.docs[r] for r in np.unique(np.concatenate([d_rows, bd_rows, bh_rows]))]
+            ce_cache = dict(zip(docs, fake_ce([(q, d) for d in docs])))
+
+            def ce_fn(pairs):
+                return [ce_cache[doc] for _, doc in pairs]
+
+            t1 = time.perf_counter()
+            ref = reference_rank(id2, q, [ids[r] for r in d_rows], d_dists.tolist(), [ids[r] for r in bd_rows],
+                                 bd_scs.tolist(), [ids[r] for r in bh_rows], bh_scs.tolist(), ce_fn)
+            t2 = time.perf_counter()
+            timings: Dict[str, Any] = {}
+            got = fusion.rank(q, d_rows, d_dists, bd_rows, bd_scs, bh_rows, bh_scs, ce_fn, timings)
+            ref_ms.append((t2 - t1) * 1000)
+            vec_ms.append(timings["fusion_ms"])
+            cands.append(timings["candidates"])
+            got_ids = [ids[r] for r in got]
+            if got_ids == ref:
+                same += 1
+            elif len(mismatches) < 5:
+                mismatches.append({"q": q, "ref": ref, "got": got_ids})
+
+        n = len(questions)
+        cache = "cold" if p == 1 else "warm"
+        print(f"[PASS {p}] {n} questions, {statistics.mean(cands):.0f} fused candidates per query "
+              f"(pool={args.pool} x 3), phrase cache {cache}")
+        print(f"  identical top-{TOPK_FINAL}: {same}/{n}")
+        for m in mismatches:
+            print(f"  [MISMATCH] {m['q']!r}\n    ref={m['ref']}\n    got={m['got']}")
+        print(f"  loop fusion ms      : mean={statistics.mean(ref_ms):.2f} p50={percentile(ref_ms, 50):.2f} p95={percentile(ref_ms, 95):.2f}")
+        print(f"  vectorized fusion ms: mean={statistics.mean(vec_ms):.3f} p50={percentile(vec_ms, 50):.3f} p95={percentile(vec_ms, 95):.3f}")
+        print(f"  speedup (mean)      : {statistics.mean(ref_ms) / max(statistics.mean(vec_ms), 1e-9):.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import pandas as pd
+import requests
+
+
+def percentile(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    k = min(len(xs) - 1, max(0, int(round(p / 100.0 * (len(xs) - 1)))))
+    return xs[k]
+
+
+def load_questions(csv_path: Path, limit: int) -> List[str]:
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    cols = {c.lower(): c for c in df.columns}
+    if "question" not in cols:
+        print("[ERROR] Input CSV must have a 'question' column.")
+        sys.exit(1)
+    qs = [str(q).strip() for q in df[cols["question"]].tolist() if str(q).strip()]
+    return qs[:limit] if limit > 0 else qs
+
+
+def summarize(latencies_ms: List[float], errors: int, wall_s: float) -> Dict[str, Any]:
+    done = len(latencies_ms)
+    return {
+        "requests": done + errors,
+        "ok": done,
+        "errors": errors,
+        "error_rate": round(errors / (done + errors), 4) if done + errors else 0.0,
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(done / wall_s, 2) if wall_s > 0 else 0.0,
+        "mean_ms": round(statistics.mean(latencies_ms), 1) if latencies_ms else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 1),
+        "p95_ms": round(percentile(latencies_ms, 95), 1),
+        "p99_ms": round(percentile(latencies_ms, 99), 1),
+    }
+
+
+class Recorder:
+    """Latencies of 200s, plus what the other requests ended in (status code or exception)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.outcomes: Counter = Counter()
+        self.kinds: Counter = Counter()   # how the 200s were answered: generated, retrieval, cache, degraded
+
+    def send(self, session: requests.Session, url: str, q: str, timeout: float, t_sched: Optional[float] = None):
+        # Open loop: latency counts from the scheduled send time, so a backed-up client is not hidden.
+        t0 = t_sched if t_sched is not None else time.perf_counter()
+        kind = ""
+        try:
+            r = session.post(url, json={"query": q}, timeout=timeout)
+            outcome = str(r.status_code)
+            if r.status_code == 200:
+                body = r.json()
+                kind = ("cache" if (body.get("cache") or {}).get("hit")
+                        else "degraded" if body.get("degradations")
+                        else "generated" if body.get("answer") else "retrieval")
+        except requests.Timeout:
+            outcome = "client_timeout"
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+        dt = (time.perf_counter() - t0) * 1000
+        with self.lock:
+            self.outcomes[outcome] += 1
+            if outcome == "200":
+                self.latencies.append(dt)
+                self.kinds[kind] += 1
+            else:
+                self.errors += 1
+
+
+def arrival_times(rate: float, duration_s: float, arrivals: str, rng: random.Random) -> List[float]:
+    """Send offsets (s) for a fixed arrival rate: Poisson (exponential gaps) or evenly spaced."""
+    out, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate) if arrivals == "poisson" else 1.0 / rate
+        if t >= duration_s:
+            return out
+        out.append(t)
+
+
+def run_open_loop(url: str, questions: List[str], rate: float, duration_s: float, arrivals: str,
+                  timeout: float, max_outstanding: int, rng: random.Random) -> Dict[str, Any]:
+    """Send at `rate` req/s for duration_s whatever the server does, then wait for the stragglers."""
+    rec = Recorder()
+    local = threading.local()
+    schedule = arrival_times(rate, duration_s, arrivals, rng)
+
+    def one(q: str, t_sched: float):
+        s = getattr(local, "s", None)
+        if s is None:
+            s = local.s = requests.Session()
+        rec.send(s, url, q, timeout, t_sched)
+
+    late = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_outstanding) as pool:
+        for i, offset in enumerate(schedule):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.05:
+                late += 1
+            pool.submit(one, questions[rng.randrange(len(questions))], start + offset)
+    wall = time.perf_counter() - start
+
+    out = {"offered_rps": rate, "sent": len(schedule), **summarize(rec.latencies, rec.errors, wall)}
+    out["outcomes"] = dict(rec.outcomes)
+    out["answered_by"] = dict(rec.kinds)
+    if late:
+        out["late_sends"] = late   # the client itself fell behind the schedule
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the benchmark questions against /askQuery.")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:5000/askQuery")
+    parser.add_argument("--csv_path", type=str, default="../testing/uhakiTestQuestions.csv")
+    parser.add_argument("--limit", type=int, default=0, help="Only use the first N questions (0 = all)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop client threads")
+    parser.add_argument("--rounds", type=int, default=1, help="Replay the question set this many times")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests sent first")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--rates", type=str, default="",
+                        help="Open loop: comma-separated arrival rates in req/s, each run for --duration (e.g. 0.5,1,2,4)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Open loop: seconds per rate")
+    parser.add_argument("--arrivals", type=str, default="poisson", choices=["poisson", "uniform"])
+    parser.add_argument("--max_outstanding", type=int, default=512, help="Open loop: most requests in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    questions = load_questions(Path(args.csv_path), args.limit)
+    session = requests.Session()
+    for q in questions[:args.warmup]:
+        try:
+            session.post(args.url, json={"query": q}, timeout=args.timeout)
+        except requests.RequestException:
+            pass
+
+    if args.rates:
+        rng = random.Random(args.seed)
+        rates = [float(r) for r in args.rates.split(",") if r.strip()]
+        print(f"[INFO] Open loop -> {args.url} | {args.arrivals} arrivals at {rates} req/s, "
+              f"{args.duration:.0f} s each | {len(questions)} questions")
+        rows = []
+        for rate in rates:
+            res = run_open_loop(args.url, questions, rate, args.duration, args.arrivals,
+                                args.timeout, args.max_outstanding, rng)
+            rows.append(res)
+            print(f"\n  rate {rate} req/s")
+            for k, v in res.items():
+                print(f"  {k:>15}: {v}")
+        print(f"\n  {'offered':>8} {'thru':>7} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'err':>7}")
+        for r in rows:
+            print(f"  {r['offered_rps']:>8} {r['throughput_rps']:>7} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+                  f"{r['p99_ms']:>9} {r['error_rate']:>7.1%}")
+        return
+
+    work = questions * max(1, args.rounds)
+    print(f"[INFO] {len(work)} requests ({len(questions)} questions x {args.rounds}) -> {args.url} "
+          f"| concurrency={args.concurrency}")
+
+    rec = Recorder()
+    local = threading.local()
+
+    def one(q: str):
+        s = getattr(local, "s", None)
+        if s is None:
+            s = local.s = requests.Session()
+        rec.send(s, args.url, q, args.timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, work))
+    wall = time.perf_counter() - start
+
+    for k, v in summarize(rec.latencies, rec.errors, wall).items():
+        print(f"  {k:>15}: {v}")
+
+
+if __name__ == "__main__":
+    main()
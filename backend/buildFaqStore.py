@@ -0,0 +1,207 @@
+# buildFaqStore.py
+# Offline job: mine the query log for frequent and slow questions and materialize their answers.
+#
+#   python buildFaqStore.py                                   # outputs/queryLog.csv* -> outputs/faqStore.json
+#   python buildFaqStore.py --top 300 --min_count 3 --slow_pct 90
+#
+# Rows are grouped by normalized query ("How do I buy land?" / "how do i buy land").
+# Paraphrases are not merged: an entry is served on an exact variant match, without the
+# routed-Act check the semantic cache applies, so each variant must really be the same
+# question. Paraphrases are caught by the semantic cache, which is prewarmed with these
+# answers when it is on. A group is kept if it was asked at least --min_count times or is
+# among the slowest (--slow_pct). The groups that save the most (count x mean runtime) are
+# answered through the API's own pipeline: retrieval, or the generator in proxy mode. The
+# answers are written to FAQ_STORE_PATH for the active index version, which the API
+# loads at startup (faqStore.py). The report shows what share of the logged traffic the
+# store covers and the latency that share would have saved.
+import argparse
+import glob
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+
+os.environ.setdefault("QUERY_LOG", "0")       # the job's own queries must not end up in the log it mines
+os.environ.setdefault("FAQ_STORE", "0")       # answer from the pipeline, not from the previous store
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+
+import numpy as np
+import pandas as pd
+
+from faqStore import FaqStore, normalize_query
+from benchServe import percentile
+
+
+def load_logs(pattern: str) -> pd.DataFrame:
+    """The query log plus rotated / archived copies (queryLog.csv, queryLog.csv.1, queryLog-2025-01.csv ...)."""
+    frames = []
+    for path in sorted(glob.glob(pattern)):
+        try:
+            df = pd.read_csv(path, encoding="utf-8-sig", usecols=["Query", "Runtime"])
+        except Exception as e:
+            print(f"[warn] Skipping {path}: {e}")
+            continue
+        frames.append(df)
+        print(f"[info] {path}: {len(df)} rows")
+    if not frames:
+        return pd.DataFrame(columns=["Query", "Runtime", "key"])
+    df = pd.concat(frames, ignore_index=True)
+    df["Runtime"] = pd.to_numeric(df["Runtime"], errors="coerce")
+    df["key"] = df["Query"].astype(str).map(normalize_query)
+    return df[df["key"] != ""]
+
+
+def cluster_queries(groups: pd.DataFrame) -> List[Dict[str, Any]]:
+    """One cluster per normalized query, most asked first."""
+    groups = groups.sort_values(["count", "runtime_ms"], ascending=[False, False])
+    clusters: List[Dict[str, Any]] = []
+    for key, row in groups.iterrows():
+        runtime_n = int(row["runtime_n"])
+        clusters.append({
+            "key": key,
+            "query": row["query"],
+            "variants": [key],
+            "count": int(row["count"]),
+            "runtime_ms": round(float(row["runtime_sum"]) / runtime_n, 2) if runtime_n else None,
+        })
+    return clusters
+
+
+def select_clusters(clusters: List[Dict[str, Any]], top: int, min_count: int, slow_ms: float) -> List[Dict[str, Any]]:
+    keep = [c for c in clusters if c["count"] >= min_count or (c["runtime_ms"] or 0) >= slow_ms]
+    keep.sort(key=lambda c: -(c["count"] * (c["runtime_ms"] or 0) or c["count"]))
+    return keep[:top]
+
+
+def materialize(uhaki, c: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """(entry, "") or (None, reason): the cluster's answer from the API pipeline, no deadline."""
+    req_id = f"faq-{uuid.uuid4().hex[:6]}"
+    params, err = uhaki.parse_ask_payload({"query": c["query"], "deadline_ms": 0})
+    if err:
+        return None, err
+    t0 = time.perf_counter()
+    if uhaki.GENERATOR_URL:
+        try:
+            generator_payload = uhaki.call_generator_api(
+                params["query"], params["act"], params["top_k_retrieve"],
+                params["top_k_return"], params["include_context"]
+            )
+        except Exception as e:
+            return None, f"generator: {e}"
+        body, status = uhaki.proxy_response(req_id, params, generator_payload, t0), 200
+        if not body.get("answer"):
+            return None, "no answer"
+    else:
+        body, status = uhaki.retrieval_response(req_id, params, t0)
+    if status != 200 or body.get("degradations"):
+        return None, body.get("error") or "degraded"
+    payload = {k: v for k, v in body.items() if k not in ("request_id", "query", "timings", "cache")}
+    return {
+        "key": c["key"],
+        "query": c["query"],
+        "variants": c["variants"],
+        "count": c["count"],
+        "runtime_ms": c["runtime_ms"],
+        "scope": uhaki.cache_scope(params),
+        "corpus_version": params["index"].corpus_version,
+        "materialized_ms": round((time.perf_counter() - t0) * 1000, 2),
+        "payload": payload,
+    }, ""
+
+
+def coverage_report(df: pd.DataFrame, store: FaqStore) -> Dict[str, Any]:
+    """Share of the logged requests the store answers, and the runtime those requests took."""
+    covered = df["key"].isin({v for e in store.entries for v in e["variants"]})
+    t0 = time.perf_counter()
+    for q in df["Query"].astype(str).head(1000):
+        store.lookup(q, "", "")
+    lookup_ms = (time.perf_counter() - t0) * 1000 / max(1, min(len(df), 1000))
+    runtimes = df.loc[covered, "Runtime"].dropna()
+    saved_ms = float((runtimes - lookup_ms).clip(lower=0).sum())
+    all_runtimes = df["Runtime"].dropna()
+    return {
+        "log_rows": int(len(df)),
+        "distinct_queries": int(df["key"].nunique()),
+        "entries": len(store),
+        "covered_rows": int(covered.sum()),
+        "coverage": round(float(covered.mean()), 4) if len(df) else 0.0,
+        "runtime_ms_total": round(float(all_runtimes.sum()), 1),
+        "runtime_ms_saved": round(saved_ms, 1),
+        "runtime_saved_share": round(saved_ms / float(all_runtimes.sum()), 4) if all_runtimes.sum() else 0.0,
+        "saved_ms_per_request": round(saved_ms / len(df), 1) if len(df) else 0.0,
+        "lookup_ms": round(lookup_ms, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize answers for frequent / slow logged queries.")
+    parser.add_argument("--logs", type=str, default=None, help="Glob of query logs (default: CSV_LOG*)")
+    parser.add_argument("--out", type=str, default=None, help="Store path (default: FAQ_STORE_PATH)")
+    parser.add_argument("--top", type=int, default=200, help="Most clusters to materialize")
+    parser.add_argument("--min_count", type=int, default=2, help="Asked at least this often")
+    parser.add_argument("--slow_pct", type=float, default=90, help="... or slower than this runtime percentile")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent pipeline calls (the generator batches them)")
+    args = parser.parse_args()
+
+    import app as uhaki
+    pattern = args.logs or uhaki.CSV_LOG + "*"
+    out = args.out or uhaki.FAQ_STORE_PATH
+    ix = uhaki.active_index
+
+    df = load_logs(pattern)
+    if df.empty:
+        print(f"[ERROR] No query log rows matched {pattern}")
+        sys.exit(1)
+    groups = df.groupby("key").agg(
+        query=("Query", lambda s: s.astype(str).str.strip().value_counts().index[0]),
+        count=("Query", "size"),
+        runtime_sum=("Runtime", "sum"),
+        runtime_n=("Runtime", "count"),
+    )
+    groups["runtime_ms"] = groups["runtime_sum"] / groups["runtime_n"].replace(0, np.nan)
+    slow_ms = percentile(df["Runtime"].dropna().tolist(), args.slow_pct) if df["Runtime"].notna().any() else float("inf")
+
+    t0 = time.perf_counter()
+    clusters = cluster_queries(groups)
+    chosen = select_clusters(clusters, args.top, args.min_count, slow_ms)
+    print(f"[info] {len(df)} rows, {len(groups)} distinct queries; {len(chosen)} to materialize "
+          f"(count >= {args.min_count} or runtime >= {slow_ms:.0f} ms) [{(time.perf_counter() - t0) * 1000:.0f} ms]")
+
+    t0 = time.perf_counter()
+    entries, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for c, (entry, reason) in zip(chosen, pool.map(lambda c: materialize(uhaki, c), chosen)):
+            if entry is None:
+                failed.append((c["query"], reason))
+            else:
+                entries.append(entry)
+    print(f"[info] Materialized {len(entries)} answers in {time.perf_counter() - t0:.1f} s "
+          f"({uhaki.BACKEND_MODE}, index {ix.name}@{ix.corpus_version})")
+    for q, reason in failed:
+        print(f"[warn] Not materialized: {q!r} ({reason})")
+
+    store = FaqStore(entries, {
+        "built_at": round(time.time(), 3),
+        "backend": uhaki.BACKEND_MODE,
+        "index": ix.name,
+        "corpus_version": ix.corpus_version,
+    })
+    report = coverage_report(df, store)
+    store.meta["report"] = report
+    store.save(out)
+
+    print(f"\nWrote {len(store)} entries to {out}")
+    print(f"  Coverage of logged traffic: {report['covered_rows']}/{report['log_rows']} requests "
+          f"({report['coverage']:.1%})")
+    print(f"  Runtime those requests took: {report['runtime_ms_saved'] / 1000:.1f} s of "
+          f"{report['runtime_ms_total'] / 1000:.1f} s ({report['runtime_saved_share']:.1%}), "
+          f"{report['saved_ms_per_request']:.0f} ms per logged request")
+    print(f"\n  {'count':>5}  {'runtime_ms':>10}  query")
+    for e in sorted(entries, key=lambda e: -e["count"])[:15]:
+        print(f"  {e['count']:>5}  {e['runtime_ms'] or 0:>10.0f}  {e['query'][:70]}")
+
+
+if __name__ == "__main__":
+    main()
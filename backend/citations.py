@@ -0,0 +1,201 @@
+# citations.py
+# Direct citation fast path.
+#
+# "section 21 of the Criminal Procedure Code", "Article 53 of the Constitution" or
+# "Employment Act s.44" name the provision outright, yet they used to go through the
+# e5 encode, the HNSW search and the cross-encoder like any other question. The
+# CitationIndex maps (act, section number) -> that section's chunks in chunk order.
+# It is built once per worker from the collection metadata, so these queries resolve
+# with a regex pass and a dict lookup.
+import re
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+
+CONSTITUTION = "Constitution of Kenya"
+
+# Short names people actually type -> Act name in the corpus (only used if that Act is indexed)
+ACT_ALIASES = {
+    "constitution": CONSTITUTION,
+    "cpc": "Criminal Procedure Code",
+    "vat act": "Value Added Tax Act",
+    "wiba": "Work Injury Benefits Act",
+    "wiba act": "Work Injury Benefits Act",
+}
+
+NUM = r"\d{1,3}[A-Za-z]?(?:\s*\([0-9a-zA-Z]{1,4}\))*"       # 44, 21A, 53(1)(b)
+REF_RE = re.compile(
+    rf"\b(?P<kind>sections?|secs?\.?|ss?\.|articles?|arts?\.?)\s*"
+    rf"(?P<nums>{NUM}(?:\s*(?:,|and|&|to|-)\s*{NUM})*)",
+    re.IGNORECASE,
+)
+NUM_TOKEN_RE = re.compile(r"(\d{1,3})([A-Za-z]?)(?:\s*\([0-9a-zA-Z]{1,4}\))*")
+RANGE_RE = re.compile(r"(\d{1,3})\s*(?:to|-)\s*(\d{1,3})", re.IGNORECASE)
+MAX_RANGE = 10
+
+# Words that carry no meaning beyond "show me this provision"
+FILLER = {
+    "what", "whats", "does", "do", "did", "is", "are", "the", "a", "an", "of", "under", "in", "to",
+    "say", "says", "said", "state", "states", "provide", "provides", "read", "reads", "mean", "means",
+    "about", "according", "show", "give", "me", "please", "text", "full", "quote", "explain",
+    "kenya", "kenyan", "law", "laws", "act", "and", "on", "contents", "content", "provision", "provisions",
+}
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _norm_num(num: str, suffix: str = "") -> str:
+    return f"{int(num)}{suffix.upper()}"
+
+
+def _parse_nums(raw: str) -> List[str]:
+    out: List[str] = []
+    for m in RANGE_RE.finditer(raw):
+        lo, hi = int(m.group(1)), int(m.group(2))
+        if lo < hi and hi - lo <= MAX_RANGE:
+            out.extend(str(n) for n in range(lo, hi + 1))
+    for m in NUM_TOKEN_RE.finditer(raw):
+        n = _norm_num(m.group(1), m.group(2))
+        if n not in out:
+            out.append(n)
+    return out
+
+
+class CitationIndex:
+    def __init__(self):
+        self._sections: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self.acts: List[str] = []
+        self._aliases: Dict[str, str] = {}
+        self._act_re: Optional[re.Pattern] = None
+        self.build_ms = 0.0
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.direct = 0
+        self.merged = 0
+        self.fast_ms_total = 0.0
+        self.saved_ms_total = 0.0
+        self.full_ms_ewma: Optional[float] = None
+
+    # ---------- build ----------
+    def build(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> "CitationIndex":
+        t0 = time.perf_counter()
+        sections: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for doc_id, rec in records:
+            md = rec.get("metadatas") or {}
+            act = md.get("act") or ""
+            m = NUM_TOKEN_RE.match(str(md.get("section_number") or ""))
+            if not act or not m:
+                continue
+            sections.setdefault((act, _norm_num(m.group(1), m.group(2))), []).append({
+                "id": doc_id,
+                "act": act,
+                "section": md.get("section", ""),
+                "text": rec.get("documents") or "",
+                "metadata": md,
+            })
+        for chunks in sections.values():
+            chunks.sort(key=lambda c: int(c["metadata"].get("chunk_id") or 0))
+
+        self._sections = sections
+        self.acts = sorted({a for a, _ in sections})
+        self._aliases = {a.lower(): a for a in self.acts}
+        for alias, act in ACT_ALIASES.items():
+            if act in self.acts:
+                self._aliases.setdefault(alias, act)
+        names = sorted(self._aliases, key=len, reverse=True)
+        self._act_re = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b", re.IGNORECASE) if names else None
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 2)
+        logging.info(f"[CITE] Section index: {len(sections)} sections across {len(self.acts)} Acts in {self.build_ms} ms")
+        return self
+
+    # ---------- parsing ----------
+    def _act_mentions(self, query: str) -> List[Tuple[int, int, str]]:
+        if self._act_re is None:
+            return []
+        return [(m.start(), m.end(), self._aliases[m.group(1).lower()]) for m in self._act_re.finditer(query)]
+
+    def parse(self, query: str, act_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Explicit citations in the query -> [{act, section_number, kind}], Act resolved where possible."""
+        mentions = self._act_mentions(query)
+        refs: List[Dict[str, Any]] = []
+        for m in REF_RE.finditer(query):
+            kind = "article" if m.group("kind").lower().startswith("art") else "section"
+            act = None
+            # "section 21 of the Criminal Procedure Code" -> the Act right after
+            after = [a for s, _, a in mentions if 0 <= s - m.end() <= 30]
+            # "Employment Act s.44" / "Employment Act, section 44" -> the Act right before
+            before = [a for _, e, a in mentions if 0 <= m.start() - e <= 3]
+            if after:
+                act = after[0]
+            elif before:
+                act = before[-1]
+            elif len({a for _, _, a in mentions}) == 1:
+                act = mentions[0][2]
+            elif act_filter:
+                act = act_filter
+            elif kind == "article" and CONSTITUTION in self.acts:
+                act = CONSTITUTION
+            if act is None:
+                continue
+            for num in _parse_nums(m.group("nums")):
+                ref = {"act": act, "section_number": num, "kind": kind}
+                if ref not in refs:
+                    refs.append(ref)
+        return refs
+
+    def residual(self, query: str) -> List[str]:
+        """Words left once citations, Act names and filler are removed; empty = a pure citation lookup."""
+        text = REF_RE.sub(" ", query)
+        if self._act_re is not None:
+            text = self._act_re.sub(" ", text)
+        return [w for w in WORD_RE.findall(text.lower()) if w not in FILLER and not w.isdigit()]
+
+    # ---------- lookup ----------
+    def lookup(self, query: str, act_filter: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Returns (resolved refs, their chunks in citation then chunk order)."""
+        refs = [r for r in self.parse(query, act_filter) if (r["act"], r["section_number"]) in self._sections]
+        chunks: List[Dict[str, Any]] = []
+        for r in refs:
+            chunks.extend(dict(c) for c in self._sections[(r["act"], r["section_number"])])
+        with self._lock:
+            self.lookups += 1
+            if chunks:
+                self.hits += 1
+        return refs, chunks
+
+    def record_fast(self, fast_ms: float, merged: bool = False):
+        with self._lock:
+            if merged:
+                self.merged += 1
+                return
+            self.direct += 1
+            self.fast_ms_total += fast_ms
+            if self.full_ms_ewma is not None:
+                self.saved_ms_total += max(0.0, self.full_ms_ewma - fast_ms)
+
+    def observe_full(self, total_ms: float, alpha: float = 0.1):
+        """Latency of a regular (non fast path) request, used to estimate time saved."""
+        with self._lock:
+            if self.full_ms_ewma is None:
+                self.full_ms_ewma = total_ms
+            else:
+                self.full_ms_ewma += alpha * (total_ms - self.full_ms_ewma)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sections": len(self._sections),
+                "acts": len(self.acts),
+                "build_ms": self.build_ms,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "direct": self.direct,
+                "merged": self.merged,
+                "fast_ms_mean": round(self.fast_ms_total / self.direct, 3) if self.direct else 0.0,
+                "full_ms_ewma": round(self.full_ms_ewma, 2) if self.full_ms_ewma is not None else None,
+                "saved_ms_total": round(self.saved_ms_total, 1),
+            }
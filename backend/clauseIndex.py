@@ -0,0 +1,124 @@
+# clauseIndex.py
+# Extractive answers: the clauses of the top chunks that best match the question.
+#
+# Retrieval-only mode answered with raw chunks, and proxy mode needed a multi-second
+# generation for any answer at all. data/scripts/buildClauseIndex.py cuts every chunk into
+# sentences and (1) / (a) sub-clauses (splitChunks.clause_spans). It embeds them in batches
+# with the collection's embedder and saves one compact array index:
+#   - chunk_ids + offsets: the clause rows of each chunk
+#   - spans: (start, end) of each clause in its chunk's text, so no clause text is stored
+#   - vectors: float16 unit embeddings ("passage: " prefix, like the chunks)
+#   - crc: a checksum of each chunk's text, so a chunk re-split since the build is skipped
+# After the rerank, select() gathers the clause rows of the top chunks and scores them all
+# against the query embedding with one matrix product. It returns the best spans, at most a
+# few per chunk, which app.py joins into a cited answer with highlight offsets. The index
+# records the collection, embedder and chunk count it was built from, and app.py only uses
+# it for an index version that matches.
+import json
+import threading
+import time
+import zlib
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+
+def text_crc(text: str) -> int:
+    return zlib.crc32((text or "").encode("utf-8")) & 0xFFFFFFFF
+
+
+class ClauseIndex:
+    def __init__(self, chunk_ids: List[str], offsets: np.ndarray, spans: np.ndarray, vectors: np.ndarray,
+                 crc: np.ndarray, meta: Dict[str, Any]):
+        self.chunk_ids = list(chunk_ids)
+        self.offsets = offsets      # [n_chunks + 1] int64: clause rows of chunk i = offsets[i]:offsets[i+1]
+        self.spans = spans          # [n_clauses, 2] int32
+        self.vectors = vectors      # [n_clauses, dim] float16
+        self.crc = crc              # [n_chunks] uint32
+        self.meta = meta
+        self.row_of = {cid: i for i, cid in enumerate(self.chunk_ids)}
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.answered = 0
+        self.missing = 0
+        self.stale = 0
+        self.select_ms = 0.0
+
+    @classmethod
+    def load(cls, path: str) -> "ClauseIndex":
+        with np.load(path, allow_pickle=False) as z:
+            return cls([str(x) for x in z["chunk_ids"]], z["offsets"], z["spans"], z["vectors"], z["crc"],
+                       json.loads(str(z["meta"])))
+
+    def save(self, path: str):
+        np.savez(path, chunk_ids=np.array(self.chunk_ids), offsets=self.offsets, spans=self.spans,
+                 vectors=self.vectors, crc=self.crc, meta=np.array(json.dumps(self.meta)))
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def select(self, q_emb, chunks: List[Dict[str, Any]], top_n: int = 3, per_chunk: int = 2,
+               min_score: float = 0.0) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Best clauses of these chunks for the query: [{source, start, end, score}] in reading order
+        (source = position in chunks; start/end = offsets into that chunk's text), plus timing info.
+        """
+        t0 = time.perf_counter()
+        rows: List[np.ndarray] = []
+        owner: List[int] = []
+        missing = stale = 0
+        for ci, ch in enumerate(chunks):
+            i = self.row_of.get(ch.get("id"))
+            if i is None:
+                missing += 1
+                continue
+            if int(self.crc[i]) != text_crc(ch.get("text")):
+                stale += 1   # the chunk text changed since the build: its spans would be off
+                continue
+            a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+            rows.append(np.arange(a, b))
+            owner.extend([ci] * (b - a))
+
+        picked: List[Dict[str, Any]] = []
+        if rows:
+            idx = np.concatenate(rows)
+            scores = self.vectors[idx].astype(np.float32) @ np.asarray(q_emb, dtype=np.float32)
+            taken: Dict[int, int] = {}
+            seen = set()   # neighbouring chunks overlap, so the same clause can come from two of them
+            for j in np.argsort(-scores, kind="stable"):
+                if len(picked) >= top_n or scores[j] < min_score:
+                    break
+                ci = owner[j]
+                start, end = self.spans[idx[j]]
+                key = " ".join(chunks[ci]["text"][start:end].split())
+                if taken.get(ci, 0) >= per_chunk or key in seen:
+                    continue
+                taken[ci] = taken.get(ci, 0) + 1
+                seen.add(key)
+                picked.append({"source": ci, "start": int(start), "end": int(end), "score": round(float(scores[j]), 4)})
+            picked.sort(key=lambda p: (p["source"], p["start"]))
+        ms = round((time.perf_counter() - t0) * 1000, 3)
+        with self._lock:
+            self.lookups += 1
+            self.answered += bool(picked)
+            self.missing += missing
+            self.stale += stale
+            self.select_ms += ms
+        return picked, {"select_ms": ms, "clauses_scored": len(owner)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.lookups
+            return {
+                "chunks": len(self.chunk_ids),
+                "clauses": len(self.spans),
+                "mb": round((self.vectors.nbytes + self.spans.nbytes + self.offsets.nbytes) / 2 ** 20, 1),
+                "model": self.meta.get("model"),
+                "built_at": self.meta.get("built_at"),
+                "lookups": n,
+                "answered_rate": round(self.answered / n, 4) if n else None,
+                "missing_chunks": self.missing,
+                "stale_chunks": self.stale,
+                "select_ms_avg": round(self.select_ms / n, 3) if n else 0.0,
+            }
@@ -0,0 +1,310 @@
+# compressedIndex.py
+# Compressed first-pass vector scan with exact float re-scoring.
+#
+# data/scripts/buildCompressedIndex.py pulls every embedding out of Chroma and fits
+#   - a PCA projection (768 -> dim) on the corpus, and/or
+#   - a product quantizer: the (projected) vector is cut into m sub-vectors and each one is
+#     replaced by the id of its nearest of 256 k-means centroids, so a vector costs m bytes, or
+#   - sign bits only (--binary): 768 dims -> 96 bytes, searched by Hamming distance (popcount).
+# A query scores all codes with one lookup table per sub-space (asymmetric distance),
+# keeps the best `rescore` candidates and re-scores those against the full float32
+# vectors, which stay on disk in a memory-mapped .npy and are only paged in per candidate.
+#
+# CompressedCollection mimics Chroma's query / get / count like ShardedCollection does,
+# so app.py can switch with VECTOR_INDEX=compressed and nothing downstream changes.
+import os
+import json
+import time
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from shards import _acts_in_where
+
+PQ_CENTROIDS = 256   # one uint8 per sub-vector
+BINARY_RESCORE = 300  # sign bits lose more than PQ; re-score a longer list
+POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):   # numpy >= 2.0
+        return np.bitwise_count(x)
+    return POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (x.itemsize,)).sum(axis=-1, dtype=np.uint8)
+
+
+# ============================
+# Training (used by data/scripts/buildCompressedIndex.py)
+# ============================
+def fit_pca(X: np.ndarray, dim: int) -> Tuple[np.ndarray, np.ndarray, float]:
+    """(mean [d], components [dim, d], explained variance ratio) from the covariance eigenvectors."""
+    mean = X.mean(axis=0)
+    Xc = X - mean
+    cov = (Xc.T @ Xc) / max(1, len(X) - 1)
+    vals, vecs = np.linalg.eigh(cov)
+    order = np.argsort(vals)[::-1]
+    vals, vecs = vals[order], vecs[:, order]
+    explained = float(vals[:dim].sum() / max(vals.sum(), 1e-12))
+    return mean.astype(np.float32), vecs[:, :dim].T.astype(np.float32), explained
+
+
+def kmeans(X: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means (k-means++ init). Empty clusters are re-seeded from the worst-fit points."""
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    k = min(k, n)
+    centers = np.empty((k, X.shape[1]), dtype=np.float32)
+    centers[0] = X[rng.integers(n)]
+    d2 = ((X - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        p = d2 / d2.sum() if d2.sum() > 0 else None
+        centers[i] = X[rng.choice(n, p=p)]
+        d2 = np.minimum(d2, ((X - centers[i]) ** 2).sum(axis=1))
+
+    x2 = (X ** 2).sum(axis=1, keepdims=True)
+    for _ in range(iters):
+        dist = x2 - 2 * X @ centers.T + (centers ** 2).sum(axis=1)
+        assign = dist.argmin(axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, assign, X)
+        nonempty = counts > 0
+        centers[nonempty] = sums[nonempty] / counts[nonempty, None]
+        if not nonempty.all():
+            worst = np.argsort(-dist[np.arange(n), assign])[: int((~nonempty).sum())]
+            centers[~nonempty] = X[worst]
+    return centers
+
+
+def fit_pq(X: np.ndarray, m: int, iters: int = 20, sample: int = 20000, seed: int = 0) -> np.ndarray:
+    """Codebooks [m, 256, d/m]. d must be divisible by m."""
+    d = X.shape[1]
+    if d % m:
+        raise ValueError(f"PQ needs dim divisible by m (dim={d}, m={m})")
+    sub = d // m
+    rng = np.random.default_rng(seed)
+    train = X[rng.choice(len(X), size=min(sample, len(X)), replace=False)]
+    books = np.zeros((m, PQ_CENTROIDS, sub), dtype=np.float32)
+    for j in range(m):
+        c = kmeans(train[:, j * sub:(j + 1) * sub], PQ_CENTROIDS, iters=iters, seed=seed + j)
+        books[j, :len(c)] = c
+        books[j, len(c):] = c[0]   # tiny corpora: pad unused code slots
+    return books
+
+
+def pq_encode(X: np.ndarray, books: np.ndarray, batch: int = 4096) -> np.ndarray:
+    m, _, sub = books.shape
+    codes = np.empty((len(X), m), dtype=np.uint8)
+    b2 = (books ** 2).sum(axis=2)   # [m, 256]
+    for s in range(0, len(X), batch):
+        blk = X[s:s + batch]
+        for j in range(m):
+            part = blk[:, j * sub:(j + 1) * sub]
+            codes[s:s + batch, j] = (b2[j] - 2 * part @ books[j].T).argmin(axis=1)
+    return codes
+
+
+def binarize(X: np.ndarray, mean: Optional[np.ndarray] = None) -> np.ndarray:
+    """Sign bits of (X - mean), packed 8 per byte: [n, d/8] uint8. Centering first splits
+    every dimension about evenly; raw e5 vectors share a large common component."""
+    Z = X if mean is None else X - mean
+    return np.packbits(np.atleast_2d(Z) > 0, axis=1)
+
+
+# ============================
+# Search
+# ============================
+class CompressedIndex:
+    def __init__(self, ids: List[str], acts: np.ndarray, act_names: List[str],
+                 vectors: np.ndarray, mean: Optional[np.ndarray] = None,
+                 components: Optional[np.ndarray] = None, books: Optional[np.ndarray] = None,
+                 codes: Optional[np.ndarray] = None, reduced: Optional[np.ndarray] = None,
+                 bits: Optional[np.ndarray] = None, info: Optional[Dict[str, Any]] = None,
+                 rescore: Optional[int] = None):
+        self.ids = list(ids)
+        self.acts = np.asarray(acts, dtype=np.int32)        # Act id per row
+        self.act_names = list(act_names)
+        self.act_idx = {a: i for i, a in enumerate(self.act_names)}
+        self.vectors = vectors                              # [n, d] float32, usually a memmap
+        self.mean = mean
+        self.components = components                        # [dim, d] or None
+        self.books = books                                  # [m, 256, dim/m] or None
+        # PQ codes [n, m] are kept transposed, one contiguous column per sub-space,
+        # so the scan is m table.take() calls
+        self.codes_t = None if codes is None else np.ascontiguousarray(np.asarray(codes).T)
+        self.reduced = reduced                              # [n, dim] float16 when there is no PQ
+        # Sign bits [n, d/8] likewise kept as one contiguous uint64 column per 64 dims
+        self.bits_t = None
+        if bits is not None:
+            bits = np.asarray(bits, dtype=np.uint8)
+            self.n_bits = bits.shape[1] * 8
+            self.bits_t = np.ascontiguousarray(bits.view(np.uint64).T if bits.shape[1] % 8 == 0 else bits.T)
+        self.info = dict(info or {})
+        if rescore is None:
+            rescore = self.info.get("rescore") or (BINARY_RESCORE if bits is not None else 100)
+        self.rescore = max(1, int(rescore))
+        if self.codes_t is None and self.reduced is None and self.bits_t is None:
+            raise ValueError("Compressed index has no PQ codes, reduced vectors or sign bits")
+
+    @classmethod
+    def load(cls, path: str, rescore: Optional[int] = None) -> "CompressedIndex":
+        data = np.load(path, allow_pickle=False)
+        info = json.loads(str(data["info"])) if "info" in data.files else {}
+        vectors_path = path[:-len(".npz")] + "_vectors.npy" if path.endswith(".npz") else path + "_vectors.npy"
+        if not os.path.exists(vectors_path):
+            vectors_path = info.get("vectors_path", vectors_path)
+        vectors = np.load(vectors_path, mmap_mode="r")
+        opt = lambda k: data[k] if k in data.files else None  # noqa: E731
+        index = cls([str(i) for i in data["ids"]], data["acts"], [str(a) for a in data["act_names"]],
+                    vectors, opt("mean"), opt("components"), opt("books"), opt("codes"), opt("reduced"),
+                    opt("bits"), info, rescore)
+        logging.info(f"[PQ] {index.describe()} loaded from {path}")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def describe(self) -> str:
+        dim = self.components.shape[0] if self.components is not None else self.vectors.shape[1]
+        if self.bits_t is not None:
+            kind = "binary"
+        else:
+            kind = f"pq m={self.codes_t.shape[0]}" if self.codes_t is not None else "float16"
+        return (f"{len(self)} vectors, {self.vectors.shape[1]}->{dim} dims, {kind}, "
+                f"{self.bytes_per_vector()} B/vector in RAM, rescore={self.rescore}")
+
+    def bytes_per_vector(self) -> int:
+        if self.bits_t is not None:
+            return self.n_bits // 8
+        if self.codes_t is not None:
+            return int(self.codes_t.shape[0])
+        return int(self.reduced.shape[1] * self.reduced.itemsize)
+
+    def encode(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Compress new float vectors with this index's fitted PCA / codebooks / mean."""
+        if self.bits_t is not None:
+            return {"bits": binarize(X, self.mean)}
+        Z = X if self.components is None else (X - self.mean) @ self.components.T
+        if self.codes_t is not None:
+            return {"codes": pq_encode(Z, self.books)}
+        return {"reduced": Z.astype(np.float16)}
+
+    def project(self, q: np.ndarray) -> np.ndarray:
+        # Rows are stored as P(x - mean). Scoring them against P q gives about x.q - mean.q,
+        # and mean.q is the same for every row, so the query is not centered.
+        if self.components is None:
+            return q
+        return self.components @ q
+
+    def approx_scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate inner products from the codes (or the float16 reduced vectors).
+        For sign bits it is n_bits - 2 * Hamming distance, which grows with the cosine."""
+        if self.bits_t is not None:
+            qb = binarize(q, self.mean)[0]
+            qb = qb.view(self.bits_t.dtype)
+            ham = np.zeros(len(self) if rows is None else len(rows), dtype=np.int32)
+            for j in range(len(qb)):
+                col = self.bits_t[j] if rows is None else self.bits_t[j][rows]
+                ham += _popcount(col ^ qb[j])
+            return (self.n_bits - 2 * ham).astype(np.float32)
+        qp = self.project(q)
+        if self.codes_t is not None:
+            m, _, sub = self.books.shape
+            table = np.einsum("jcs,js->jc", self.books, qp.reshape(m, sub))   # [m, 256]
+            scores = np.zeros(len(self) if rows is None else len(rows), dtype=np.float32)
+            for j in range(m):
+                col = self.codes_t[j] if rows is None else self.codes_t[j][rows]
+                scores += table[j].take(col)
+            return scores
+        reduced = self.reduced if rows is None else self.reduced[rows]
+        return reduced.astype(np.float32) @ qp
+
+    def rows_for(self, acts: Optional[List[str]]) -> Optional[np.ndarray]:
+        if not acts:
+            return None
+        wanted = [self.act_idx[a] for a in acts if a in self.act_idx]
+        return np.flatnonzero(np.isin(self.acts, wanted))
+
+    def search(self, q_emb, top_k: int, acts: Optional[List[str]] = None,
+               rescore: Optional[int] = None) -> Tuple[List[int], List[float], Dict[str, float]]:
+        """
+        (row indices, cosine similarities, timings). The first pass picks `rescore`
+        candidates from the codes. Exact float32 dot products then order them.
+        rescore=0 returns the approximate order (for measuring what re-scoring buys).
+        """
+        q = np.asarray(q_emb, dtype=np.float32)
+        rows = self.rows_for(acts)
+        if rows is not None and not len(rows):
+            return [], [], {"scan_ms": 0.0, "rescore_ms": 0.0}
+        t0 = time.perf_counter()
+        approx = self.approx_scores(q, rows)
+        n_cand = self.rescore if rescore is None else rescore
+        keep = min(len(approx), max(top_k, n_cand))
+        cand = np.argpartition(-approx, keep - 1)[:keep] if keep < len(approx) else np.arange(len(approx))
+        t1 = time.perf_counter()
+        cand_rows = cand if rows is None else rows[cand]
+        if n_cand == 0:
+            scores = approx[cand]
+        else:
+            order = np.argsort(cand_rows)   # sequential reads from the memmap
+            cand_rows = cand_rows[order]
+            scores = np.asarray(self.vectors[cand_rows], dtype=np.float32) @ q
+        best = np.argsort(-scores)[:top_k]
+        t2 = time.perf_counter()
+        timings = {"scan_ms": round((t1 - t0) * 1000, 3), "rescore_ms": round((t2 - t1) * 1000, 3)}
+        return [int(cand_rows[i]) for i in best], [float(scores[i]) for i in best], timings
+
+    def exact(self, q_emb, top_k: int, acts: Optional[List[str]] = None) -> Tuple[List[int], List[float]]:
+        """Full-precision brute force over the float32 vectors: the recall baseline."""
+        q = np.asarray(q_emb, dtype=np.float32)
+        rows = self.rows_for(acts)
+        vecs = self.vectors if rows is None else self.vectors[rows]
+        scores = np.asarray(vecs, dtype=np.float32) @ q
+        best = np.argsort(-scores)[:top_k]
+        idx = best if rows is None else rows[best]
+        return [int(i) for i in idx], [float(scores[i]) for i in best]
+
+
+class CompressedCollection:
+    """Chroma-shaped wrapper: vector search from the CompressedIndex, documents and
+    metadata from the wrapped collection by id."""
+
+    space = "cosine"   # distances are 1 - the re-scored dot product
+
+    def __init__(self, base, index: CompressedIndex):
+        self.base = base
+        self.index = index
+        self.name = getattr(base, "name", "")
+        self.metadata = getattr(base, "metadata", None) or {}
+
+    def count(self) -> int:
+        return self.base.count()
+
+    def get(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.base.get(*args, **kwargs)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Result has Chroma's shape plus "pq_ms" = {scan_ms, rescore_ms, fetch_ms}."""
+        include = list(include or ["documents", "metadatas", "distances"])
+        acts = _acts_in_where(where)
+        fields = [k for k in ("documents", "metadatas", "embeddings") if k in include]
+        out: Dict[str, Any] = {"ids": [], "distances": []}
+        for k in fields:
+            out[k] = []
+        for q in query_embeddings:
+            rows, sims, timings = self.index.search(q, n_results, acts)
+            ids = [self.index.ids[r] for r in rows]
+            t0 = time.perf_counter()
+            found: Dict[str, Dict[str, Any]] = {}
+            if ids and fields:
+                res = self.base.get(ids=ids, include=fields)
+                for j, doc_id in enumerate(res.get("ids") or []):
+                    found[doc_id] = {k: res[k][j] for k in fields if res.get(k) is not None and j < len(res[k])}
+            timings["fetch_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+            out["ids"].append(ids)
+            out["distances"].append([1.0 - s for s in sims])
+            for k in fields:
+                out[k].append([found.get(i, {}).get(k) for i in ids])
+            out["pq_ms"] = timings
+        return out
@@ -0,0 +1,237 @@
+# contextPacker.py
+# Packs retrieved chunks into the generator prompt under a token budget.
+#
+# build_context() used to paste every top chunk verbatim. splitChunks.py windows long
+# sections with an 80-token overlap, so two hits from the same section repeat up to
+# 80 tokens, and every repeated token is paid for again in prefill. Here:
+#   - chunks of the same (act, section) are merged in chunk order, overlap removed
+#   - passages are grouped by Act (most relevant Act first), then by section number
+#   - the most relevant passages are kept until the budget is spent; the first one
+#     that does not fit is truncated instead of dropped
+#   - each call reports raw vs packed prompt tokens
+#
+# Tokens are counted with the generator tokenizer when one is given (CONTEXT_TOKENIZER
+# in app.py, the batcher's tokenizer in generatorService.py), whitespace tokens otherwise.
+import re
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+MAX_OVERLAP_WORDS   = 120   # > OVERLAP_TOKENS in splitChunks.py
+MIN_TRUNCATE_TOKENS = 48    # below this a truncated passage is not worth its header
+ELLIPSIS            = " …"
+
+SECTION_NUM_RE = re.compile(r"^\s*(\d+)\s*([A-Za-z]*)")
+
+
+class TokenCounter:
+    def __init__(self, tokenizer=None, name: Optional[str] = None):
+        self.tokenizer = tokenizer
+        self.name = name or getattr(tokenizer, "name_or_path", None) or ("custom" if tokenizer else "whitespace")
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return len(text.split())
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def load_token_counter(name: str) -> TokenCounter:
+    """HF tokenizer by name (e.g. Qwen/Qwen3-8B); falls back to whitespace tokens."""
+    if not name:
+        return TokenCounter()
+    try:
+        from transformers import AutoTokenizer
+        return TokenCounter(AutoTokenizer.from_pretrained(name), name=name)
+    except Exception:
+        import logging
+        logging.exception(f"[PACK] Could not load tokenizer {name!r}; counting whitespace tokens")
+        return TokenCounter()
+
+
+def _meta(c: Dict[str, Any], key: str):
+    if c.get(key) is not None:
+        return c[key]
+    return (c.get("metadata") or {}).get(key)
+
+
+def _section_key(section_number: str, section: str) -> Tuple[int, int, str]:
+    """Preamble first, then numeric order (21 < 21A < 22), then anything unnumbered."""
+    raw = str(section_number or section or "")
+    if raw.lower().startswith("preamble"):
+        return (0, -1, "")
+    m = SECTION_NUM_RE.match(raw)
+    if m:
+        return (1, int(m.group(1)), m.group(2).upper())
+    return (2, 0, raw.lower())
+
+
+def _overlap(a: List[str], b: List[str], max_words: int) -> int:
+    """Length of the longest suffix of a that is also a prefix of b."""
+    lim = min(len(a), len(b), max_words)
+    if lim == 0:
+        return 0
+    first = b[0]
+    for i in range(len(a) - lim, len(a)):
+        if a[i] == first and a[i:] == b[:len(a) - i]:
+            return len(a) - i
+    return 0
+
+
+def render_passage(i: int, act: str, section: str, text: str) -> str:
+    return f"[{i}] {act} - {section}\n{text.strip()}"
+
+
+def passages_from_bundle(bundle: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Notebook retrieval bundle (Top6_*) -> chunk dicts in relevance order."""
+    out = []
+    for doc_id, sec, act, doc in zip(bundle.get("Top6_IDs") or [None] * len(bundle["Top6_Answers"]),
+                                     bundle["Top6_Sections_fmt"], bundle["Top6_Acts"], bundle["Top6_Answers"]):
+        out.append({"id": doc_id, "act": act, "section": sec,
+                    "section_number": str(sec).split(" - ")[0], "text": doc or ""})
+    return out
+
+
+class ContextPacker:
+    def __init__(self, counter: Optional[TokenCounter] = None, token_budget: int = 0,
+                 max_overlap_words: int = MAX_OVERLAP_WORDS):
+        self.counter = counter or TokenCounter()
+        self.token_budget = max(0, int(token_budget))   # 0 = no budget, still dedups and orders
+        self.max_overlap_words = max_overlap_words
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_raw = 0
+        self.tokens_packed = 0
+        self.truncated = 0
+        self.dropped = 0
+
+    # ---------- internals ----------
+    def _truncate(self, p: Dict[str, Any], budget: int) -> Optional[str]:
+        """Longest word prefix of the passage whose rendered block fits the budget."""
+        words = p["words"]
+        lo, hi, best = 1, len(words), None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            text = " ".join(words[:mid]) + ELLIPSIS
+            if self.counter(render_passage(0, p["act"], p["section"], text)) <= budget:
+                best, lo = text, mid + 1
+            else:
+                hi = mid - 1
+        return best
+
+    # ---------- public API ----------
+    def merge_sections(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """One passage per (act, section); chunks joined in chunk order with the overlap cut."""
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for rank, c in enumerate(chunks):
+            act = c.get("act") or ""
+            section = c.get("section") or ""
+            g = groups.setdefault((act, section), {
+                "act": act,
+                "section": section,
+                "section_number": _meta(c, "section_number") or "",
+                "rank": rank,
+                "parts": [],
+            })
+            try:
+                pos = int(_meta(c, "chunk_id"))
+            except (TypeError, ValueError):
+                pos = None
+            g["parts"].append((pos if pos is not None else 10**9 + rank, pos is not None,
+                               (c.get("text") or "").split(), rank))
+
+        removed = 0
+        passages = []
+        for g in groups.values():
+            g["parts"].sort(key=lambda t: t[0])
+            words: List[str] = []
+            prev_pos = None
+            for pos, known, part, _ in g["parts"]:
+                if not words:
+                    words = list(part)
+                else:
+                    k = _overlap(words, part, self.max_overlap_words)
+                    removed += k
+                    if k == 0 and not (known and prev_pos is not None and pos == prev_pos + 1):
+                        words.append(ELLIPSIS.strip())   # gap between non-adjacent chunks
+                    words.extend(part[k:])
+                prev_pos = pos if known else None
+            passages.append({"act": g["act"], "section": g["section"], "section_number": g["section_number"],
+                             "rank": g["rank"], "words": words, "text": " ".join(words),
+                             "members": [t[3] for t in g["parts"]]})
+        return passages, removed
+
+    def pack(self, chunks: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """chunks in relevance order -> (context, stats)."""
+        raw = "\n\n".join(render_passage(i, c.get("act", ""), c.get("section", ""), c.get("text") or "")
+                          for i, c in enumerate(chunks, start=1))
+        tokens_raw = self.counter(raw)
+
+        passages, overlap_words = self.merge_sections(chunks)
+        kept: List[Dict[str, Any]] = []
+        truncated = dropped = 0
+        used = 0
+        for p in sorted(passages, key=lambda p: p["rank"]):
+            cost = self.counter(render_passage(0, p["act"], p["section"], p["text"]))
+            if not self.token_budget or used + cost <= self.token_budget:
+                kept.append(p)
+                used += cost
+                continue
+            left = self.token_budget - used
+            # never send an empty context: the best passage is cut down to whatever budget there is
+            text = self._truncate(p, left) if (not truncated and (left >= MIN_TRUNCATE_TOKENS or not kept)) else None
+            if text is None:
+                dropped += 1
+                continue
+            p["text"] = text
+            p["truncated"] = True
+            kept.append(p)
+            used += self.counter(render_passage(0, p["act"], p["section"], text))
+            truncated += 1
+
+        act_rank: Dict[str, int] = {}
+        for p in kept:
+            act_rank[p["act"]] = min(act_rank.get(p["act"], p["rank"]), p["rank"])
+        kept.sort(key=lambda p: (act_rank[p["act"]], p["act"], _section_key(p["section_number"], p["section"])))
+
+        context = "\n\n".join(render_passage(i, p["act"], p["section"], p["text"])
+                              for i, p in enumerate(kept, start=1))
+        tokens_packed = self.counter(context)
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_raw += tokens_raw
+            self.tokens_packed += tokens_packed
+            self.truncated += truncated
+            self.dropped += dropped
+
+        return context, {
+            "tokenizer": self.counter.name,
+            "token_budget": self.token_budget,
+            "chunks": len(chunks),
+            "passages": len(kept),
+            "overlap_words_removed": overlap_words,
+            "truncated": truncated,
+            "dropped": dropped,
+            "prompt_tokens_raw": tokens_raw,
+            "prompt_tokens_packed": tokens_packed,
+            "prompt_tokens_saved": max(0, tokens_raw - tokens_packed),
+            # chunk positions behind each passage, in context order (responseShaper's context refs)
+            "layout": [{"results": p["members"], "truncated": p.get("truncated", False)} for p in kept],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = max(0, self.tokens_raw - self.tokens_packed)
+            return {
+                "tokenizer": self.counter.name,
+                "token_budget": self.token_budget,
+                "requests": self.requests,
+                "prompt_tokens_raw": self.tokens_raw,
+                "prompt_tokens_packed": self.tokens_packed,
+                "prompt_tokens_saved": saved,
+                "saved_per_request": round(saved / self.requests, 1) if self.requests else 0.0,
+                "truncated": self.truncated,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,117 @@
+# deadline.py
+# Per-request latency budgets for /askQuery.
+#
+# Without one, every request runs the full pipeline: dense search, cross-encoder over all
+# top_k_retrieve chunks, context packing and, in proxy mode, a generator call that may
+# take GENERATOR_TIMEOUT_S. Under a load spike that makes every request slow. A Deadline
+# (DEADLINE_MS, or the request's deadline_ms) is checked before each stage and the stage
+# does less instead of running past it: fewer Chroma results, a shorter or skipped rerank,
+# no context block, retrieval-only results when the generator can't answer in time. Each
+# step is recorded and returned as "degradations". StageCosts keeps a moving average of
+# what the stages cost on this worker; that is what the remaining budget is compared with.
+# A stage skipped on its estimate is not observed, so a skipped stage gets a real run (a
+# probe) at most once per probe_s; otherwise one slow sample could switch it off for good.
+import time
+import threading
+from typing import List, Dict, Any, Optional
+
+
+class Deadline:
+    def __init__(self, budget_ms: float, t0: Optional[float] = None):
+        self.budget_ms = float(budget_ms or 0)
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.degradations: List[str] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_ms > 0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000
+
+    def remaining_ms(self) -> float:
+        """Budget left; infinite when there is no deadline."""
+        if not self.enabled:
+            return float("inf")
+        return self.budget_ms - self.elapsed_ms()
+
+    def allows(self, cost_ms: Optional[float]) -> bool:
+        """True if a stage expected to take cost_ms (None = no estimate yet) still fits."""
+        remaining = self.remaining_ms()
+        if remaining <= 0:
+            return False
+        return cost_ms is None or cost_ms <= remaining
+
+    def degrade(self, what: str):
+        self.degradations.append(what)
+
+
+class StageCosts:
+    """Moving average cost per stage: ms per request for "search" and "generator", ms per chunk for "rerank"."""
+
+    def __init__(self, alpha: float = 0.2, probe_s: float = 30.0):
+        self.alpha = alpha
+        self.probe_s = float(probe_s)
+        self._ms: Dict[str, float] = {}
+        self._seen: Dict[str, float] = {}   # stage -> last observation or probe (monotonic s)
+        self._probing = set()                # stages whose next observation replaces the average
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.degraded = 0
+        self.by_kind: Dict[str, int] = {}
+        self.probes: Dict[str, int] = {}
+
+    def observe(self, stage: str, ms: float, units: int = 1):
+        if units <= 0:
+            return
+        per_unit = ms / units
+        with self._lock:
+            prev = self._ms.get(stage)
+            if prev is None or stage in self._probing:
+                self._ms[stage] = per_unit
+                self._probing.discard(stage)
+            else:
+                self._ms[stage] = prev + self.alpha * (per_unit - prev)
+            self._seen[stage] = time.monotonic()
+
+    def probe(self, stage: str) -> bool:
+        """True if a stage its estimate would skip should run anyway: nothing observed for probe_s.
+        Claims the probe, so concurrent requests don't all take it; what the probe measures
+        replaces the average instead of being blended into it."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._seen.get(stage)
+            if self.probe_s <= 0 or (last is not None and now - last < self.probe_s):
+                return False
+            self._seen[stage] = now
+            self._probing.add(stage)
+            self.probes[stage] = self.probes.get(stage, 0) + 1
+            return True
+
+    def estimate(self, stage: str, units: int = 1) -> Optional[float]:
+        per_unit = self._ms.get(stage)
+        return None if per_unit is None else per_unit * units
+
+    def record(self, deadline: Deadline):
+        """Count a finished request and the kinds of degradation it needed ("rerank:12->4" -> "rerank")."""
+        if not deadline.enabled:
+            return
+        with self._lock:
+            self.requests += 1
+            if deadline.degradations:
+                self.degraded += 1
+            for d in deadline.degradations:
+                kind = d.split(":", 1)[0]
+                self.by_kind[kind] = self.by_kind.get(kind, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "degraded": self.degraded,
+                "degraded_rate": round(self.degraded / self.requests, 4) if self.requests else 0.0,
+                "by_kind": dict(self.by_kind),
+                "stage_ms": {k: round(v, 3) for k, v in self._ms.items()},
+                "probes": dict(self.probes),
+            }
@@ -0,0 +1,241 @@
+# definitions.py
+# Statutory definitions index for "what does X mean" queries.
+#
+# data/scripts/buildDefinitions.py harvests the interpretation sections of every Act
+# into term -> (Act, section, definition) entries. Here they are keyed by a normalized,
+# lightly stemmed form of the term ("Employees'" -> "employee") and put in a character
+# trie, so a definitional query resolves with an exact walk or a fuzzy walk that allows
+# one edit ("employe", "dependant" vs "dependent"), instead of dense retrieval + rerank
+# that often lands on the wrong chunk. Without an Act in the question (or the act filter),
+# it only answers an explicit "what does X mean" that a single Act defines, and not when
+# another Act is named after the term: "What is a marriage?" is not a definitional question
+# just because the Land Act happens to define "marriage", "income" should not come from the
+# Law of Succession Act alone, and "child" is defined by six Acts.
+import re
+import json
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from citations import ACT_ALIASES
+
+QUOTES_RE = re.compile(r"[\"“”‘’'`]")
+NON_WORD_RE = re.compile(r"[^a-z0-9\s-]")
+LEADING_ARTICLE_RE = re.compile(r"^(?:the|a|an)\s+")
+WS_RE = re.compile(r"\s+")
+
+# Definitional question shapes; the captured term must still resolve in the index.
+# (regex, explicit): "who is a ..." / "what is a ..." only counts once the question names an Act.
+DEFINITION_QUERY_RES = [
+    (re.compile(r"^\s*what\s+(?:does|do|is)\s+(?:the\s+)?(?:term|word|phrase|expression)?\s*(?P<term>.+?)\s+mean\b", re.I), True),
+    (re.compile(r"^\s*what\s+is\s+(?:meant\s+by|the\s+meaning\s+of|the\s+definition\s+of)\s+(?P<term>.+)", re.I), True),
+    (re.compile(r"^\s*(?:define|definition\s+of|meaning\s+of)\s+(?P<term>.+)", re.I), True),
+    (re.compile(r"^\s*(?:who|what)\s+(?:is|are)\s+(?:an?\s+|the\s+)?(?P<term>.+)", re.I), False),
+    (re.compile(r"^\s*(?:who|what)\s+counts\s+as\s+(?:an?\s+|the\s+)?(?P<term>.+)", re.I), False),
+]
+# Trailing scope the user may add: "... under the Employment Act", "... in Kenyan law?"
+TRAILING_SCOPE_RE = re.compile(
+    r"\s+(?:under|in|according\s+to|as\s+per|for\s+the\s+purposes\s+of|as\s+defined\s+in|as\s+used\s+in)\s+.*$",
+    re.I,
+)
+TRAILING_NOISE_RE = re.compile(r"[\s?.!]+$")
+SCOPE_WORDS_RE = re.compile(r"\b(?:act|acts|law|laws|kenya|kenyan|constitution|statute|code)\b", re.I)
+
+MIN_FUZZY_LEN = 5   # shorter keys only match exactly ("act" vs "art" is not a typo)
+
+
+def normalize_term(text: str) -> str:
+    s = QUOTES_RE.sub("", (text or "").lower())
+    s = NON_WORD_RE.sub(" ", s)
+    s = WS_RE.sub(" ", s).strip()
+    return LEADING_ARTICLE_RE.sub("", s)
+
+
+def stem(word: str) -> str:
+    """Plural / possessive stripping only; legal terms are too precise for a full stemmer."""
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def term_key(term: str) -> str:
+    return " ".join(stem(w) for w in normalize_term(term).split())
+
+
+def render_definition(entry: Dict[str, Any]) -> str:
+    """'"child" means an individual who ...' / '"organ" has the meaning assigned to it in ...'"""
+    return f"\"{entry['term']}\" {entry['kind']} {entry['definition']}"
+
+
+class _Node:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.entries: List[int] = []
+
+
+class TermTrie:
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    def insert(self, key: str, idx: int):
+        node = self.root
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+        if not node.entries:
+            self.size += 1
+        node.entries.append(idx)
+
+    def exact(self, key: str) -> List[int]:
+        node = self.root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return list(node.entries)
+
+    def fuzzy(self, key: str, max_edits: int = 1) -> List[Tuple[int, int]]:
+        """(entry idx, edit distance) for every key within max_edits (Levenshtein over the trie)."""
+        out: List[Tuple[int, int]] = []
+        first_row = list(range(len(key) + 1))
+
+        def walk(node: _Node, ch: str, prev_row: List[int]):
+            row = [prev_row[0] + 1]
+            for i in range(1, len(key) + 1):
+                row.append(min(row[i - 1] + 1, prev_row[i] + 1, prev_row[i - 1] + (key[i - 1] != ch)))
+            if row[-1] <= max_edits and node.entries:
+                out.extend((idx, row[-1]) for idx in node.entries)
+            if min(row) <= max_edits:
+                for c, child in node.children.items():
+                    walk(child, c, row)
+
+        for c, child in self.root.children.items():
+            walk(child, c, first_row)
+        return out
+
+
+class DefinitionsIndex:
+    def __init__(self, entries: List[Dict[str, Any]]):
+        t0 = time.perf_counter()
+        self.entries = entries
+        self.trie = TermTrie()
+        for i, e in enumerate(entries):
+            self.trie.insert(e.get("key") or term_key(e["term"]), i)
+        self.acts = sorted({e["act"] for e in entries})
+        aliases = {a.lower(): a for a in self.acts}
+        for alias, act in ACT_ALIASES.items():
+            if act in self.acts:
+                aliases.setdefault(alias, act)
+        self._aliases = aliases
+        names = sorted(aliases, key=len, reverse=True)
+        self._title_keys = {a: f" {term_key(a)} " for a in self.acts}
+        self._act_re = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b", re.I) if names else None
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.declined = 0
+        self.fast_ms_total = 0.0
+
+    @classmethod
+    def load(cls, path: str) -> "DefinitionsIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["entries"] if isinstance(data, dict) else data)
+        logging.info(f"[DEFS] {len(index.entries)} definitions, {index.trie.size} terms, "
+                     f"{len(index.acts)} Acts loaded from {path} in {index.build_ms} ms")
+        return index
+
+    # ---------- lookup ----------
+    def lookup(self, term: str, acts: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """Entries for term, restricted to acts if given. Returns (entries, "exact" | "fuzzy" | "")."""
+        key = term_key(term)
+        if not key:
+            return [], ""
+
+        def scoped(idxs: List[int]) -> List[Dict[str, Any]]:
+            found = [self.entries[i] for i in dict.fromkeys(idxs)]
+            return [e for e in found if e["act"] in acts] if acts else found
+
+        entries = scoped(self.trie.exact(key))
+        if entries:
+            return entries, "exact"
+        if len(key) >= MIN_FUZZY_LEN:
+            entries = scoped([idx for idx, _ in sorted(self.trie.fuzzy(key, 1), key=lambda t: t[1])])
+            if entries:
+                return entries, "fuzzy"
+        return [], ""
+
+    def parse_query(self, query: str) -> Tuple[List[str], List[str], bool]:
+        """(candidate terms, Acts named in the query, explicit shape) for definitional questions, else ([], acts, False)."""
+        acts = []
+        if self._act_re is not None:
+            acts = list(dict.fromkeys(self._aliases[m.group(1).lower()] for m in self._act_re.finditer(query)))
+        for rx, explicit in DEFINITION_QUERY_RES:
+            m = rx.match(query)
+            if not m:
+                continue
+            term = TRAILING_NOISE_RE.sub("", m.group("term"))
+            terms = [term]
+            # "child under the Children Act" -> "child", but "person in need of care" stays whole
+            scope = TRAILING_SCOPE_RE.search(term)
+            if scope and (acts or SCOPE_WORDS_RE.search(scope.group(0))):
+                terms.append(TRAILING_NOISE_RE.sub("", term[:scope.start()]))
+            return [t for t in dict.fromkeys(terms) if t], acts, explicit
+        return [], acts, False
+
+    def authoritative(self, term: str, act: str) -> bool:
+        """False when another Act is named after the term ("income" -> Income Tax Act, defined elsewhere)."""
+        key = f" {term_key(term)} "
+        return not any(key in title for a, title in self._title_keys.items() if a != act)
+
+    def match_query(self, query: str, act_filter: Optional[str] = None) -> Tuple[Optional[str], List[Dict[str, Any]], str]:
+        """Returns (matched term, entries, "exact" | "fuzzy" | ""). Without an Act to scope to, only an
+        explicit definitional question whose term a single Act, and no other Act's title, covers is answered."""
+        t0 = time.perf_counter()
+        terms, acts, explicit = self.parse_query(query)
+        scope = [act_filter] if act_filter else acts
+        term, entries, how = (terms[0] if terms else None), [], ""
+        for t in terms:
+            entries, how = self.lookup(t, scope or None)
+            if entries:
+                term = t
+                break
+        defining = {e["act"] for e in entries}
+        declined = bool(entries) and not scope and (
+            not explicit or len(defining) > 1 or not self.authoritative(term, next(iter(defining))))
+        if declined:
+            entries, how = [], ""
+        with self._lock:
+            self.lookups += 1
+            self.declined += declined
+            if entries:
+                self.hits += 1
+                self.fuzzy_hits += how == "fuzzy"
+                self.fast_ms_total += (time.perf_counter() - t0) * 1000
+        return term, entries, how
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "definitions": len(self.entries),
+                "terms": self.trie.size,
+                "acts": len(self.acts),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "declined": self.declined,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "lookup_ms_mean": round(self.fast_ms_total / self.hits, 3) if self.hits else 0.0,
+            }
@@ -0,0 +1,94 @@
+# docStore.py
+# In-process id -> (text, act, section) store for proxy-mode source hydration.
+#
+# The generator returns chunk ids only, and hydrate_generator_sources used to turn them
+# back into texts with collection.get(ids=...) on every request: a Chroma/SQLite round
+# trip on the latency path, right after the generator's multi-second call. The store is
+# filled once per worker from the same collection scan that builds the citation index,
+# keeps one __slots__ record per chunk with interned Act / section strings (every chunk
+# of a section shares them), and is rebuilt when the corpus version changes.
+import sys
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Tuple, Iterable
+
+
+class DocRecord:
+    __slots__ = ("text", "act", "section")
+
+    def __init__(self, text: str, act: str, section: str):
+        self.text = text
+        self.act = act
+        self.section = section
+
+
+class DocStore:
+    def __init__(self, version: str = ""):
+        self.version = version
+        self._docs: Dict[str, DocRecord] = {}
+        self.build_ms = 0.0
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def build(self, records: Iterable[Tuple[str, Dict[str, Any]]], version: str = "") -> "DocStore":
+        """records = (id, {"documents": text, "metadatas": meta}) pairs, as from shards.iter_collection."""
+        t0 = time.perf_counter()
+        docs: Dict[str, DocRecord] = {}
+        for doc_id, rec in records:
+            md = rec.get("metadatas") or {}
+            act = md.get("act") or md.get("Act") or ""
+            section = md.get("section") or md.get("section_title") or md.get("heading") or ""
+            docs[sys.intern(doc_id)] = DocRecord(rec.get("documents") or "", sys.intern(act), sys.intern(section))
+        with self._lock:
+            self._docs = docs
+            self.version = version
+            self.rebuilds += 1
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 2)
+        logging.info(f"[DOCS] {len(docs)} chunks, {len({d.act for d in docs.values()})} Acts in {self.build_ms} ms "
+                     f"(~{self.approx_bytes() / 2 ** 20:.1f} MB) version={version}")
+        return self
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def get_many(self, ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """({id: {id, text, act, section}} for the ids held here, ids that were not found)."""
+        docs = self._docs   # a rebuild swaps the dict, never mutates it
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for doc_id in ids:
+            d = docs.get(doc_id)
+            if d is None:
+                missing.append(doc_id)
+                continue
+            found[doc_id] = {"id": doc_id, "text": d.text, "act": d.act, "section": d.section}
+        with self._lock:
+            self.lookups += 1
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def approx_bytes(self) -> int:
+        docs = self._docs
+        strings = {id(s): s for d in docs.values() for s in (d.act, d.section)}
+        return (sys.getsizeof(docs)
+                + sum(sys.getsizeof(k) + sys.getsizeof(d) + sys.getsizeof(d.text) for k, d in docs.items())
+                + sum(sys.getsizeof(s) for s in strings.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.hits + self.misses
+            return {
+                "chunks": len(self._docs),
+                "version": self.version,
+                "build_ms": self.build_ms,
+                "lookups": self.lookups,
+                "hit_rate": round(self.hits / n, 4) if n else 0.0,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+            }
@@ -0,0 +1,113 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+from benchServe import percentile
+
+
+def section_hit(metas: List[Dict[str, Any]], act: str, number: str) -> bool:
+    return any((m or {}).get("act") == act and str((m or {}).get("section_number")) == number for m in metas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routed vs unscoped dense search: Act accuracy, recall@k and latency.")
+    parser.add_argument("--router", type=str, default="../data/scripts/actRouter.npz")
+    parser.add_argument("--mode", type=str, default="linear", choices=["linear", "centroid"])
+    parser.add_argument("--min_conf", type=float, default=0.5)
+    parser.add_argument("--mass", type=float, default=0.9)
+    parser.add_argument("--max_acts", type=int, default=3)
+    parser.add_argument("--chroma_path", type=str, default="../data/scripts/chroma")
+    parser.add_argument("--collection", type=str, default="actSectionsV2")
+    parser.add_argument("--layout", type=str, default="single", choices=["single", "sharded"])
+    parser.add_argument("--model", type=str, default="intfloat/e5-base-v2")
+    parser.add_argument("--top_k", type=int, nargs="+", default=[1, 5, 12])
+    parser.add_argument("--csv_path", type=str, default="../testing/uhakiTestQuestions.csv")
+    args = parser.parse_args()
+
+    try:
+        from sentence_transformers import SentenceTransformer
+        import chromadb
+    except Exception as e:
+        print("[ERROR] You need 'sentence-transformers' and 'chromadb' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    from actRouter import ActRouter, act_where, question_hash
+    router = ActRouter.load(args.router, mode=args.mode, min_conf=args.min_conf, mass=args.mass, max_acts=args.max_acts)
+    saved = np.load(args.router)
+    trained = {str(h) for h in saved["train_questions"]} if "train_questions" in saved.files else set()
+
+    df = pd.read_csv(Path(args.csv_path), encoding="utf-8-sig")
+    cols = {c.lower(): c for c in df.columns}
+    rows = []
+    for q, act, sec in zip(df[cols["question"]], df[cols["act"]], df[cols["section"]]):
+        q = str(q).strip()
+        if question_hash(q) in trained:
+            continue
+        rows.append((q, str(act).strip(), str(sec).strip().split()[-1]))
+
+    model = SentenceTransformer(args.model)
+    model.max_seq_length = 512
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    if args.layout == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, args.collection)
+    else:
+        coll = client.get_collection(name=args.collection)
+
+    k_max = max(args.top_k)
+    top1 = in_scope = routed = 0
+    hits_global = {k: 0 for k in args.top_k}
+    hits_routed = {k: 0 for k in args.top_k}
+    route_ms: List[float] = []
+    global_ms: List[float] = []
+    routed_ms: List[float] = []
+    for q, act, number in rows:
+        emb = model.encode("query: " + q, normalize_embeddings=True)
+
+        t0 = time.perf_counter()
+        acts, ranked = router.scope(emb)
+        t1 = time.perf_counter()
+        route_ms.append((t1 - t0) * 1000)
+        top1 += ranked[0][0] == act
+        if acts:
+            routed += 1
+            in_scope += act in acts
+
+        kwargs = {"query_embeddings": [emb.tolist()], "n_results": k_max, "include": ["metadatas"]}
+        t2 = time.perf_counter()
+        res_g = coll.query(**kwargs)
+        t3 = time.perf_counter()
+        res_r = coll.query(**kwargs, where=act_where(acts)) if acts else res_g
+        t4 = time.perf_counter()
+        global_ms.append((t3 - t2) * 1000)
+        routed_ms.append(((t4 - t3) if acts else (t3 - t2)) * 1000 + route_ms[-1])
+
+        metas_g = res_g["metadatas"][0]
+        metas_r = res_r["metadatas"][0]
+        for k in args.top_k:
+            hits_global[k] += section_hit(metas_g[:k], act, number)
+            hits_routed[k] += section_hit(metas_r[:k], act, number)
+
+    n = len(rows)
+    print(f"[INFO] {n} questions ({len(trained)} skipped as training data) | mode={router.mode} "
+          f"min_conf={args.min_conf} mass={args.mass} max_acts={args.max_acts} | layout={args.layout}")
+    print(f"  router top-1 Act accuracy : {top1 / n:.3f}")
+    print(f"  routed (not global)       : {routed}/{n}  | labelled Act in scope when routed: "
+          f"{(in_scope / routed if routed else 0):.3f}")
+    print(f"  router ms                 : mean={statistics.mean(route_ms):.3f} p95={percentile(route_ms, 95):.3f}")
+    print(f"  {'':<10}{'recall@k global':>18}{'recall@k routed':>18}")
+    for k in args.top_k:
+        print(f"  k={k:<8}{hits_global[k] / n:>18.3f}{hits_routed[k] / n:>18.3f}")
+    print(f"  search ms global          : mean={statistics.mean(global_ms):.2f} p95={percentile(global_ms, 95):.2f}")
+    print(f"  search ms routed (+route) : mean={statistics.mean(routed_ms):.2f} p95={percentile(routed_ms, 95):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Dict
+
+import numpy as np
+import pandas as pd
+
+from benchServe import percentile
+from compressedIndex import CompressedIndex
+
+
+def recall_table(index: CompressedIndex, Q, truth: List[List[int]], rescores: List[int], top_k: List[int]):
+    k_max = max(top_k)
+    header = "".join(f"{'recall@' + str(k):>11}" for k in top_k)
+    print(f"  {'rescore':>8}{header}{'scan ms':>10}{'rescore ms':>12}")
+    for r in rescores:
+        hits = {k: 0.0 for k in top_k}
+        scan_ms: List[float] = []
+        resc_ms: List[float] = []
+        for q, gold in zip(Q, truth):
+            rows, _, t = index.search(q, k_max, rescore=r)
+            scan_ms.append(t["scan_ms"])
+            resc_ms.append(t["rescore_ms"])
+            for k in top_k:
+                hits[k] += len(set(rows[:k]) & set(gold[:k])) / max(1, min(k, len(gold)))
+        n = len(Q)
+        cells = "".join(f"{hits[k] / n:>11.3f}" for k in top_k)
+        print(f"  {r:>8}{cells}{statistics.mean(scan_ms):>10.2f}{statistics.mean(resc_ms):>12.2f}")
+
+
+def replicate(index: CompressedIndex, factor: int, noise: float, seed: int = 0) -> CompressedIndex:
+    """Synthetic corpus `factor` times the size: each copy of the real vectors gets a little
+    Gaussian noise and is re-normalized, then compressed with the same PCA / codebooks."""
+    rng = np.random.default_rng(seed)
+    base = np.asarray(index.vectors, dtype=np.float32)
+    n, d = base.shape
+    X = np.empty((n * factor, d), dtype=np.float32)
+    X[:n] = base
+    for r in range(1, factor):
+        blk = base + rng.normal(0.0, noise, size=base.shape).astype(np.float32)
+        blk /= np.linalg.norm(blk, axis=1, keepdims=True)
+        X[r * n:(r + 1) * n] = blk
+    return CompressedIndex([str(i) for i in range(len(X))], np.tile(index.acts, factor), index.act_names, X,
+                           mean=index.mean, components=index.components, books=index.books,
+                           info=index.info, rescore=index.rescore, **index.encode(X))
+
+
+def throughput(index: CompressedIndex, Q, factor: int, noise: float, k: int):
+    t0 = time.perf_counter()
+    big = replicate(index, factor, noise) if factor > 1 else index
+    build_s = time.perf_counter() - t0
+    hot_mb = len(big) * big.bytes_per_vector() / 2 ** 20
+    full_mb = len(big) * big.vectors.shape[1] * 4 / 2 ** 20
+
+    t0 = time.perf_counter()
+    truth = [big.exact(q, k)[0] for q in Q]
+    exact_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    got = [big.search(q, k)[0] for q in Q]
+    comp_s = time.perf_counter() - t0
+    recall = statistics.mean(len(set(g) & set(t)) / k for g, t in zip(got, truth))
+    print(f"  {factor:>4}x {len(big):>9} vectors | hot index {hot_mb:>8.1f} MB vs float32 {full_mb:>8.1f} MB | "
+          f"QPS compressed {len(Q) / comp_s:>8.1f} vs float32 {len(Q) / exact_s:>8.1f} | "
+          f"recall@{k} {recall:.3f} | encode {build_s:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed vs full-precision search: memory, build time, recall@k and latency.")
+    parser.add_argument("--index", type=str, nargs="+", default=["../data/scripts/compressedIndex.npz"],
+                        help="One or more files from data/scripts/buildCompressedIndex.py")
+    parser.add_argument("--rescore", type=int, nargs="+", default=[0, 50, 100, 300],
+                        help="Candidate list sizes to re-score exactly (0 = compressed scores only)")
+    parser.add_argument("--model", type=str, default="intfloat/e5-base-v2")
+    parser.add_argument("--top_k", type=int, nargs="+", default=[1, 5, 12])
+    parser.add_argument("--csv_path", type=str, default="../testing/uhakiTestQuestions.csv")
+    parser.add_argument("--chroma_path", type=str, default="../data/scripts/chroma",
+                        help="Also measure recall against collection.query (Chroma's HNSW); '' to skip")
+    parser.add_argument("--collection", type=str, default="actSectionsV2")
+    parser.add_argument("--scale", type=int, nargs="*", default=[1, 10, 100],
+                        help="Throughput on synthetic corpora this many times the real one")
+    parser.add_argument("--noise", type=float, default=0.02, help="Per-dim noise for the synthetic copies")
+    parser.add_argument("--scale_queries", type=int, default=100)
+    args = parser.parse_args()
+
+    try:
+        from sentence_transformers import SentenceTransformer
+    except Exception as e:
+        print("[ERROR] You need 'sentence-transformers' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    df = pd.read_csv(Path(args.csv_path), encoding="utf-8-sig")
+    cols = {c.lower(): c for c in df.columns}
+    questions = [str(q).strip() for q in df[cols["question"]]]
+    model = SentenceTransformer(args.model)
+    model.max_seq_length = 512
+    Q = model.encode(["query: " + q for q in questions], normalize_embeddings=True, batch_size=64)
+    k_max = max(args.top_k)
+
+    chroma_ids: List[List[str]] = []
+    if args.chroma_path:
+        import chromadb
+        coll = chromadb.PersistentClient(path=args.chroma_path).get_collection(name=args.collection)
+        for q in Q:
+            res = coll.query(query_embeddings=[q.tolist()], n_results=k_max, include=["distances"])
+            chroma_ids.append(res["ids"][0])
+
+    for path in args.index:
+        index = CompressedIndex.load(path)
+        info = index.info
+        full_bytes = index.vectors.shape[1] * 4
+        print(f"\n[INFO] {path}: {index.describe()}")
+        print(f"  memory / vector : {index.bytes_per_vector()} B in RAM vs {full_bytes} B float32 "
+              f"({full_bytes / index.bytes_per_vector():.0f}x smaller; float32 copy stays on disk for re-scoring)")
+        if info.get("build_s"):
+            print(f"  build time      : {info['build_s']} s | PCA variance kept: {info.get('pca_explained')}")
+
+        exact_ms: List[float] = []
+        truth = []
+        for q in Q:
+            t0 = time.perf_counter()
+            rows, _ = index.exact(q, k_max)
+            exact_ms.append((time.perf_counter() - t0) * 1000)
+            truth.append(rows)
+        print(f"  exact float32 brute force ms: mean={statistics.mean(exact_ms):.2f} p95={percentile(exact_ms, 95):.2f}")
+        print("  vs exact float32 search:")
+        recall_table(index, Q, truth, args.rescore, args.top_k)
+
+        if chroma_ids:
+            row_of: Dict[str, int] = {doc_id: i for i, doc_id in enumerate(index.ids)}
+            chroma_rows = [[row_of[i] for i in ids if i in row_of] for ids in chroma_ids]
+            chroma_recall = statistics.mean(len(set(c) & set(t)) / k_max for c, t in zip(chroma_rows, truth))
+            print(f"  vs collection.query (Chroma's own recall@{k_max} against exact: {chroma_recall:.3f}):")
+            recall_table(index, Q, chroma_rows, args.rescore, args.top_k)
+
+        if args.scale:
+            print(f"  throughput on synthetic corpora ({args.scale_queries} queries, rescore={index.rescore}):")
+            for factor in args.scale:
+                throughput(index, Q[:args.scale_queries], factor, args.noise, k_max)
+
+
+if __name__ == "__main__":
+    main()
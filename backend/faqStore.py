@@ -0,0 +1,87 @@
+# faqStore.py
+# Materialized answers for the questions people actually ask, mined from the query log.
+#
+# outputs/queryLog.csv records every query with its runtime, and the same handful of
+# questions ("how can I buy land", "how do I register a business") come back again and
+# again, each paying for retrieval and, in proxy mode, a 10-70 s generation. buildFaqStore.py
+# mines the log for frequent and slow queries and stores each one's answer once, keyed by
+# its normalized text. The API loads the store at startup: an exact variant is answered
+# from it directly, and the semantic cache (when on) is prewarmed with the answers so
+# paraphrases can hit there, under its routed-Act check. Entries belong to
+# one corpus version and one request scope, and are ignored once the index changes.
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+
+def normalize_query(q: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer."""
+    return " ".join((q or "").lower().split()).rstrip("?.! ")
+
+
+class FaqStore:
+    def __init__(self, entries: Optional[List[Dict[str, Any]]] = None, meta: Optional[Dict[str, Any]] = None):
+        self.entries = entries or []
+        self.meta = meta or {}
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        for e in self.entries:
+            for v in e.get("variants") or [e["key"]]:
+                self._by_key.setdefault(v, e)
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self.saved_ms = 0.0
+
+    @classmethod
+    def load(cls, path: str) -> "FaqStore":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("entries"), {k: v for k, v in data.items() if k != "entries"})
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**self.meta, "saved_at": round(time.time(), 3), "entries": self.entries},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, query: str, scope: str, corpus_version: str) -> Optional[Dict[str, Any]]:
+        """The entry for this query if it was materialized for the same scope and corpus version."""
+        entry = self._by_key.get(normalize_query(query))
+        with self._lock:
+            self.lookups += 1
+            if entry is None or entry.get("scope") != scope:
+                return None
+            if entry.get("corpus_version") != corpus_version:
+                self.stale += 1   # built against another index version; rerun buildFaqStore.py
+                return None
+            self.hits += 1
+            self.saved_ms += entry.get("runtime_ms") or 0.0
+        return entry
+
+    def live_entries(self, corpus_version: str) -> List[Dict[str, Any]]:
+        """Entries still valid for this corpus version, most requested first."""
+        live = [e for e in self.entries if e.get("corpus_version") == corpus_version]
+        return sorted(live, key=lambda e: -(e.get("count") or 0))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "variants": len(self._by_key),
+                "built_at": self.meta.get("built_at"),
+                "log_coverage": (self.meta.get("report") or {}).get("coverage"),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "stale": self.stale,
+                "est_latency_saved_ms": round(self.saved_ms, 1),
+            }
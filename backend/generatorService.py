@@ -0,0 +1,653 @@
+# generatorService.py
+# Generator service used by notebooks/backendProcess.ipynb behind /generate.
+#
+# generate_uhaki_answer() used to tokenize one prompt and call model.generate() per
+# HTTP request, so waitress' 8 threads simply queued on the model. Here a single
+# scheduler thread owns the model and runs continuous batching:
+#   - new requests are prefilled as they arrive and join the running decode batch
+#     between steps; finished ones leave without stalling the others
+#   - every active request advances one token per shared forward pass
+#   - the KV cache of the fixed system-prompt prefix is computed once and reused
+#   - tokens are streamed back to callers as they are produced (<think> blocks hidden)
+#   - the retrieved context is packed to CONTEXT_TOKEN_BUDGET first (contextPacker.py)
+#   - a follow-up's earlier turns ("history" from the API's session) go in as chat turns
+#     after the system prompt, so the cached prefix still matches; retrieval runs on its
+#     "retrieval_query" (the follow-up after the questions it follows) when the API sends one
+#   - a request whose caller goes away (stream closed, or no token within
+#     GEN_TOKEN_TIMEOUT_S) is cancelled and leaves the batch at the next step
+#
+# Self-check on CPU with a tiny random causal LM (no downloads):
+#   python generatorService.py --selfcheck
+# or against any small local checkpoint:
+#   python generatorService.py --selfcheck --model path/to/tiny-model
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+
+import torch
+import torch.nn.functional as F
+
+from contextPacker import ContextPacker, TokenCounter, passages_from_bundle
+
+GEN_MAX_BATCH      = int(os.getenv("GEN_MAX_BATCH", "8"))
+GEN_MAX_NEW_TOKENS = int(os.getenv("GEN_MAX_NEW_TOKENS", "512"))
+GEN_TEMPERATURE    = float(os.getenv("GEN_TEMPERATURE", "0.2"))
+GEN_TOP_P          = float(os.getenv("GEN_TOP_P", "0.9"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1536"))
+GEN_MAX_HISTORY    = int(os.getenv("GEN_MAX_HISTORY", "3"))        # earlier turns of a conversation kept in the prompt
+GEN_TOKEN_TIMEOUT_S = float(os.getenv("GEN_TOKEN_TIMEOUT_S", "120"))  # longest wait for the next token (queue included)
+
+SYSTEM_PROMPT = (
+    "You are Uhaki, an AI legal assistant for Kenyan law. "
+    "Answer the user's question using only the legal information provided in the context below. "
+    "Provide a concise but complete legal summary. "
+    "Cite Acts and sections in parentheses (e.g., Employment Act s.44). "
+    "If the answer is not in the context, say so."
+)
+
+THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL | re.IGNORECASE)
+
+
+# ============================
+# Prompt helpers
+# ============================
+def build_context_from_bundle(bundle: Dict[str, Any], packer: Optional[ContextPacker] = None) -> str:
+    packer = packer or ContextPacker(token_budget=CONTEXT_TOKEN_BUDGET)
+    return packer.pack(passages_from_bundle(bundle))[0]
+
+def build_messages(query: str, context: str,
+                   history: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, str]]:
+    """history: earlier {query, answer} turns of the conversation, oldest first (their context is not repeated)."""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    for turn in (history or [])[-GEN_MAX_HISTORY:] if GEN_MAX_HISTORY > 0 else []:
+        # answered turns only: chat templates expect user / assistant to alternate
+        if not isinstance(turn, dict) or not str(turn.get("query") or "").strip() or not turn.get("answer"):
+            continue
+        messages.append({"role": "user", "content": str(turn["query"]).strip()})
+        messages.append({"role": "assistant", "content": str(turn["answer"]).strip()})
+    messages.append({"role": "user", "content": f"Context:\n{context}\n\nQuestion: {query}"})
+    return messages
+
+def clean_answer(text: str) -> str:
+    cleaned = THINK_RE.sub("", text or "")
+    return re.sub(r"\s+", " ", cleaned).strip()
+
+
+class ThinkFilter:
+    """Streaming counterpart of THINK_RE: drops <think>...</think> spans from text fed piecewise."""
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.buf = ""
+        self.inside = False
+
+    def feed(self, text: str) -> str:
+        self.buf += text
+        out = []
+        while True:
+            if self.inside:
+                j = self.buf.find(self.CLOSE)
+                if j < 0:
+                    self.buf = self.buf[-(len(self.CLOSE) - 1):]
+                    break
+                self.buf = self.buf[j + len(self.CLOSE):]
+                self.inside = False
+                continue
+            j = self.buf.find(self.OPEN)
+            if j >= 0:
+                out.append(self.buf[:j])
+                self.buf = self.buf[j + len(self.OPEN):]
+                self.inside = True
+                continue
+            # hold back a possible partial "<think" at the end
+            keep = 0
+            for k in range(min(len(self.OPEN) - 1, len(self.buf)), 0, -1):
+                if self.OPEN.startswith(self.buf[-k:]):
+                    keep = k
+                    break
+            out.append(self.buf[:len(self.buf) - keep])
+            self.buf = self.buf[len(self.buf) - keep:]
+            break
+        return "".join(out)
+
+    def flush(self) -> str:
+        rest = "" if self.inside else self.buf
+        self.buf = ""
+        return rest
+
+
+# ============================
+# KV cache plumbing (works with transformers 4.4x-5.x cache objects)
+# ============================
+def _cache_layers(cache) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+    if isinstance(cache, (tuple, list)):
+        return [(k, v) for k, v in cache]
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+def _make_cache(layers: List[Tuple[torch.Tensor, torch.Tensor]]):
+    from transformers import DynamicCache
+    cache = DynamicCache()
+    for i, (k, v) in enumerate(layers):
+        cache.update(k, v, i)
+    return cache
+
+def _left_pad(x: torch.Tensor, pad: int) -> torch.Tensor:
+    # x: [B, heads, L, dim] -> pad L on the left
+    return F.pad(x, (0, 0, pad, 0)) if pad > 0 else x
+
+
+def _sample(logits: torch.Tensor, temperature: float, top_p: float) -> int:
+    if temperature <= 0:
+        return int(torch.argmax(logits).item())
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    if 0.0 < top_p < 1.0:
+        sorted_p, sorted_ix = torch.sort(probs, descending=True)
+        cum = torch.cumsum(sorted_p, dim=-1)
+        cut = cum - sorted_p > top_p
+        sorted_p[cut] = 0.0
+        probs = torch.zeros_like(probs).scatter_(0, sorted_ix, sorted_p)
+    return int(torch.multinomial(probs / probs.sum(), 1).item())
+
+
+# ============================
+# Continuous batching scheduler
+# ============================
+class GenRequest:
+    __slots__ = ("prompt_ids", "max_new_tokens", "temperature", "top_p", "events", "tokens",
+                 "pos", "next_token", "submitted_at", "first_token_at", "finished_at",
+                 "finish_reason", "prefix_tokens", "cancelled")
+
+    def __init__(self, prompt_ids: List[int], max_new_tokens: int, temperature: float, top_p: float):
+        self.prompt_ids = list(prompt_ids)
+        self.max_new_tokens = max(1, int(max_new_tokens))
+        self.temperature = float(temperature)
+        self.top_p = float(top_p)
+        self.events: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self.tokens: List[int] = []
+        self.pos = 0                 # real tokens held in this request's KV cache
+        self.next_token: Optional[int] = None
+        self.submitted_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.finish_reason: Optional[str] = None
+        self.prefix_tokens = 0       # prompt tokens served from the prefix cache
+        self.cancelled = False       # set by the caller; the scheduler drops the request at its next step
+
+    def cancel(self):
+        """Stop decoding for a caller that went away. A no-op once the request has finished."""
+        self.cancelled = True
+
+    def iter_tokens(self, timeout: Optional[float] = GEN_TOKEN_TIMEOUT_S) -> Iterator[int]:
+        while True:
+            try:
+                kind, val = self.events.get(timeout=timeout)
+            except queue.Empty:
+                self.cancel()
+                raise TimeoutError(f"No token within {timeout}s") from None
+            if kind == "token":
+                yield val
+            elif kind == "error":
+                raise RuntimeError(f"Generation failed: {val}")
+            else:
+                return
+
+    def timings(self) -> Dict[str, Any]:
+        def ms(a, b):
+            return round((b - a) * 1000, 2) if (a is not None and b is not None) else None
+        return {
+            "queue_to_first_token_ms": ms(self.submitted_at, self.first_token_at),
+            "generation_ms": ms(self.submitted_at, self.finished_at),
+            "new_tokens": len(self.tokens),
+            "prompt_tokens": len(self.prompt_ids),
+            "prefix_cached_tokens": self.prefix_tokens,
+            "finish_reason": self.finish_reason,
+        }
+
+
+class ContinuousBatcher:
+    def __init__(self, model, tokenizer=None, max_batch: int = GEN_MAX_BATCH,
+                 eos_token_ids: Optional[List[int]] = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch = max(1, int(max_batch))
+        self.device = next(model.parameters()).device
+        if eos_token_ids is None:
+            eos = getattr(getattr(model, "generation_config", None), "eos_token_id", None)
+            if eos is None and tokenizer is not None:
+                eos = tokenizer.eos_token_id
+            eos_token_ids = eos if isinstance(eos, (list, tuple)) else ([eos] if eos is not None else [])
+        self.eos = set(int(e) for e in eos_token_ids)
+
+        self.pending: "queue.Queue[GenRequest]" = queue.Queue()
+        self.prefixes: Dict[Tuple[int, ...], List[Tuple[torch.Tensor, torch.Tensor]]] = {}
+        self._prefix_lock = threading.Lock()
+
+        # running batch state (scheduler thread only)
+        self.rows: List[GenRequest] = []
+        self.layers: Optional[List[Tuple[torch.Tensor, torch.Tensor]]] = None
+        self.mask: Optional[torch.Tensor] = None   # [B, L] 1 = real token, 0 = left padding
+
+        self.stats = {"requests": 0, "decode_steps": 0, "decoded_tokens": 0, "max_batch_seen": 0,
+                      "prefix_hits": 0, "prefill_tokens_saved": 0, "cancelled": 0}
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- lifecycle ----------
+    def start(self) -> "ContinuousBatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="uhaki-generator", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    # ---------- prefix cache ----------
+    def register_prefix(self, prefix_ids: List[int]):
+        """Precompute the KV cache for a shared prompt prefix (e.g. the system prompt)."""
+        key = tuple(int(t) for t in prefix_ids)
+        if not key:
+            return
+        with torch.inference_mode():
+            ids = torch.tensor([key], device=self.device)
+            out = self.model(input_ids=ids, attention_mask=torch.ones_like(ids), use_cache=True)
+        with self._prefix_lock:
+            self.prefixes[key] = [(k.detach(), v.detach()) for k, v in _cache_layers(out.past_key_values)]
+        logging.info(f"[GEN] Cached prompt prefix of {len(key)} tokens")
+
+    def register_chat_prefix(self, system_prompt: str = SYSTEM_PROMPT):
+        """Cache the chat-template tokens that precede the user turn."""
+        full = self.tokenizer.apply_chat_template(
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": "x"}],
+            tokenize=False, add_generation_prompt=True
+        )
+        marker = full.rfind("x")
+        ids = self.tokenizer(full[:marker], add_special_tokens=False)["input_ids"]
+        # Drop the last few tokens: BPE merges at the user-turn boundary can differ per prompt.
+        self.register_prefix(ids[:-2] if len(ids) > 4 else ids)
+
+    def _match_prefix(self, prompt_ids: List[int]) -> Tuple[int, Optional[List[Tuple[torch.Tensor, torch.Tensor]]]]:
+        best_len, best = 0, None
+        with self._prefix_lock:
+            for key, layers in self.prefixes.items():
+                n = len(key)
+                if best_len < n < len(prompt_ids) and tuple(prompt_ids[:n]) == key:
+                    best_len, best = n, layers
+        return best_len, best
+
+    # ---------- submission ----------
+    def submit(self, prompt_ids: List[int], max_new_tokens: int = GEN_MAX_NEW_TOKENS,
+               temperature: float = GEN_TEMPERATURE, top_p: float = GEN_TOP_P) -> GenRequest:
+        if not prompt_ids:
+            raise ValueError("Empty prompt")
+        req = GenRequest(prompt_ids, max_new_tokens, temperature, top_p)
+        self.pending.put(req)
+        self.start()
+        return req
+
+    def generate_ids(self, prompt_ids: List[int], **kwargs) -> List[int]:
+        req = self.submit(prompt_ids, **kwargs)
+        return list(req.iter_tokens())
+
+    def encode_chat(self, messages: List[Dict[str, str]], enable_thinking: bool = False) -> List[int]:
+        text = self.tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True, enable_thinking=enable_thinking
+        )
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def stream_chat(self, messages: List[Dict[str, str]], req_out: Optional[list] = None,
+                    enable_thinking: bool = False, **kwargs) -> Iterator[str]:
+        """Yields answer text pieces as they are decoded (think blocks removed)."""
+        req = self.submit(self.encode_chat(messages, enable_thinking), **kwargs)
+        if req_out is not None:
+            req_out.append(req)
+        think = ThinkFilter()
+        ids: List[int] = []
+        sent = ""
+        try:
+            for tok in req.iter_tokens():
+                ids.append(tok)
+                text = self.tokenizer.decode(ids, skip_special_tokens=True)
+                if text.endswith("�"):       # incomplete multi-byte character
+                    continue
+                piece, sent = text[len(sent):], text
+                visible = think.feed(piece)
+                if visible:
+                    yield visible
+        finally:
+            req.cancel()   # closed early (client gone) or timed out; harmless once finished
+        tail = think.feed(self.tokenizer.decode(ids, skip_special_tokens=True)[len(sent):]) + think.flush()
+        if tail:
+            yield tail
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> Tuple[str, Dict[str, Any]]:
+        reqs: list = []
+        text = "".join(self.stream_chat(messages, req_out=reqs, **kwargs))
+        return clean_answer(text), reqs[0].timings()
+
+    # ---------- scheduler ----------
+    def _emit(self, req: GenRequest, tok: int) -> bool:
+        """Record a sampled token; returns True when the request is finished."""
+        if req.first_token_at is None:
+            req.first_token_at = time.perf_counter()
+        if tok in self.eos:
+            req.finish_reason = "eos"
+        else:
+            req.tokens.append(tok)
+            req.events.put(("token", tok))
+            if len(req.tokens) >= req.max_new_tokens:
+                req.finish_reason = "length"
+        if req.finish_reason:
+            req.finished_at = time.perf_counter()
+            req.events.put(("done", req.finish_reason))
+            return True
+        req.next_token = tok
+        return False
+
+    def _prefill(self, req: GenRequest):
+        n_prefix, prefix_layers = self._match_prefix(req.prompt_ids)
+        suffix = req.prompt_ids[n_prefix:]
+        ids = torch.tensor([suffix], device=self.device)
+        kwargs: Dict[str, Any] = {
+            "input_ids": ids,
+            "attention_mask": torch.ones(1, len(req.prompt_ids), dtype=torch.long, device=self.device),
+            "use_cache": True,
+        }
+        if prefix_layers is not None:
+            kwargs["past_key_values"] = _make_cache(prefix_layers)
+            kwargs["position_ids"] = torch.arange(n_prefix, len(req.prompt_ids), device=self.device)[None]
+            req.prefix_tokens = n_prefix
+            self.stats["prefix_hits"] += 1
+            self.stats["prefill_tokens_saved"] += n_prefix
+        out = self.model(**kwargs)
+        req.pos = len(req.prompt_ids)
+        layers = _cache_layers(out.past_key_values)
+        done = self._emit(req, _sample(out.logits[0, -1], req.temperature, req.top_p))
+        if not done:
+            self._join(req, layers)
+
+    def _join(self, req: GenRequest, layers: List[Tuple[torch.Tensor, torch.Tensor]]):
+        new_mask = torch.ones(1, req.pos, dtype=torch.long, device=self.device)
+        if not self.rows:
+            self.rows, self.layers, self.mask = [req], layers, new_mask
+            return
+        cur = self.mask.shape[1]
+        width = max(cur, req.pos)
+        self.layers = [
+            (torch.cat([_left_pad(k0, width - cur), _left_pad(k1, width - req.pos)], dim=0),
+             torch.cat([_left_pad(v0, width - cur), _left_pad(v1, width - req.pos)], dim=0))
+            for (k0, v0), (k1, v1) in zip(self.layers, layers)
+        ]
+        self.mask = torch.cat([F.pad(self.mask, (width - cur, 0)), F.pad(new_mask, (width - req.pos, 0))], dim=0)
+        self.rows.append(req)
+
+    def _drop_rows(self, finished: List[int]):
+        keep = [i for i in range(len(self.rows)) if i not in set(finished)]
+        if not keep:
+            self.rows, self.layers, self.mask = [], None, None
+            return
+        ix = torch.tensor(keep, device=self.device)
+        self.rows = [self.rows[i] for i in keep]
+        self.layers = [(k.index_select(0, ix), v.index_select(0, ix)) for k, v in self.layers]
+        self.mask = self.mask.index_select(0, ix)
+        # trim columns that are padding for every remaining row
+        lead = int((self.mask.sum(dim=0) == 0).long().cumprod(dim=0).sum().item())
+        if lead:
+            self.mask = self.mask[:, lead:]
+            self.layers = [(k[:, :, lead:], v[:, :, lead:]) for k, v in self.layers]
+
+    def _cancel(self, req: GenRequest):
+        req.finish_reason = "cancelled"
+        req.finished_at = time.perf_counter()
+        req.events.put(("done", req.finish_reason))
+        self.stats["cancelled"] += 1
+
+    def _decode_step(self):
+        cancelled = [i for i, r in enumerate(self.rows) if r.cancelled]
+        if cancelled:
+            for i in cancelled:
+                self._cancel(self.rows[i])
+            self._drop_rows(cancelled)
+            if not self.rows:
+                return
+        B = len(self.rows)
+        input_ids = torch.tensor([[r.next_token] for r in self.rows], device=self.device)
+        position_ids = torch.tensor([[r.pos] for r in self.rows], device=self.device)
+        mask = torch.cat([self.mask, torch.ones(B, 1, dtype=torch.long, device=self.device)], dim=1)
+        out = self.model(input_ids=input_ids, attention_mask=mask, position_ids=position_ids,
+                         past_key_values=_make_cache(self.layers), use_cache=True)
+        self.layers = _cache_layers(out.past_key_values)
+        self.mask = mask
+        self.stats["decode_steps"] += 1
+        self.stats["decoded_tokens"] += B
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], B)
+
+        finished = []
+        logits = out.logits[:, -1, :]
+        for i, r in enumerate(self.rows):
+            r.pos += 1
+            if self._emit(r, _sample(logits[i], r.temperature, r.top_p)):
+                finished.append(i)
+        if finished:
+            self._drop_rows(finished)
+
+    def _admit(self):
+        while len(self.rows) < self.max_batch:
+            try:
+                # block briefly only when idle; never stall a running batch
+                req = self.pending.get(timeout=0.05) if not self.rows else self.pending.get_nowait()
+            except queue.Empty:
+                return
+            if req.cancelled:
+                self._cancel(req)   # gave up while queued: never prefilled
+                continue
+            self.stats["requests"] += 1
+            try:
+                self._prefill(req)
+            except Exception as e:
+                logging.exception("[GEN] Prefill failed")
+                req.events.put(("error", str(e)))
+
+    def _run(self):
+        with torch.inference_mode():
+            while not self._stop:
+                self._admit()
+                if not self.rows:
+                    continue
+                try:
+                    self._decode_step()
+                except Exception as e:
+                    logging.exception("[GEN] Decode step failed; failing the running batch")
+                    for r in self.rows:
+                        r.events.put(("error", str(e)))
+                    self.rows, self.layers, self.mask = [], None, None
+
+
+# ============================
+# HTTP service (same /generate contract the backend proxies to)
+# ============================
+def create_app(retrieve_fn: Callable[[str], Dict[str, Any]], batcher: ContinuousBatcher,
+               api_key: str, top_k_final: int = 6, health_extra: Optional[Dict[str, Any]] = None,
+               packer: Optional[ContextPacker] = None):
+    import json
+    from flask import Flask, request, jsonify, Response, stream_with_context
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    CORS(app)
+    bundle_keys = ["Top6_IDs", "Top6_Sections_fmt", "Top6_Answers", "Top6_Acts"]
+    # Budget counted with the generator's own tokenizer, so it is the real prefill size.
+    packer = packer or ContextPacker(TokenCounter(batcher.tokenizer), CONTEXT_TOKEN_BUDGET)
+
+    def prepare():
+        if request.headers.get("X-API-Key") != api_key:
+            return None, (jsonify({"error": "Unauthorized"}), 401)
+        data = request.get_json(force=True) or {}
+        query = (data.get("query") or "").strip()
+        if not query:
+            return None, (jsonify({"error": "No query provided"}), 400)
+        top_k_return = int(data.get("top_k_return", top_k_final))
+        history = data.get("history") if isinstance(data.get("history"), list) else None
+        t0 = time.perf_counter()
+        bundle = retrieve_fn((data.get("retrieval_query") or "").strip() or query)
+        if top_k_return < top_k_final:
+            for k in bundle_keys:
+                bundle[k] = bundle[k][:top_k_return]
+        retrieval_ms = round((time.perf_counter() - t0) * 1000, 2)
+        t1 = time.perf_counter()
+        context, ctx_stats = packer.pack(passages_from_bundle(bundle))
+        ctx_stats["pack_ms"] = round((time.perf_counter() - t1) * 1000, 2)
+        return (query, bundle, context, ctx_stats, retrieval_ms, history), None
+
+    def sources(bundle):
+        return (
+            [{"act": a, "section": s} for a, s in zip(bundle["Top6_Acts"], bundle["Top6_Sections_fmt"])],
+            {"ids": bundle["Top6_IDs"], "sections_fmt": bundle["Top6_Sections_fmt"], "acts": bundle["Top6_Acts"]},
+        )
+
+    @app.get("/health")
+    def health():
+        return jsonify({"ok": True, "generator": batcher.stats, "context_packer": packer.stats(), **(health_extra or {})})
+
+    @app.post("/generate")
+    def generate():
+        prepared, err = prepare()
+        if err:
+            return err
+        query, bundle, context, ctx_stats, retrieval_ms, history = prepared
+        try:
+            answer, gen_timings = batcher.chat(build_messages(query, context, history))
+        except TimeoutError as e:
+            logging.warning(f"[GEN] Generation cancelled: {e}")
+            return jsonify({"error": "Generation timed out"}), 504
+        top6, raw = sources(bundle)
+        return jsonify({
+            "ok": True,
+            "query": query,
+            "answer": answer,
+            "top6": top6,
+            "raw": raw,
+            "context_stats": ctx_stats,
+            "timings": {"retrieval_ms": retrieval_ms, "pack_ms": ctx_stats["pack_ms"],
+                        "prompt_tokens_saved": ctx_stats["prompt_tokens_saved"], **bundle.get("Timings", {}),
+                        **gen_timings},
+        })
+
+    @app.post("/generate/stream")
+    def generate_stream():
+        """NDJSON: one "sources" line, then "token" lines, then a final "done" line."""
+        prepared, err = prepare()
+        if err:
+            return err
+        query, bundle, context, ctx_stats, retrieval_ms, history = prepared
+        messages = build_messages(query, context, history)
+
+        def events():
+            top6, raw = sources(bundle)
+            yield json.dumps({"type": "sources", "query": query, "top6": top6, "raw": raw}) + "\n"
+            reqs: list = []
+            pieces = []
+            try:
+                for piece in batcher.stream_chat(messages, req_out=reqs):
+                    pieces.append(piece)
+                    yield json.dumps({"type": "token", "text": piece}) + "\n"
+            except TimeoutError as e:
+                logging.warning(f"[GEN] Generation cancelled: {e}")
+                yield json.dumps({"type": "error", "error": "Generation timed out"}) + "\n"
+                return
+            finally:
+                # The WSGI server closes this generator when the client disconnects; stop decoding for it.
+                if reqs:
+                    reqs[0].cancel()
+            yield json.dumps({
+                "type": "done",
+                "answer": clean_answer("".join(pieces)),
+                "context_stats": ctx_stats,
+                "timings": {"retrieval_ms": retrieval_ms, "pack_ms": ctx_stats["pack_ms"],
+                            "prompt_tokens_saved": ctx_stats["prompt_tokens_saved"], **bundle.get("Timings", {}),
+                            **reqs[0].timings()},
+            }) + "\n"
+
+        return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+
+    return app
+
+
+# ============================
+# Self-check: batched decode must match sequential greedy generate()
+# ============================
+def _tiny_random_lm():
+    from transformers import LlamaConfig, LlamaForCausalLM
+    torch.manual_seed(0)
+    cfg = LlamaConfig(vocab_size=256, hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+                      num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=512)
+    model = LlamaForCausalLM(cfg).eval()
+    # sharpen the random logits so greedy decoding isn't decided by float noise
+    with torch.no_grad():
+        model.lm_head.weight.mul_(20.0)
+    return model, None
+
+
+def _selfcheck(model_path: Optional[str], n_prompts: int, new_tokens: int, max_batch: int):
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+
+    if model_path:
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        tok = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModelForCausalLM.from_pretrained(model_path).eval()
+        vocab = min(tok.vocab_size, model.config.vocab_size)
+    else:
+        model, tok = _tiny_random_lm()
+        vocab = model.config.vocab_size
+
+    rnd = random.Random(0)
+    prefix = [rnd.randrange(3, vocab) for _ in range(24)]
+    prompts = [prefix + [rnd.randrange(3, vocab) for _ in range(rnd.randint(3, 40))] for _ in range(n_prompts)]
+
+    t0 = time.perf_counter()
+    expected = []
+    with torch.inference_mode():
+        for p in prompts:
+            ids = torch.tensor([p])
+            out = model.generate(ids, attention_mask=torch.ones_like(ids), max_new_tokens=new_tokens,
+                                 min_new_tokens=new_tokens, do_sample=False, eos_token_id=None, pad_token_id=0)
+            expected.append(out[0, len(p):].tolist())
+    seq_s = time.perf_counter() - t0
+
+    batcher = ContinuousBatcher(model, tok, max_batch=max_batch, eos_token_ids=[]).start()
+    batcher.register_prefix(prefix)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_prompts) as pool:
+        got = list(pool.map(lambda p: batcher.generate_ids(p, max_new_tokens=new_tokens, temperature=0.0), prompts))
+    batch_s = time.perf_counter() - t0
+    batcher.stop()
+
+    matches = sum(1 for a, b in zip(expected, got) if a == b)
+    print(f"[SELFCHECK] {matches}/{n_prompts} prompts identical to sequential greedy generate()")
+    print(f"[SELFCHECK] sequential: {seq_s:.2f}s | continuous batching: {batch_s:.2f}s | stats: {batcher.stats}")
+    return matches == n_prompts
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--selfcheck", action="store_true")
+    parser.add_argument("--model", type=str, default="", help="Local causal LM dir (default: tiny random Llama)")
+    parser.add_argument("--prompts", type=int, default=12)
+    parser.add_argument("--new_tokens", type=int, default=24)
+    parser.add_argument("--max_batch", type=int, default=GEN_MAX_BATCH)
+    args = parser.parse_args()
+    if args.selfcheck:
+        sys.exit(0 if _selfcheck(args.model or None, args.prompts, args.new_tokens, args.max_batch) else 1)
+    parser.print_help()
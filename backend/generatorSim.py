@@ -0,0 +1,342 @@
+# generatorSim.py
+# Local stand-in for the notebook generator (/generate behind ngrok), for load-testing proxy mode.
+#
+# It speaks the same contract as generatorService.create_app(): POST /generate returns
+# {"ok", "query", "answer", "top6", "raw": {"ids", "sections_fmt", "acts"}, "timings"},
+# POST /generate/stream returns the NDJSON "sources" / "token" / "done" lines, and both
+# need X-API-Key. raw.ids are real chunk ids drawn from the backend's own collection, so
+# the API's hydration (doc store, Chroma fallback), context and CSV logging do the work
+# they do in production. No model is loaded. Each request sleeps for a latency drawn from
+# the configured distribution, which is split into time to first token plus one step per
+# streamed token. At most --max_batch requests decode at once (the real generator's
+# GEN_MAX_BATCH), and the rest queue. Errors and hangs are injected at configurable rates.
+#
+#   python generatorSim.py --latency lognormal --median_ms 12000 --sigma 0.6 --error_rate 0.02
+#   GENERATOR_URL=http://127.0.0.1:7860/generate NOTEBOOK_API_KEY=sim python app.py
+#   python benchServe.py --rates 0.5,1,2 --duration 60
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import List, Dict, Any, Tuple
+
+import chromadb
+from flask import Flask, request, jsonify, Response, stream_with_context
+
+from shards import iter_collection
+
+CHROMA_PATH     = os.getenv("CHROMA_PATH", "../data/scripts/chroma")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "actSectionsV2")
+INDEX_LAYOUT    = os.getenv("INDEX_LAYOUT", "single").lower()
+SIM_API_KEY     = os.getenv("SIM_API_KEY", os.getenv("NOTEBOOK_API_KEY", "sim"))
+SIM_PORT        = int(os.getenv("SIM_PORT", "7860"))
+
+WORDS = ("the", "person", "shall", "under", "section", "court", "may", "any", "Act", "provided",
+         "that", "employer", "land", "child", "within", "days", "notice", "right", "order", "law")
+
+
+# ============================
+# Latency model
+# ============================
+class LatencyModel:
+    """Total generation time per request, drawn from one of:
+    fixed (median_ms), uniform (low_ms..high_ms), lognormal (median_ms, sigma),
+    replay (Runtime column of a query log, resampled)."""
+
+    def __init__(self, kind: str, median_ms: float, sigma: float, low_ms: float, high_ms: float,
+                 replay_path: str = "", seed: int = 0):
+        self.kind = kind
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.low_ms = low_ms
+        self.high_ms = high_ms
+        self.rng = random.Random(seed)
+        self.samples: List[float] = []
+        if kind == "replay":
+            import pandas as pd
+            df = pd.read_csv(replay_path, encoding="utf-8-sig")
+            self.samples = [float(x) for x in pd.to_numeric(df["Runtime"], errors="coerce").dropna() if x > 0]
+            if not self.samples:
+                raise ValueError(f"No Runtime values in {replay_path}")
+
+    def draw_ms(self) -> float:
+        if self.kind == "fixed":
+            return self.median_ms
+        if self.kind == "uniform":
+            return self.rng.uniform(self.low_ms, self.high_ms)
+        if self.kind == "replay":
+            return self.rng.choice(self.samples)
+        return self.median_ms * math.exp(self.rng.gauss(0.0, self.sigma))
+
+    def describe(self) -> Dict[str, Any]:
+        out = {"kind": self.kind}
+        if self.kind in ("fixed", "lognormal"):
+            out["median_ms"] = self.median_ms
+        if self.kind == "lognormal":
+            out["sigma"] = self.sigma
+        if self.kind == "uniform":
+            out.update(low_ms=self.low_ms, high_ms=self.high_ms)
+        if self.kind == "replay":
+            out["samples"] = len(self.samples)
+        return out
+
+
+# ============================
+# Simulator
+# ============================
+class GeneratorSim:
+    def __init__(self, chunks: List[Tuple[str, str, str]], latency: LatencyModel, max_batch: int,
+                 ttft_frac: float, answer_tokens: int, error_rate: float, timeout_rate: float,
+                 hang_s: float, top_k: int = 6):
+        self.chunks = chunks
+        self.by_act: Dict[str, List[Tuple[str, str, str]]] = {}
+        for c in chunks:
+            self.by_act.setdefault(c[1].lower(), []).append(c)
+        self.latency = latency
+        self.slots = threading.BoundedSemaphore(max(1, max_batch))
+        self.max_batch = max(1, max_batch)
+        self.ttft_frac = min(max(ttft_frac, 0.0), 1.0)
+        self.answer_tokens = max(1, answer_tokens)
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self.top_k = top_k
+        self.rng = random.Random(1)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.errors = 0
+        self.hangs = 0
+        self.unauthorized = 0
+
+    def draw_sources(self, query: str, act: str, k: int) -> List[Tuple[str, str, str]]:
+        """k chunks, the same ones for the same query (seeded by it), from `act` when it is known."""
+        pool = self.by_act.get((act or "").lower()) or self.chunks
+        rng = random.Random(int(hashlib.sha1(query.encode("utf-8")).hexdigest()[:8], 16))
+        return rng.sample(pool, min(k, len(pool)))
+
+    def fault(self) -> str:
+        """"error", "hang" or "" for this request."""
+        with self._lock:
+            r = self.rng.random()
+        if r < self.error_rate:
+            return "error"
+        if r < self.error_rate + self.timeout_rate:
+            return "hang"
+        return ""
+
+    def answer_pieces(self, sources: List[Tuple[str, str, str]], n: int) -> List[str]:
+        """n streamed pieces of a made-up answer that cites the first source."""
+        act, section = (sources[0][1], sources[0][2]) if sources else ("the Act", "1")
+        words = f"Under the {act} ({section}),".split()
+        rng = random.Random(n)
+        while len(words) < n:
+            words.append(rng.choice(WORDS))
+        words = words[:n]
+        return [w + " " for w in words[:-1]] + [words[-1] + "."]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "completed": self.completed,
+                "injected_errors": self.errors,
+                "injected_hangs": self.hangs,
+                "unauthorized": self.unauthorized,
+                "max_batch": self.max_batch,
+                "latency": self.latency.describe(),
+                "chunks": len(self.chunks),
+            }
+
+    def run(self, fault: str):
+        """Context for one generation: holds a decode slot (queueing for it) and draws its timing."""
+        return _Generation(self, fault)
+
+
+class _Generation:
+    def __init__(self, sim: GeneratorSim, fault: str):
+        self.sim = sim
+        self.fault = fault
+
+    def __enter__(self):
+        sim = self.sim
+        with sim._lock:
+            sim.requests += 1
+            sim.queued += 1
+        t_q = time.perf_counter()
+        sim.slots.acquire()
+        with sim._lock:
+            sim.queued -= 1
+            sim.in_flight += 1
+        self.queue_ms = (time.perf_counter() - t_q) * 1000
+        if self.fault == "hang":
+            with sim._lock:
+                sim.hangs += 1
+            time.sleep(sim.hang_s)
+        with sim._lock:
+            total_ms = sim.latency.draw_ms()
+        self.total_ms = total_ms
+        self.ttft_s = total_ms * sim.ttft_frac / 1000
+        self.n_tokens = sim.answer_tokens
+        self.step_s = (total_ms - total_ms * sim.ttft_frac) / 1000 / self.n_tokens
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        sim = self.sim
+        sim.slots.release()
+        with sim._lock:
+            sim.in_flight -= 1
+            if exc_type is None and self.fault != "error":
+                sim.completed += 1
+        return False
+
+
+def load_chunks(path: str, name: str) -> List[Tuple[str, str, str]]:
+    """(id, act, section) of every chunk in the backend's collection."""
+    client = chromadb.PersistentClient(path=path)
+    if INDEX_LAYOUT == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, name)
+    else:
+        coll = client.get_collection(name=name)
+    out = []
+    for doc_id, rec in iter_collection(coll, include=["metadatas"]):
+        meta = rec.get("metadatas") or {}
+        out.append((doc_id, meta.get("act") or meta.get("Act") or "",
+                    meta.get("section") or meta.get("section_title") or ""))
+    return out
+
+
+# ============================
+# HTTP service (/generate contract of generatorService.create_app)
+# ============================
+def create_app(sim: GeneratorSim, api_key: str) -> Flask:
+    app = Flask(__name__)
+
+    def prepare():
+        if request.headers.get("X-API-Key") != api_key:
+            with sim._lock:
+                sim.unauthorized += 1
+            return None, (jsonify({"error": "Unauthorized"}), 401)
+        data = request.get_json(force=True) or {}
+        query = (data.get("query") or "").strip()
+        if not query:
+            return None, (jsonify({"error": "No query provided"}), 400)
+        k = min(int(data.get("top_k_return", sim.top_k)), sim.top_k)
+        retrieval_query = (data.get("retrieval_query") or "").strip() or query
+        return (query, sim.draw_sources(retrieval_query, data.get("act") or "", k)), None
+
+    def sources(chunks):
+        return (
+            [{"act": a, "section": s} for _, a, s in chunks],
+            {"ids": [i for i, _, _ in chunks], "sections_fmt": [s for _, _, s in chunks],
+             "acts": [a for _, a, _ in chunks]},
+        )
+
+    @app.get("/health")
+    def health():
+        return jsonify({"ok": True, "simulated": True, "generator": sim.stats()})
+
+    @app.post("/generate")
+    def generate():
+        prepared, err = prepare()
+        if err:
+            return err
+        query, chunks = prepared
+        fault = sim.fault()
+        with sim.run(fault) as g:
+            if fault == "error":
+                with sim._lock:
+                    sim.errors += 1
+                time.sleep(g.ttft_s)
+                return jsonify({"error": "Simulated generator failure"}), 500
+            time.sleep(g.ttft_s + g.step_s * g.n_tokens)
+        top6, raw = sources(chunks)
+        return jsonify({
+            "ok": True,
+            "query": query,
+            "answer": "".join(sim.answer_pieces(chunks, g.n_tokens)),
+            "top6": top6,
+            "raw": raw,
+            "timings": {"queue_ms": round(g.queue_ms, 2), "generate_ms": round(g.total_ms, 2),
+                        "new_tokens": g.n_tokens, "simulated": True},
+        })
+
+    @app.post("/generate/stream")
+    def generate_stream():
+        """NDJSON: one "sources" line, then "token" lines, then a final "done" line."""
+        prepared, err = prepare()
+        if err:
+            return err
+        query, chunks = prepared
+        fault = sim.fault()
+
+        def events():
+            top6, raw = sources(chunks)
+            yield json.dumps({"type": "sources", "query": query, "top6": top6, "raw": raw}) + "\n"
+            with sim.run(fault) as g:
+                time.sleep(g.ttft_s)
+                pieces = sim.answer_pieces(chunks, g.n_tokens)
+                for i, piece in enumerate(pieces):
+                    if fault == "error" and i == len(pieces) // 2:
+                        with sim._lock:
+                            sim.errors += 1
+                        yield json.dumps({"type": "error", "error": "Simulated generator failure"}) + "\n"
+                        return
+                    yield json.dumps({"type": "token", "text": piece}) + "\n"
+                    time.sleep(g.step_s)
+            yield json.dumps({
+                "type": "done",
+                "answer": "".join(pieces),
+                "timings": {"queue_ms": round(g.queue_ms, 2), "generate_ms": round(g.total_ms, 2),
+                            "new_tokens": g.n_tokens, "simulated": True},
+            }) + "\n"
+
+        return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated /generate endpoint for load-testing proxy mode.")
+    parser.add_argument("--port", type=int, default=SIM_PORT)
+    parser.add_argument("--latency", type=str, default="lognormal", choices=["fixed", "uniform", "lognormal", "replay"])
+    parser.add_argument("--median_ms", type=float, default=12000, help="fixed / lognormal median generation time")
+    parser.add_argument("--sigma", type=float, default=0.6, help="lognormal spread (0.6: p95 is about 2.7x the median)")
+    parser.add_argument("--low_ms", type=float, default=5000)
+    parser.add_argument("--high_ms", type=float, default=30000)
+    parser.add_argument("--replay", type=str, default="../outputs/queryLog.csv", help="Query log whose Runtime column --latency replay samples")
+    parser.add_argument("--ttft_frac", type=float, default=0.25, help="Share of the time spent before the first token (prefill)")
+    parser.add_argument("--tokens", type=int, default=200, help="Answer tokens streamed per request")
+    parser.add_argument("--max_batch", type=int, default=int(os.getenv("GEN_MAX_BATCH", "8")), help="Concurrent generations; the rest queue")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--timeout_rate", type=float, default=0.0, help="Share of requests that hang for --hang_s first")
+    parser.add_argument("--hang_s", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    chunks = load_chunks(CHROMA_PATH, COLLECTION_NAME)
+    if not chunks:
+        raise SystemExit(f"[ERROR] Collection {COLLECTION_NAME!r} at {CHROMA_PATH} is empty")
+    latency = LatencyModel(args.latency, args.median_ms, args.sigma, args.low_ms, args.high_ms, args.replay, args.seed)
+    sim = GeneratorSim(chunks, latency, args.max_batch, args.ttft_frac, args.tokens,
+                       args.error_rate, args.timeout_rate, args.hang_s)
+    logging.info(f"[SIM] {len(chunks)} chunks from {COLLECTION_NAME}; latency {latency.describe()}; "
+                 f"max_batch={args.max_batch}, error_rate={args.error_rate}, timeout_rate={args.timeout_rate}")
+    print(f" Simulated generator on http://0.0.0.0:{args.port}/generate (X-API-Key: {SIM_API_KEY!r})")
+    create_app(sim, SIM_API_KEY).run(host="0.0.0.0", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
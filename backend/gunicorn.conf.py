@@ -0,0 +1,50 @@
+# gunicorn.conf.py
+# Multi-worker serving for the Uhaki API (run from backend/):
+#   gunicorn -c gunicorn.conf.py wsgi:app                 # threaded WSGI workers
+#   WORKER_CLASS=aiohttp.GunicornWebWorker \
+#   gunicorn -c gunicorn.conf.py asyncServer:web_app      # asyncio front end
+import gc
+import multiprocessing
+import os
+
+# Set before torch / tokenizers are imported by the preloaded app.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+# Worker / thread defaults are starting points from the core count, not measured optima:
+# tune them on the target box with benchServe.py (see the README).
+bind         = os.getenv("BIND", "0.0.0.0:5000")
+workers      = int(os.getenv("WEB_WORKERS", str(max(1, min(4, CPU_COUNT // 2)))))
+worker_class = os.getenv("WORKER_CLASS", "gthread")
+threads      = int(os.getenv("WEB_THREADS", "4"))
+timeout      = int(os.getenv("WEB_TIMEOUT_S", "180"))  # > GENERATOR_TIMEOUT_S
+graceful_timeout = 30
+keepalive    = 5
+
+# Load models + index in the master so workers share those pages copy-on-write.
+preload_app  = True
+
+# Intra-op threads per worker; default splits the cores evenly between workers.
+WORKER_TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0")) or max(1, CPU_COUNT // workers)
+
+
+def when_ready(server):
+    # Move everything allocated during preload into the permanent generation so the
+    # cyclic GC doesn't touch (and un-share) those pages in the workers.
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"[INIT] Preload done; forking {workers} x {worker_class} workers, "
+                    f"{WORKER_TORCH_THREADS} torch threads each")
+    if workers > 1 and int(os.getenv("SESSIONS", "512")) > 0:
+        # sessions.py keeps conversations per process; a follow-up on another worker starts over
+        server.log.warning(f"[INIT] Conversation sessions are per worker: route each session_id to one "
+                           f"of the {workers} workers (sticky proxy) or set WEB_WORKERS=1")
+
+
+def post_fork(server, worker):
+    import app as uhaki
+    uhaki.configure_torch_threads(WORKER_TORCH_THREADS)
+    uhaki.open_collection()
+    uhaki.start_index_watch()
+    uhaki.warm_up()
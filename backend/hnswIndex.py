@@ -0,0 +1,196 @@
+# hnswIndex.py
+# HNSW vector search with the graph parameters and search ef chosen by data/scripts/tuneHnsw.py.
+#
+# Chroma builds its HNSW graph with default parameters (M=16, construction_ef=100,
+# search_ef=10) unless the collection was created with hnsw:* metadata. It also fixes
+# search_ef per collection, so a request cannot trade recall for latency. tuneHnsw.py builds
+# the graph over a grid of (M, construction_ef), measures recall@k against exact search
+# and the query latency per search ef, and saves the chosen graph next to a JSON sidecar.
+# The sidecar holds the ids, Acts, chosen parameters and the smallest ef that reaches the
+# recall target for each Act filter. A filtered search walks the graph and skips other Acts,
+# so small Acts need a larger ef than global search. The library is hnswlib (chroma-hnswlib),
+# the same one Chroma uses. HnswCollection mimics Chroma's query / get / count like
+# CompressedCollection does, so app.py switches with VECTOR_INDEX=hnsw. query() also takes
+# an ef per call: the request's search_ef, else the tuned ef of the Act filter, else the
+# tuned default.
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from shards import _acts_in_where
+
+try:
+    import hnswlib
+except ImportError:   # ships with chromadb as chroma-hnswlib; VECTOR_INDEX=hnsw needs it
+    hnswlib = None
+
+
+def sidecar_path(index_path: str) -> str:
+    return os.path.splitext(index_path)[0] + ".json"
+
+
+def build_graph(X: np.ndarray, M: int, construction_ef: int, space: str = "cosine", threads: int = -1):
+    """An hnswlib index over the rows of X (labels = row numbers)."""
+    if hnswlib is None:
+        raise RuntimeError("hnswlib is not installed (pip install chroma-hnswlib)")
+    graph = hnswlib.Index(space=space, dim=X.shape[1])
+    graph.init_index(max_elements=len(X), M=M, ef_construction=construction_ef)
+    graph.set_num_threads(threads if threads > 0 else (os.cpu_count() or 1))
+    graph.add_items(X, np.arange(len(X)))
+    return graph
+
+
+class HnswIndex:
+    def __init__(self, graph, ids: List[str], acts: np.ndarray, act_names: List[str],
+                 config: Dict[str, Any], act_ef: Optional[Dict[str, int]] = None, default_ef: int = 0):
+        self.graph = graph
+        self.ids = ids
+        self.acts = acts
+        self.act_names = act_names
+        self.act_idx = {a: i for i, a in enumerate(act_names)}
+        self.config = config
+        self.act_ef = dict(act_ef or {})
+        self.default_ef = default_ef or int(config.get("search_ef") or 10)
+        self.graph.set_num_threads(1)   # one query at a time per request thread
+
+        self._lock = threading.Lock()   # set_ef is index-wide; hold it from set_ef to the end of the query
+        self.queries = 0
+        self.filtered = 0
+        self.short = 0
+        self.search_ms = 0.0
+        self.ef_used: Dict[int, int] = {}
+
+    @classmethod
+    def load(cls, path: str, default_ef: int = 0) -> "HnswIndex":
+        if hnswlib is None:
+            raise RuntimeError("hnswlib is not installed (pip install chroma-hnswlib)")
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            side = json.load(f)
+        cfg = side["config"]
+        graph = hnswlib.Index(space=cfg.get("space", "cosine"), dim=int(cfg["dim"]))
+        graph.load_index(path, max_elements=len(side["ids"]))
+        return cls(graph, side["ids"], np.asarray(side["acts"], dtype=np.int32), side["act_names"],
+                   cfg, side.get("act_ef"), default_ef)
+
+    def save(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.graph.save_index(path)
+        with open(sidecar_path(path), "w", encoding="utf-8") as f:
+            json.dump({"config": self.config, "act_ef": self.act_ef, "ids": self.ids,
+                       "acts": self.acts.tolist(), "act_names": self.act_names, **(extra or {})}, f)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def ef_for(self, acts: Optional[List[str]]) -> int:
+        """Tuned ef for this Act filter: the largest among the Acts (a mixed filter needs the hardest one's)."""
+        if not acts:
+            return self.default_ef
+        return max(self.act_ef.get(a, self.default_ef) for a in acts)
+
+    def search(self, q_emb, top_k: int, acts: Optional[List[str]] = None,
+               ef: Optional[int] = None) -> Tuple[List[int], List[float], Dict[str, Any]]:
+        """(row indices, cosine distances, info). ef below top_k is raised to top_k (hnswlib needs ef >= k)."""
+        q = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+        filt = None
+        if acts:
+            wanted = np.isin(self.acts, [self.act_idx[a] for a in acts if a in self.act_idx])
+            n_match = int(wanted.sum())
+            if n_match == 0:
+                return [], [], {"ef": 0, "search_ms": 0.0}
+            top_k = min(top_k, n_match)
+            filt = lambda label: bool(wanted[label])
+        top_k = min(top_k, len(self))
+        ef = max(int(ef or self.ef_for(acts)), top_k)
+        t0 = time.perf_counter()
+        with self._lock:
+            self.graph.set_ef(ef)
+            try:
+                labels, dists = self.graph.knn_query(q, k=top_k, filter=filt)
+            except RuntimeError:
+                # hnswlib raises when the walk finds fewer than k matches (tight filter, small ef)
+                labels, dists = self._partial(q, top_k, filt)
+        ms = (time.perf_counter() - t0) * 1000
+        rows = [int(i) for i in labels[0]]
+        with self._lock:
+            self.queries += 1
+            self.filtered += filt is not None
+            self.short += len(rows) < top_k
+            self.search_ms += ms
+            self.ef_used[ef] = self.ef_used.get(ef, 0) + 1
+        return rows, [float(d) for d in dists[0]], {"ef": ef, "search_ms": round(ms, 3)}
+
+    def _partial(self, q: np.ndarray, top_k: int, filt) -> Tuple[np.ndarray, np.ndarray]:
+        for k in range(top_k - 1, 0, -1):
+            try:
+                return self.graph.knn_query(q, k=k, filter=filt)
+            except RuntimeError:
+                continue
+        return np.zeros((1, 0), dtype=np.int64), np.zeros((1, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.queries
+            return {
+                "vectors": len(self.ids),
+                "M": self.config.get("M"),
+                "construction_ef": self.config.get("construction_ef"),
+                "default_ef": self.default_ef,
+                "tuned_recall": self.config.get("recall"),
+                "act_ef": len(self.act_ef),
+                "queries": n,
+                "filtered": self.filtered,
+                "short_results": self.short,
+                "search_ms_avg": round(self.search_ms / n, 3) if n else 0.0,
+                "ef_used": {str(k): v for k, v in sorted(self.ef_used.items())},
+            }
+
+
+class HnswCollection:
+    """Chroma-shaped wrapper: vector search from the HnswIndex, documents and metadata
+    from the wrapped collection by id."""
+
+    accepts_ef = True   # retrieve_dense passes the request's search_ef through
+
+    def __init__(self, base, index: HnswIndex):
+        self.base = base
+        self.index = index
+        self.name = getattr(base, "name", "")
+        self.metadata = getattr(base, "metadata", None) or {}
+        self.space = index.config.get("space", "cosine")   # the graph's metric, not the base collection's
+
+    def count(self) -> int:
+        return self.base.count()
+
+    def get(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.base.get(*args, **kwargs)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None, ef: Optional[int] = None) -> Dict[str, Any]:
+        """Result has Chroma's shape plus "hnsw" = {ef, search_ms, fetch_ms}."""
+        include = list(include or ["documents", "metadatas", "distances"])
+        acts = _acts_in_where(where)
+        fields = [k for k in ("documents", "metadatas", "embeddings") if k in include]
+        out: Dict[str, Any] = {"ids": [], "distances": []}
+        for k in fields:
+            out[k] = []
+        for q in query_embeddings:
+            rows, dists, info = self.index.search(q, n_results, acts, ef)
+            ids = [self.index.ids[r] for r in rows]
+            t0 = time.perf_counter()
+            found: Dict[str, Dict[str, Any]] = {}
+            if ids and fields:
+                res = self.base.get(ids=ids, include=fields)
+                for j, doc_id in enumerate(res.get("ids") or []):
+                    found[doc_id] = {k: res[k][j] for k in fields if res.get(k) is not None and j < len(res[k])}
+            info["fetch_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+            out["ids"].append(ids)
+            out["distances"].append(dists)
+            for k in fields:
+                out[k].append([found.get(i, {}).get(k) for i in ids])
+            out["hnsw"] = info
+        return out
@@ -0,0 +1,298 @@
+# hybridFusion.py
+# Array-indexed corpus and vectorized score fusion for the notebook's hybrid retriever
+# (retrieve_top6_for_question_T6: dense + BM25(doc) + BM25(heading) -> Act gating ->
+# cross-encoder -> priors -> per-section de-dup).
+#
+# The notebook used to look every candidate up with id2.loc[_id, ...], fuse scores in
+# defaultdict loops and re-run the heading regexes / tokenizer per candidate per request.
+# HybridCorpus turns the corpus into integer rows once at load: Act and section codes,
+# per-heading prior flags and an inverted index of heading tokens. HybridFusion then works
+# on row arrays only: min-max with numpy, fusion and Act mass with np.bincount, priors
+# as masked array arithmetic. The rankings are the same as the loop version (see
+# benchFusion.py): same float operations in the same order, and stable sorts keep the
+# dict-insertion tie order.
+import re
+import time
+import bisect
+from typing import List, Dict, Any, Optional, Tuple, Callable, Sequence
+
+import numpy as np
+
+DEAD_HEAD_RE  = re.compile(r"\b(spent|repealed|revoked|deleted)\b|\[\s*spent\s*\]", re.I)
+INTERP_RE     = re.compile(r"\binterpretation\b", re.I)
+NUM_RE        = re.compile(r"\d+")
+SPLIT_RE      = re.compile(r"\W+")
+
+PHRASE_CACHE_SIZE = 20000
+
+SALIENT_TERMS = [
+    "equality", "non-discrimination", "discrimination", "privacy", "consent",
+    "detention", "expression", "housing", "health", "education", "water",
+    "termination", "unfair termination", "redundancy", "dismissal",
+    "children", "bail", "arrest", "data", "lawful processing", "principles of data protection"
+]
+
+
+def tokenize(text: str) -> List[str]:
+    return [x for x in SPLIT_RE.split((text or "").lower()) if x]
+
+
+def minmax(x) -> np.ndarray:
+    """Vector version of the notebook's _minmax (all zeros when max <= min)."""
+    x = np.asarray(x, dtype=np.float64)
+    if not len(x):
+        return x
+    mn, mx = x.min(), x.max()
+    if mx <= mn:
+        return np.zeros(len(x))
+    with np.errstate(invalid="ignore"):
+        return (x - mn) / (mx - mn)
+
+
+def _codes(values: List[str]) -> Tuple[List[str], np.ndarray]:
+    """(distinct values in first-seen order, int32 code per value)."""
+    index: Dict[str, int] = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=len(values))
+    return list(index), codes
+
+
+class HybridCorpus:
+    def __init__(self, ids: Sequence[str], docs: Sequence[str], headings: Sequence[str],
+                 acts: Sequence[str], section_nums: Sequence[str], salient_terms: Sequence[str] = SALIENT_TERMS):
+        t0 = time.perf_counter()
+        self.ids = list(ids)
+        self.row_of = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.docs = list(docs)
+        self.headings = [h or "" for h in headings]
+        self.section_nums = [str(s or "") for s in section_nums]
+        self.act_names, self.act_codes = _codes([str(a or "") for a in acts])
+        self.sec_names, self.sec_codes = _codes(self.section_nums)
+        self.sec_index = {s: i for i, s in enumerate(self.sec_names)}
+        self.sec_empty = np.array([not s for s in self.sec_names], dtype=bool)
+        self.salient_terms = list(salient_terms)
+
+        # Heading-only parts of the priors, once per distinct heading
+        heads, self.head_codes = _codes([h.lower() for h in self.headings])
+        self.head_lower = heads
+        self.head_salient = np.array([any(t in h for t in self.salient_terms) for h in heads], dtype=bool)
+        self.head_dead = np.array([bool(DEAD_HEAD_RE.search(h)) for h in heads], dtype=bool)
+        self.head_interp = np.array([bool(INTERP_RE.search(h)) for h in heads], dtype=bool)
+
+        # Inverted index token -> distinct headings containing it (CSR over the token vocabulary)
+        self.vocab: Dict[str, int] = {}
+        postings: List[List[int]] = []
+        lens: List[int] = []
+        for h_code, h in enumerate(heads):
+            toks = set(tokenize(h))
+            lens.append(len(toks))
+            for t in toks:
+                t_id = self.vocab.setdefault(t, len(self.vocab))
+                if t_id == len(postings):
+                    postings.append([])
+                postings[t_id].append(h_code)
+        self.post_ptr = np.cumsum([0] + [len(p) for p in postings]).astype(np.int64)
+        self.post_heads = np.asarray([h for p in postings for h in p], dtype=np.int32)
+        self.head_ntok = np.asarray(lens, dtype=np.int32)
+        self._head_text = "\n".join(heads)
+        self._head_ends = np.cumsum([len(h) + 1 for h in heads]).tolist()
+        self._phrase_cache: Dict[str, np.ndarray] = {}
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 2)
+
+    @classmethod
+    def from_df(cls, df, **kwargs) -> "HybridCorpus":
+        """From the notebook's corpus_df (id, doc, heading, act, section_num)."""
+        return cls(df["id"].tolist(), df["doc"].tolist(), df["heading"].fillna("").tolist(),
+                   df["act"].tolist(), df["section_num"].fillna("").tolist(), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, ids: Sequence[str]) -> np.ndarray:
+        """Chroma ids -> row numbers. The corpus is loaded from the same collection, so every id is known."""
+        row_of = self.row_of
+        return np.fromiter((row_of[i] for i in ids), dtype=np.int64, count=len(ids))
+
+    # ---------- priors ----------
+    def heading_prior(self, q: str, rows: np.ndarray, pos: float, neg: float, interp: float) -> np.ndarray:
+        ql = (q or "").lower()
+        q_salient = any(t in ql for t in self.salient_terms)
+        hc = self.head_codes[rows]
+        out = np.where(self.head_interp[hc], interp, 0.0)
+        out = np.where(self.head_dead[hc], neg, out)
+        if q_salient:
+            out = np.where(self.head_salient[hc], pos, out)
+        return out
+
+    def overlap_prior(self, q: str, rows: np.ndarray) -> np.ndarray:
+        qtokens = tokenize(q)
+        qt = set(qtokens)
+        out = np.zeros(len(rows))
+        if not qt or not len(rows):
+            return out
+        # Work per distinct heading among the candidates, then broadcast back
+        hc = self.head_codes[rows]
+        present = np.zeros(len(self.head_lower), dtype=bool)
+        present[hc] = True
+        uniq = np.flatnonzero(present)
+        pos = np.empty(len(self.head_lower), dtype=np.int64)
+        pos[uniq] = np.arange(len(uniq))
+        inv = pos[hc]
+        lens = self.head_ntok[uniq]
+        # |q tokens & heading tokens| from the postings of the query tokens only
+        counts = np.zeros(len(self.head_lower))
+        for t in qt:
+            t_id = self.vocab.get(t)
+            if t_id is not None:
+                counts[self.post_heads[self.post_ptr[t_id]:self.post_ptr[t_id + 1]]] += 1
+        inter = counts[uniq]
+        union = lens + len(qt) - inter
+        bonus = np.minimum(0.05, 0.30 * (inter / np.maximum(1, union)))
+
+        phrases = {" ".join(p) for p in zip(qtokens, qtokens[1:])}
+        if phrases:
+            has_phrase = np.zeros(len(self.head_lower), dtype=bool)
+            for p in phrases:
+                has_phrase[self.phrase_heads(p)] = True
+            bonus = np.where(has_phrase[uniq], bonus + 0.02, bonus)
+        bonus = np.minimum(bonus, 0.07)
+        bonus[lens == 0] = 0.0
+        return bonus[inv]
+
+    def phrase_heads(self, phrase: str) -> np.ndarray:
+        """Codes of the distinct headings containing phrase as a substring (cached per phrase).
+        Query bigrams repeat a lot ("of the", "right to"), so most lookups skip the scan."""
+        hit = self._phrase_cache.get(phrase)
+        if hit is not None:
+            return hit
+        # One str.find pass over all headings joined by "\n" (phrases never contain it)
+        text, ends = self._head_text, self._head_ends
+        found: List[int] = []
+        i = text.find(phrase)
+        while i >= 0:
+            k = bisect.bisect_right(ends, i)
+            found.append(k)
+            i = text.find(phrase, ends[k])
+        hit = np.asarray(found, dtype=np.int64)
+        if len(self._phrase_cache) >= PHRASE_CACHE_SIZE:
+            self._phrase_cache.clear()
+        self._phrase_cache[phrase] = hit
+        return hit
+
+    def section_num_bonus(self, q: str, rows: np.ndarray, bonus: float = 0.03) -> np.ndarray:
+        q_codes = [self.sec_index[n] for n in set(NUM_RE.findall(q or "")) if n in self.sec_index]
+        if not q_codes:
+            return np.zeros(len(rows))
+        return np.where(np.isin(self.sec_codes[rows], q_codes), bonus, 0.0)
+
+
+class HybridFusion:
+    def __init__(self, corpus: HybridCorpus, w_dense: float = 0.30, w_bm25_doc: float = 0.35,
+                 w_bm25_head: float = 0.35, alpha: float = 0.80, act_beta: float = 0.05,
+                 gating_k: int = 3, conf_min: float = 0.55, topk_ce: int = 400, topk_final: int = 6,
+                 heading_pos: float = 0.05, heading_neg: float = -0.05, interp_prior: float = -0.03):
+        self.corpus = corpus
+        self.w_dense = w_dense
+        self.w_bm25_doc = w_bm25_doc
+        self.w_bm25_head = w_bm25_head
+        self.alpha = alpha
+        self.act_beta = act_beta
+        self.gating_k = gating_k
+        self.conf_min = conf_min
+        self.topk_ce = topk_ce
+        self.topk_final = topk_final
+        self.heading_pos = heading_pos
+        self.heading_neg = heading_neg
+        self.interp_prior = interp_prior
+
+    def early_fusion(self, d_rows, d_dists, bd_rows, bd_scs, bh_rows, bh_scs) -> Tuple[np.ndarray, np.ndarray]:
+        """(candidate rows, fused scores), best first; ties keep first-seen order (dense, doc, heading)."""
+        n = len(self.corpus)
+        pools = [(np.asarray(d_rows, dtype=np.int64), self.w_dense * minmax(-np.asarray(d_dists, dtype=np.float64))),
+                 (np.asarray(bd_rows, dtype=np.int64), self.w_bm25_doc * minmax(bd_scs)),
+                 (np.asarray(bh_rows, dtype=np.int64), self.w_bm25_head * minmax(bh_scs))]
+        fused = np.zeros(n)
+        seen = np.zeros(n, dtype=bool)
+        new_rows = []
+        for rows, w in pools:
+            fused += np.bincount(rows, weights=w, minlength=n)
+            # Rows this pool adds, in pool order (a pool never repeats a row)
+            new_rows.append(rows[~seen[rows]])
+            seen[rows] = True
+        cand = np.concatenate(new_rows)
+        scores = fused[cand]
+        order = np.argsort(-scores, kind="stable")
+        return cand[order], scores[order]
+
+    def act_gate(self, cand: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(gated rows, Act share per Act code) - gating keeps the top Acts by fused mass when confident."""
+        codes = self.corpus.act_codes[cand]
+        n_acts = len(self.corpus.act_names)
+        mass = np.bincount(codes, weights=scores, minlength=n_acts)
+        total = float(np.cumsum(scores)[-1]) if len(scores) else 0.0
+        share_map = mass / total if total > 0 else np.zeros(n_acts)
+
+        first = np.full(n_acts, len(codes))
+        np.minimum.at(first, codes, np.arange(len(codes)))
+        seen = np.flatnonzero(first < len(codes))
+        seen = seen[np.argsort(first[seen], kind="stable")]      # Acts in first-seen order
+        ranked = seen[np.argsort(-mass[seen], kind="stable")]
+        share = mass[ranked[0]] / total if (len(ranked) and total > 0) else 0.0
+        top = [c for c in ranked[:self.gating_k] if self.corpus.act_names[c]]
+        if share >= self.conf_min and top:
+            return cand[np.isin(codes, top)][:self.topk_ce], share_map
+        return cand[:self.topk_ce], share_map
+
+    def final_scores(self, q: str, gated: np.ndarray, ce_scores, d_rows, d_dists,
+                     share_map: np.ndarray) -> np.ndarray:
+        c = self.corpus
+        ce_norm = minmax(ce_scores)
+        dense = np.full(len(c), -np.inf)
+        dense[np.asarray(d_rows, dtype=np.int64)] = -np.asarray(d_dists, dtype=np.float64)
+        dense_norm = minmax(dense[gated])
+        return (self.alpha * ce_norm + (1.0 - self.alpha) * dense_norm
+                + c.heading_prior(q, gated, self.heading_pos, self.heading_neg, self.interp_prior)
+                + c.overlap_prior(q, gated)
+                + self.act_beta * share_map[c.act_codes[gated]]
+                + c.section_num_bonus(q, gated))
+
+    def select(self, gated: np.ndarray, scores: np.ndarray) -> List[int]:
+        """Best row per section number, topped up with the next best rows if there are too few sections."""
+        order = gated[np.argsort(-scores, kind="stable")]
+        c = self.corpus
+        seen, top = set(), []
+        for r in order:
+            s = c.sec_codes[r]
+            if not c.sec_empty[s] and s in seen:
+                continue
+            seen.add(s)
+            top.append(int(r))
+            if len(top) >= self.topk_final:
+                break
+        if len(top) < self.topk_final:
+            for r in order:
+                if int(r) not in top:
+                    top.append(int(r))
+                if len(top) >= self.topk_final:
+                    break
+        return top
+
+    def rank(self, q: str, d_rows, d_dists, bd_rows, bd_scs, bh_rows, bh_scs,
+             ce_fn: Callable[[List[Tuple[str, str]]], Sequence[float]],
+             timings: Optional[Dict[str, Any]] = None) -> List[int]:
+        """Top rows for q. ce_fn scores (query, doc) pairs (the cross-encoder's predict)."""
+        t0 = time.perf_counter()
+        cand, fused = self.early_fusion(d_rows, d_dists, bd_rows, bd_scs, bh_rows, bh_scs)
+        gated, share_map = self.act_gate(cand, fused)
+        t1 = time.perf_counter()
+        docs = self.corpus.docs
+        ce_scores = ce_fn([(q, docs[r]) for r in gated])
+        t2 = time.perf_counter()
+        scores = self.final_scores(q, gated, ce_scores, d_rows, d_dists, share_map)
+        top = self.select(gated, scores)
+        t3 = time.perf_counter()
+        if timings is not None:
+            timings["candidates"] = int(len(cand))
+            timings["gated"] = int(len(gated))
+            timings["fusion_ms"] = round(((t1 - t0) + (t3 - t2)) * 1000, 3)
+            timings["ce_ms"] = round((t2 - t1) * 1000, 3)
+        return top
@@ -0,0 +1,243 @@
+# indexVersions.py
+# Blue/green index versions: load a new collection next to the live one, smoke-test it,
+# swap it in, and roll back.
+#
+# The API used to bind one collection (COLLECTION_NAME) at import, so a re-chunked or
+# re-embedded corpus meant stopping the server. An IndexVersion holds a collection with
+# everything derived from it: corpus version, citation index, doc store, and the query
+# embedder it was built with. app.py loads and validates a candidate off the request path,
+# then swaps it in by rebinding one reference. Requests keep the version they started on,
+# so in-flight requests finish on the old one. The retired version stays loaded for an
+# instant rollback. A small pointer file (INDEX_POINTER_FILE) names the active version: an
+# admin call rewrites it, and every worker process picks it up with watch(), also after a
+# restart. run_build() runs an index build (createEmbeddings.py) in the background.
+import csv
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable
+
+
+class IndexVersion:
+    """One loaded index. Fields derived from the chunks are filled by app.load_corpus_state()."""
+
+    def __init__(self, name: str, path: str, collection, embedder, embed_model: str):
+        self.name = name
+        self.path = path
+        self.collection = collection
+        self.embedder = embedder
+        self.embed_model = embed_model
+        self.corpus_version = ""
+        self.citation_index = None
+        self.doc_store = None
+        self.clause_index = None
+        self.act_router = None
+        self.loaded_at = time.time()
+        self.activated_at: Optional[float] = None
+        self.smoke: Optional[Dict[str, Any]] = None
+
+    def spec(self) -> Dict[str, Any]:
+        return {"name": self.name, "path": self.path, "model": self.embed_model}
+
+    def matches(self, spec: Dict[str, Any]) -> bool:
+        return (spec.get("name") == self.name
+                and os.path.abspath(spec.get("path") or self.path) == os.path.abspath(self.path)
+                and (spec.get("model") or self.embed_model) == self.embed_model)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.corpus_version,
+            "path": self.path,
+            "embed_model": self.embed_model,
+            "loaded_at": round(self.loaded_at, 3),
+            "activated_at": round(self.activated_at, 3) if self.activated_at else None,
+            "smoke": self.smoke,
+        }
+
+
+def load_smoke_questions(path: str, limit: int) -> List[Dict[str, str]]:
+    """(question, act) pairs from an evaluation CSV: question/Question + act/True_Act columns."""
+    if not path or not os.path.exists(path):
+        return []
+    out = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            q = (row.get("question") or row.get("Question") or "").strip()
+            act = (row.get("act") or row.get("True_Act") or "").strip()
+            if q and act:
+                out.append({"question": q, "act": act})
+            if len(out) >= limit:
+                break
+    return out
+
+
+def smoke_test(search: Callable[[str], List[str]], questions: List[Dict[str, str]]) -> Dict[str, Any]:
+    """search(question) -> Acts of the top results. Reports how often the expected Act is among them."""
+    hits = errors = 0
+    times: List[float] = []
+    for q in questions:
+        t0 = time.perf_counter()
+        try:
+            acts = {a.strip().lower() for a in search(q["question"]) if a}
+        except Exception:
+            if not errors:
+                logging.exception(f"[INDEX] Smoke query failed: {q['question']!r}")
+            errors += 1
+            continue
+        times.append((time.perf_counter() - t0) * 1000)
+        hits += q["act"].lower() in acts
+    times.sort()
+    n = len(questions)
+    return {
+        "questions": n,
+        "act_hit_rate": round(hits / n, 4) if n else None,
+        "errors": errors,
+        "p50_ms": round(times[len(times) // 2], 2) if times else None,
+    }
+
+
+class IndexManager:
+    def __init__(self, pointer_path: str = "", history: int = 20):
+        self.pointer_path = pointer_path
+        self.active: Optional[IndexVersion] = None
+        self.previous: Optional[IndexVersion] = None
+        self.swap_lock = threading.RLock()   # one load / swap at a time; requests never take it
+        self.build: Optional[Dict[str, Any]] = None
+        self.events: deque = deque(maxlen=history)
+        self.swaps = 0
+        self.rollbacks = 0
+        self.rejected = 0
+        self._pointer_mtime: Optional[float] = None
+        self._watcher_pid: Optional[int] = None
+        self._watch_lock = threading.Lock()
+
+    def record(self, event: str, **info):
+        self.events.append({"at": round(time.time(), 3), "event": event, **info})
+
+    def activate(self, ix: IndexVersion, rollback: bool = False):
+        """Make ix the active version; the one it replaces is kept for rollback."""
+        ix.activated_at = time.time()
+        if self.active is not None and self.active is not ix:
+            self.previous = self.active
+        self.active = ix
+        if self.previous is ix:
+            self.previous = None
+        if rollback:
+            self.rollbacks += 1
+        elif self.previous is not None:
+            self.swaps += 1
+        self.record("rollback" if rollback else "activate", name=ix.name, version=ix.corpus_version)
+
+    def reset(self):
+        """Forget loaded versions: after fork they hold the parent's Chroma handles. Rollback then
+        reopens the previous version from the pointer file."""
+        self.active = None
+        self.previous = None
+
+    # ---------- pointer file ----------
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.pointer_path) if self.pointer_path else None
+        except OSError:
+            return None
+
+    def read_pointer(self) -> Optional[Dict[str, Any]]:
+        if not self.pointer_path or not os.path.exists(self.pointer_path):
+            return None
+        try:
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return spec if isinstance(spec, dict) and spec.get("name") else None
+
+    def write_pointer(self, spec: Dict[str, Any]):
+        """Atomically replace the pointer file, so readers see the old or the new one, never half of it."""
+        if not self.pointer_path:
+            return
+        tmp = f"{self.pointer_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**spec, "updated_at": round(time.time(), 3)}, f, indent=2)
+        os.replace(tmp, self.pointer_path)
+        self._pointer_mtime = self._mtime()
+
+    def watch(self, interval_s: float, on_change: Callable[[Dict[str, Any]], None]):
+        """Poll the pointer file from a daemon thread (one per process) and call on_change(spec) when it changes."""
+        if not self.pointer_path or interval_s <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._watch_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            self._pointer_mtime = self._mtime()
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                mtime = self._mtime()
+                if mtime is None or mtime == self._pointer_mtime:
+                    continue
+                self._pointer_mtime = mtime
+                spec = self.read_pointer()
+                if spec is None or (self.active is not None and self.active.matches(spec)):
+                    continue
+                try:
+                    on_change(spec)
+                except Exception:
+                    logging.exception(f"[INDEX] Could not switch to {spec.get('name')!r} from the pointer file")
+
+        threading.Thread(target=loop, name="uhaki-index-watch", daemon=True).start()
+
+    # ---------- background builds ----------
+    def run_build(self, name: str, cmd: List[str], cwd: str, env: Dict[str, str], log_path: str,
+                  then: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+        """Start cmd in the background (None if a build is already running); then(build) runs once it succeeds."""
+        with self.swap_lock:
+            if self.build is not None and self.build["state"] == "running":
+                return None
+            self.build = {"name": name, "state": "running", "started_at": round(time.time(), 3),
+                          "finished_at": None, "returncode": None, "log": log_path}
+            build = self.build
+        self.record("build_started", name=name)
+
+        def run():
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            try:
+                with open(log_path, "w", encoding="utf-8") as log:
+                    rc = subprocess.run(cmd, cwd=cwd, env={**os.environ, **env},
+                                        stdout=log, stderr=subprocess.STDOUT).returncode
+            except Exception:
+                logging.exception(f"[INDEX] Build {name!r} could not start")
+                rc = -1
+            build["returncode"] = rc
+            build["finished_at"] = round(time.time(), 3)
+            build["state"] = "built" if rc == 0 else "failed"
+            self.record(f"build_{build['state']}", name=name, returncode=rc)
+            logging.info(f"[INDEX] Build {name!r} {build['state']} (rc={rc}); log: {log_path}")
+            if rc == 0 and then is not None:
+                try:
+                    then(build)
+                except Exception as e:
+                    logging.exception(f"[INDEX] Post-build step for {name!r} failed")
+                    build["state"] = "failed"
+                    self.record("build_failed", name=name, error=str(e))
+
+        threading.Thread(target=run, name="uhaki-index-build", daemon=True).start()
+        return build
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "active": self.active.describe() if self.active is not None else None,
+            "previous": self.previous.describe() if self.previous is not None else None,
+            "pointer_file": self.pointer_path or None,
+            "build": dict(self.build) if self.build is not None else None,
+            "swaps": self.swaps,
+            "rollbacks": self.rollbacks,
+            "rejected": self.rejected,
+            "events": list(self.events),
+        }
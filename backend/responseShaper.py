@@ -0,0 +1,189 @@
+# responseShaper.py
+# Field selection, serialization and compression of /askQuery responses.
+#
+# With include_context on, every top chunk's text went out twice, once in top_results and
+# again inside the packed context, through Flask's stdlib jsonify and uncompressed. On a
+# phone the payload, not the pipeline, was most of the wait. shape() cuts a body down to
+# what the client asked for: top_results without text, ids only, or text cut to a snippet,
+# and the context as references to top_results ("refs") instead of a second copy. Bodies
+# are shaped last, per request, so the semantic cache and coalesced requests keep the full
+# answer. ResponseEncoder serializes with orjson when it is installed and compresses with
+# brotli or gzip, whichever the client accepts, and counts bytes saved and time spent. The
+# unshaped size is estimated from the text shaping removed, not by serializing the body twice.
+import gzip
+import json
+import time
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:   # stdlib json, same output shape
+    orjson = None
+try:
+    import brotli
+except ImportError:   # gzip only
+    brotli = None
+
+FIELDS          = ("full", "no_text", "ids")
+CONTEXT_FORMATS = ("text", "refs")
+ELLIPSIS        = "…"
+GZIP_LEVEL      = 5
+BROTLI_QUALITY  = 5   # dynamic content: 4-6 is where brotli beats gzip at similar cost
+
+
+def _shape_result(r: Dict[str, Any], fields: str, snippet_chars: int) -> Dict[str, Any]:
+    if fields == "ids":
+        return {"id": r.get("id"), "act": r.get("act"), "section": r.get("section")}
+    out = dict(r)
+    if fields == "no_text":
+        out.pop("text", None)
+    elif snippet_chars and len(out.get("text") or "") > snippet_chars:
+        out["text"] = out["text"][:snippet_chars].rstrip() + ELLIPSIS
+    return out
+
+
+def shape(body: Dict[str, Any], fields: str = "full", snippet_chars: int = 0,
+          context_format: str = "text") -> Dict[str, Any]:
+    """A shaped copy of an /askQuery body; the body itself (possibly cached or shared) is not modified."""
+    if "request_id" not in body:
+        return body   # an error body
+    out = dict(body)
+    layout = None
+    if "layout" in (out.get("context_stats") or {}):
+        out["context_stats"] = dict(out["context_stats"])
+        layout = out["context_stats"].pop("layout")
+
+    if context_format == "refs" and "context" in out:
+        # passage i of the context = the texts of top_results[results] (overlap not removed)
+        del out["context"]
+        out["context_refs"] = layout or []
+    if out.get("top_results") and (fields != "full" or snippet_chars):
+        out["top_results"] = [_shape_result(r, fields, snippet_chars) for r in out["top_results"]]
+    return out
+
+
+def removed_bytes(full: Dict[str, Any], shaped: Dict[str, Any]) -> int:
+    """
+    About how many bytes shape() took out of `full`: the context text and the chunk text dropped
+    or cut. Scores and metadata dropped by fields="ids" are not counted (a few dozen bytes a row).
+    """
+    if shaped is full:
+        return 0
+    n = 0
+    if "context" in full and "context" not in shaped:
+        n += len((full["context"] or "").encode("utf-8"))
+    for before, after in zip(full.get("top_results") or [], shaped.get("top_results") or []):
+        if before is not after:
+            n += len((before.get("text") or "").encode("utf-8")) - len((after.get("text") or "").encode("utf-8"))
+    return max(0, n)
+
+
+def _dumps_stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" or "gzip" from an Accept-Encoding header (q=0 means refused), else None."""
+    offered = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    for enc in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if offered.get(enc, offered.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+class ResponseEncoder:
+    def __init__(self, fast_json: bool = True, compression: bool = True, min_bytes: int = 1024):
+        self.fast_json = fast_json and orjson is not None
+        self.compression = compression
+        self.min_bytes = max(0, min_bytes)
+
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.bytes_full = 0
+        self.bytes_json = 0
+        self.bytes_sent = 0
+        self.serialize_ms = 0.0
+        self.compress_ms = 0.0
+        self.encodings: Dict[str, int] = {"identity": 0, "gzip": 0, "br": 0}
+
+    def dumps(self, obj: Any) -> bytes:
+        if self.fast_json:
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass   # something orjson won't take; the stdlib path stringifies it
+        return _dumps_stdlib(obj)
+
+    def encode(self, body: Dict[str, Any], removed: int = 0,
+               accept_encoding: str = "") -> Tuple[bytes, Dict[str, str], Dict[str, Any]]:
+        """
+        body -> (bytes to send, headers, info). `removed` is what shaping took out of the body
+        (removed_bytes()); the unshaped size is reported as the shaped size plus that.
+        """
+        t0 = time.perf_counter()
+        data = self.dumps(body)
+        serialize_ms = (time.perf_counter() - t0) * 1000
+        n_json = len(data)
+        n_full = n_json + max(0, removed)
+
+        headers = {"Content-Type": "application/json", "Vary": "Accept-Encoding"}
+        encoding = accepted_encoding(accept_encoding) if self.compression and n_json >= self.min_bytes else None
+        compress_ms = 0.0
+        if encoding is not None:
+            t1 = time.perf_counter()
+            if encoding == "br":
+                data = brotli.compress(data, quality=BROTLI_QUALITY)
+            else:
+                data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+            compress_ms = (time.perf_counter() - t1) * 1000
+            headers["Content-Encoding"] = encoding
+
+        info = {
+            "bytes_full": n_full,
+            "bytes_json": n_json,
+            "bytes_sent": len(data),
+            "bytes_saved": n_full - len(data),
+            "encoding": encoding or "identity",
+            "serialize_ms": round(serialize_ms, 3),
+            "compress_ms": round(compress_ms, 3),
+        }
+        headers["Server-Timing"] = f"serialize;dur={info['serialize_ms']}, compress;dur={info['compress_ms']}"
+        headers["X-Payload-Bytes"] = f"full={n_full}, shaped={n_json}, sent={len(data)}"
+
+        with self._lock:
+            self.responses += 1
+            self.bytes_full += n_full
+            self.bytes_json += n_json
+            self.bytes_sent += len(data)
+            self.serialize_ms += serialize_ms
+            self.compress_ms += compress_ms
+            self.encodings[info["encoding"]] += 1
+        return data, headers, info
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.responses
+            saved = self.bytes_full - self.bytes_sent
+            return {
+                "json": "orjson" if self.fast_json else "json",
+                "compression": ((["br"] if brotli is not None else []) + ["gzip"]) if self.compression else [],
+                "responses": n,
+                "encodings": dict(self.encodings),
+                "bytes_full": self.bytes_full,
+                "bytes_sent": self.bytes_sent,
+                "bytes_saved_by_shaping": self.bytes_full - self.bytes_json,
+                "bytes_saved": saved,
+                "saved_rate": round(saved / self.bytes_full, 4) if self.bytes_full else 0.0,
+                "serialize_ms_avg": round(self.serialize_ms / n, 3) if n else 0.0,
+                "compress_ms_avg": round(self.compress_ms / n, 3) if n else 0.0,
+            }
@@ -0,0 +1,142 @@
+# resultPages.py
+# Cursor pagination over a cached candidate pool.
+#
+# "Show more sources" used to mean asking again with a larger top_k_retrieve / top_k_return,
+# which re-ran the embed, the Chroma search and the cross-encoder over everything already
+# shown. Now a paginated /askQuery keeps its candidates: the reranked rows in the order
+# shown, plus a tail of dense candidates that have not been reranked yet. The response
+# carries an opaque cursor (pool id + offset). /askQuery/more pages through the ranked rows
+# and reranks the next batch of the tail only when a page reaches past them. Answers that
+# came from a cache or the generator have no local candidates; their pool starts with the
+# sources shown and runs one dense search the first time a page goes past them. Pools live
+# in this process only, bounded by count and by bytes (LRU), and expire after a TTL. An
+# unknown or expired cursor means the client asks the question again.
+import base64
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+ROW_OVERHEAD_BYTES = 512   # dict, ids, scores and metadata of one candidate, beyond its text
+
+
+def pool_bytes(pool: Dict[str, Any]) -> int:
+    """Rough memory held by a pool: candidate texts plus a fixed overhead per row."""
+    rows = pool["ranked"] + (pool["pending"] or [])
+    size = sum(len(r.get("text") or "") + ROW_OVERHEAD_BYTES for r in rows)
+    if pool.get("q_emb") is not None:
+        size += len(pool["q_emb"]) * 8
+    return size
+
+
+def encode_cursor(pool_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{pool_id}.{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        pool_id, offset = raw.rsplit(".", 1)
+        return pool_id, max(0, int(offset))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class CursorStore:
+    def __init__(self, max_pools: int = 256, max_bytes: int = 64 * 2 ** 20, ttl_s: float = 900.0):
+        self.max_pools = max(1, int(max_pools))
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+
+        self._lock = threading.Lock()
+        self._pools: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()   # LRU order
+        self.bytes = 0
+
+        self.created = 0
+        self.pages = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.lazy_reranks = 0
+        self.lazy_searches = 0
+        self.rerank_ms = 0.0
+
+    # ---------- internals (call with the lock held) ----------
+    def _drop(self, pool_id: str):
+        pool = self._pools.pop(pool_id, None)
+        if pool is not None:
+            self.bytes -= pool["bytes"]
+
+    def _evict(self):
+        while self._pools and (len(self._pools) > self.max_pools or self.bytes > self.max_bytes):
+            self._drop(next(iter(self._pools)))
+            self.evictions += 1
+
+    # ---------- public API ----------
+    def put(self, pool: Dict[str, Any]) -> str:
+        """Store a pool ({query, ranked, pending, ...}) and return its id."""
+        pool_id = secrets.token_urlsafe(9)
+        pool.update(lock=threading.Lock(), created_at=time.time(), bytes=pool_bytes(pool))
+        with self._lock:
+            self.created += 1
+            if pool["bytes"] > self.max_bytes:
+                self.evictions += 1   # larger than the whole budget: its cursor just misses
+                return pool_id
+            self._pools[pool_id] = pool
+            self.bytes += pool["bytes"]
+            self._evict()
+        return pool_id
+
+    def get(self, cursor: str) -> Optional[Tuple[str, Dict[str, Any], int]]:
+        """(pool id, pool, offset) for a live cursor, else None."""
+        parsed = decode_cursor(cursor or "")
+        with self._lock:
+            pool = self._pools.get(parsed[0]) if parsed else None
+            if pool is None:
+                self.misses += 1
+                return None
+            if time.time() - pool["created_at"] > self.ttl_s:
+                self._drop(parsed[0])
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._pools.move_to_end(parsed[0])
+            self.pages += 1
+            return parsed[0], pool, parsed[1]
+
+    def resized(self, pool_id: str):
+        """Re-measure a pool after it grew (a lazy search filled its tail)."""
+        with self._lock:
+            pool = self._pools.get(pool_id)
+            if pool is None:
+                return
+            new = pool_bytes(pool)
+            self.bytes += new - pool["bytes"]
+            pool["bytes"] = new
+            self._evict()
+
+    def observe(self, rerank_ms: float = 0.0, searched: bool = False):
+        with self._lock:
+            if rerank_ms:
+                self.lazy_reranks += 1
+                self.rerank_ms += rerank_ms
+            self.lazy_searches += searched
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pools": len(self._pools),
+                "max_pools": self.max_pools,
+                "mb": round(self.bytes / 2 ** 20, 2),
+                "max_mb": round(self.max_bytes / 2 ** 20, 2),
+                "ttl_s": self.ttl_s,
+                "created": self.created,
+                "pages": self.pages,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "lazy_reranks": self.lazy_reranks,
+                "lazy_rerank_ms_avg": round(self.rerank_ms / self.lazy_reranks, 2) if self.lazy_reranks else 0.0,
+                "lazy_searches": self.lazy_searches,
+            }
@@ -0,0 +1,133 @@
+# semanticCache.py
+# Near-duplicate query cache keyed on the (normalized) e5 query embedding.
+#
+# "When can authorities take a child away from their parents?" and "Can the state
+# remove my kids?" miss an exact-string cache but land on the same reranked sources
+# and, in proxy mode, the same multi-second generation. Entries are matched by cosine
+# similarity >= threshold within the same scope (act filter + top-k params, and the
+# Act the router ranks first when app.py has one), bounded
+# by size (LRU) and TTL, and dropped wholesale when the corpus version changes.
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int = 512, threshold: float = 0.93, ttl_s: float = 3600.0):
+        self.max_entries = max(1, int(max_entries))
+        self.threshold = float(threshold)
+        self.ttl_s = float(ttl_s)
+        self.corpus_version: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._vecs: Optional[np.ndarray] = None              # [max_entries, dim], rows are unit vectors
+        self._scope = np.full(self.max_entries, -1, dtype=np.int64)  # -1 = free slot
+        self._scope_ids: Dict[str, int] = {}
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # slot -> entry, LRU order
+        self._free: List[int] = list(range(self.max_entries - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    # ---------- internals (call with the lock held) ----------
+    def _scope_id(self, scope: str) -> int:
+        if scope not in self._scope_ids:
+            self._scope_ids[scope] = len(self._scope_ids)
+        return self._scope_ids[scope]
+
+    def _drop(self, slot: int):
+        self._entries.pop(slot, None)
+        self._scope[slot] = -1
+        self._free.append(slot)
+
+    def _check_version(self, corpus_version: str):
+        if self.corpus_version != corpus_version:
+            if self._entries:
+                self.invalidations += 1
+            for slot in list(self._entries):
+                self._drop(slot)
+            self._vecs = None   # a swapped-in index may embed queries with another model / size
+            self.corpus_version = corpus_version
+
+    # ---------- public API ----------
+    def lookup(self, q_emb, scope: str, corpus_version: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Returns (entry, similarity) for the closest live entry in scope, or None."""
+        q = np.asarray(q_emb, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._check_version(corpus_version)
+            sid = self._scope_ids.get(scope)
+            if sid is None or self._vecs is None or not self._entries:
+                self.misses += 1
+                return None
+            slots = np.flatnonzero(self._scope == sid)
+            if slots.size == 0:
+                self.misses += 1
+                return None
+            sims = self._vecs[slots] @ q
+            order = np.argsort(-sims)
+            for j in order:
+                sim = float(sims[j])
+                if sim < self.threshold:
+                    break
+                slot = int(slots[j])
+                entry = self._entries[slot]
+                if now - entry["stored_at"] > self.ttl_s:
+                    self._drop(slot)
+                    self.expired += 1
+                    continue
+                self._entries.move_to_end(slot)
+                entry["hits"] += 1
+                self.hits += 1
+                return entry, sim
+            self.misses += 1
+            return None
+
+    def store(self, q_emb, scope: str, corpus_version: str, query: str, payload: Dict[str, Any]):
+        q = np.asarray(q_emb, dtype=np.float32)
+        with self._lock:
+            self._check_version(corpus_version)
+            if self._vecs is None:
+                self._vecs = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+            if not self._free:
+                lru_slot = next(iter(self._entries))
+                self._drop(lru_slot)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._vecs[slot] = q
+            self._scope[slot] = self._scope_id(scope)
+            self._entries[slot] = {
+                "query": query,
+                "scope": scope,
+                "payload": payload,
+                "stored_at": time.time(),
+                "hits": 0,
+            }
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._drop(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_s": self.ttl_s,
+                "corpus_version": self.corpus_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "invalidations": self.invalidations,
+            }
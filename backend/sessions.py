@@ -0,0 +1,230 @@
+# sessions.py
+# Conversation sessions for multi-turn retrieval.
+#
+# ChatPage.js sent every message to /askQuery on its own, so a follow-up such as "what about
+# for employers?" ran a full retrieval with no idea what came before, and the generator never
+# saw the earlier turns. A request may now carry a session_id (the chat page makes one per
+# conversation). Its session keeps, in this process only:
+#   - the last few questions and answers (sent to the generator as history),
+#   - a conversation embedding: a decayed sum of the turns' query embeddings, updated with one
+#     vector per turn, so the history is never re-encoded,
+#   - the reranked candidates of recent turns with their embeddings (the session's pool).
+# A follow-up blends its query embedding with the conversation embedding and rescores the pool
+# with one matrix product. If enough pool candidates still score well, they are reranked in
+# place of a Chroma search. Otherwise (a new topic) the normal search runs with the blended
+# embedding. Sessions are bounded by count and by bytes (LRU) and expire after a TTL without a
+# turn. A session opened on another index version keeps its history but drops the embeddings.
+# The store is not shared between worker processes: under gunicorn with several workers a
+# conversation must be routed to one worker (sticky on session_id), or a follow-up that lands
+# on another worker silently starts an empty session (its response says "turn": 1).
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+ANSWER_CHARS = 1500        # answer text kept per turn for the generator's history
+ROW_OVERHEAD_BYTES = 512   # dict, ids, scores and metadata of one pool row, beyond its text and vector
+
+
+def unit(v: np.ndarray) -> np.ndarray:
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+
+class Session:
+    def __init__(self, session_id: str, max_turns: int, index_version: Optional[str]):
+        self.id = session_id
+        self.lock = threading.Lock()
+        self.turns: deque = deque(maxlen=max_turns)   # {query, answer, ts}
+        self.n_turns = 0
+        self.index_version = index_version
+        self.state: Optional[np.ndarray] = None       # decayed sum of query embeddings (not unit length)
+        self.rows: List[Dict[str, Any]] = []          # pool, most recent turn first
+        self.embs: Optional[np.ndarray] = None        # [len(rows), dim] float16, unit rows
+        self.last_used = time.time()
+        self.bytes = 0
+
+    def measure(self) -> int:
+        size = sum(len(r.get("text") or "") + ROW_OVERHEAD_BYTES for r in self.rows)
+        size += sum(len(t["query"]) + len(t["answer"] or "") for t in self.turns)
+        if self.embs is not None:
+            size += self.embs.nbytes
+        if self.state is not None:
+            size += self.state.nbytes
+        return size
+
+    def context_embedding(self, q_emb, weight: float) -> np.ndarray:
+        """The query embedding blended with the conversation's (unit length)."""
+        q = unit(np.asarray(q_emb, dtype=np.float32))
+        with self.lock:
+            if self.state is None or weight <= 0:
+                return q
+            return unit(q + weight * unit(self.state))
+
+    def rescore(self, emb, act: Optional[str], top_k: int) -> List[Dict[str, Any]]:
+        """The pool's best top_k rows for this embedding, as retrieve_dense shapes them."""
+        with self.lock:
+            if self.embs is None or not self.rows:
+                return []
+            rows, embs = self.rows, self.embs
+        scores = embs.astype(np.float32) @ np.asarray(emb, dtype=np.float32)
+        order = [i for i in np.argsort(-scores, kind="stable") if not act or rows[i].get("act") == act][:top_k]
+        out = []
+        for rank, i in enumerate(order):
+            row = {k: v for k, v in rows[i].items() if k not in ("rerank_score", "score", "rank_after", "score_after")}
+            row["dense_score"] = float(scores[i])
+            row["rank_before"] = rank + 1
+            row["score_before"] = round(row["dense_score"], 4)
+            out.append(row)
+        return out
+
+    def rerank_query(self, query: str, n: int) -> str:
+        """The query with the session's previous n questions before it, for the cross-encoder."""
+        with self.lock:
+            earlier = [t["query"] for t in list(self.turns)[-n:]] if n > 0 else []
+        return " ".join(earlier + [query])
+
+    def history(self, n: int) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [{"query": t["query"], "answer": t["answer"]} for t in list(self.turns)[-n:]] if n > 0 else []
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 512, max_bytes: int = 128 * 2 ** 20, ttl_s: float = 1800.0,
+                 max_turns: int = 6, pool_size: int = 36, decay: float = 0.5):
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self.max_turns = max(1, int(max_turns))
+        self.pool_size = max(0, int(pool_size))
+        self.decay = float(decay)
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()   # LRU order
+        self.bytes = 0
+
+        self.created = 0
+        self.resumed = 0
+        self.expired = 0
+        self.evictions = 0
+        self.resets = 0
+        self.turns = 0
+        self.pool_reused = 0
+        self.pool_missed = 0
+        self.rescore_ms = 0.0
+
+    # ---------- internals (call with the lock held) ----------
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.bytes -= session.bytes
+
+    def _evict(self):
+        while self._sessions and (len(self._sessions) > self.max_sessions or self.bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+
+    # ---------- public API ----------
+    def open(self, session_id: str, index_version: Optional[str]) -> Session:
+        """The live session with this id, or a new one (unknown, expired and evicted ids start over)."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_used > self.ttl_s:
+                self._drop(session_id)
+                self.expired += 1
+                session = None
+            if session is None:
+                session = Session(session_id, self.max_turns, index_version)
+                self._sessions[session_id] = session
+                self.created += 1
+            else:
+                self._sessions.move_to_end(session_id)
+                self.resumed += 1
+            session.last_used = now
+        if session.index_version != index_version:
+            with session.lock:
+                # Another index (maybe another embedder): the pool and the state no longer match it
+                session.state, session.rows, session.embs = None, [], None
+                session.index_version = index_version
+            with self._lock:
+                self.resets += 1
+        return session
+
+    def record(self, session: Session, query: str, answer: Optional[str], q_emb=None,
+               rows: Optional[List[Dict[str, Any]]] = None, embs: Optional[Dict[str, Any]] = None):
+        """
+        Add a turn. q_emb (if the request encoded the query) folds into the conversation embedding.
+        rows are the turn's ranked candidates; embs maps their ids to embeddings (rows already in
+        the pool keep theirs). They go to the front of the pool, older rows fill the rest.
+        """
+        embs = embs or {}
+        with session.lock:
+            session.turns.append({"query": query, "answer": (answer or "")[:ANSWER_CHARS] or None, "ts": time.time()})
+            session.n_turns += 1
+            if q_emb is not None:
+                q = unit(np.asarray(q_emb, dtype=np.float32))
+                session.state = q if session.state is None else self.decay * session.state + q
+            if rows and self.pool_size:
+                known = {r["id"]: i for i, r in enumerate(session.rows)}
+                new_rows, new_embs = [], []
+                for r in rows:
+                    rid = r.get("id")
+                    if rid in embs:
+                        vec = unit(np.asarray(embs[rid], dtype=np.float32))
+                    elif rid in known:
+                        vec = session.embs[known[rid]]
+                    else:
+                        continue   # e.g. a citation hit merged in without a dense search
+                    new_rows.append({k: v for k, v in r.items() if k != "embedding"})
+                    new_embs.append(vec)
+                    known.pop(rid, None)
+                for rid, i in sorted(known.items(), key=lambda x: x[1]):
+                    new_rows.append(session.rows[i])
+                    new_embs.append(session.embs[i])
+                new_rows, new_embs = new_rows[:self.pool_size], new_embs[:self.pool_size]
+                if new_rows:
+                    session.rows = new_rows
+                    session.embs = np.vstack(new_embs).astype(np.float16)
+            session.last_used = time.time()
+            size = session.measure()
+        with self._lock:
+            self.turns += 1
+            if self._sessions.get(session.id) is not session:
+                return   # evicted while this turn ran
+            self.bytes += size - session.bytes
+            session.bytes = size
+            self._evict()
+
+    def observe(self, reused: bool, rescore_ms: float):
+        with self._lock:
+            if reused:
+                self.pool_reused += 1
+            else:
+                self.pool_missed += 1
+            self.rescore_ms += rescore_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            follow_ups = self.pool_reused + self.pool_missed
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "mb": round(self.bytes / 2 ** 20, 2),
+                "max_mb": round(self.max_bytes / 2 ** 20, 2),
+                "ttl_s": self.ttl_s,
+                "created": self.created,
+                "resumed": self.resumed,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "index_resets": self.resets,
+                "turns": self.turns,
+                "pool_reused": self.pool_reused,
+                "pool_missed": self.pool_missed,
+                "pool_reuse_rate": round(self.pool_reused / follow_ups, 4) if follow_ups else None,
+                "rescore_ms_avg": round(self.rescore_ms / follow_ups, 3) if follow_ups else 0.0,
+            }
@@ -0,0 +1,191 @@
+# shadowIndex.py
+# Shadow retrieval: mirror a sample of live queries to a second collection built with a
+# candidate embedder, and log how its results compare with the live ones.
+#
+# A smaller embedder (e5-small, a MiniLM model) would cut embed_ms and the index size, but
+# an offline benchmark says little about real traffic. ShadowMirror takes a random
+# SHADOW_SAMPLE of /askQuery requests after the live retrieval has run. It queues the query
+# with the live dense results and timings, and a daemon thread replays it against the shadow
+# collection. The request never waits for it: a full queue drops the mirror. Each comparison
+# is appended as one JSON line: overlap@k, Spearman rank correlation over the union of both
+# lists, top-1 agreement, and embed / search time on both sides. shadowReport.py summarizes
+# the log. Chunk ids hash in the embedding model, so chunks are matched on act / section /
+# chunk_id instead.
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+# search(query, acts, k) -> (chunk keys, embed_ms, search_ms); acts is the live request's Act scope
+ShadowSearch = Callable[[str, Optional[List[str]], int], Tuple[List[str], float, float]]
+
+
+def chunk_key(meta: Dict[str, Any]) -> str:
+    """Identity of a chunk across collections (ids differ: they include the embedding model)."""
+    meta = meta or {}
+    return f"{meta.get('act') or ''}::{meta.get('section') or ''}::{meta.get('chunk_id') or 0}"
+
+
+def overlap_at_k(a: List[str], b: List[str], k: int) -> float:
+    k = min(k, max(len(a), len(b)))
+    if k == 0:
+        return 1.0
+    return len(set(a[:k]) & set(b[:k])) / k
+
+
+def rank_correlation(a: List[str], b: List[str], k: int) -> Optional[float]:
+    """Spearman's rho over the union of both top-k lists; a chunk missing from one list ranks k+1 there."""
+    a, b = a[:k], b[:k]
+    union = list(dict.fromkeys(a + b))
+    n = len(union)
+    if n < 2:
+        return 1.0 if n == 1 and a == b else None
+    ra = {x: i + 1 for i, x in enumerate(a)}
+    rb = {x: i + 1 for i, x in enumerate(b)}
+    xs = [ra.get(x, k + 1) for x in union]
+    ys = [rb.get(x, k + 1) for x in union]
+    mx, my = sum(xs) / n, sum(ys) / n
+    cov = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    vx = sum((x - mx) ** 2 for x in xs)
+    vy = sum((y - my) ** 2 for y in ys)
+    if vx == 0 or vy == 0:
+        return None
+    return cov / (vx * vy) ** 0.5
+
+
+class ShadowMirror:
+    """Mirrors sampled queries to the shadow index from one daemon thread per process."""
+
+    def __init__(self, open_search: Callable[[], Tuple[ShadowSearch, Dict[str, Any]]], sample: float,
+                 log_path: str, queue_size: int = 64, labels: Optional[Dict[str, Any]] = None):
+        # open_search() -> (search, labels it resolved); called in the mirror thread, so each worker opens its own handles
+        self.open_search = open_search
+        self.sample = sample
+        self.log_path = log_path
+        self.queue_size = queue_size
+        self.labels = dict(labels or {})  # written on every row: which models / collections were compared
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self._worker_pid: Optional[int] = None
+        self._search: Optional[ShadowSearch] = None
+        self._failed = False
+
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.mirrored = 0
+        self.dropped = 0
+        self.errors = 0
+        self.overlap_sum = 0.0
+        self.rho_sum = 0.0
+        self.rho_n = 0
+        self.top1_same = 0
+        self.embed_ms = [0.0, 0.0]    # primary, shadow
+        self.search_ms = [0.0, 0.0]
+
+    def offer(self, query: str, acts: Optional[List[str]], k: int, primary_keys: List[str],
+              primary_ms: Dict[str, float]) -> bool:
+        """Queue a comparison for a sampled request. Never blocks; returns whether it was queued.
+        acts is the Act filter the live search used (explicit or routed), so both sides search the same scope."""
+        if self._failed or random.random() >= self.sample:
+            return False
+        self._ensure_worker()
+        with self._lock:
+            self.offered += 1
+        try:
+            self._queue.put_nowait({"query": query, "acts": acts, "k": k, "primary": primary_keys,
+                                    "primary_ms": primary_ms, "ts": time.time()})
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _ensure_worker(self):
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.queue_size)   # a forked worker must not share the parent's
+            self._search = None
+        threading.Thread(target=self._loop, name="uhaki-shadow", daemon=True).start()
+
+    def _loop(self):
+        try:
+            self._search, resolved = self.open_search()
+            self.labels.update(resolved)
+            logging.info(f"[SHADOW] Mirroring {self.sample:.0%} of queries to {self.labels} (pid={os.getpid()})")
+        except Exception:
+            logging.exception("[SHADOW] Could not open the shadow index; mirroring off")
+            self._failed = True
+            return
+        while True:
+            job = self._queue.get()
+            try:
+                self._compare(job)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logging.exception("[SHADOW] Shadow query failed")
+
+    def _compare(self, job: Dict[str, Any]):
+        k = job["k"]
+        keys, embed_ms, search_ms = self._search(job["query"], job["acts"], k)
+        primary = job["primary"]
+        overlap = overlap_at_k(primary, keys, k)
+        rho = rank_correlation(primary, keys, k)
+        same = bool(primary and keys and primary[0] == keys[0])
+        p_ms = job["primary_ms"]
+        row = {
+            "ts": round(job["ts"], 3),
+            **self.labels,
+            "query": job["query"],
+            "acts": job["acts"],
+            "k": k,
+            "overlap": round(overlap, 4),
+            "rho": round(rho, 4) if rho is not None else None,
+            "top1_same": same,
+            "top1_act_same": bool(primary and keys and primary[0].split("::")[0] == keys[0].split("::")[0]),
+            "primary_embed_ms": p_ms.get("embed_ms"),
+            "primary_search_ms": p_ms.get("search_ms"),
+            "shadow_embed_ms": round(embed_ms, 2),
+            "shadow_search_ms": round(search_ms, 2),
+            "lag_ms": round((time.time() - job["ts"]) * 1000, 1),
+            "primary_ids": primary,
+            "shadow_ids": keys,
+        }
+        with self._lock:
+            self.mirrored += 1
+            self.overlap_sum += overlap
+            if rho is not None:
+                self.rho_sum += rho
+                self.rho_n += 1
+            self.top1_same += same
+            self.embed_ms[0] += p_ms.get("embed_ms") or 0.0
+            self.embed_ms[1] += embed_ms
+            self.search_ms[0] += p_ms.get("search_ms") or 0.0
+            self.search_ms[1] += search_ms
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.mirrored
+            return {
+                **self.labels,
+                "sample": self.sample,
+                "offered": self.offered,
+                "mirrored": n,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "pending": self._queue.qsize(),
+                "overlap_avg": round(self.overlap_sum / n, 4) if n else None,
+                "rho_avg": round(self.rho_sum / self.rho_n, 4) if self.rho_n else None,
+                "top1_same_rate": round(self.top1_same / n, 4) if n else None,
+                "embed_ms_avg": {"primary": round(self.embed_ms[0] / n, 2), "shadow": round(self.embed_ms[1] / n, 2)} if n else None,
+                "search_ms_avg": {"primary": round(self.search_ms[0] / n, 2), "shadow": round(self.search_ms[1] / n, 2)} if n else None,
+            }
@@ -0,0 +1,115 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import List, Dict, Any
+
+from benchServe import percentile
+
+
+def load_rows(path: Path, since_h: float) -> List[Dict[str, Any]]:
+    cutoff = time.time() - since_h * 3600 if since_h > 0 else 0.0
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue   # a line cut short by a restart
+            if row.get("ts", 0) >= cutoff:
+                rows.append(row)
+    return rows
+
+
+def mean(xs: List[float]) -> float:
+    return round(statistics.mean(xs), 4) if xs else 0.0
+
+
+def side_by_side(rows: List[Dict[str, Any]], key: str) -> Dict[str, float]:
+    p = [r[f"primary_{key}"] for r in rows if r.get(f"primary_{key}") is not None]
+    s = [r[f"shadow_{key}"] for r in rows if r.get(f"shadow_{key}") is not None]
+    return {"primary_p50": round(percentile(p, 50), 2), "shadow_p50": round(percentile(s, 50), 2),
+            "primary_p95": round(percentile(p, 95), 2), "shadow_p95": round(percentile(s, 95), 2)}
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    last = rows[-1]   # sizes as of the latest comparison
+    overlaps = [r["overlap"] for r in rows]
+    rhos = [r["rho"] for r in rows if r.get("rho") is not None]
+    scoped = [r["overlap"] for r in rows if r.get("acts")]
+    unscoped = [r["overlap"] for r in rows if not r.get("acts")]
+    out: Dict[str, Any] = {
+        "comparisons": len(rows),
+        "k": last.get("k"),
+        "overlap_mean": mean(overlaps),
+        "overlap_p10": round(percentile(overlaps, 10), 4),
+        "overlap_p50": round(percentile(overlaps, 50), 4),
+        "overlap_act_scoped": mean(scoped) if scoped else None,
+        "overlap_global": mean(unscoped) if unscoped else None,
+        "rho_mean": mean(rhos) if rhos else None,
+        "top1_same": mean([float(r["top1_same"]) for r in rows]),
+        "top1_act_same": mean([float(r["top1_act_same"]) for r in rows]),
+        "embed_ms": side_by_side(rows, "embed_ms"),
+        "search_ms": side_by_side(rows, "search_ms"),
+        "lag_ms_p95": round(percentile([r.get("lag_ms") or 0.0 for r in rows], 95), 1),
+    }
+    if last.get("primary_dim") and last.get("shadow_dim"):
+        p_mb = (last.get("primary_count") or 0) * last["primary_dim"] * 4 / 2 ** 20
+        s_mb = (last.get("shadow_count") or 0) * last["shadow_dim"] * 4 / 2 ** 20
+        out["vectors_mb"] = {"primary": round(p_mb, 1), "shadow": round(s_mb, 1),
+                             "dims": f"{last['primary_dim']} -> {last['shadow_dim']}"}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the shadow-index comparison log (SHADOW_LOG).")
+    parser.add_argument("--log", type=str, default="../outputs/shadowLog.jsonl")
+    parser.add_argument("--since_h", type=float, default=0.0, help="Only the last N hours (0 = whole log)")
+    parser.add_argument("--worst", type=int, default=10, help="Also list the N queries the two indexes agree on least")
+    parser.add_argument("--json_out", type=str, default="", help="Also write the summary here as JSON")
+    args = parser.parse_args()
+
+    path = Path(args.log)
+    if not path.exists():
+        print(f"[ERROR] No shadow log at {path}; set SHADOW_COLLECTION on the API and let it see some traffic.")
+        sys.exit(1)
+    rows = load_rows(path, args.since_h)
+    if not rows:
+        print("[INFO] No comparisons in the selected window.")
+        return
+
+    # One summary per pairing, in case the shadow or the live index changed while logging
+    groups: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+    for r in rows:
+        groups[(r.get("primary"), r.get("primary_model"), r.get("shadow"), r.get("shadow_model"))].append(r)
+
+    report = []
+    for (p_name, p_model, s_name, s_model), grp in groups.items():
+        summary = summarize(grp)
+        report.append({"primary": p_name, "primary_model": p_model, "shadow": s_name, "shadow_model": s_model, **summary})
+        print(f"\n[SHADOW] {p_name} ({p_model})  vs  {s_name} ({s_model}) | {summary['comparisons']} queries")
+        for k, v in summary.items():
+            if k != "comparisons":
+                print(f"  {k:>18}: {v}")
+        emb = summary["embed_ms"]
+        if emb["shadow_p50"] > 0:
+            print(f"  {'embed speed-up':>18}: {emb['primary_p50'] / emb['shadow_p50']:.2f}x at p50")
+        if args.worst:
+            print(f"  lowest overlap@{summary['k']}:")
+            for r in sorted(grp, key=lambda r: r["overlap"])[:args.worst]:
+                print(f"    {r['overlap']:.2f}  rho={r.get('rho')}  {r['query'][:90]!r}")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n[DONE] Summary written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# shards.py
+# Act-partitioned index: one Chroma collection per Act (or per group of Acts),
+# written by data/scripts/createEmbeddings.py with SHARD_LAYOUT=act|groups.
+#
+# ShardedCollection mimics the bits of the Chroma Collection API that app.py uses
+# (query / get / count), so the rest of the pipeline doesn't care which layout is live.
+import json
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def _collection_names(client) -> List[str]:
+    # chromadb 0.6 returns names, 0.5 / 1.x return Collection objects
+    return [c if isinstance(c, str) else c.name for c in client.list_collections()]
+
+
+def _acts_in_where(where: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """Pull the Act filter out of a Chroma where clause ({"act": x} or {"act": {"$in": [...]}})."""
+    if not where:
+        return None
+    cond = where.get("act")
+    if cond is None and "$and" in where:
+        for sub in where["$and"]:
+            found = _acts_in_where(sub)
+            if found is not None:
+                return found
+        return None
+    if isinstance(cond, str):
+        return [cond]
+    if isinstance(cond, dict):
+        if "$eq" in cond:
+            return [cond["$eq"]]
+        if "$in" in cond:
+            return list(cond["$in"])
+    return None
+
+
+def _column(res: Dict[str, Any], key: str, qi: int) -> list:
+    # Avoid truthiness checks: chromadb may hand back numpy arrays for embeddings.
+    col = res.get(key)
+    if col is None or len(col) <= qi or col[qi] is None:
+        return []
+    return list(col[qi])
+
+
+class ShardedCollection:
+    def __init__(self, client, base_name: str, max_workers: int = 8):
+        self.base_name = base_name
+        self.name = base_name
+        self.shards: Dict[str, Any] = {}          # shard collection name -> Collection
+        self.shard_acts: Dict[str, List[str]] = {}
+        self.act_to_shards: Dict[str, List[str]] = {}
+        self.metadata: Dict[str, Any] = {}
+
+        for name in _collection_names(client):
+            coll = client.get_collection(name=name)
+            meta = coll.metadata or {}
+            if meta.get("shard_of") != base_name:
+                continue
+            acts = json.loads(meta.get("shard_acts") or "[]")
+            self.shards[name] = coll
+            self.shard_acts[name] = acts
+            for a in acts:
+                self.act_to_shards.setdefault(a, []).append(name)
+            if not self.metadata:
+                self.metadata = {k: v for k, v in meta.items() if not k.startswith("shard_")}
+
+        if not self.shards:
+            raise ValueError(f"No shards found for base collection '{base_name}'")
+        self.pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self.shards))),
+                                       thread_name_prefix="uhaki-shard")
+        logging.info(f"[SHARDS] {len(self.shards)} shards for '{base_name}' covering {len(self.act_to_shards)} Acts")
+
+    def count(self) -> int:
+        return sum(c.count() for c in self.shards.values())
+
+    def select_shards(self, acts: Optional[List[str]]) -> List[str]:
+        if not acts:
+            return list(self.shards)
+        names: List[str] = []
+        for a in acts:
+            for n in self.act_to_shards.get(a, []):
+                if n not in names:
+                    names.append(n)
+        return names
+
+    def _query_one(self, name: str, q_embs, n_results: int, where, include) -> Tuple[str, Dict[str, Any], float]:
+        coll = self.shards[name]
+        kwargs = {"query_embeddings": q_embs, "n_results": n_results, "include": include}
+        # A single-Act shard needs no metadata filter; mixed shards still do.
+        if where and len(self.shard_acts.get(name, [])) != 1:
+            kwargs["where"] = where
+        t0 = time.perf_counter()
+        res = coll.query(**kwargs)
+        return name, res, round((time.perf_counter() - t0) * 1000, 2)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Fan out to the selected shards and merge per-shard top-k by distance.
+        Each shard returns its own top n_results, so the union always contains the
+        global top n_results and the merge is exact (up to each shard's own HNSW recall).
+        The result has Chroma's shape plus "shard_ms" = {shard: latency_ms}.
+        """
+        include = list(include or ["documents", "metadatas", "distances"])
+        if "distances" not in include:
+            include.append("distances")
+        names = self.select_shards(_acts_in_where(where))
+        futures = [self.pool.submit(self._query_one, n, query_embeddings, n_results, where, include) for n in names]
+        per_shard = [f.result() for f in futures]
+
+        fields = [k for k in ("documents", "metadatas", "embeddings") if k in include]
+        merged: Dict[str, Any] = {"ids": [], "distances": [], "shard_ms": {}}
+        for k in fields:
+            merged[k] = []
+        for name, _, ms in per_shard:
+            merged["shard_ms"][name] = ms
+
+        for qi in range(len(query_embeddings)):
+            cands = []
+            for _, res, _ in per_shard:
+                ids = _column(res, "ids", qi)
+                dists = _column(res, "distances", qi)
+                cols = {k: _column(res, k, qi) for k in fields}
+                for j, doc_id in enumerate(ids):
+                    row = {k: (cols[k][j] if j < len(cols[k]) else None) for k in fields}
+                    cands.append((float(dists[j]), doc_id, row))
+            top = heapq.nsmallest(n_results, cands, key=lambda t: (t[0], t[1]))
+            merged["ids"].append([t[1] for t in top])
+            merged["distances"].append([t[0] for t in top])
+            for k in fields:
+                merged[k].append([t[2][k] for t in top])
+        return merged
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        include = list(include or ["documents", "metadatas"])
+        acts = _acts_in_where(kwargs.get("where"))
+        names = self.select_shards(acts)
+        futures = [self.pool.submit(self.shards[n].get, ids=ids, include=include, **kwargs) for n in names]
+        found: Dict[str, Dict[str, Any]] = {}
+        order: List[str] = []
+        for f in futures:
+            res = f.result()
+            for j, doc_id in enumerate(res.get("ids") or []):
+                if doc_id in found:
+                    continue
+                order.append(doc_id)
+                found[doc_id] = {k: res[k][j] for k in include if res.get(k) is not None and j < len(res[k])}
+        if ids is not None:
+            order = [i for i in ids if i in found]
+        out: Dict[str, Any] = {"ids": order}
+        for k in include:
+            out[k] = [found[i].get(k) for i in order]
+        return out
+
+
+def iter_collection(coll, include: List[str], page_size: int = 2000):
+    """Page through every record of a collection (or every shard of a ShardedCollection).
+    Yields (id, {field: value}) pairs."""
+    colls = list(coll.shards.values()) if isinstance(coll, ShardedCollection) else [coll]
+    for c in colls:
+        offset = 0
+        while True:
+            res = c.get(include=include, limit=page_size, offset=offset)
+            ids = res.get("ids") or []
+            for j, doc_id in enumerate(ids):
+                yield doc_id, {k: res[k][j] for k in include if res.get(k) is not None and j < len(res[k])}
+            if len(ids) < page_size:
+                break
+            offset += page_size
@@ -0,0 +1,140 @@
+# singleFlight.py
+# Coalescing of identical in-flight /askQuery requests.
+#
+# A shared link brings bursts of the same question at the same moment, and each copy used
+# to run its own embed, Chroma query, rerank and (in proxy mode) generator call. The first
+# request for a key becomes the leader and computes; identical requests that arrive while
+# it is running wait for its result instead of computing again. Each waiter has its own
+# timeout, and a waiter giving up never affects the leader. In the asyncio version the
+# computation runs as its own task, so a leader whose client disconnects does not cancel
+# the work the waiters are waiting on. The key is built by the caller (app.flight_key).
+import time
+import asyncio
+import threading
+from typing import Dict, Any, Callable, Awaitable, Tuple, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters", "compute_ms")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+        self.compute_ms = 0.0
+
+
+class _FlightCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.saved_ms = 0.0
+        self.max_waiters = 0
+
+    def _record_leader(self, waiters: int):
+        with self._lock:
+            self.leaders += 1
+            self.max_waiters = max(self.max_waiters, waiters)
+
+    def _record_shared(self, compute_ms: float):
+        """A waiter got the leader's result: one run of the computation saved."""
+        with self._lock:
+            self.coalesced += 1
+            self.saved_ms += compute_ms
+
+    def _record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.leaders + self.coalesced
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_rate": round(self.coalesced / n, 4) if n else 0.0,
+                "waiter_timeouts": self.timeouts,
+                "max_waiters": self.max_waiters,
+                "compute_ms_saved": round(self.saved_ms, 2),
+            }
+
+
+class SingleFlight(_FlightCounters):
+    """For threaded servers (Flask / gthread)."""
+
+    def __init__(self):
+        super().__init__()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout_s: float) -> Tuple[Any, bool]:
+        """(result, shared): fn() run by this caller (shared=False) or the in-flight leader's result.
+        Raises TimeoutError if a waiter gives up after timeout_s; the leader's exception is re-raised."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            t0 = time.perf_counter()
+            try:
+                call.result = fn()
+                return call.result, False
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                call.compute_ms = (time.perf_counter() - t0) * 1000
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+                self._record_leader(call.waiters)
+
+        if not call.done.wait(timeout_s):
+            self._record_timeout()
+            raise TimeoutError(f"no result for an identical in-flight request within {timeout_s:.2f}s")
+        if call.error is not None:
+            raise call.error
+        self._record_shared(call.compute_ms)
+        return call.result, True
+
+
+class AsyncSingleFlight(_FlightCounters):
+    """Same for coroutines on one event loop; the leader's work runs as a separate task."""
+
+    def __init__(self):
+        super().__init__()
+        self._calls: Dict[Hashable, list] = {}   # key -> [task, waiters]
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]], timeout_s: float) -> Tuple[Any, bool]:
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._run(key, factory))
+            self._calls[key] = [task, 0]
+            result, _ = await asyncio.shield(task)   # cancelling this request leaves the task running
+            return result, False
+
+        entry[1] += 1
+        try:
+            result, compute_ms = await asyncio.wait_for(asyncio.shield(entry[0]), timeout_s)
+        except asyncio.TimeoutError:
+            self._record_timeout()
+            raise TimeoutError(f"no result for an identical in-flight request within {timeout_s:.2f}s")
+        self._record_shared(compute_ms)
+        return result, True
+
+    async def _run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]):
+        t0 = time.perf_counter()
+        try:
+            result = await factory()
+        finally:
+            compute_ms = (time.perf_counter() - t0) * 1000
+            entry = self._calls.pop(key, None)
+            self._record_leader(entry[1] if entry else 0)
+        return result, compute_ms
@@ -0,0 +1,200 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchServe import percentile
+from hnswIndex import HnswIndex, build_graph, hnswlib
+from shards import iter_collection
+
+
+def exact_top(X: np.ndarray, Q: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> List[List[int]]:
+    """Brute-force cosine top-k rows per query (rows of X and Q are unit length)."""
+    S = Q @ X.T
+    if allowed is not None:
+        S[:, ~allowed] = -np.inf
+    k = min(k, X.shape[0] if allowed is None else int(allowed.sum()))
+    top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    return [list(row[np.argsort(-S[i, row])]) for i, row in enumerate(top)]
+
+
+def measure(index: HnswIndex, Q: np.ndarray, truth: List[List[int]], k: int, ef: int,
+            acts: Optional[List[Optional[List[str]]]] = None) -> Dict[str, float]:
+    """recall@k against the exact rows and per-query latency at this search ef."""
+    recalls: List[float] = []
+    ms: List[float] = []
+    for i, q in enumerate(Q):
+        scope = acts[i] if acts else None
+        t0 = time.perf_counter()
+        rows, _, _ = index.search(q, k, scope, ef=ef)
+        ms.append((time.perf_counter() - t0) * 1000)
+        gold = truth[i]
+        recalls.append(len(set(rows) & set(gold)) / max(1, len(gold)))
+    return {"recall": statistics.mean(recalls), "p50_ms": percentile(ms, 50), "p95_ms": percentile(ms, 95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid-search HNSW parameters for recall@k vs latency and save the tuned index used with VECTOR_INDEX=hnsw.")
+    parser.add_argument("--chroma_path", type=str, default="../data/scripts/chroma")
+    parser.add_argument("--collection", type=str, default="actSectionsV2")
+    parser.add_argument("--layout", type=str, default="single", choices=["single", "sharded"])
+    parser.add_argument("--csv_path", type=str, default="../testing/uhakiTestQuestions.csv",
+                        help="Questions to tune on; an 'act' column also tunes the per-Act (filtered) ef")
+    parser.add_argument("--model", type=str, default="intfloat/e5-base-v2")
+    parser.add_argument("--k", type=int, default=12, help="recall@k, normally TOP_K_RETRIEVE")
+    parser.add_argument("--target_recall", type=float, default=0.98)
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction_ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320], help="Search ef values to try")
+    parser.add_argument("--threads", type=int, default=0, help="Build threads (0 = all cores)")
+    parser.add_argument("--output", type=str, default="../data/scripts/hnswIndex.bin",
+                        help="Tuned graph; ids, Acts and the chosen config go next to it as *.json")
+    parser.add_argument("--config_out", type=str, default="../data/scripts/hnswConfig.json",
+                        help="Chosen parameters, for HNSW_CONFIG in createEmbeddings.py")
+    parser.add_argument("--no_metadata", action="store_true", help="Don't record the chosen config in the collection metadata")
+    args = parser.parse_args()
+
+    if hnswlib is None:
+        print("[ERROR] You need 'chroma-hnswlib' installed where you RUN this script.")
+        sys.exit(1)
+    try:
+        import chromadb
+        from sentence_transformers import SentenceTransformer
+    except Exception as e:
+        print("[ERROR] You need 'chromadb' and 'sentence-transformers' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    if args.layout == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, args.collection)
+    else:
+        coll = client.get_collection(name=args.collection)
+
+    # 1) Every embedding in the live index
+    t0 = time.perf_counter()
+    ids: List[str] = []
+    acts: List[str] = []
+    vecs: List[np.ndarray] = []
+    for doc_id, rec in iter_collection(coll, ["embeddings", "metadatas"]):
+        ids.append(doc_id)
+        acts.append((rec.get("metadatas") or {}).get("act") or "")
+        vecs.append(np.asarray(rec["embeddings"], dtype=np.float32))
+    X = np.vstack(vecs)
+    X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+    act_names = sorted(set(acts))
+    act_idx = {a: i for i, a in enumerate(act_names)}
+    act_rows = np.array([act_idx[a] for a in acts], dtype=np.int32)
+    print(f"[INFO] {len(ids)} vectors x {X.shape[1]} dims from {args.collection} in {time.perf_counter() - t0:.1f}s")
+
+    # 2) Questions and their exact top-k, unfiltered and within the labelled Act
+    df = pd.read_csv(Path(args.csv_path), encoding="utf-8-sig")
+    cols = {c.lower(): c for c in df.columns}
+    questions = [str(q).strip() for q in df[cols["question"]]]
+    labels = [str(a).strip() for a in df[cols["act"]]] if "act" in cols else [""] * len(questions)
+    model = SentenceTransformer(args.model)
+    model.max_seq_length = 512
+    Q = np.asarray(model.encode(["query: " + q for q in questions], normalize_embeddings=True, batch_size=64),
+                   dtype=np.float32)
+    t0 = time.perf_counter()
+    truth = exact_top(X, Q, args.k)
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(Q)
+    by_act: Dict[str, List[int]] = {}
+    for i, a in enumerate(labels):
+        if a in act_idx:
+            by_act.setdefault(a, []).append(i)
+    f_rows = [i for rows in by_act.values() for i in rows]
+    f_scope = [[labels[i]] for i in f_rows]
+    f_truth: List[List[int]] = [[] for _ in f_rows]
+    pos = {i: j for j, i in enumerate(f_rows)}
+    for a, rows in by_act.items():
+        for i, gold in zip(rows, exact_top(X, Q[rows], args.k, act_rows == act_idx[a])):
+            f_truth[pos[i]] = gold
+    print(f"[INFO] {len(Q)} questions ({len(f_rows)} with an Act in the index, {len(by_act)} Acts) | "
+          f"exact brute force {exact_ms:.2f} ms/query")
+
+    # 3) Grid: build once per (M, construction_ef), then sweep the search ef on that graph
+    efs = sorted({max(ef, args.k) for ef in args.ef})   # hnswlib searches with at least ef = k
+    results: List[Dict[str, Any]] = []
+    built: Dict[tuple, HnswIndex] = {}
+    print(f"\n  {'M':>4} {'c_ef':>5} {'build_s':>8} {'ef':>5} {'recall':>8} {'p50_ms':>8} {'p95_ms':>8} "
+          f"{'f_recall':>9} {'f_p50_ms':>9}")
+    for M in args.M:
+        for c_ef in args.construction_ef:
+            t0 = time.perf_counter()
+            graph = build_graph(X, M, c_ef, threads=args.threads)
+            build_s = time.perf_counter() - t0
+            index = HnswIndex(graph, ids, act_rows, act_names,
+                              {"space": "cosine", "dim": int(X.shape[1]), "M": M, "construction_ef": c_ef})
+            built[(M, c_ef)] = index
+            for ef in efs:
+                r = measure(index, Q, truth, args.k, ef)
+                f = measure(index, Q[f_rows], f_truth, args.k, ef, f_scope) if f_rows else {}
+                results.append({"M": M, "construction_ef": c_ef, "build_s": round(build_s, 2), "ef": ef,
+                                **{k: round(v, 4) for k, v in r.items()},
+                                **{"filtered_" + k: round(v, 4) for k, v in f.items()}})
+                print(f"  {M:>4} {c_ef:>5} {build_s:>8.2f} {ef:>5} {r['recall']:>8.3f} {r['p50_ms']:>8.3f} "
+                      f"{r['p95_ms']:>8.3f} {f.get('recall', 0):>9.3f} {f.get('p50_ms', 0):>9.3f}")
+
+    # 4) Cheapest query latency that reaches the target (build time breaks ties)
+    ok = [r for r in results if r["recall"] >= args.target_recall]
+    if ok:
+        best = min(ok, key=lambda r: (r["p50_ms"], r["build_s"]))
+    else:
+        best = max(results, key=lambda r: (r["recall"], -r["p50_ms"]))
+        print(f"\n[WARN] No configuration reached recall@{args.k} >= {args.target_recall}; using the best one "
+              f"({best['recall']:.3f}). Try larger --ef / --M values.")
+    index = built[(best["M"], best["construction_ef"])]
+    index.default_ef = best["ef"]
+
+    # 5) Per-Act ef on the chosen graph: the smallest that reaches the target inside that Act's filter
+    act_ef: Dict[str, int] = {}
+    for a, rows in by_act.items():
+        scope = [[a]] * len(rows)
+        gold = [f_truth[pos[i]] for i in rows]
+        choice = efs[-1]
+        for ef in efs:
+            if measure(index, Q[rows], gold, args.k, ef, scope)["recall"] >= args.target_recall:
+                choice = ef
+                break
+        if choice != best["ef"]:
+            act_ef[a] = choice
+    index.act_ef = act_ef
+    index.config.update(search_ef=best["ef"], recall=best["recall"], k=args.k, target_recall=args.target_recall,
+                        tuned_at=datetime.now(timezone.utc).isoformat())
+
+    out = Path(args.output)
+    index.save(str(out), extra={"collection": args.collection, "grid": results})
+    config = {k: index.config[k] for k in ("space", "M", "construction_ef", "search_ef", "recall", "k", "tuned_at")}
+    config["act_ef"] = act_ef
+    Path(args.config_out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.config_out, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+
+    if not args.no_metadata:
+        # Chroma can't change hnsw:* on an existing collection, so the tuned values are recorded
+        # under their own keys; createEmbeddings.py applies them (HNSW_CONFIG) on the next build.
+        tuned = {"hnsw_tuned_M": best["M"], "hnsw_tuned_construction_ef": best["construction_ef"],
+                 "hnsw_tuned_search_ef": best["ef"], "hnsw_tuned_recall": best["recall"],
+                 "hnsw_tuned_k": args.k, "hnsw_tuned_at": config["tuned_at"]}
+        try:
+            coll.modify(metadata={**(coll.metadata or {}), **tuned})
+            print(f"[INFO] Recorded the tuned config in {args.collection}'s metadata")
+        except Exception as e:
+            print(f"[WARN] Could not update the collection metadata ({e}); the config is in {args.config_out}")
+
+    print(f"\n[DONE] M={best['M']} construction_ef={best['construction_ef']} search_ef={best['ef']} | "
+          f"recall@{args.k} {best['recall']:.3f}, p50 {best['p50_ms']:.3f} ms (exact {exact_ms:.2f} ms) | "
+          f"{len(act_ef)} Acts with their own ef | {out} + {args.config_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sharded layout against the monolithic collection.")
+    parser.add_argument("--chroma_path", type=str, default="../data/scripts/chroma")
+    parser.add_argument("--collection", type=str, default="actSectionsV2", help="Monolithic collection")
+    parser.add_argument("--shard_base", type=str, default="actSectionsV2", help="shard_of value of the shards")
+    parser.add_argument("--model", type=str, default="intfloat/e5-base-v2")
+    parser.add_argument("--top_k", type=int, default=12)
+    parser.add_argument("--csv_path", type=str, default="../testing/uhakiTestQuestions.csv")
+    parser.add_argument("--with_act", action="store_true", help="Also pass each question's labelled Act as a filter")
+    args = parser.parse_args()
+
+    try:
+        from sentence_transformers import SentenceTransformer
+        import chromadb
+    except Exception as e:
+        print("[ERROR] You need 'sentence-transformers' and 'chromadb' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    from shards import ShardedCollection
+
+    df = pd.read_csv(Path(args.csv_path), encoding="utf-8-sig")
+    cols = {c.lower(): c for c in df.columns}
+    model = SentenceTransformer(args.model)
+    model.max_seq_length = 512
+
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    mono = client.get_collection(name=args.collection)
+    sharded = ShardedCollection(client, args.shard_base)
+
+    exact = 0
+    mono_ms: List[float] = []
+    fan_ms: List[float] = []
+    per_shard: Dict[str, List[float]] = {}
+    for _, row in df.iterrows():
+        q = str(row[cols["question"]]).strip()
+        act = str(row[cols["act"]]).strip() if (args.with_act and "act" in cols) else None
+        emb = model.encode("query: " + q, normalize_embeddings=True).tolist()
+        kwargs = {"query_embeddings": [emb], "n_results": args.top_k, "include": ["distances"]}
+        if act:
+            kwargs["where"] = {"act": act}
+
+        t0 = time.perf_counter()
+        a = mono.query(**kwargs)
+        t1 = time.perf_counter()
+        b = sharded.query(**kwargs)
+        t2 = time.perf_counter()
+        mono_ms.append((t1 - t0) * 1000)
+        fan_ms.append((t2 - t1) * 1000)
+        for name, ms in b["shard_ms"].items():
+            per_shard.setdefault(name, []).append(ms)
+        # Compare distance profiles so ties broken in a different order still count as exact.
+        if [round(d, 6) for d in a["distances"][0]] == [round(d, 6) for d in b["distances"][0]]:
+            exact += 1
+
+    n = len(mono_ms)
+    print(f"[INFO] {n} questions | top_k={args.top_k} | act filter={'on' if args.with_act else 'off'}")
+    print(f"  exact top-k (by score): {exact}/{n}")
+    print(f"  monolithic query ms   : mean={statistics.mean(mono_ms):.2f}")
+    print(f"  sharded fan-out ms    : mean={statistics.mean(fan_ms):.2f}")
+    print("  per-shard ms (mean / max):")
+    for name, xs in sorted(per_shard.items(), key=lambda kv: -statistics.mean(kv[1])):
+        print(f"    {name:<60} {statistics.mean(xs):7.2f} / {max(xs):7.2f}  (n={len(xs)})")
+
+
+if __name__ == "__main__":
+    main()
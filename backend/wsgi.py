@@ -0,0 +1,7 @@
+# wsgi.py
+# Production WSGI entry point: `gunicorn -c gunicorn.conf.py wsgi:app` (run from backend/).
+# Importing app loads the embedder, reranker and collection once; with preload_app
+# the master does this before forking, so workers share the model weights copy-on-write.
+from app import app
+
+__all__ = ["app"]
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+import numpy as np
+
+from splitChunks import clause_spans
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from shards import iter_collection  # noqa: E402
+from clauseIndex import ClauseIndex, text_crc  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split every chunk into sentences / sub-clauses, embed them and "
+                                                 "save the clause index used for extractive answers (EXTRACTIVE=1).")
+    parser.add_argument("--chroma_path", type=str, default="./chroma")
+    parser.add_argument("--collection", type=str, default="actSectionsV2")
+    parser.add_argument("--layout", type=str, default="single", choices=["single", "sharded"])
+    parser.add_argument("--model", type=str, default="", help="Embedder (default: the collection's 'model' metadata)")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--output", type=str, default="./clauseIndex.npz")
+    args = parser.parse_args()
+
+    try:
+        import chromadb
+        from sentence_transformers import SentenceTransformer
+    except Exception as e:
+        print("[ERROR] You need 'chromadb' and 'sentence-transformers' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    if args.layout == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, args.collection)
+    else:
+        coll = client.get_collection(name=args.collection)
+    model_name = args.model or (coll.metadata or {}).get("model") or "intfloat/e5-base-v2"
+
+    # 1) Every chunk, cut into clauses (spans into the chunk text)
+    t0 = time.perf_counter()
+    chunk_ids: List[str] = []
+    crc: List[int] = []
+    offsets = [0]
+    spans: List[Tuple[int, int]] = []
+    texts: List[str] = []
+    for doc_id, rec in iter_collection(coll, ["documents"]):
+        text = rec.get("documents") or ""
+        cut = clause_spans(text)
+        chunk_ids.append(doc_id)
+        crc.append(text_crc(text))
+        spans.extend(cut)
+        texts.extend(text[a:b] for a, b in cut)
+        offsets.append(len(spans))
+    print(f"[INFO] {len(chunk_ids)} chunks -> {len(spans)} clauses "
+          f"({len(spans) / max(1, len(chunk_ids)):.1f} per chunk) in {time.perf_counter() - t0:.1f}s")
+
+    # 2) Embed them in batches, as passages (same prefix as the chunks)
+    model = SentenceTransformer(model_name)
+    model.max_seq_length = 512
+    t0 = time.perf_counter()
+    vectors = np.asarray(model.encode(["passage: " + t for t in texts], batch_size=args.batch_size,
+                                      normalize_embeddings=True, show_progress_bar=True), dtype=np.float16)
+    print(f"[INFO] Embedded with {model_name} in {time.perf_counter() - t0:.1f}s")
+
+    index = ClauseIndex(chunk_ids, np.asarray(offsets, dtype=np.int64), np.asarray(spans, dtype=np.int32).reshape(-1, 2),
+                        vectors, np.asarray(crc, dtype=np.uint32),
+                        {"collection": args.collection, "model": model_name, "chunks": len(chunk_ids),
+                         "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+                         "built_at": datetime.now(timezone.utc).isoformat()})
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    index.save(args.output)
+    mb = os.path.getsize(args.output) / 2 ** 20
+    print(f"[DONE] {len(index)} clauses of {len(chunk_ids)} chunks -> {args.output} ({mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
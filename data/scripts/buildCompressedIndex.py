@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from shards import iter_collection  # noqa: E402
+from compressedIndex import fit_pca, fit_pq, pq_encode, binarize, BINARY_RESCORE  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the PCA / product-quantized / binary index used with VECTOR_INDEX=compressed.")
+    parser.add_argument("--chroma_path", type=str, default="./chroma")
+    parser.add_argument("--collection", type=str, default="actSectionsV2")
+    parser.add_argument("--layout", type=str, default="single", choices=["single", "sharded"])
+    parser.add_argument("--output", type=str, default="./compressedIndex.npz",
+                        help="Codes go here; the float32 vectors for re-scoring go next to it as *_vectors.npy")
+    parser.add_argument("--dim", type=int, default=256, help="PCA dimensions (0 = keep all 768)")
+    parser.add_argument("--pq_m", type=int, default=32, help="PQ sub-vectors, 1 byte each (0 = float16 reduced vectors, no PQ)")
+    parser.add_argument("--iters", type=int, default=20, help="k-means iterations per sub-space")
+    parser.add_argument("--sample", type=int, default=20000, help="Vectors used to train the PQ codebooks")
+    parser.add_argument("--binary", action="store_true", help="Sign bits of the full vectors instead of PCA / PQ (1 bit per dim)")
+    parser.add_argument("--raw_signs", action="store_true", help="With --binary: take signs of the raw vectors, without centering")
+    parser.add_argument("--rescore", type=int, default=0,
+                        help=f"Default re-score depth stored with the index (0 = 100, or {BINARY_RESCORE} for --binary)")
+    args = parser.parse_args()
+
+    try:
+        import chromadb
+    except Exception as e:
+        print("[ERROR] You need 'chromadb' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    if args.layout == "sharded":
+        from shards import ShardedCollection
+        coll = ShardedCollection(client, args.collection)
+    else:
+        coll = client.get_collection(name=args.collection)
+
+    # 1) Every embedding in the live index (already unit length from createEmbeddings.py)
+    t0 = time.perf_counter()
+    ids: List[str] = []
+    acts: List[str] = []
+    vecs: List[np.ndarray] = []
+    for doc_id, rec in iter_collection(coll, ["embeddings", "metadatas"]):
+        ids.append(doc_id)
+        acts.append((rec.get("metadatas") or {}).get("act") or "")
+        vecs.append(np.asarray(rec["embeddings"], dtype=np.float32))
+    X = np.vstack(vecs)
+    X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+    act_names = sorted(set(acts))
+    act_idx = {a: i for i, a in enumerate(act_names)}
+    t_load = time.perf_counter() - t0
+    print(f"[INFO] {len(ids)} vectors x {X.shape[1]} dims from {args.collection} in {t_load:.1f}s")
+
+    # 2) PCA fitted on the corpus
+    t1 = time.perf_counter()
+    arrays = {}
+    Z = X
+    explained = 1.0
+    if args.binary:
+        args.dim, args.pq_m = 0, 0
+        if not args.raw_signs:
+            arrays["mean"] = X.mean(axis=0).astype(np.float32)
+        arrays["bits"] = binarize(X, arrays.get("mean"))
+        ones = float(np.unpackbits(arrays["bits"], axis=1).mean())
+        print(f"[INFO] Sign bits ({'raw' if args.raw_signs else 'centered'}): "
+              f"{arrays['bits'].shape[1]} B/vector, {ones:.1%} of bits set")
+    elif 0 < args.dim < X.shape[1]:
+        mean, components, explained = fit_pca(X, args.dim)
+        Z = (X - mean) @ components.T
+        arrays.update(mean=mean, components=components)
+        print(f"[INFO] PCA {X.shape[1]} -> {args.dim} dims keeps {explained:.1%} of the variance")
+    t_pca = time.perf_counter() - t1
+
+    # 3) Product quantization of the (projected) vectors, or float16 storage without it (not for --binary)
+    t2 = time.perf_counter()
+    if args.pq_m > 0:
+        books = fit_pq(Z, args.pq_m, iters=args.iters, sample=args.sample)
+        codes = pq_encode(Z, books)
+        arrays.update(books=books, codes=codes)
+        recon = np.concatenate([books[j][codes[:, j]] for j in range(args.pq_m)], axis=1)
+        err = float(((Z - recon) ** 2).sum(axis=1).mean() / max((Z ** 2).sum(axis=1).mean(), 1e-12))
+        print(f"[INFO] PQ m={args.pq_m} x 256 centroids, relative reconstruction error {err:.3f}")
+    elif not args.binary:
+        arrays["reduced"] = Z.astype(np.float16)
+    t_pq = time.perf_counter() - t2
+
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    vectors_path = str(out.with_name(out.stem + "_vectors.npy"))
+    np.save(vectors_path, X)
+    info = {
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "collection": args.collection,
+        "count": len(ids),
+        "source_dim": int(X.shape[1]),
+        "dim": int(Z.shape[1]),
+        "pq_m": args.pq_m,
+        "kind": "binary" if args.binary else ("pq" if args.pq_m > 0 else "float16"),
+        "rescore": args.rescore or (BINARY_RESCORE if args.binary else 100),
+        "pca_explained": round(explained, 4),
+        "vectors_path": os.path.abspath(vectors_path),
+        "build_s": {"load": round(t_load, 2), "pca": round(t_pca, 2), "pq": round(t_pq, 2)},
+    }
+    np.savez(out, ids=np.array(ids), acts=np.array([act_idx[a] for a in acts], dtype=np.int32),
+             act_names=np.array(act_names), info=np.array(json.dumps(info)), **arrays)
+
+    if args.binary:
+        ram = arrays["bits"].shape[1]
+    else:
+        ram = args.pq_m if args.pq_m > 0 else Z.shape[1] * 2
+    print(f"[DONE] {out} ({ram} B/vector in RAM vs {X.shape[1] * 4} B float32) | "
+          f"build {t_pca + t_pq:.1f}s (pca/bits {t_pca:.1f}s, pq {t_pq:.1f}s) | re-score vectors: {vectors_path}")
+
+
+if __name__ == "__main__":
+    main()
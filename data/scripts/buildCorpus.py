@@ -0,0 +1,369 @@
+"""
+End-to-end corpus build: Act PDFs / cleaned text -> ActsinJson -> ActsinSectionChunks.
+
+    python buildCorpus.py                      # every Act, only what changed
+    python buildCorpus.py --acts "Land Act"    # just these
+    python buildCorpus.py --source pdf         # re-extract from the PDFs even where a cleaned .txt exists
+
+Each Act comes from "Cleaned acts/<Act>.txt" when that hand-cleaned file exists and from
+"Original laws and acts/<Act>.pdf" otherwise. It goes through four stages:
+
+    extract    PDF text page by page, in a process pool (PyMuPDF, else pypdf)
+    clean      drop running headers / page numbers, re-join hyphenated words
+    structure  preprocess_law() from preprocess.py  -> ../ActsinJson/<Act>.json
+    chunk      process_act() from splitChunks.py    -> ../ActsinSectionChunks/<Act>_Chunks.json
+
+Every stage's output is cached under --cache_dir. The cache key hashes the stage's input
+content, the stage code and its parameters, so an edit to splitChunks.py re-chunks every Act
+without extracting a single page again. manifest.json records the source hash and the code
+fingerprint each Act was built with. An Act whose source and code are unchanged is skipped
+entirely, so adding one statute only processes that statute. Embed the result with
+createEmbeddings.py and re-run buildDefinitions.py afterwards.
+"""
+import os
+import re
+import sys
+import json
+import time
+import glob
+import hashlib
+import inspect
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Tuple, Optional
+
+import preprocess
+import splitChunks
+
+PDF_DIR       = "../Original laws and acts"
+TEXT_DIR      = "../Cleaned acts"
+JSON_DIR      = "../ActsinJson"
+CHUNKS_DIR    = "../ActsinSectionChunks"
+CACHE_DIR     = "../.corpusCache"
+STAGES        = ("extract", "clean", "structure", "chunk")
+
+PAGE_NO_RE    = re.compile(r"^(?:page\s+)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?$", re.IGNORECASE)
+SECTION_NO_RE = re.compile(r"^\d+[A-Z]*\.$")   # "12." alone on its line, heading on the next
+HYPHEN_END_RE = re.compile(r"[A-Za-z]-$")
+DIGITS_RE     = re.compile(r"\d+")
+HEADER_SHARE  = 0.5   # a line on at least half the pages (digits ignored) is a running header / footer
+HEADER_MIN    = 8     # ... if it is this long; "(1)" or "(a)" on their own lines are not headers
+HEADER_LINES  = 3     # ... and among the first / last lines of the pages it is on
+
+
+# ============================
+# Stages
+# ============================
+def pdf_backend() -> Optional[str]:
+    for name in ("fitz", "pypdf"):
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            continue
+    return None
+
+def pdf_page_count(path: str) -> int:
+    if pdf_backend() == "fitz":
+        import fitz
+        with fitz.open(path) as doc:
+            return doc.page_count
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def extract_pages(path: str, start: int, stop: int) -> Tuple[int, List[str], float]:
+    """Text of pages [start, stop) -> (start, texts, seconds). Runs in a pool worker."""
+    t0 = time.perf_counter()
+    if pdf_backend() == "fitz":
+        import fitz
+        with fitz.open(path) as doc:
+            texts = [doc.load_page(i).get_text("text") for i in range(start, stop)]
+    else:
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        texts = [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+    return start, texts, time.perf_counter() - t0
+
+def clean_pdf_text(pages: List[str]) -> str:
+    """Page texts -> one text in the shape of the hand-cleaned files (one heading / paragraph per line)."""
+    page_lines = [[ln.strip() for ln in p.splitlines() if ln.strip()] for p in pages]
+    seen = Counter()
+    for lines in page_lines:
+        edges = lines[:HEADER_LINES] + lines[-HEADER_LINES:]
+        seen.update({DIGITS_RE.sub("#", ln) for ln in edges})
+    min_pages = max(3, int(len(pages) * HEADER_SHARE))
+    running = {ln for ln, n in seen.items() if n >= min_pages and len(ln) >= HEADER_MIN}
+
+    out: List[str] = []
+    for lines in page_lines:
+        last = len(lines) - 1
+        for i, ln in enumerate(lines):
+            at_edge = i < HEADER_LINES or i > last - HEADER_LINES
+            if at_edge and (PAGE_NO_RE.match(ln) or DIGITS_RE.sub("#", ln) in running):
+                continue
+            if out and HYPHEN_END_RE.search(out[-1]) and ln[0].islower():
+                out[-1] = out[-1][:-1] + ln   # "employ-" / "ment"
+            elif out and SECTION_NO_RE.match(out[-1]):
+                out[-1] = f"{out[-1]} {ln}"   # preprocess_law wants "12. Heading" on one line
+            else:
+                out.append(ln)
+    return "\n".join(out) + "\n"
+
+def structure_act(text: str, act: str) -> Dict[str, Any]:
+    return preprocess.preprocess_law(text, act_name=act)
+
+def chunk_act(structured: Dict[str, Any], act: str) -> List[Dict[str, Any]]:
+    return splitChunks.process_act(structured, act)
+
+
+# ============================
+# Hashing + cache
+# ============================
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def code_fingerprints() -> Dict[str, str]:
+    """Per stage: hash of the code and parameters that produce its output."""
+    with open(splitChunks.__file__, "rb") as f:
+        chunk_src = f.read().decode("utf-8")
+    parts = {
+        "extract": [pdf_backend() or "", inspect.getsource(extract_pages)],
+        "clean": [inspect.getsource(clean_pdf_text), PAGE_NO_RE.pattern, SECTION_NO_RE.pattern,
+                  HYPHEN_END_RE.pattern, str(HEADER_SHARE), str(HEADER_MIN), str(HEADER_LINES)],
+        "structure": [inspect.getsource(preprocess.preprocess_law)],
+        "chunk": [chunk_src],
+    }
+    return {stage: sha256_bytes(json.dumps(p).encode("utf-8"))[:16] for stage, p in parts.items()}
+
+def stage_key(stage: str, code: Dict[str, str], act: str, input_hash: str) -> str:
+    return sha256_bytes(f"{stage}|{code[stage]}|{act}|{input_hash}".encode("utf-8"))[:32]
+
+def cache_path(cache_dir: str, stage: str, key: str) -> str:
+    ext = "txt" if stage in ("extract", "clean") else "json"
+    return os.path.join(cache_dir, stage, f"{key}.{ext}")
+
+def cache_get(cache_dir: str, stage: str, key: str) -> Optional[str]:
+    path = cache_path(cache_dir, stage, key)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def write_atomic(path: str, data: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# ============================
+# Per-Act pipeline (pool worker)
+# ============================
+def run_stage(cache_dir: str, code: Dict[str, str], stage: str, act: str, data: str, fn,
+              timings: Dict[str, Any], force: bool) -> str:
+    """Cached fn(data) -> str for one stage; records seconds spent and whether the cache answered."""
+    t0 = time.perf_counter()
+    key = stage_key(stage, code, act, sha256_bytes(data.encode("utf-8")))
+    out = None if force else cache_get(cache_dir, stage, key)
+    hit = out is not None
+    if out is None:
+        out = fn(data)
+        write_atomic(cache_path(cache_dir, stage, key), out)
+    timings[stage] = {"s": time.perf_counter() - t0, "cached": hit}
+    return out
+
+def build_act(act: str, kind: str, text: str, cache_dir: str, code: Dict[str, str], force: bool) -> Dict[str, Any]:
+    """clean (PDF sources only) -> structure -> chunk for one Act. `text` is the extracted or cleaned text."""
+    timings: Dict[str, Any] = {}
+    if kind == "pdf":
+        text = run_stage(cache_dir, code, "clean", act, text,
+                         lambda t: clean_pdf_text(t.split("\f")), timings, force)
+
+    structured = run_stage(cache_dir, code, "structure", act, text,
+                           lambda t: json.dumps(structure_act(t, act), indent=4, ensure_ascii=False), timings, force)
+    write_atomic(os.path.join(JSON_DIR, f"{act}.json"), structured)
+
+    chunked = run_stage(cache_dir, code, "chunk", act, structured,
+                        lambda s: json.dumps(chunk_act(json.loads(s), act), ensure_ascii=False, indent=2), timings, force)
+    write_atomic(os.path.join(CHUNKS_DIR, f"{act}_Chunks.json"), chunked)
+    return {"act": act, "timings": timings, "chunks": len(json.loads(chunked))}
+
+
+# ============================
+# Driver
+# ============================
+def find_sources(source: str, acts: List[str]) -> Dict[str, Tuple[str, str]]:
+    """Act -> (kind, path): the cleaned .txt unless --source pdf, else the PDF."""
+    found: Dict[str, Tuple[str, str]] = {}
+    for path in sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf"))):
+        found[os.path.splitext(os.path.basename(path))[0]] = ("pdf", path)
+    if source == "auto":
+        for path in sorted(glob.glob(os.path.join(TEXT_DIR, "*.txt"))):
+            found[os.path.splitext(os.path.basename(path))[0]] = ("text", path)
+    if acts:
+        missing = [a for a in acts if a not in found]
+        if missing:
+            print(f"[warn] No source for: {', '.join(missing)}")
+        found = {a: found[a] for a in acts if a in found}
+    return found
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"acts": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def up_to_date(entry: Optional[Dict[str, Any]], kind: str, src_hash: str, code: Dict[str, str]) -> bool:
+    if not entry or entry.get("kind") != kind or entry.get("source_hash") != src_hash:
+        return False
+    stages = STAGES if kind == "pdf" else ("structure", "chunk")
+    if any((entry.get("code") or {}).get(s) != code[s] for s in stages):
+        return False
+    return all(os.path.exists(p) for p in entry.get("outputs") or [])
+
+def extract_pdfs(pool: ProcessPoolExecutor, pdfs: Dict[str, str], pages_per_task: int) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """Act -> extracted text (pages joined with form feeds), all PDFs' pages in one pool; Act -> worker seconds."""
+    futures = {}
+    pages: Dict[str, List[str]] = {}
+    for act, path in pdfs.items():
+        n = pdf_page_count(path)
+        pages[act] = [""] * n
+        for start in range(0, n, pages_per_task):
+            futures[pool.submit(extract_pages, path, start, min(n, start + pages_per_task))] = act
+    seconds: Dict[str, float] = {act: 0.0 for act in pdfs}
+    for fut, act in futures.items():
+        start, texts, s = fut.result()
+        pages[act][start:start + len(texts)] = texts
+        seconds[act] += s
+    return {act: "\f".join(p) for act, p in pages.items()}, seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Build ActsinJson and ActsinSectionChunks from the Act PDFs / cleaned text, incrementally.")
+    parser.add_argument("--acts", nargs="*", default=None, help="Only these Acts (file names without extension)")
+    parser.add_argument("--source", type=str, default="auto", choices=["auto", "pdf"],
+                        help="auto = Cleaned acts/<Act>.txt where it exists, else the PDF; pdf = always extract")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Worker processes")
+    parser.add_argument("--pages_per_task", type=int, default=8, help="PDF pages per extraction task")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR)
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and the stage cache")
+    parser.add_argument("--prune", action="store_true", help="Delete outputs of Acts whose source is gone")
+    args = parser.parse_args()
+
+    t_start = time.perf_counter()
+    manifest_path = os.path.join(args.cache_dir, "manifest.json")
+    manifest = load_manifest(manifest_path)
+    code = code_fingerprints()
+    sources = find_sources(args.source, args.acts)
+
+    t0 = time.perf_counter()
+    todo: Dict[str, Tuple[str, str, str]] = {}
+    skipped = []
+    for act, (kind, path) in sources.items():
+        src_hash = file_hash(path)
+        if not args.force and up_to_date(manifest["acts"].get(act), kind, src_hash, code):
+            skipped.append(act)
+        else:
+            todo[act] = (kind, path, src_hash)
+    hash_s = time.perf_counter() - t0
+    print(f"[info] {len(sources)} Acts: {len(todo)} to build, {len(skipped)} unchanged "
+          f"(hashed sources in {hash_s:.2f} s)")
+
+    if not args.acts:
+        gone = [a for a in manifest["acts"] if a not in sources]
+        for act in gone:
+            if args.prune:
+                for p in manifest["acts"][act].get("outputs") or []:
+                    if os.path.exists(p):
+                        os.remove(p)
+                del manifest["acts"][act]
+                print(f"[info] Pruned {act} (source removed)")
+            else:
+                print(f"[warn] {act}: source removed, outputs kept (use --prune)")
+
+    stage_s = {s: 0.0 for s in STAGES}
+    extract_wall = build_wall = 0.0
+    stage_n = {s: [0, 0] for s in STAGES}   # [built, cached]
+    if todo:
+        pdfs, texts = {}, {}
+        for act, (kind, path, src_hash) in todo.items():
+            if kind == "pdf":
+                cached = None if args.force else cache_get(args.cache_dir, "extract", stage_key("extract", code, act, src_hash))
+                if cached is not None:
+                    texts[act] = cached
+                    stage_n["extract"][1] += 1
+                else:
+                    pdfs[act] = path
+            else:
+                with open(path, "r", encoding="utf-8-sig") as f:
+                    texts[act] = f.read()
+        if pdfs and pdf_backend() is None:
+            print("[ERROR] Extracting PDFs needs 'pymupdf' or 'pypdf' installed where you RUN this script.")
+            print("        Missing text for:", ", ".join(pdfs))
+            sys.exit(1)
+
+        os.makedirs(JSON_DIR, exist_ok=True)
+        os.makedirs(CHUNKS_DIR, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            if pdfs:
+                t0 = time.perf_counter()
+                extracted, seconds = extract_pdfs(pool, pdfs, max(1, args.pages_per_task))
+                for act, text in extracted.items():
+                    write_atomic(cache_path(args.cache_dir, "extract", stage_key("extract", code, act, todo[act][2])), text)
+                    texts[act] = text
+                    stage_s["extract"] += seconds[act]
+                    stage_n["extract"][0] += 1
+                extract_wall = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            futures = {act: pool.submit(build_act, act, todo[act][0], texts[act], args.cache_dir, code, args.force)
+                       for act in todo}
+            results = {}
+            for act, fut in futures.items():
+                try:
+                    results[act] = fut.result()
+                except Exception as e:
+                    print(f"[ERROR] {act}: {e}")
+            build_wall = time.perf_counter() - t0
+
+        for act, res in results.items():
+            kind, path, src_hash = todo[act]
+            for stage, t in res["timings"].items():
+                stage_s[stage] += t["s"]
+                stage_n[stage][1 if t["cached"] else 0] += 1
+            manifest["acts"][act] = {
+                "kind": kind,
+                "source": path,
+                "source_hash": src_hash,
+                "code": code,
+                "chunks": res["chunks"],
+                "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "outputs": [os.path.join(JSON_DIR, f"{act}.json"), os.path.join(CHUNKS_DIR, f"{act}_Chunks.json")],
+            }
+            print(f" {act} ({kind}) → {res['chunks']} chunks")
+
+    manifest["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    write_atomic(manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False))
+
+    print(f"\n  {'stage':<10} {'built':>5} {'cached':>6} {'cpu_s':>8}")
+    print(f"  {'hash':<10} {len(sources):>5} {'':>6} {hash_s:>8.2f}")
+    for stage in STAGES:
+        built, cached = stage_n[stage]
+        print(f"  {stage:<10} {built:>5} {cached:>6} {stage_s[stage]:>8.2f}")
+    print(f"  wall: extract {extract_wall:.2f} s, clean+structure+chunk {build_wall:.2f} s, "
+          f"total {time.perf_counter() - t_start:.2f} s with {args.workers} workers")
+    if todo:
+        print("\nNext: createEmbeddings.py to embed the chunks (then buildClauseIndex.py), buildDefinitions.py to refresh the definitions index.")
+
+
+if __name__ == "__main__":
+    main()
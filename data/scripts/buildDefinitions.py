@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Tuple
+
+from splitChunks import section_identity, clean_text
+
+# Keys must be built exactly the way the backend looks them up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from definitions import term_key  # noqa: E402
+
+REPO_ROOT     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+INPUT_FOLDER  = "../ActsinJson"
+OUTPUT_PATH   = "../ActDefinitions/definitionsIndex.json"
+
+# Same idea as definition_pattern in preprocess.py, but it also accepts curly quotes and
+# "includes" definitions, and runs to the next quoted term instead of the first ";",
+# so definitions with (a)/(b) lists survive intact.
+DEFINITION_RE = re.compile(
+    r"[\"“]([^\"”“]{1,80})[\"”]\s+(means|includes|has the (?:same )?meaning)\s+(.*?)(?=;\s*(?:and\s+|or\s+)?(?:\([a-z]{1,4}\)\s*)?[\"“]|;?\s*$)",
+    re.IGNORECASE | re.DOTALL,
+)
+INTERPRETATION_RE = re.compile(r"\binterpretation\b|\bdefinitions?\b", re.IGNORECASE)
+# The last definition of a section runs into the next subsection or the amendment history
+DEFINITION_END_RE = re.compile(r"\.\s*\(\d+[A-Z]?\)\s|\s*\[(?:Act|L\.N\.|Cap\.) ")
+# Numbered paragraph of a schedule ("1. Interpretation"), same shape as a section line in preprocess.py
+PARAGRAPH_RE = re.compile(r"^\s*(\d+[A-Z]?)\.\s*(.*)")
+
+
+def schedule_paragraphs(node: Dict[str, Any], part: str = "") -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(part, paragraph number, {"Heading", "Content"}) for each numbered paragraph of a schedule
+    (preprocess.py's Schedules entries), so their interpretation paragraphs are harvested like sections."""
+    part = f"{part} > {node.get('Heading', '')}" if part else node.get("Heading", "")
+    out: List[Tuple[str, str, Dict[str, Any]]] = []
+    for item in node.get("Content") or []:
+        if isinstance(item, dict):
+            out.extend(schedule_paragraphs(item, part))
+            continue
+        m = PARAGRAPH_RE.match(item)
+        if m:
+            out.append((part, m.group(1), {"Heading": m.group(2), "Content": ""}))
+        elif out and out[-1][0] == part:
+            out[-1][2]["Content"] += " " + item
+    return out
+
+
+def harvest_section(act: str, part: str, sec_num: str, sec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    heading = (sec.get("Heading") or "").strip()
+    content = clean_text(sec.get("Content") or "")
+    section = section_identity(sec_num, heading)
+    found: Dict[str, Dict[str, Any]] = {}
+
+    for m in DEFINITION_RE.finditer(content):
+        term, kind, text = m.group(1).strip(), m.group(2).lower(), clean_text(m.group(3)).rstrip(";")
+        text = DEFINITION_END_RE.split(text, maxsplit=1)[0].strip()
+        if not term or not text:
+            continue
+        found.setdefault(term_key(term), {
+            "term": term,
+            "kind": kind,
+            "definition": text,
+        })
+    # Anything preprocess_law captured that the wider pattern missed
+    for term, text in (sec.get("Definitions") or {}).items():
+        key = term_key(term)
+        if key and key not in found and text:
+            found[key] = {"term": term.strip(), "kind": "means", "definition": clean_text(text)}
+
+    out = []
+    for key, d in found.items():
+        if not key:
+            continue
+        out.append({
+            "key": key,
+            "term": d["term"],
+            "kind": d["kind"],
+            "definition": d["definition"],
+            "act": act,
+            "part": part,
+            "section": section,
+            "section_number": str(sec_num),
+        })
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the term -> (Act, section, definition) index.")
+    parser.add_argument("--input_folder", type=str, default=INPUT_FOLDER)
+    parser.add_argument("--output", type=str, default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    entries: List[Dict[str, Any]] = []
+    per_act: Dict[str, int] = {}
+    for fp in sorted(glob.glob(os.path.join(args.input_folder, "*.json"))):
+        with open(fp, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        act = data.get("Act", os.path.splitext(os.path.basename(fp))[0])
+        for part, sections in (data.get("Parts") or {}).items():
+            if not isinstance(sections, dict):
+                continue
+            for sec_num, sec in sections.items():
+                if not isinstance(sec, dict):
+                    continue
+                if not (INTERPRETATION_RE.search(sec.get("Heading") or "") or sec.get("Definitions")):
+                    continue
+                got = harvest_section(act, part, sec_num, sec)
+                entries.extend(got)
+                per_act[act] = per_act.get(act, 0) + len(got)
+        for schedule in data.get("Schedules") or []:
+            for part, para_num, para in schedule_paragraphs(schedule):
+                if not INTERPRETATION_RE.search(para["Heading"]):
+                    continue
+                got = harvest_section(act, part, para_num, para)
+                entries.extend(got)
+                per_act[act] = per_act.get(act, 0) + len(got)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "source": os.path.relpath(os.path.abspath(args.input_folder), REPO_ROOT),
+            "entries": entries,
+        }, f, indent=2, ensure_ascii=False)
+
+    for act, n in sorted(per_act.items()):
+        print(f"  {act:<35} {n:>4} definitions")
+    print(f" {len(entries)} definitions ({len({e['key'] for e in entries})} distinct terms) → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
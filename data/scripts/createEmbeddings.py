@@ -1,4 +1,4 @@
-import os, glob, json, hashlib
+import os, re, glob, json, hashlib
 from typing import List, Dict
 from sentence_transformers import SentenceTransformer
 from chromaInit import get_chroma_collection  
@@ -10,32 +10,98 @@ BATCH_SIZE          = int(os.getenv("BATCH_SIZE", "64"))
 HF_MODEL            = os.getenv("HF_MODEL", "intfloat/e5-base-v2")
 NEW_COLLECTION_NAME = os.getenv("NEW_COLLECTION", "actSectionsV2")
 ADD_E5_PREFIX       = os.getenv("ADD_E5_PREFIX", "1") == "1"
+# "none" = one monolithic collection (default), "act" = one collection per Act,
+# "groups" = one collection per group listed in SHARD_GROUPS_FILE ({"group": ["Act", ...]})
+SHARD_LAYOUT        = os.getenv("SHARD_LAYOUT", "none").lower()
+SHARD_GROUPS_FILE   = os.getenv("SHARD_GROUPS_FILE", "")
+# hnswConfig.json from backend/tuneHnsw.py: build the collection with the tuned HNSW parameters
+HNSW_CONFIG         = os.getenv("HNSW_CONFIG", "")
 
 
+def hnsw_metadata(path: str) -> Dict:
+    """Chroma's hnsw:* creation metadata from a tuned config; empty = Chroma's defaults."""
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    keys = {"space": "hnsw:space", "M": "hnsw:M", "construction_ef": "hnsw:construction_ef", "search_ef": "hnsw:search_ef"}
+    return {meta_key: cfg[k] for k, meta_key in keys.items() if cfg.get(k) is not None}
+
+HNSW_METADATA = hnsw_metadata(HNSW_CONFIG)
+
 model = SentenceTransformer(HF_MODEL)
 model.max_seq_length = 512
 
 collection = None
-try:
-    collection = get_chroma_collection(NEW_COLLECTION_NAME)
-except TypeError:
+if SHARD_LAYOUT == "none":
     try:
-        import chromadb
-        from chromadb.config import Settings
-        client = chromadb.PersistentClient(
-            path=os.getenv("CHROMA_PATH", "./chroma"),
-            settings=Settings(allow_reset=True)
-        )
-        collection = client.get_or_create_collection(
-            NEW_COLLECTION_NAME,
-            metadata={"model": HF_MODEL, "source": "ActsinSectionChunks"}
-        )
-        print(f"[info] Using direct Chroma client. Created/loaded collection: {NEW_COLLECTION_NAME}")
-    except Exception as e:
-        print(f"[warn] Named collection not supported and direct client failed ({e}). "
-              f"Falling back to default get_chroma_collection(). This may MIX embeddings with the old table.")
-        collection = get_chroma_collection()
-
+        collection = get_chroma_collection(NEW_COLLECTION_NAME)
+    except TypeError:
+        try:
+            import chromadb
+            from chromadb.config import Settings
+            client = chromadb.PersistentClient(
+                path=os.getenv("CHROMA_PATH", "./chroma"),
+                settings=Settings(allow_reset=True)
+            )
+            collection = client.get_or_create_collection(
+                NEW_COLLECTION_NAME,
+                metadata={"model": HF_MODEL, "source": "ActsinSectionChunks", **HNSW_METADATA}
+            )
+            print(f"[info] Using direct Chroma client. Created/loaded collection: {NEW_COLLECTION_NAME}")
+        except Exception as e:
+            print(f"[warn] Named collection not supported and direct client failed ({e}). "
+                  f"Falling back to default get_chroma_collection(). This may MIX embeddings with the old table.")
+            collection = get_chroma_collection()
+
+
+def shard_collection_name(base: str, key: str) -> str:
+    # Chroma names: 3-63 chars of [a-zA-Z0-9._-], alphanumeric at both ends
+    slug = re.sub(r"[^a-z0-9]+", "-", key.lower()).strip("-") or "shard"
+    name = f"{base}__{slug}"
+    if len(name) > 63:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:54].rstrip('-_.')}-{digest}"
+    return name
+
+def load_shard_groups(path: str) -> Dict[str, str]:
+    """Act -> group key from SHARD_GROUPS_FILE."""
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        groups = json.load(f)
+    return {act: group for group, acts in groups.items() for act in acts}
+
+def plan_shards(act_names: List[str]) -> Dict[str, List[str]]:
+    """Shard key -> Acts it holds, for the configured SHARD_LAYOUT."""
+    groups = load_shard_groups(SHARD_GROUPS_FILE) if SHARD_LAYOUT == "groups" else {}
+    plan: Dict[str, List[str]] = {}
+    for act in act_names:
+        key = groups.get(act, act) if SHARD_LAYOUT == "groups" else act
+        plan.setdefault(key, []).append(act)
+    return plan
+
+def get_shard_collection(key: str, acts: List[str]):
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(
+        path=os.getenv("CHROMA_PATH", "./chroma"),
+        settings=Settings(allow_reset=True)
+    )
+    name = shard_collection_name(NEW_COLLECTION_NAME, key)
+    coll = client.get_or_create_collection(
+        name,
+        metadata={
+            "model": HF_MODEL,
+            "source": "ActsinSectionChunks",
+            "shard_of": NEW_COLLECTION_NAME,
+            "shard_key": key,
+            "shard_acts": json.dumps(sorted(acts), ensure_ascii=False),
+            **HNSW_METADATA,
+        }
+    )
+    print(f"[info] Shard '{key}' -> collection {name} ({len(acts)} Acts)")
+    return coll
 
 def deterministic_id(act: str, section: str, chunk_id: int, model_tag: str) -> str:
     raw = f"{act}::{section}::{chunk_id}::{model_tag}"
@@ -51,12 +117,27 @@ def sanitize_metadata(meta: Dict) -> Dict:
   
     return {k: v for k, v in meta.items() if v is not None}
 
+def act_name_for(file_path: str) -> str:
+    return os.path.splitext(os.path.basename(file_path))[0].replace("_Chunks", "")
+
 chunk_files = glob.glob(os.path.join(CHUNKS_DIR, "*.json"))
 print(f"Found {len(chunk_files)} chunk files in {CHUNKS_DIR}")
 
+shard_for_act: Dict[str, object] = {}
+if SHARD_LAYOUT in ("act", "groups"):
+    plan = plan_shards([act_name_for(fp) for fp in chunk_files])
+    for key, acts in plan.items():
+        coll = get_shard_collection(key, acts)
+        for a in acts:
+            shard_for_act[a] = coll
+    print(f"[info] SHARD_LAYOUT={SHARD_LAYOUT}: {len(plan)} shards of '{NEW_COLLECTION_NAME}'")
+elif SHARD_LAYOUT != "none":
+    raise ValueError(f"Unknown SHARD_LAYOUT: {SHARD_LAYOUT}")
+
 for file_idx, file_path in enumerate(sorted(chunk_files), start=1):
-    act_name = os.path.splitext(os.path.basename(file_path))[0].replace("_Chunks", "")
+    act_name = act_name_for(file_path)
     print(f"\n[{file_idx}/{len(chunk_files)}] Embedding: {act_name}")
+    target = shard_for_act.get(act_name, collection)
 
     with open(file_path, "r", encoding="utf-8") as f:
         chunks: List[Dict] = json.load(f)
@@ -95,8 +176,8 @@ for file_idx, file_path in enumerate(sorted(chunk_files), start=1):
             for m in metadatas
         ]
 
-        collection.add(documents=texts, embeddings=embeddings, metadatas=metadatas, ids=ids)
+        target.add(documents=texts, embeddings=embeddings, metadatas=metadatas, ids=ids)
 
-    print(f" → Completed embedding {len(chunks)} chunks for {act_name} into collection '{NEW_COLLECTION_NAME}'")
+    print(f" → Completed embedding {len(chunks)} chunks for {act_name} into collection '{target.name}'")
 
 print("\n All section chunks embedded into the NEW Chroma collection .")
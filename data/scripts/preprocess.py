@@ -10,11 +10,20 @@ def preprocess_law(text, act_name="Unknown Act"):
 
     current_part = "General"
     current_section = None
+    # Schedules (rates, forms, lists) come after the last section; once the first one starts,
+    # every line belongs to a schedule, so their numbered paragraphs don't become sections.
+    schedules = []
+    current_schedule = None
+    current_block = None
 
     
     part_pattern = re.compile(r'Part\s+([IVXLC]+)\s*[-–]?\s*(.*)', re.IGNORECASE)
     section_pattern = re.compile(r'^\s*(\d+)\.\s*(.*)', re.MULTILINE)
     definition_pattern = re.compile(r'"([^"]+)"\s+means\s+(.*?)(?=(;|$))', re.IGNORECASE)
+    schedule_pattern = re.compile(
+        r'^((?:FIRST|SECOND|THIRD|FOURTH|FIFTH|SIXTH|SEVENTH|EIGHTH|NINTH|TENTH|ELEVENTH|TWELFTH|THIRTEENTH|'
+        r'FOURTEENTH|FIFTEENTH)\s+)?SCHEDULE\b\s*(\[[^\]]*\]?|\(ss?\.[^A-Z]*)?\s*(.*)$'
+    )
 
     lines = text.splitlines()
 
@@ -24,6 +33,37 @@ def preprocess_law(text, act_name="Unknown Act"):
             continue
 
         
+        schedule_match = schedule_pattern.match(line)
+        if schedule_match:
+            ordinal, reference, title = schedule_match.groups()
+            current_schedule = {"Heading": f"{ordinal or ''}SCHEDULE", "Content": []}
+            if reference:
+                reference = reference.strip()[1:]
+                if reference.endswith("]") or (reference.endswith(")") and reference.count(")") > reference.count("(")):
+                    reference = reference[:-1]
+                current_schedule["Reference"] = reference.strip()
+            if title.strip():
+                current_schedule["Heading"] += f" – {title.strip()}"
+            current_block = current_schedule["Content"]
+            schedules.append(current_schedule)
+            continue
+
+        if current_schedule is not None:
+            letters = re.sub(r'[^A-Za-z]', '', line)
+            part_match = part_pattern.match(line)
+            if part_match:
+                roman, heading = part_match.groups()
+                block = {"Heading": f"Part {roman} – {heading.strip()}", "Content": []}
+                current_schedule["Content"].append(block)
+                current_block = block["Content"]
+            elif (" – " not in current_schedule["Heading"] and not current_schedule["Content"]
+                    and len(letters) >= 3 and sum(c.isupper() for c in letters) >= 0.8 * len(letters)
+                    and line[0] not in "[("):
+                current_schedule["Heading"] += f" – {line}"   # title on the line after "FIRST SCHEDULE [s. 8(1)]"
+            else:
+                current_block.append(line)
+            continue
+
         part_match = part_pattern.match(line)
         if part_match:
             roman, heading = part_match.groups()
@@ -64,6 +104,9 @@ def preprocess_law(text, act_name="Unknown Act"):
                 if definitions:
                     sec_data["Definitions"] = definitions
 
+    if schedules:
+        structured_data["Schedules"] = schedules
+
     return structured_data
 
 
@@ -79,7 +122,7 @@ if __name__ == "__main__":
             input_path = os.path.join(input_dir, filename)
             output_path = os.path.join(output_dir, f"{act_name}.json")
 
-            with open(input_path, "r", encoding="utf-8") as f:
+            with open(input_path, "r", encoding="utf-8-sig") as f:
                 text = f.read()
 
             structured = preprocess_law(text, act_name=act_name)
@@ -17,6 +17,13 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 WS_RE = re.compile(r"\s+")
 LIST_BULLET_RE = re.compile(r"^\s*(?:\d+\.|\(\d+\)|[a-z]\)|[A-Z]\)|[-•])\s+")
 SUBCLAUSE_RE = re.compile(r"^\s*(?:\(\w{1,3}\))\s+")  # (a) (b) (i) (ii) etc.
+# The same markers inside a chunk (chunk text has its newlines collapsed): "(1)", "(a)", "(iv)", "a)"
+INLINE_CLAUSE_RE = re.compile(r"(?<!\S)(?:\(\w{1,4}\)|[a-z]\))(?=\s)")
+SENTENCE_END_RE = re.compile(r"(?<=[.;])\s+(?=[A-Z\"“])")
+# "... under section (2)", "paragraphs (a) and (b)": a reference, not the start of a clause
+REFERENCE_WORD_RE = re.compile(r"(?:sub)?(?:section|paragraph|regulation|rule|article|clause)s?$|^(?:and|or|to|of|in)$", re.IGNORECASE)
+MIN_CLAUSE_CHARS  = 40
+MAX_CLAUSE_CHARS  = 600
 
 def clean_text(text: str) -> str:
     """Collapse whitespace, trim."""
@@ -53,6 +60,51 @@ def soft_paragraph_split(raw: str) -> List[str]:
  
     return [p for p in chunks if p] or [raw.strip()]
 
+def clause_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    (start, end) character spans of the sentences / sub-clauses of a chunk, for the clause
+    index (buildClauseIndex.py). Cuts before (1) / (a) markers and after sentence ends; short
+    pieces join the next one, long ones are cut at a space.
+    """
+    cuts = {0, len(text)}
+    for m in INLINE_CLAUSE_RE.finditer(text):
+        before = text[:m.start()].rstrip().rsplit(" ", 2)
+        listed = len(before) > 1 and before[-2].endswith((";", ","))   # "...; or (iv) ..." ends a list
+        if listed or not REFERENCE_WORD_RE.search(before[-1]):
+            cuts.add(m.start())
+    cuts.update(m.end() for m in SENTENCE_END_RE.finditer(text))
+    bounds = sorted(cuts)
+
+    spans: List[Tuple[int, int]] = []
+    start = None
+    for a, b in zip(bounds, bounds[1:]):
+        start = a if start is None else start
+        if len(text[start:b].strip()) >= MIN_CLAUSE_CHARS or b == len(text):
+            spans.append((start, b))
+            start = None
+    if len(spans) >= 2 and len(text[spans[-1][0]:spans[-1][1]].strip()) < MIN_CLAUSE_CHARS:
+        spans[-2:] = [(spans[-2][0], spans[-1][1])]
+
+    out: List[Tuple[int, int]] = []
+    for a, b in spans:
+        while b - a > MAX_CLAUSE_CHARS:
+            cut = text.rfind(" ", a + MIN_CLAUSE_CHARS, a + MAX_CLAUSE_CHARS)
+            if cut <= a:
+                break
+            out.append((a, cut))
+            a = cut
+        out.append((a, b))
+    # Trim the whitespace around each span
+    trimmed = []
+    for a, b in out:
+        while a < b and text[a].isspace():
+            a += 1
+        while b > a and text[b - 1].isspace():
+            b -= 1
+        if b > a:
+            trimmed.append((a, b))
+    return trimmed
+
 def chunk_with_overlap(text: str, max_tokens: int, overlap: int) -> List[str]:
    
     toks = tokenize(clean_text(text))
@@ -197,11 +249,163 @@ def make_section_chunks(
 
     return chunks, counter
 
+# --- Schedules ---
+# Schedules are tables and lists (rates, tariff lines, forms), not running text. They used to be
+# chunked as json.dumps output; now they are walked item by item and each item is written as
+# plain text, with its place in the schedule kept in section_path.
+TITLE_KEYS   = ("heading", "title", "name")
+CONTENT_KEYS = ("content", "text", "body", "paragraphs")
+ROWS_KEYS    = ("rows", "items", "entries")
+HEADER_KEYS  = ("columns", "headers", "header")
+SHORT_VALUE_TOKENS = 12   # a longer string under a key is a paragraph of its own, not a "key: value" field
+
+def scalar_text(v: Any) -> str:
+    return "" if v is None or isinstance(v, (dict, list)) else clean_text(str(v))
+
+def render_row(row: Any, header: List[str]) -> str:
+    """One table row as "Column: value; Column: value." (bare values if there is no header)."""
+    if isinstance(row, dict):
+        pairs = [(str(k), scalar_text(v)) for k, v in row.items()]
+    else:
+        cells = [scalar_text(v) for v in (row if isinstance(row, list) else [row])]
+        pairs = [(header[i] if i < len(header) else "", c) for i, c in enumerate(cells)]
+    text = "; ".join(f"{k}: {v}" if k else v for k, v in pairs if v)
+    return text + "." if text and text[-1] not in ".;:" else text
+
+def is_table(rows: List[Any]) -> bool:
+    """A list of flat dicts or of flat lists."""
+    if len(rows) < 2:
+        return False
+    if all(isinstance(r, dict) for r in rows):
+        return all(not isinstance(v, (dict, list)) for r in rows for v in r.values())
+    if all(isinstance(r, list) for r in rows):
+        return all(not isinstance(v, (dict, list)) for r in rows for v in r)
+    return False
+
+def schedule_items(node: Any, path: List[str]) -> List[Tuple[List[str], str]]:
+    """(path, text) for every paragraph and table row of a schedule, in document order."""
+    items: List[Tuple[List[str], str]] = []
+    if isinstance(node, str):
+        for para in soft_paragraph_split(node) if node.strip() else []:
+            para = clean_text(para)
+            if para:
+                items.append((path, para))
+    elif isinstance(node, list):
+        if is_table(node):
+            header: List[str] = []
+            rows = node
+            if isinstance(node[0], list) and all(isinstance(v, str) for v in node[0]):
+                header, rows = [clean_text(v) for v in node[0]], node[1:]   # first row is the header
+            for row in rows:
+                text = render_row(row, header)
+                if text:
+                    items.append((path, text))
+        else:
+            for item in node:
+                items.extend(schedule_items(item, path))
+    elif isinstance(node, dict):
+        lower = {str(k).lower(): k for k in node}
+        title = next((scalar_text(node[lower[k]]) for k in TITLE_KEYS if k in lower), "")
+        here = path + [title] if title else path
+        header = next(([scalar_text(h) for h in node[lower[k]]] for k in HEADER_KEYS
+                       if k in lower and isinstance(node[lower[k]], list)), [])
+        for k, v in node.items():
+            key = str(k).lower()
+            if key in TITLE_KEYS or key in HEADER_KEYS:
+                continue
+            if key in ROWS_KEYS and isinstance(v, list) and header:
+                items.extend((here, t) for t in (render_row(r, header) for r in v) if t)
+            elif key in CONTENT_KEYS or key in ROWS_KEYS:
+                items.extend(schedule_items(v, here))
+            elif isinstance(v, (dict, list)) or (isinstance(v, str) and len(tokenize(v)) > SHORT_VALUE_TOKENS):
+                items.extend(schedule_items(v, here + [clean_text(str(k))]))
+            else:
+                text = scalar_text(v)
+                if text:
+                    items.append((here, f"{clean_text(str(k))}: {text}"))
+    elif node is not None:
+        text = scalar_text(node)
+        if text:
+            items.append((path, text))
+    return items
+
+def common_path(paths: List[List[str]]) -> List[str]:
+    out: List[str] = []
+    for level in zip(*paths):
+        if any(p != level[0] for p in level):
+            break
+        out.append(level[0])
+    return out
+
+def make_schedule_chunks(act_name: str, schedules: Any, global_counter_start: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Chunks for an Act's Schedules: consecutive items of the same schedule are packed up to
+    MAX_TOKENS (an item longer than that is windowed on its own). section is the schedule's
+    name and section_path the deepest path all of the chunk's items share.
+    """
+    chunks: List[Dict[str, Any]] = []
+    counter = global_counter_start
+    items = schedule_items(schedules, [])
+
+    def emit(paths: List[List[str]], text: str):
+        nonlocal counter
+        path = common_path(paths)
+        name = path[0] if path else "Schedules"
+        chunks.append({
+            "act": act_name,
+            "part": "Schedules",
+            "section": name,
+            "section_number": name,
+            "section_title": name,
+            "section_path": " > ".join(["Schedules"] + path),
+            "chunk_index": len(chunks) + 1,
+            "chunk_id": counter,
+            "text": text
+        })
+        counter += 1
+
+    buffer_tokens: List[str] = []
+    buffer_paths: List[List[str]] = []
+    for path, text in items:
+        toks = tokenize(text)
+        same_schedule = buffer_paths and buffer_paths[0][:1] == path[:1]
+        if buffer_tokens and (not same_schedule or len(buffer_tokens) + len(toks) > MAX_TOKENS):
+            emit(buffer_paths, detokenize(buffer_tokens))
+            buffer_tokens, buffer_paths = [], []
+        if len(toks) > MAX_TOKENS:
+            for sub in chunk_with_overlap(text, MAX_TOKENS, OVERLAP_TOKENS):
+                emit([path], sub)
+            continue
+        buffer_tokens.extend(toks)
+        buffer_paths.append(path)
+    if buffer_tokens:
+        emit(buffer_paths, detokenize(buffer_tokens))
+
+    for i, ch in enumerate(chunks):
+        ch["prev_chunk_id"] = chunks[i-1]["chunk_id"] if i > 0 else None
+        ch["next_chunk_id"] = chunks[i+1]["chunk_id"] if i < len(chunks)-1 else None
+
+    return chunks, counter
+
+def schedule_report(schedules: Any) -> Dict[str, int]:
+    """Chunks and indexed tokens (overlaps included) of the Schedules: json.dumps windows vs per-item chunks."""
+    old = chunk_with_overlap(json.dumps(schedules, ensure_ascii=False, indent=2), MAX_TOKENS, OVERLAP_TOKENS)
+    new, _ = make_schedule_chunks("", schedules, 1)
+    return {
+        "json_chunks": len(old),
+        "json_tokens": sum(len(tokenize(t)) for t in old),
+        "chunks": len(new),
+        "tokens": sum(len(tokenize(c["text"])) for c in new),
+    }
+
 def process_file(file_path: str) -> List[Dict[str, Any]]:
     with open(file_path, "r", encoding="utf-8") as f:
         data = json.load(f)
+    return process_act(data, os.path.splitext(os.path.basename(file_path))[0])
 
-    act_name = data.get("Act", os.path.splitext(os.path.basename(file_path))[0])
+def process_act(data: Dict[str, Any], default_name: str) -> List[Dict[str, Any]]:
+    """Chunks for one Act's structured JSON (what preprocess_law produces)."""
+    act_name = data.get("Act", default_name)
     act_year = data.get("Year") or data.get("year")  # if present in your JSON
 
     parts: Dict[str, Any] = data.get("Parts", {}) or {}
@@ -273,38 +477,34 @@ def process_file(file_path: str) -> List[Dict[str, Any]]:
 
 
     if schedules:
-        sch_text = json.dumps(schedules, ensure_ascii=False, indent=2)
-        for i, txt in enumerate(chunk_with_overlap(sch_text, MAX_TOKENS, OVERLAP_TOKENS), 1):
-            all_chunks.append({
-                "act": act_name,
-                "act_year": act_year,
-                "part": "Schedules",
-                "section": "Schedules",
-                "section_number": "Schedules",
-                "section_title": "Schedules",
-                "section_path": "Schedules",
-                "chunk_index": i,
-                "chunk_id": gid,
-                "text": txt,
-                "prev_chunk_id": all_chunks[-1]["chunk_id"] if all_chunks else None,
-                "next_chunk_id": None
-            })
-            if len(all_chunks) >= 2:
-                all_chunks[-2]["next_chunk_id"] = gid
-            gid += 1
+        sch_chunks, gid = make_schedule_chunks(act_name, schedules, gid)
+        for ch in sch_chunks:
+            ch["act_year"] = act_year
+            if all_chunks:
+                ch["prev_chunk_id"] = all_chunks[-1]["chunk_id"]
+                all_chunks[-1]["next_chunk_id"] = ch["chunk_id"]
+            all_chunks.append(ch)
 
     return all_chunks
 
 def main():
     input_files = glob.glob(os.path.join(INPUT_FOLDER, "*.json"))
     for fp in input_files:
-        chunks = process_file(fp)
+        with open(fp, "r", encoding="utf-8") as f:
+            data = json.load(f)
         base = os.path.splitext(os.path.basename(fp))[0]
+        chunks = process_act(data, base)
         out_path = os.path.join(OUTPUT_FOLDER, f"{base}_Chunks.json")
         with open(out_path, "w", encoding="utf-8") as out_f:
             json.dump(chunks, out_f, ensure_ascii=False, indent=2)
         act_name = chunks[0]["act"] if chunks else base
         print(f" {act_name} chunked into {len(chunks)} pieces → {out_path}")
+        schedules = data.get("Schedules") or data.get("schedules")
+        if schedules:
+            r = schedule_report(schedules)
+            saved = 100.0 * (1 - r["tokens"] / r["json_tokens"]) if r["json_tokens"] else 0.0
+            print(f"   Schedules: {r['json_chunks']} → {r['chunks']} chunks, "
+                  f"{r['json_tokens']} → {r['tokens']} tokens ({saved:.0f}% fewer)")
 
 if __name__ == "__main__":
     main()
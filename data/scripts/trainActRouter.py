@@ -0,0 +1,147 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from actRouter import question_hash  # noqa: E402
+from shards import iter_collection  # noqa: E402
+
+
+def train_softmax(X: np.ndarray, y: np.ndarray, n_classes: int, epochs: int, lr: float,
+                  l2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Class-balanced multinomial logistic regression, full-batch gradient descent with momentum."""
+    n, d = X.shape
+    counts = np.bincount(y, minlength=n_classes).astype(np.float32)
+    sample_w = (n / (n_classes * np.maximum(counts, 1)))[y]
+    sample_w /= sample_w.sum()
+    Y = np.zeros((n, n_classes), dtype=np.float32)
+    Y[np.arange(n), y] = 1.0
+
+    W = np.zeros((n_classes, d), dtype=np.float32)
+    b = np.zeros(n_classes, dtype=np.float32)
+    vW = np.zeros_like(W)
+    vb = np.zeros_like(b)
+    for epoch in range(epochs):
+        logits = X @ W.T + b
+        logits -= logits.max(axis=1, keepdims=True)
+        P = np.exp(logits)
+        P /= P.sum(axis=1, keepdims=True)
+        G = (P - Y) * sample_w[:, None]
+        gW = G.T @ X + l2 * W
+        gb = G.sum(axis=0)
+        vW = 0.9 * vW - lr * gW
+        vb = 0.9 * vb - lr * gb
+        W += vW
+        b += vb
+        if epoch % 50 == 0 or epoch == epochs - 1:
+            loss = -float((np.log(P[np.arange(n), y] + 1e-9) * sample_w).sum())
+            acc = float((P.argmax(axis=1) == y).mean())
+            print(f"  epoch {epoch:>4}  loss={loss:.4f}  train_acc={acc:.3f}")
+    return W, b
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the query -> Act router used by backend/actRouter.py.")
+    parser.add_argument("--chroma_path", type=str, default="./chroma")
+    parser.add_argument("--collection", type=str, default="actSectionsV2")
+    parser.add_argument("--model", type=str, default="intfloat/e5-base-v2")
+    parser.add_argument("--output", type=str, default="./actRouter.npz")
+    parser.add_argument("--csv_path", type=str, default="../../testing/uhakiTestQuestions.csv",
+                        help="Labelled questions (question, act); a fraction of them can be used for training")
+    parser.add_argument("--csv_fraction", type=float, default=0.0,
+                        help="Share of the labelled questions to train on (the rest stay unseen for evalActRouter.py)")
+    parser.add_argument("--epochs", type=int, default=400)
+    parser.add_argument("--lr", type=float, default=20.0)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--temperature", type=float, default=0.05, help="Softmax temperature for centroid mode")
+    args = parser.parse_args()
+
+    try:
+        from sentence_transformers import SentenceTransformer
+        import chromadb
+    except Exception as e:
+        print("[ERROR] You need 'sentence-transformers' and 'chromadb' installed where you RUN this script.")
+        print("Details:", e)
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    coll = client.get_collection(name=args.collection)
+
+    # 1) Passage embeddings straight from the index, labelled by Act
+    vecs: List[np.ndarray] = []
+    labels: List[str] = []
+    titles: Dict[Tuple[str, str], None] = {}
+    for _, rec in iter_collection(coll, ["embeddings", "metadatas"]):
+        md = rec.get("metadatas") or {}
+        act = md.get("act")
+        if not act or rec.get("embeddings") is None:
+            continue
+        vecs.append(np.asarray(rec["embeddings"], dtype=np.float32))
+        labels.append(act)
+        title = (md.get("section_title") or "").strip()
+        if title and title.lower() != "preamble":
+            titles[(act, title)] = None
+    acts = sorted(set(labels))
+    act_idx = {a: i for i, a in enumerate(acts)}
+    P = np.vstack(vecs)
+    P /= np.linalg.norm(P, axis=1, keepdims=True) + 1e-12
+    y_p = np.array([act_idx[a] for a in labels])
+    print(f"[INFO] {len(P)} passages across {len(acts)} Acts")
+
+    # 2) Act centroids (mean passage direction)
+    centroids = np.vstack([P[y_p == i].mean(axis=0) for i in range(len(acts))])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+
+    # 3) Query-side examples: section headings as pseudo-queries (+ optionally labelled questions)
+    model = SentenceTransformer(args.model)
+    model.max_seq_length = 512
+    title_keys = list(titles)
+    Q = model.encode(["query: " + t for _, t in title_keys], normalize_embeddings=True, batch_size=64)
+    y_q = [act_idx[a] for a, _ in title_keys]
+    print(f"[INFO] {len(title_keys)} section-heading pseudo-queries")
+
+    trained_hashes: List[str] = []
+    if args.csv_fraction > 0 and Path(args.csv_path).exists():
+        df = pd.read_csv(args.csv_path, encoding="utf-8-sig")
+        cols = {c.lower(): c for c in df.columns}
+        rows = [(str(q).strip(), str(a).strip()) for q, a in zip(df[cols["question"]], df[cols["act"]])
+                if str(a).strip() in act_idx]
+        cut = int(args.csv_fraction * 100)
+        rows = [(q, a) for q, a in rows if int(question_hash(q), 16) % 100 < cut]
+        if rows:
+            QC = model.encode(["query: " + q for q, _ in rows], normalize_embeddings=True, batch_size=64)
+            Q = np.vstack([Q, QC])
+            y_q += [act_idx[a] for _, a in rows]
+            trained_hashes = [question_hash(q) for q, _ in rows]
+        print(f"[INFO] {len(trained_hashes)} labelled questions used for training")
+
+    X = np.vstack([P, np.asarray(Q, dtype=np.float32)])
+    y = np.concatenate([y_p, np.asarray(y_q)])
+
+    # 4) Linear model over the embedding
+    print(f"[INFO] Training softmax regression on {len(X)} examples ...")
+    W, b = train_softmax(X, y, len(acts), args.epochs, args.lr, args.l2)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        args.output,
+        acts=np.array(acts),
+        centroids=centroids.astype(np.float32),
+        W=W.astype(np.float32),
+        b=b.astype(np.float32),
+        temperature=np.float32(args.temperature),
+        model=np.array(args.model),
+        train_questions=np.array(trained_hashes),
+    )
+    print(f"[DONE] Router saved to {args.output} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@ import ReactMarkdown from "react-markdown";
 import "../Styles/MessageList.css";
 import robotLogo from "../Assets/robotlogo.webp";
 
-const MessageList = ({ messages = [], isTyping = false }) => {
+const MessageList = ({ messages = [], isTyping = false, onMoreSources }) => {
   const listRef = useRef(null);
-  const [sourcesModal, setSourcesModal] = useState(null);
+  const [sourcesModalId, setSourcesModalId] = useState(null);
+  // Looked up on every render so sources loaded while the modal is open show up in it.
+  const sourcesModal = messages.find((m) => m.id === sourcesModalId) || null;
 
   useEffect(() => {
     if (listRef.current) {
@@ -15,11 +17,12 @@ const MessageList = ({ messages = [], isTyping = false }) => {
 
   const openSourcesModal = (message) => {
     if (message.sources && message.sources.length > 0) {
-      setSourcesModal(message);
+      setSourcesModalId(message.id);
     }
   };
 
-  const closeModal = () => setSourcesModal(null);
+  const closeModal = () => setSourcesModalId(null);
+  const canLoadMore = (m) => Boolean(onMoreSources && ((m.heldSources || []).length > 0 || m.cursor));
 
   return (
     <div ref={listRef} className="message-list-container">
@@ -117,6 +120,15 @@ const MessageList = ({ messages = [], isTyping = false }) => {
                 </li>
               ))}
             </ol>
+            {canLoadMore(sourcesModal) && (
+              <button
+                type="button"
+                className="sources-more"
+                onClick={() => onMoreSources(sourcesModal.id)}
+              >
+                Show more sources
+              </button>
+            )}
           </div>
         </div>
       )}
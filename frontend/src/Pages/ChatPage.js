@@ -10,6 +10,14 @@ const ChatPage = ({ registerClear }) => {
   const bottomRef = useRef(null);
 
   const generateId = () => `${Date.now()}-${Math.random().toString(36).substr(2, 5)}`;
+  const newSessionId = () => `${Date.now().toString(36)}-${Math.random().toString(36).substr(2, 10)}`;
+
+  // One server-side session per conversation, so follow-up questions are answered in context.
+  // Every turn of a session after the first skips the server's caches, so the id lives only as long
+  // as the conversation does: this page view, until the chat is cleared or goes idle.
+  const CONVERSATION_IDLE_MS = 10 * 60 * 1000;
+  const sessionRef = useRef(null);
+  const lastTurnRef = useRef(0);
 
   useEffect(() => {
     const saved = localStorage.getItem("uhaki_chat_history");
@@ -34,6 +42,7 @@ const ChatPage = ({ registerClear }) => {
         const confirmClear = window.confirm("Are you sure you want to clear this chat?");
         if (confirmClear) {
           localStorage.removeItem("uhaki_chat_history");
+          sessionRef.current = null;
           setMessages([
             { id: generateId(), sender: 'uhaki', text: 'Hello, I�?Tm Uhaki, a legal assistant. How may I help you?' }
           ]);
@@ -52,6 +61,43 @@ const ChatPage = ({ registerClear }) => {
     return () => window.removeEventListener('resize', setBBHeight);
   }, []);
 
+  const formatSources = (results) =>
+    results.map((r) => ({
+      act: r.act || 'N/A',
+      section: r.section || 'N/A',
+      snippet: (r.text || '').replace(/\s+/g, ' ').slice(0, 200)
+    }));
+
+  // Next 3 sources of an answer: the ones already received first, then pages of the
+  // candidates the server kept for it (cursor).
+  const loadMoreSources = async (messageId) => {
+    const message = messages.find((m) => m.id === messageId);
+    if (!message) return;
+    const held = message.heldSources || [];
+    if (held.length > 0) {
+      setMessages((prev) => prev.map((m) => (m.id === messageId
+        ? { ...m, sources: [...(m.sources || []), ...held.slice(0, 3)], heldSources: held.slice(3) }
+        : m)));
+      return;
+    }
+    if (!message.cursor) return;
+    try {
+      const response = await fetch('http://localhost:5000/askQuery/more', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ cursor: message.cursor, limit: 3, snippet_chars: 200 }),
+      });
+      // 410: the server no longer holds the candidates; drop the button.
+      const data = response.ok ? await response.json() : {};
+      const more = Array.isArray(data.top_results) ? formatSources(data.top_results) : [];
+      setMessages((prev) => prev.map((m) => (m.id === messageId
+        ? { ...m, sources: [...(m.sources || []), ...more], cursor: data.cursor || null }
+        : m)));
+    } catch (error) {
+      console.error('Error loading more sources:', error);
+    }
+  };
+
   const handleSend = async (text) => {
     if (!text.trim()) return;
 
@@ -59,11 +105,22 @@ const ChatPage = ({ registerClear }) => {
     setMessages((prev) => [...prev, userMessage]);
     setIsTyping(true);
 
+    if (sessionRef.current === null || Date.now() - lastTurnRef.current > CONVERSATION_IDLE_MS) {
+      sessionRef.current = newSessionId();
+    }
+
     try {
       const response = await fetch('http://localhost:5000/askQuery', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ query: text }),
+        // Only the answer and short source snippets are shown; skip the duplicated context text.
+        body: JSON.stringify({
+          query: text,
+          snippet_chars: 200,
+          context_format: 'refs',
+          paginate: true,
+          session_id: sessionRef.current
+        }),
       });
 
       if (!response.ok) {
@@ -73,19 +130,18 @@ const ChatPage = ({ registerClear }) => {
       const data = await response.json();
       const results = Array.isArray(data.top_results) ? data.top_results : [];
       const answer = data.answer || "I'm sorry, I couldn�?Tt find a clear answer from the available acts.";
-      const formattedSources = results.slice(0, 3).map((r) => ({
-        act: r.act || 'N/A',
-        section: r.section || 'N/A',
-        snippet: (r.text || '').replace(/\s+/g, ' ').slice(0, 200)
-      }));
+      const formattedSources = formatSources(results.slice(0, 3));
 
       const uhakiAnswer = {
         id: generateId(),
         sender: 'uhaki',
         text: answer,
-        sources: formattedSources
+        sources: formattedSources,
+        heldSources: formatSources(results.slice(3)),
+        cursor: data.cursor || null
       };
       setMessages((prev) => [...prev, uhakiAnswer]);
+      lastTurnRef.current = Date.now();
 
     } catch (error) {
       console.error('Error sending query:', error);
@@ -105,7 +161,7 @@ const ChatPage = ({ registerClear }) => {
   return (
     <div className="ChatPage">
       <main className="ChatScroll">
-        <MessageList messages={messages} isTyping={isTyping} />
+        <MessageList messages={messages} isTyping={isTyping} onMoreSources={loadMoreSources} />
       </main>
 
       <div className="BottomBar" ref={bottomRef}>